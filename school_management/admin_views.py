@@ -2,7 +2,7 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied, ValidationError
-from django.db.models import Count, Avg
+from django.db.models import Count, Avg, Q
 from django.utils import timezone
 from django.views.generic import TemplateView
 from django.contrib import messages
@@ -14,6 +14,7 @@ from .models import (
     Evaluation, Note, Absence, Bulletin, Communication
 )
 from .permissions import get_user_type
+from .dashboard_cache import contexte_dashboard
 from .forms import (
     CustomUserCreationForm, CustomUserChangeForm,
     EleveUserForm, ProfesseurUserForm, ParentUserForm
@@ -32,6 +33,15 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        debut_mois = timezone.localdate().replace(day=1)
+        context.update(contexte_dashboard(
+            'admin', debut_mois.isoformat(), ['structure', 'global'], self.calculer_statistiques
+        ))
+        return context
+    
+    def calculer_statistiques(self):
+        """Statistiques du tableau de bord, mises en cache par contexte_dashboard"""
+        context = {}
         
         # Statistiques générales
         context['total_eleves'] = Eleve.objects.count()
@@ -46,8 +56,11 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
         context['total_bulletins'] = Bulletin.objects.count()
         
         # Statistiques des absences
-        context['total_absences'] = Absence.objects.count()
-        context['absences_non_justifiees'] = Absence.objects.filter(justifiee=False).count()
+        absences = Absence.objects.aggregate(
+            total=Count('id'), non_justifiees=Count('id', filter=Q(justifiee=False))
+        )
+        context['total_absences'] = absences['total']
+        context['absences_non_justifiees'] = absences['non_justifiees']
         
         # Statistiques des communications
         context['total_communications'] = Communication.objects.count()
@@ -55,18 +68,20 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
             date_creation__gte=timezone.now().replace(day=1)
         ).count()
         
-        # Moyennes par classe
+        # Moyennes par classe, une requête pour toutes les classes
         classes_stats = []
-        for classe in Classe.objects.all():
-            bulletins = Bulletin.objects.filter(classe=classe, statut='VALIDE')
-            if bulletins.exists():
-                moyenne_classe = bulletins.aggregate(avg=Avg('moyenne_generale'))['avg']
-                classes_stats.append({
-                    'classe': classe,
-                    'moyenne': round(moyenne_classe, 2) if moyenne_classe else 0,
-                    'effectif': classe.eleves.count(),
-                    'bulletins_valides': bulletins.count()
-                })
+        classes = Classe.objects.annotate(
+            moyenne=Avg('bulletins__moyenne_generale', filter=Q(bulletins__statut='VALIDE')),
+            bulletins_valides=Count('bulletins', filter=Q(bulletins__statut='VALIDE'), distinct=True),
+            effectif=Count('eleves', distinct=True)
+        ).filter(bulletins_valides__gt=0)
+        for classe in classes:
+            classes_stats.append({
+                'classe': classe,
+                'moyenne': round(classe.moyenne, 2) if classe.moyenne else 0,
+                'effectif': classe.effectif,
+                'bulletins_valides': classe.bulletins_valides
+            })
         
         context['classes_stats'] = sorted(classes_stats, key=lambda x: x['moyenne'], reverse=True)
         
@@ -74,23 +89,23 @@ class AdminDashboardView(LoginRequiredMixin, TemplateView):
         top_eleves = Bulletin.objects.filter(
             statut='VALIDE',
             moyenne_generale__isnull=False
-        ).order_by('-moyenne_generale')[:5]
+        ).select_related('eleve__user', 'classe').order_by('-moyenne_generale')[:5]
         
-        context['top_eleves'] = top_eleves
+        context['top_eleves'] = list(top_eleves)
         
         # Répartition par trimestre
         bulletins_par_trimestre = Bulletin.objects.values('trimestre').annotate(
             count=Count('id')
         ).order_by('trimestre')
         
-        context['bulletins_par_trimestre'] = bulletins_par_trimestre
+        context['bulletins_par_trimestre'] = list(bulletins_par_trimestre)
         
         # Professeurs avec le plus d'évaluations
-        profs_actifs = Professeur.objects.annotate(
+        profs_actifs = Professeur.objects.select_related('user').annotate(
             nb_evaluations=Count('evaluations')
         ).order_by('-nb_evaluations')[:5]
         
-        context['profs_actifs'] = profs_actifs
+        context['profs_actifs'] = list(profs_actifs)
         
         return context
 
@@ -148,6 +163,46 @@ def admin_statistics(request):
     return render(request, 'school_management/admin/statistics.html', context)
 
 
+@login_required
+def admin_metriques(request):
+    """Synthèse des requêtes SQL et de la latence par vue sur la dernière heure"""
+    from .metriques import FENETRE_MINUTES, SEUIL_N_PLUS_1, synthese, taux_echantillonnage
+    
+    user_type = get_user_type(request.user)
+    if user_type != 'admin':
+        raise PermissionDenied("Accès réservé aux administrateurs.")
+    
+    try:
+        minutes = min(max(int(request.GET.get('minutes', FENETRE_MINUTES)), 1), FENETRE_MINUTES)
+    except ValueError:
+        minutes = FENETRE_MINUTES
+    
+    context = {
+        'lignes': synthese(minutes),
+        'minutes': minutes,
+        'fenetre_max': FENETRE_MINUTES,
+        'echantillonnage': taux_echantillonnage() * 100,
+        'seuil_n_plus_1': SEUIL_N_PLUS_1,
+    }
+    return render(request, 'school_management/admin/metriques.html', context)
+
+
+def metrics(request):
+    """Cumuls des métriques par vue au format texte Prometheus"""
+    import hmac
+    from django.conf import settings
+    from django.http import HttpResponse
+    from .metriques import exposition_prometheus
+    
+    jeton = getattr(settings, 'METRIQUES_JETON', '')
+    autorisation = request.headers.get('Authorization', '')
+    if not (jeton and hmac.compare_digest(autorisation, f'Bearer {jeton}')):
+        if not request.user.is_authenticated or get_user_type(request.user) != 'admin':
+            raise PermissionDenied("Accès réservé aux administrateurs.")
+    
+    return HttpResponse(exposition_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 @login_required
 def admin_users_management(request):
     """Vue pour la gestion des utilisateurs"""
@@ -448,20 +503,16 @@ def admin_create_professeur_user(request, professeur_id):
         form = ProfesseurUserForm(request.POST, request.FILES, user=professeur.user)
         if form.is_valid():
             form.save()
-            messages.success(request, f'Compte utilisateur créé pour le professeur {professeur.nom} {professeur.prenom}.')
+            messages.success(request, f'Compte utilisateur créé pour le professeur {professeur.nom_complet}.')
             return redirect('school_management:admin_user_management')
     else:
+        # Le nom et l'email du professeur sont ceux de son compte, pré-remplis par le formulaire
         form = ProfesseurUserForm(user=professeur.user)
-        # Pré-remplir avec les données du professeur
-        form.fields['username'].initial = f"{professeur.prenom.lower()}.{professeur.nom.lower()}"
-        form.fields['first_name'].initial = professeur.prenom
-        form.fields['last_name'].initial = professeur.nom
-        form.fields['email'].initial = professeur.email
     
     context = {
         'form': form,
         'professeur': professeur,
-        'title': f'Créer un compte pour {professeur.prenom} {professeur.nom}'
+        'title': f'Créer un compte pour {professeur.nom_complet}'
     }
     
     return render(request, 'school_management/admin/professeur_user_form.html', context)
@@ -480,7 +531,7 @@ def admin_edit_professeur_user(request, professeur_id):
         form = ProfesseurUserForm(request.POST, request.FILES, instance=professeur, user=professeur.user)
         if form.is_valid():
             form.save()
-            messages.success(request, f'Professeur {professeur.nom} {professeur.prenom} modifié avec succès.')
+            messages.success(request, f'Professeur {professeur.nom_complet} modifié avec succès.')
             return redirect('school_management:admin_user_management')
     else:
         form = ProfesseurUserForm(instance=professeur, user=professeur.user)
@@ -488,7 +539,7 @@ def admin_edit_professeur_user(request, professeur_id):
     context = {
         'form': form,
         'professeur': professeur,
-        'title': f'Modifier {professeur.prenom} {professeur.nom}'
+        'title': f'Modifier {professeur.nom_complet}'
     }
     
     return render(request, 'school_management/admin/professeur_user_form.html', context)
@@ -0,0 +1,210 @@
+"""
+Service d'analyse des résultats
+
+Calcule tous les chiffres de la page d'analyse des résultats avec quelques
+agrégations SQL groupées et les conserve dans un instantané en cache. La clé
+de l'instantané contient un numéro de version incrémenté à chaque
+modification des notes : un instantané périmé n'est jamais relu, il expire.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, FloatField, Max, Min, Q, Sum, Window
+from django.db.models.functions import Cast, RowNumber, TruncMonth
+from django.utils import timezone
+
+from .models import Classe, Eleve, Matiere, MoyenneEleveMatiere, Note
+
+
+CLE_VERSION = 'analyse_resultats:version'
+DUREE_INSTANTANE = 60 * 60  # Les mois de l'évolution changent avec le temps
+NB_ELEVES_CLASSEMENT = 10
+NB_MOIS_EVOLUTION = 6
+
+
+def version_analyse_resultats():
+    version = cache.get(CLE_VERSION)
+    if version is None:
+        version = 1
+        cache.add(CLE_VERSION, version, None)
+    return version
+
+
+def invalider_analyse_resultats():
+    """Rend périmé l'instantané courant, appelé à chaque modification des notes"""
+    try:
+        cache.incr(CLE_VERSION)
+    except ValueError:
+        cache.set(CLE_VERSION, 2, None)
+
+
+def obtenir_analyse_resultats():
+    """Retourne l'instantané courant, en le calculant s'il n'existe pas"""
+    cle = f'analyse_resultats:{version_analyse_resultats()}'
+    instantane = cache.get(cle)
+    if instantane is None:
+        instantane = calculer_analyse_resultats()
+        cache.set(cle, instantane, DUREE_INSTANTANE)
+    return instantane
+
+
+def _moyenne_agregee():
+    return Cast(Sum('somme_notes'), FloatField()) / Sum('nombre_notes')
+
+
+def _statistiques_generales():
+    """Totaux et répartition des notes par tranches en une requête"""
+    return Note.objects.aggregate(
+        total_notes=Count('id'),
+        moyenne_generale=Avg('note'),
+        note_min=Min('note'),
+        note_max=Max('note'),
+        excellent=Count('id', filter=Q(note__gte=16)),
+        tres_bien=Count('id', filter=Q(note__gte=14, note__lt=16)),
+        bien=Count('id', filter=Q(note__gte=12, note__lt=14)),
+        assez_bien=Count('id', filter=Q(note__gte=10, note__lt=12)),
+        insuffisant=Count('id', filter=Q(note__lt=10)),
+    )
+
+
+def _classements_eleves():
+    """Meilleurs élèves et élèves en difficulté, classés par fonctions de fenêtre"""
+    lignes = list(
+        MoyenneEleveMatiere.objects.order_by().values('eleve').annotate(
+            moyenne=_moyenne_agregee(),
+            nb_notes=Sum('nombre_notes')
+        ).filter(nb_notes__gt=0).annotate(
+            rang=Window(RowNumber(), order_by=F('moyenne').desc()),
+            rang_inverse=Window(RowNumber(), order_by=F('moyenne').asc())
+        ).filter(
+            Q(rang__lte=NB_ELEVES_CLASSEMENT) |
+            Q(rang_inverse__lte=NB_ELEVES_CLASSEMENT, moyenne__lt=10)
+        )
+    )
+    eleves = Eleve.objects.select_related('classe').in_bulk([ligne['eleve'] for ligne in lignes])
+
+    def element(ligne):
+        return {
+            'eleve': eleves[ligne['eleve']],
+            'moyenne': ligne['moyenne'],
+            'nb_notes': ligne['nb_notes'],
+        }
+
+    meilleurs = sorted(
+        (ligne for ligne in lignes if ligne['rang'] <= NB_ELEVES_CLASSEMENT),
+        key=lambda ligne: ligne['rang']
+    )
+    difficulte = sorted(
+        (ligne for ligne in lignes
+         if ligne['rang_inverse'] <= NB_ELEVES_CLASSEMENT and ligne['moyenne'] < 10),
+        key=lambda ligne: ligne['rang_inverse']
+    )
+    return [element(ligne) for ligne in meilleurs], [element(ligne) for ligne in difficulte]
+
+
+def _performance_par(champ, objets, nom):
+    """Moyenne, min, max et nombre de notes groupés sur un champ de MoyenneEleveMatiere"""
+    performance = [
+        {
+            nom: objets[ligne[champ]],
+            'moyenne': ligne['moyenne'],
+            'min': ligne['min'],
+            'max': ligne['max'],
+            'count': ligne['count'],
+        }
+        for ligne in MoyenneEleveMatiere.objects.order_by().values(champ).annotate(
+            moyenne=_moyenne_agregee(),
+            min=Min('note_min'),
+            max=Max('note_max'),
+            count=Sum('nombre_notes')
+        ).filter(count__gt=0)
+    ]
+    performance.sort(key=lambda x: x['moyenne'], reverse=True)
+    return performance
+
+
+def _taux_reussite_classes(classes):
+    """Part des élèves de chaque classe ayant une moyenne d'au moins 10"""
+    reussites = Counter(
+        ligne['eleve__classe']
+        for ligne in MoyenneEleveMatiere.objects.order_by().values('eleve', 'eleve__classe').annotate(
+            moyenne=_moyenne_agregee(),
+            nb_notes=Sum('nombre_notes')
+        ).filter(nb_notes__gt=0, moyenne__gte=10)
+    )
+
+    taux_reussite = []
+    for classe in classes.values():
+        if classe.nb_eleves:
+            eleves_reussite = reussites[classe.id]
+            taux_reussite.append({
+                'classe': classe,
+                'taux_reussite': (eleves_reussite / classe.nb_eleves) * 100,
+                'eleves_reussite': eleves_reussite,
+                'total_eleves': classe.nb_eleves,
+            })
+    taux_reussite.sort(key=lambda x: x['taux_reussite'], reverse=True)
+    return taux_reussite
+
+
+def _evolution_moyennes():
+    """Moyenne et nombre de notes saisies pour chacun des derniers mois"""
+    maintenant = timezone.localtime()
+    mois = [maintenant.replace(day=1, hour=0, minute=0, second=0, microsecond=0)]
+    for _ in range(NB_MOIS_EVOLUTION - 1):
+        mois.append((mois[-1] - timedelta(days=1)).replace(day=1))
+    mois.reverse()
+
+    par_mois = {
+        ligne['mois'].date(): ligne
+        for ligne in Note.objects.filter(date_saisie__gte=mois[0]).annotate(
+            mois=TruncMonth('date_saisie')
+        ).order_by().values('mois').annotate(
+            moyenne=Avg('note'),
+            nb_notes=Count('id')
+        )
+    }
+
+    evolution = []
+    for debut in mois:
+        ligne = par_mois.get(debut.date(), {})
+        evolution.append({
+            'mois': debut.strftime('%B %Y'),
+            'moyenne': ligne.get('moyenne') or 0,
+            'nb_notes': ligne.get('nb_notes', 0),
+        })
+    return evolution
+
+
+def calculer_analyse_resultats():
+    """Calcule tous les chiffres de la page d'analyse des résultats"""
+    statistiques = _statistiques_generales()
+    meilleurs_eleves, eleves_difficulte = _classements_eleves()
+
+    matieres = Matiere.objects.in_bulk()
+    classes = Classe.objects.annotate(nb_eleves=Count('eleves')).in_bulk()
+
+    performance_matieres = _performance_par('matiere', matieres, 'matiere')
+    performance_classes = _performance_par('eleve__classe', classes, 'classe')
+    for ligne in performance_classes:
+        ligne['nb_eleves'] = ligne['classe'].nb_eleves
+
+    return {
+        'total_notes': statistiques['total_notes'],
+        'moyenne_generale': statistiques['moyenne_generale'] or 0,
+        'note_min': statistiques['note_min'] or 0,
+        'note_max': statistiques['note_max'] or 0,
+        'excellent': statistiques['excellent'],
+        'tres_bien': statistiques['tres_bien'],
+        'bien': statistiques['bien'],
+        'assez_bien': statistiques['assez_bien'],
+        'insuffisant': statistiques['insuffisant'],
+        'meilleurs_eleves': meilleurs_eleves,
+        'eleves_difficulte': eleves_difficulte,
+        'performance_matieres': performance_matieres,
+        'performance_classes': performance_classes,
+        'evolution_moyennes': _evolution_moyennes(),
+        'taux_reussite_classes': _taux_reussite_classes(classes),
+        'date_calcul': timezone.now(),
+    }
@@ -5,3 +5,6 @@ class SchoolManagementConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'school_management'
     verbose_name = 'Gestion École'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,235 @@
+"""
+Statistiques journalières et archivage des logs d'audit
+
+Les statistiques par jour et par action / par utilisateur sont incrémentées à
+chaque écriture de logs et servent aux indicateurs de la page des logs, sans
+parcourir la table AuditLog. L'archivage déplace les mois anciens dans des
+fichiers JSON Lines compressés (gzip) ; les statistiques de ces mois sont
+recalculées avant la suppression et restent donc consultables.
+"""
+import gzip
+import json
+import os
+from collections import Counter
+from datetime import date, datetime, time
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Min, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchiveAuditLog, AuditLog, StatistiqueAuditAction, StatistiqueAuditUtilisateur
+
+
+def _incrementer(modele, filtres, nombre):
+    if modele.objects.filter(**filtres).update(nombre=F('nombre') + nombre):
+        return
+    try:
+        with transaction.atomic():
+            modele.objects.create(nombre=nombre, **filtres)
+    except IntegrityError:
+        # Ligne créée entre-temps par un autre processus
+        modele.objects.filter(**filtres).update(nombre=F('nombre') + nombre)
+
+
+def incrementer_statistiques_audit(logs):
+    """Ajoute un lot de logs venant d'être écrits aux statistiques journalières"""
+    par_action = Counter()
+    par_utilisateur = Counter()
+    for log in logs:
+        jour = timezone.localdate(log.timestamp)
+        par_action[(jour, log.action)] += 1
+        par_utilisateur[(jour, log.user_id)] += 1
+
+    for (jour, action), nombre in par_action.items():
+        _incrementer(StatistiqueAuditAction, {'date': jour, 'action': action}, nombre)
+    for (jour, user_id), nombre in par_utilisateur.items():
+        _incrementer(StatistiqueAuditUtilisateur, {'date': jour, 'user_id': user_id}, nombre)
+
+
+def recalculer_statistiques_audit(debut=None, fin=None):
+    """
+    Recalcule exactement les statistiques des jours présents dans AuditLog
+
+    debut et fin (datetimes, fin exclue) restreignent la période. Les jours
+    déjà archivés, absents de la table, ne sont pas modifiés.
+    """
+    logs = AuditLog.objects.order_by()
+    if debut:
+        logs = logs.filter(timestamp__gte=debut)
+    if fin:
+        logs = logs.filter(timestamp__lt=fin)
+    remplir_statistiques_audit(logs, StatistiqueAuditAction, StatistiqueAuditUtilisateur)
+
+
+def remplir_statistiques_audit(logs, modele_action, modele_utilisateur):
+    """
+    Écrit les statistiques journalières des logs donnés, en remplaçant celles des mêmes jours
+
+    Les modèles sont passés en paramètre pour servir aussi depuis la migration
+    de remplissage initial, qui n'a accès qu'aux modèles historiques.
+    """
+    logs = logs.annotate(jour=TruncDate('timestamp'))
+
+    modele_action.objects.bulk_create(
+        [
+            modele_action(date=ligne['jour'], action=ligne['action'], nombre=ligne['nombre'])
+            for ligne in logs.values('jour', 'action').annotate(nombre=Count('id'))
+        ],
+        update_conflicts=True,
+        unique_fields=['date', 'action'],
+        update_fields=['nombre'],
+        batch_size=1000
+    )
+    modele_utilisateur.objects.bulk_create(
+        [
+            modele_utilisateur(date=ligne['jour'], user_id=ligne['user'], nombre=ligne['nombre'])
+            for ligne in logs.values('jour', 'user').annotate(nombre=Count('id'))
+        ],
+        update_conflicts=True,
+        unique_fields=['date', 'user'],
+        update_fields=['nombre'],
+        batch_size=1000
+    )
+
+
+def _debut_mois(jour):
+    return date(jour.year, jour.month, 1)
+
+
+def _mois_suivant(mois):
+    return date(mois.year + mois.month // 12, mois.month % 12 + 1, 1)
+
+
+def _en_datetime(jour):
+    return timezone.make_aware(datetime.combine(jour, time.min))
+
+
+def _ligne_archive(log):
+    return json.dumps({
+        'id': log.id,
+        'user_id': log.user_id,
+        'username': log.user.username,
+        'action': log.action,
+        'model_name': log.model_name,
+        'object_id': log.object_id,
+        'object_repr': log.object_repr,
+        'details': log.details,
+        'ip_address': log.ip_address,
+        'user_agent': log.user_agent,
+        'timestamp': log.timestamp.isoformat(),
+    }, ensure_ascii=False)
+
+
+def mois_a_archiver(mois_a_garder):
+    """Retourne les mois (premier jour) antérieurs à la période conservée et contenant des logs"""
+    limite = _debut_mois(timezone.localdate())
+    for _ in range(mois_a_garder):
+        limite = _debut_mois(date.fromordinal(limite.toordinal() - 1))
+
+    plus_ancien = AuditLog.objects.filter(timestamp__lt=_en_datetime(limite)).aggregate(
+        plus_ancien=Min('timestamp')
+    )['plus_ancien']
+    if plus_ancien is None:
+        return []
+
+    mois = []
+    courant = _debut_mois(timezone.localdate(plus_ancien))
+    while courant < limite:
+        mois.append(courant)
+        courant = _mois_suivant(courant)
+    return mois
+
+
+def archiver_mois(mois, dossier=None):
+    """
+    Archive les logs d'un mois dans un fichier gzip puis les supprime de la table
+
+    Retourne l'ArchiveAuditLog créée, ou None si le mois ne contient aucun log.
+    """
+    dossier = dossier or settings.AUDIT_ARCHIVE_DIR
+    debut, fin = _en_datetime(mois), _en_datetime(_mois_suivant(mois))
+    logs = AuditLog.objects.filter(timestamp__gte=debut, timestamp__lt=fin)
+
+    dernier_id = logs.aggregate(dernier=Max('id'))['dernier']
+    if dernier_id is None:
+        return None
+    logs = logs.filter(id__lte=dernier_id)
+
+    # Les statistiques du mois doivent être exactes avant la suppression des logs
+    recalculer_statistiques_audit(debut, fin)
+
+    os.makedirs(dossier, exist_ok=True)
+    horodatage = timezone.now().strftime('%Y%m%d%H%M%S')
+    chemin = os.path.join(dossier, f"audit_logs_{mois.strftime('%Y_%m')}_{horodatage}.jsonl.gz")
+
+    nombre = 0
+    with gzip.open(chemin, 'wt', encoding='utf-8') as fichier:
+        for log in logs.select_related('user').order_by('id').iterator(chunk_size=2000):
+            fichier.write(_ligne_archive(log))
+            fichier.write('\n')
+            nombre += 1
+
+    with transaction.atomic():
+        archive = ArchiveAuditLog.objects.create(
+            mois=mois,
+            fichier=chemin,
+            nombre_logs=nombre,
+            taille=os.path.getsize(chemin)
+        )
+        logs.delete()
+
+    return archive
+
+
+def indicateurs_audit(logs, search='', action='', user_id='', date_from='', date_to=''):
+    """
+    Calcule les indicateurs de la page des logs d'audit
+
+    Les statistiques journalières sont utilisées dès que les filtres le
+    permettent ; une recherche textuelle, ou un filtre que la statistique ne
+    porte pas, impose de compter sur les logs filtrés.
+    """
+    aujourd_hui = timezone.localdate()
+    par_action = StatistiqueAuditAction.objects.all()
+    par_utilisateur = StatistiqueAuditUtilisateur.objects.all()
+    if date_from:
+        par_action = par_action.filter(date__gte=date_from)
+        par_utilisateur = par_utilisateur.filter(date__gte=date_from)
+    if date_to:
+        par_action = par_action.filter(date__lte=date_to)
+        par_utilisateur = par_utilisateur.filter(date__lte=date_to)
+    if action:
+        par_action = par_action.filter(action=action)
+    if user_id:
+        par_utilisateur = par_utilisateur.filter(user_id=user_id)
+
+    actions_depuis_statistiques = not search and not user_id
+    utilisateurs_depuis_statistiques = not search and not action
+
+    if actions_depuis_statistiques:
+        frequent_actions = par_action.values('action').annotate(count=Sum('nombre')).order_by('-count')[:5]
+    else:
+        frequent_actions = logs.values('action').annotate(count=Count('action')).order_by('-count')[:5]
+
+    colonnes_utilisateur = ('user__username', 'user__first_name', 'user__last_name')
+    if utilisateurs_depuis_statistiques:
+        active_users = par_utilisateur.values(*colonnes_utilisateur).annotate(count=Sum('nombre')).order_by('-count')[:5]
+    else:
+        active_users = logs.values(*colonnes_utilisateur).annotate(count=Count('user')).order_by('-count')[:5]
+
+    if actions_depuis_statistiques or utilisateurs_depuis_statistiques:
+        statistiques = par_action if actions_depuis_statistiques else par_utilisateur
+        total_logs = statistiques.aggregate(total=Sum('nombre'))['total'] or 0
+        today_logs = statistiques.filter(date=aujourd_hui).aggregate(total=Sum('nombre'))['total'] or 0
+    else:
+        total_logs = logs.count()
+        today_logs = logs.filter(timestamp__date=aujourd_hui).count()
+
+    return {
+        'total_logs': total_logs,
+        'today_logs': today_logs,
+        'frequent_actions': frequent_actions,
+        'active_users': active_users,
+    }
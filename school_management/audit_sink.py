@@ -0,0 +1,195 @@
+"""
+Écriture différée des logs d'audit
+
+Les événements sont placés dans une file en mémoire et écrits par lots
+(bulk_create) depuis un thread d'arrière-plan, dès que le lot est plein ou que
+le délai AUDIT_FLUSH_INTERVAL est écoulé depuis le premier événement en
+attente, en même temps que les statistiques journalières. Si l'écriture d'un
+lot échoue, ses événements sont réécrits un par un : seuls ceux qui échouent
+encore sont perdus. La file est vidée à l'arrêt du processus. Avec
+AUDIT_ASYNC=False, chaque événement est écrit immédiatement dans la requête.
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+
+from .audit_archive import incrementer_statistiques_audit
+from .models import AuditLog
+
+
+logger = logging.getLogger('school_management')
+
+# Marqueur placé dans la file pour demander l'écriture immédiate du lot courant
+_VIDAGE = object()
+
+
+class AuditSink:
+    """File d'attente des logs d'audit, vidée par un thread d'arrière-plan"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        # Compteurs modifiés par le thread d'écriture et les requêtes, lus par d'autres threads
+        self._verrou_compteurs = threading.Lock()
+        self._file = None
+        self._thread = None
+        self._pid = None
+        self._arret = threading.Event()
+        self.evenements_ecrits = 0
+        self.evenements_perdus = 0
+        self.lots_ecrits = 0
+
+    @property
+    def asynchrone(self):
+        return getattr(settings, 'AUDIT_ASYNC', False)
+
+    def enregistrer(self, log):
+        """Ajoute un AuditLog non enregistré à la file, ou l'écrit directement en mode synchrone"""
+        if not self.asynchrone:
+            self._ecrire([log])
+            return
+
+        self._demarrer()
+        try:
+            self._file.put_nowait(log)
+        except queue.Full:
+            self._compter(perdus=1)
+            logger.warning("File des logs d'audit pleine, événement perdu : %s %s", log.action, log.model_name)
+
+    def vider(self, timeout=5.0):
+        """Écrit immédiatement les événements en attente et attend la fin de l'écriture"""
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        termine = threading.Event()
+        self._file.put((_VIDAGE, termine))
+        termine.wait(timeout)
+
+    def arreter(self, timeout=5.0):
+        """Vide la file puis arrête le thread d'écriture"""
+        if self._thread is None or self._pid != os.getpid():
+            return
+        self._arret.set()
+        self.vider(timeout)
+        self._thread.join(timeout)
+
+    def statistiques(self):
+        with self._verrou_compteurs:
+            compteurs = {
+                'evenements_ecrits': self.evenements_ecrits,
+                'evenements_perdus': self.evenements_perdus,
+                'lots_ecrits': self.lots_ecrits,
+            }
+        return {
+            'asynchrone': self.asynchrone,
+            'en_attente': self._file.qsize() if self._file is not None and self._pid == os.getpid() else 0,
+            **compteurs,
+        }
+
+    def _compter(self, ecrits=0, perdus=0, lots=0):
+        with self._verrou_compteurs:
+            self.evenements_ecrits += ecrits
+            self.evenements_perdus += perdus
+            self.lots_ecrits += lots
+
+    def _demarrer(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._verrou:
+            # Après un fork, le thread du processus parent n'existe plus
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._file = queue.Queue(maxsize=settings.AUDIT_QUEUE_MAX_SIZE)
+            self._arret.clear()
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._boucle, name='audit-sink', daemon=True)
+            self._thread.start()
+
+    def _boucle(self):
+        taille_lot = settings.AUDIT_BATCH_SIZE
+        intervalle = settings.AUDIT_FLUSH_INTERVAL
+        lot = []
+        echeance = None
+
+        try:
+            while not (self._arret.is_set() and self._file.empty()):
+                delai = None if echeance is None else max(echeance - time.monotonic(), 0)
+                try:
+                    element = self._file.get(timeout=delai if delai is not None else 0.5)
+                except queue.Empty:
+                    element = None
+
+                if isinstance(element, tuple) and element[0] is _VIDAGE:
+                    # Vider aussi les événements placés avant le marqueur
+                    while True:
+                        try:
+                            suivant = self._file.get_nowait()
+                        except queue.Empty:
+                            break
+                        if isinstance(suivant, tuple) and suivant[0] is _VIDAGE:
+                            suivant[1].set()
+                        else:
+                            lot.append(suivant)
+                    self._ecrire(lot)
+                    lot, echeance = [], None
+                    element[1].set()
+                    continue
+
+                if element is not None:
+                    lot.append(element)
+                    if echeance is None:
+                        echeance = time.monotonic() + intervalle
+
+                if len(lot) >= taille_lot or (echeance is not None and time.monotonic() >= echeance):
+                    self._ecrire(lot)
+                    lot, echeance = [], None
+        finally:
+            self._ecrire(lot)
+            connection.close()
+
+    def _recycler_connexion(self):
+        """
+        Ferme la connexion du thread d'écriture si elle est inutilisable ou
+        trop ancienne : hors requête HTTP, aucun signal ne le fait, et une
+        connexion coupée (redémarrage de la base, réseau) ferait perdre tous
+        les lots suivants. Sans effet dans le thread d'une requête (mode
+        synchrone), dont la connexion peut être dans une transaction.
+        """
+        if threading.current_thread() is self._thread:
+            close_old_connections()
+
+    def _ecrire(self, lot):
+        if not lot:
+            return
+        self._recycler_connexion()
+        try:
+            self._inserer(lot)
+            self._compter(ecrits=len(lot), lots=1)
+        except Exception:
+            # Une ligne invalide ne doit pas faire perdre tout le lot : réessai ligne par ligne
+            logger.exception("Erreur lors de l'écriture de %s log(s) d'audit, réessai un par un", len(lot))
+            self._recycler_connexion()
+            ecrits = 0
+            for log in lot:
+                try:
+                    self._inserer([log])
+                    ecrits += 1
+                except Exception:
+                    # En cas d'erreur, on ne veut pas interrompre le processus principal
+                    logger.exception("Log d'audit perdu : %s %s", log.action, log.model_name)
+            self._compter(ecrits=ecrits, perdus=len(lot) - ecrits, lots=1)
+
+    def _inserer(self, logs):
+        for log in logs:
+            # Une insertion annulée a pu attribuer une clé
+            log.pk = None
+        with transaction.atomic():
+            AuditLog.objects.bulk_create(logs, batch_size=settings.AUDIT_BATCH_SIZE)
+            incrementer_statistiques_audit(logs)
+
+audit_sink = AuditSink()
+atexit.register(audit_sink.arreter)
@@ -2,6 +2,7 @@
 Utilitaires pour l'audit des actions des utilisateurs
 """
 from django.contrib.auth.models import User
+from .audit_sink import audit_sink
 from .models import AuditLog
 
 
@@ -17,6 +18,9 @@ def log_user_action(user, action, model_name, object_id=None, object_repr="", de
         object_repr: La représentation textuelle de l'objet
         details: Détails supplémentaires
         request: L'objet request pour récupérer IP et User-Agent
+    
+    L'écriture est confiée à audit_sink : elle est différée et groupée sauf si
+    AUDIT_ASYNC est désactivé.
     """
     try:
         ip_address = None
@@ -33,7 +37,7 @@ def log_user_action(user, action, model_name, object_id=None, object_repr="", de
             # Récupérer le User-Agent
             user_agent = request.META.get('HTTP_USER_AGENT', '')
         
-        AuditLog.objects.create(
+        audit_sink.enregistrer(AuditLog(
             user=user,
             action=action,
             model_name=model_name,
@@ -42,7 +46,7 @@ def log_user_action(user, action, model_name, object_id=None, object_repr="", de
             details=details,
             ip_address=ip_address,
             user_agent=user_agent
-        )
+        ))
     except Exception as e:
         # En cas d'erreur, on ne veut pas interrompre le processus principal
         print(f"Erreur lors de l'enregistrement du log d'audit: {e}")
@@ -1,114 +1,102 @@
-from django.contrib.auth.backends import BaseBackend
-from django.contrib.auth.models import User
+from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from .models import Eleve, Professeur, Parent
+from django.db.models import Q
+from .roles import RELATIONS_PROFIL
 
 User = get_user_model()
 
-class EleveAuthBackend(BaseBackend):
+
+class SchoolAuthBackend(ModelBackend):
     """
-    Backend d'authentification pour les élèves
-    Permet la connexion avec le numéro étudiant et un mot de passe
+    Backend d'authentification unique de l'établissement
+
+    L'identifiant est un numéro étudiant (élèves) ou un nom d'utilisateur
+    (professeurs, parents, administrateurs). Il est résolu en une seule
+    requête, profils compris, et le mot de passe n'est vérifié qu'une fois.
+    Les permissions restent celles de ModelBackend.
     """
-    
-    def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # Chercher l'élève par son numéro étudiant
-            eleve = Eleve.objects.get(numero_etudiant=username)
-            user = eleve.user
-            
-            # Vérifier que l'élève a un objet User associé
-            if user is None:
-                return None
-            
-            # Vérifier le mot de passe
-            if user.check_password(password):
-                return user
-        except Eleve.DoesNotExist:
-            return None
-        return None
-    
-    def get_user(self, user_id):
-        try:
-            return User.objects.get(pk=user_id)
-        except User.DoesNotExist:
+
+    def authenticate(self, request, username=None, password=None, user_type=None, **kwargs):
+        if username is None:
+            username = kwargs.get(User.USERNAME_FIELD)
+        if username is None or password is None:
             return None
 
+        candidats = list(
+            User.objects.select_related(*RELATIONS_PROFIL)
+            .filter(Q(eleve__numero_etudiant=username) | Q(username=username))[:2]
+        )
+        user = self.choisir_candidat(candidats, username, user_type)
 
-class ProfesseurAuthBackend(BaseBackend):
-    """
-    Backend d'authentification pour les professeurs
-    Permet la connexion avec le nom d'utilisateur et un mot de passe
-    """
-    
-    def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # Chercher le professeur par son nom d'utilisateur
-            professeur = Professeur.objects.get(user__username=username)
-            user = professeur.user
-            
-            # Vérifier le mot de passe
-            if user.check_password(password):
-                return user
-        except Professeur.DoesNotExist:
+        if user is None:
+            # Même coût qu'un mot de passe erroné, pour ne pas révéler les identifiants existants
+            User().set_password(password)
             return None
+
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
         return None
-    
-    def get_user(self, user_id):
-        try:
-            return User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return None
 
+    def choisir_candidat(self, candidats, username, user_type=None):
+        """
+        Choisit le compte à vérifier quand l'identifiant correspond à la fois
+        au numéro étudiant d'un élève et au nom d'utilisateur d'un autre compte
+
+        Le numéro étudiant est prioritaire, sauf si le formulaire de connexion
+        indique un autre type d'utilisateur.
+        """
+        if len(candidats) < 2:
+            return candidats[0] if candidats else None
+
+        def par_numero(user):
+            eleve = getattr(user, 'eleve', None)
+            return eleve is not None and eleve.numero_etudiant == username
+
+        numero = next((user for user in candidats if par_numero(user)), None)
+        nom = next((user for user in candidats if user is not numero), None)
+        if user_type in (None, 'eleve'):
+            return numero or nom
+        return nom or numero
 
-class AdminAuthBackend(BaseBackend):
-    """
-    Backend d'authentification pour les administrateurs
-    Authentification standard Django
-    """
-    
-    def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(username=username)
-            if user.check_password(password) and (user.is_staff or user.is_superuser):
-                return user
-        except User.DoesNotExist:
-            return None
-        return None
-    
     def get_user(self, user_id):
+        """
+        Charge l'utilisateur de la session avec ses profils, en une requête
+
+        AuthenticationMiddleware conserve le résultat sur la requête
+        (request._cached_user) : get_user n'est appelé qu'une fois par requête.
+        """
         try:
-            return User.objects.get(pk=user_id)
+            user = User.objects.select_related(*RELATIONS_PROFIL).get(pk=user_id)
         except User.DoesNotExist:
             return None
+        return user if self.user_can_authenticate(user) else None
 
 
-class ParentAuthBackend(BaseBackend):
+class AncienBackend(SchoolAuthBackend):
     """
-    Backend d'authentification pour les parents
-    Permet la connexion avec le nom d'utilisateur et un mot de passe
+    Ancien chemin de backend, conservé le temps d'une version
+
+    Django enregistre en session le chemin du backend qui a authentifié
+    l'utilisateur et refuse une session dont le backend n'est plus dans
+    AUTHENTICATION_BACKENDS. Ces classes ne servent qu'à relire ces
+    sessions (get_user) : l'authentification passe par SchoolAuthBackend.
     """
-    
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            # Chercher le parent par son nom d'utilisateur
-            parent = Parent.objects.get(user__username=username)
-            user = parent.user
-            
-            # Vérifier que le parent a un objet User associé
-            if user is None:
-                return None
-            
-            # Vérifier le mot de passe
-            if user.check_password(password):
-                return user
-        except Parent.DoesNotExist:
-            return None
         return None
-    
-    def get_user(self, user_id):
-        try:
-            return User.objects.get(pk=user_id)
-        except User.DoesNotExist:
-            return None
 
+
+class EleveAuthBackend(AncienBackend):
+    pass
+
+
+class ProfesseurAuthBackend(AncienBackend):
+    pass
+
+
+class ParentAuthBackend(AncienBackend):
+    pass
+
+
+class AdminAuthBackend(AncienBackend):
+    pass
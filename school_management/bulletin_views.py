@@ -15,6 +15,7 @@ from .models import (
 )
 from .forms import BulletinForm, NoteBulletinFormSet
 from .permissions import get_user_type
+from .grade_engine import calculer_resultats_classe
 
 
 # ===== VUES POUR ÉLÈVES ET PARENTS =====
@@ -386,6 +387,9 @@ def generer_bulletins_classe(request, classe_id, trimestre):
                 bulletins_mis_a_jour = 0
                 erreurs = 0
                 
+                # Calculer une seule fois les résultats de toute la classe
+                resultats = calculer_resultats_classe(classe, trimestre, '2024-2025')
+                
                 for eleve in classe.eleves.all():
                     try:
                         # Créer ou mettre à jour le bulletin
@@ -406,7 +410,7 @@ def generer_bulletins_classe(request, classe_id, trimestre):
                             bulletins_mis_a_jour += 1
                             
                         # Générer le contenu détaillé du bulletin
-                        generer_contenu_bulletin_detaille(bulletin, eleve, classe, trimestre)
+                        generer_contenu_bulletin_detaille(bulletin, eleve, classe, trimestre, resultats)
                         
                     except Exception as e:
                         erreurs += 1
@@ -424,128 +428,22 @@ def generer_bulletins_classe(request, classe_id, trimestre):
     return redirect('school_management:prof_principal_bulletins')
 
 
-def generer_contenu_bulletin_detaille(bulletin, eleve, classe, trimestre):
+def generer_contenu_bulletin_detaille(bulletin, eleve, classe, trimestre, resultats=None):
     """Génère le contenu détaillé d'un bulletin avec toutes les informations"""
-    from django.utils import timezone
-    from .models import Note, Evaluation
-    
-    # Récupérer les notes de l'élève pour le trimestre
-    notes = Note.objects.filter(
-        eleve=eleve,
-        evaluation__date_evaluation__year=timezone.now().year
-    ).select_related('evaluation', 'evaluation__matiere')
-    
-    # Calculer les moyennes par matière
-    matieres_notes = {}
-    for note in notes:
-        matiere = note.evaluation.matiere
-        if matiere not in matieres_notes:
-            matieres_notes[matiere] = []
-        matieres_notes[matiere].append(note.note)
+    if resultats is None:
+        resultats = calculer_resultats_classe(classe, trimestre, bulletin.annee_scolaire)
     
-    # Calculer les moyennes par matière
-    moyennes_par_matiere = {}
-    for matiere, notes_list in matieres_notes.items():
-        moyennes_par_matiere[matiere] = sum(notes_list) / len(notes_list)
-    
-    # Calculer la moyenne générale avec coefficients
-    if moyennes_par_matiere:
-        total_points = 0
-        total_coefficients = 0
-        for matiere, moyenne in moyennes_par_matiere.items():
-            coefficient = matiere.coefficient or 1
-            total_points += moyenne * coefficient
-            total_coefficients += coefficient
-        moyenne_generale = total_points / total_coefficients if total_coefficients > 0 else 0
-    else:
-        moyenne_generale = 0
-    
-    # Calculer le rang dans la classe
-    eleves_classe = eleve.classe.eleves.all()
-    rangs = []
-    for e in eleves_classe:
-        e_notes = Note.objects.filter(
-            eleve=e,
-            evaluation__date_evaluation__year=timezone.now().year
-        ).select_related('evaluation', 'evaluation__matiere')
-        
-        e_matieres_notes = {}
-        for note in e_notes:
-            matiere = note.evaluation.matiere
-            if matiere not in e_matieres_notes:
-                e_matieres_notes[matiere] = []
-            e_matieres_notes[matiere].append(note.note)
-        
-        e_moyennes = {}
-        for matiere, notes_list in e_matieres_notes.items():
-            e_moyennes[matiere] = sum(notes_list) / len(notes_list)
-        
-        if e_moyennes:
-            # Calculer la moyenne générale avec coefficients pour le rang
-            e_total_points = 0
-            e_total_coefficients = 0
-            for matiere, moyenne in e_moyennes.items():
-                coefficient = matiere.coefficient or 1
-                e_total_points += moyenne * coefficient
-                e_total_coefficients += coefficient
-            e_moyenne_generale = e_total_points / e_total_coefficients if e_total_coefficients > 0 else 0
-            rangs.append((e, e_moyenne_generale))
-    
-    # Trier par moyenne décroissante pour calculer le rang
-    rangs.sort(key=lambda x: x[1], reverse=True)
-    rang_eleve = 1
-    for i, (e, moy) in enumerate(rangs):
-        if e == eleve:
-            rang_eleve = i + 1
-            break
-    
-    # Calculer la moyenne de la classe
-    if rangs:
-        moyenne_classe = sum([moy for _, moy in rangs]) / len(rangs)
-    else:
-        moyenne_classe = 0
-    
-    # Déterminer la mention
-    moyenne_pourcentage = (moyenne_generale / 20) * 100
-    
-    if moyenne_generale >= 18:
-        mention = "EXCELLENT"
-    elif moyenne_generale >= 16:
-        mention = "TRÈS BIEN"
-    elif moyenne_generale >= 14:
-        mention = "BIEN"
-    elif moyenne_generale >= 12:
-        mention = "ASSEZ BIEN"
-    elif moyenne_generale >= 10:
-        mention = "PASSABLE"
-    else:
-        mention = "INSUFFISANT"
-    
-    # Déterminer la décision de passage
-    echecs = 0
-    for matiere, moyenne in moyennes_par_matiere.items():
-        if moyenne < 10:
-            echecs += 1
-    
-    if moyenne_pourcentage < 50:
-        decision_passage = "REDOUBLE"
-    elif moyenne_pourcentage >= 50 and moyenne_pourcentage <= 100:
-        if echecs > 2:
-            decision_passage = "SECONDE SESSION"
-        else:
-            decision_passage = "PASSE EN CLASSE SUPERIEURE"
-    else:
-        decision_passage = "PASSE EN CLASSE SUPERIEURE"
+    # Moyennes, rang et effectif issus du calcul de la classe
+    bulletin.appliquer_resultats(resultats)
     
     # Générer l'appréciation générale
-    appreciation_generale = generer_appreciation_generale(eleve, moyenne_generale, echecs, len(moyennes_par_matiere))
-    
-    # Mettre à jour le bulletin avec toutes les informations
-    bulletin.moyenne_generale = round(moyenne_generale, 2)
-    bulletin.rang = rang_eleve
-    bulletin.effectif_classe = len(eleves_classe)
-    bulletin.moyenne_classe = round(moyenne_classe, 2)
-    bulletin.appreciation_generale = appreciation_generale
+    if resultats.contient(eleve.id):
+        moyenne_generale = resultats.moyenne_generale(eleve.id) or 0
+        echecs = resultats.nb_echecs(eleve.id)
+        nb_matieres = len(resultats.moyennes_par_matiere(eleve.id))
+    else:
+        moyenne_generale, echecs, nb_matieres = 0, 0, 0
+    bulletin.appreciation_generale = generer_appreciation_generale(eleve, moyenne_generale, echecs, nb_matieres)
     bulletin.save()
     
     return bulletin
@@ -0,0 +1,273 @@
+"""
+Test de charge HTTP de bout en bout, par rôle
+
+Des utilisateurs virtuels (un thread chacun, avec sa propre session) se
+connectent avec les comptes d'une école générée par seed_school puis
+enchaînent sans pause les pages de leur rôle, tirées selon les poids de
+SCENARIOS ; la population suit REPARTITION. Les requêtes émises pendant
+l'échauffement ne sont pas mesurées.
+
+Le nombre de requêtes SQL par page est lu dans l'en-tête X-Requetes-SQL,
+posé par MetriquesRequetesMiddleware quand METRIQUES_EN_TETES est actif sur
+le serveur. Le résultat (latences p50/p95/p99, débit, erreurs, requêtes SQL
+par vue, par rôle et global) s'enregistre en JSON : comparer() confronte un
+nouveau passage à cette référence.
+"""
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+from http.cookiejar import CookieJar
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import Evaluation
+
+
+# Pages parcourues par rôle : (nom d'URL, poids)
+SCENARIOS = {
+    'eleve': (('eleve_dashboard', 3), ('emploi_eleve', 1)),
+    'parent': (('parent_dashboard', 3), ('mes_bulletins', 1)),
+    'professeur': (('professeur_dashboard', 2), ('saisir_notes', 1)),
+    'admin': (('results_analysis', 1),),
+}
+REPARTITION = {'eleve': 0.5, 'parent': 0.3, 'professeur': 0.15, 'admin': 0.05}
+COMPTES = {'eleve': 'eleve', 'parent': 'parent', 'professeur': 'prof', 'admin': 'admin'}
+PERCENTILES = (50, 95, 99)
+DELAI_REQUETE = 30  # secondes
+ECART_SQL = 0.5  # requêtes SQL par page en plus avant de signaler une régression
+
+
+class _SansRedirection(urllib.request.HTTPRedirectHandler):
+    """Une redirection est une réponse comme une autre : connexion, session perdue"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+# =============== POPULATION ===============
+
+def repartir(nombre, repartition=REPARTITION):
+    """Nombre d'utilisateurs virtuels par rôle, au plus fort reste"""
+    parts = {role: nombre * poids / sum(repartition.values()) for role, poids in repartition.items()}
+    effectifs = {role: int(part) for role, part in parts.items()}
+    restes = sorted(parts, key=lambda role: effectifs[role] - parts[role])
+    for role in restes[:nombre - sum(effectifs.values())]:
+        effectifs[role] += 1
+    return effectifs
+
+
+def comptes(prefixe, effectifs, graine=0):
+    """
+    Choisit les comptes de chaque rôle parmi ceux générés avec ce préfixe
+
+    Retourne une liste (rôle, identifiant, ids d'évaluations) ; les ids
+    d'évaluations sont celles du professeur, pour la saisie des notes.
+    """
+    rng = random.Random(graine)
+    choisis = []
+    for role, effectif in effectifs.items():
+        if not effectif:
+            continue
+        identifiants = list(
+            User.objects.filter(username__startswith=f'{prefixe}{COMPTES[role]}', is_active=True)
+            .order_by('id').values_list('username', flat=True)
+        )
+        if not identifiants:
+            raise ValueError(f'Aucun compte {prefixe}{COMPTES[role]}* : générer l\'école avec seed_school')
+        rng.shuffle(identifiants)
+        for n in range(effectif):
+            identifiant = identifiants[n % len(identifiants)]
+            evaluations = []
+            if role == 'professeur':
+                evaluations = list(
+                    Evaluation.objects.filter(professeur__user__username=identifiant)
+                    .order_by('id').values_list('id', flat=True)
+                )
+            choisis.append((role, identifiant, evaluations))
+    return choisis
+
+
+# =============== UTILISATEUR VIRTUEL ===============
+
+class UtilisateurVirtuel(threading.Thread):
+    """Se connecte puis parcourt les pages de son rôle jusqu'à la fin du test"""
+
+    def __init__(self, base, role, identifiant, mot_de_passe, evaluations, graine, depart):
+        super().__init__(daemon=True)
+        self.pret = threading.Event()
+        self.depart = depart
+        self.base = base.rstrip('/')
+        self.role = role
+        self.identifiant = identifiant
+        self.mot_de_passe = mot_de_passe
+        self.evaluations = evaluations
+        self.rng = random.Random(f'{graine}:{identifiant}')
+        self.cookies = CookieJar()
+        self.client = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(self.cookies), _SansRedirection()
+        )
+        self.pages = [vue for vue, _ in SCENARIOS[role] if vue != 'saisir_notes' or evaluations]
+        self.poids = [poids for vue, poids in SCENARIOS[role] if vue != 'saisir_notes' or evaluations]
+        self.mesures = []
+        self.erreur = None
+
+    def requete(self, chemin, donnees=None):
+        """Retourne (statut, nombre de requêtes SQL ou None, en-têtes)"""
+        corps = urllib.parse.urlencode(donnees).encode() if donnees is not None else None
+        requete = urllib.request.Request(self.base + chemin, data=corps, headers={'Referer': self.base + chemin})
+        try:
+            with self.client.open(requete, timeout=DELAI_REQUETE) as reponse:
+                reponse.read()
+                statut, entetes = reponse.status, reponse.headers
+        except urllib.error.HTTPError as erreur:
+            erreur.read()
+            statut, entetes = erreur.code, erreur.headers
+        nb_sql = entetes.get('X-Requetes-SQL')
+        return statut, int(nb_sql) if nb_sql is not None else None, entetes
+
+    def connecter(self):
+        chemin = reverse('school_management:login')
+        self.requete(chemin)
+        jeton = next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+        statut, _, entetes = self.requete(chemin, {
+            'csrfmiddlewaretoken': jeton, 'username': self.identifiant, 'password': self.mot_de_passe,
+            'user_type': self.role,
+        })
+        if statut != 302 or chemin in entetes.get('Location', chemin):
+            raise ValueError(f'Connexion refusée pour {self.identifiant} ({self.role}, HTTP {statut})')
+
+    def chemin(self, vue):
+        if vue == 'saisir_notes':
+            return reverse('school_management:saisir_notes', args=[self.rng.choice(self.evaluations)])
+        return reverse(f'school_management:{vue}')
+
+    def parcourir(self, debut_mesure, fin):
+        while True:
+            debut = time.perf_counter()
+            if debut >= fin:
+                return
+            vue = self.rng.choices(self.pages, self.poids)[0]
+            try:
+                statut, nb_sql, _ = self.requete(self.chemin(vue))
+            except OSError:
+                statut, nb_sql = 0, None
+            if debut >= debut_mesure:
+                self.mesures.append((vue, time.perf_counter() - debut, statut, nb_sql))
+
+    def run(self):
+        try:
+            self.connecter()
+        except (OSError, ValueError) as erreur:
+            self.erreur = erreur
+            self.pret.set()
+            return
+        self.pret.set()
+        self.depart.wait()
+        self.parcourir(self.debut_mesure, self.fin)
+
+
+# =============== EXÉCUTION ET SYNTHÈSE ===============
+
+def _synthese(mesures, duree):
+    latences = sorted(latence for _, latence, _, _ in mesures)
+    sql = [nb_sql for _, _, _, nb_sql in mesures if nb_sql is not None]
+    if len(latences) > 1:
+        quantiles = statistics.quantiles(latences, n=100, method='inclusive')
+        centiles = {f'p{p}_ms': round(quantiles[p - 1] * 1000, 1) for p in PERCENTILES}
+    else:
+        centiles = {f'p{p}_ms': round(latences[0] * 1000, 1) if latences else None for p in PERCENTILES}
+    return {
+        'requetes': len(mesures),
+        'debit_rps': round(len(mesures) / duree, 2),
+        'erreurs': sum(1 for _, _, statut, _ in mesures if not 200 <= statut < 300),
+        'moyenne_ms': round(statistics.fmean(latences) * 1000, 1) if latences else None,
+        **centiles,
+        'max_ms': round(latences[-1] * 1000, 1) if latences else None,
+        'sql_moyenne': round(statistics.fmean(sql), 2) if sql else None,
+        'sql_max': max(sql) if sql else None,
+    }
+
+
+def executer(base, utilisateurs, duree, echauffement=0, prefixe='s0-', mot_de_passe='motdepasse', graine=0,
+             repartition=REPARTITION):
+    """
+    Lance le test et retourne la synthèse, prête à être enregistrée en JSON
+
+    Lève ValueError si aucun utilisateur virtuel n'a pu se connecter.
+    """
+    effectifs = repartir(utilisateurs, repartition)
+    depart = threading.Event()
+    virtuels = [
+        UtilisateurVirtuel(base, role, identifiant, mot_de_passe, evaluations, graine, depart)
+        for role, identifiant, evaluations in comptes(prefixe, effectifs, graine)
+    ]
+    for virtuel in virtuels:
+        virtuel.start()
+    for virtuel in virtuels:
+        virtuel.pret.wait()
+
+    refuses = [virtuel for virtuel in virtuels if virtuel.erreur]
+    if len(refuses) == len(virtuels):
+        depart.set()
+        raise ValueError(f'Aucune connexion réussie : {refuses[0].erreur}')
+    maintenant = time.perf_counter()
+    for virtuel in virtuels:
+        virtuel.debut_mesure = maintenant + echauffement
+        virtuel.fin = maintenant + echauffement + duree
+    depart.set()
+    for virtuel in virtuels:
+        virtuel.join()
+
+    par_vue = defaultdict(list)
+    par_role = defaultdict(list)
+    for virtuel in virtuels:
+        par_role[virtuel.role].extend(virtuel.mesures)
+        for mesure in virtuel.mesures:
+            par_vue[mesure[0]].append(mesure)
+    return {
+        'date': timezone.now().isoformat(timespec='seconds'),
+        'url': base,
+        'parametres': {
+            'utilisateurs': utilisateurs, 'duree': duree, 'echauffement': echauffement, 'graine': graine,
+            'repartition': effectifs,
+        },
+        'connexions_refusees': [str(virtuel.erreur) for virtuel in refuses],
+        'global': _synthese([mesure for mesures in par_role.values() for mesure in mesures], duree),
+        'roles': {role: _synthese(mesures, duree) for role, mesures in sorted(par_role.items())},
+        'vues': {vue: _synthese(mesures, duree) for vue, mesures in sorted(par_vue.items())},
+    }
+
+
+def comparer(reference, resultat, tolerance=0.1):
+    """
+    Compare vue par vue un passage à la référence
+
+    Retourne des tuples (vue, indicateur, référence, valeur, régression) :
+    une latence qui dépasse la référence de plus de tolérance, un débit qui
+    baisse d'autant, ou plus de ECART_SQL requêtes SQL par page en plus
+    sont des régressions.
+    """
+    ecarts = []
+    vues = [('global', reference['global'], resultat['global'])] + [
+        (vue, reference['vues'][vue], resultat['vues'][vue])
+        for vue in sorted(reference['vues'].keys() & resultat['vues'].keys())
+    ]
+    for vue, avant, apres in vues:
+        for indicateur in [f'p{p}_ms' for p in PERCENTILES] + ['debit_rps', 'sql_moyenne']:
+            if avant.get(indicateur) is None or apres.get(indicateur) is None:
+                continue
+            if indicateur == 'debit_rps':
+                regression = apres[indicateur] < avant[indicateur] * (1 - tolerance)
+            elif indicateur == 'sql_moyenne':
+                regression = apres[indicateur] > avant[indicateur] + ECART_SQL
+            else:
+                regression = apres[indicateur] > avant[indicateur] * (1 + tolerance)
+            ecarts.append((vue, indicateur, avant[indicateur], apres[indicateur], regression))
+    return ecarts
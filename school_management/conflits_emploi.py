@@ -0,0 +1,79 @@
+"""
+Détection des conflits de l'emploi du temps
+
+Les cours actifs d'une année scolaire et d'un semestre sont chargés en une
+requête et indexés par (créneau, professeur), (créneau, salle) et
+(créneau, classe) : les conflits d'un cours, d'un cours envisagé ou de tout
+l'établissement se lisent dans ces tables, sans requête par cours.
+"""
+from collections import defaultdict
+
+from .models import EmploiDuTemps
+
+
+DIMENSIONS = ('professeur', 'salle', 'classe')
+
+
+class ConflitsEmploi:
+    """Index des cours par (créneau, ressource) pour chaque dimension"""
+
+    def __init__(self, emplois):
+        self.index = {dimension: defaultdict(list) for dimension in DIMENSIONS}
+        for emploi in emplois:
+            for dimension in DIMENSIONS:
+                self.index[dimension][emploi.creneau_id, getattr(emploi, f'{dimension}_id')].append(emploi)
+
+    @classmethod
+    def charger(cls, annee_scolaire, semestre, creneaux=None, select_related=()):
+        """Cours actifs de la période, limités aux créneaux donnés s'il y en a"""
+        emplois = EmploiDuTemps.objects.filter(annee_scolaire=annee_scolaire, semestre=semestre, actif=True)
+        if creneaux is not None:
+            emplois = emplois.filter(creneau_id__in=creneaux)
+        return cls(emplois.select_related(*select_related))
+
+    def conflits(self, creneau_id, professeur_id=None, salle_id=None, classe_id=None, exclure=None):
+        """
+        Cours du créneau qui occupent déjà le professeur, la salle ou la
+        classe donnés, hors le cours exclure : dimension → liste de cours
+        """
+        ressources = {'professeur': professeur_id, 'salle': salle_id, 'classe': classe_id}
+        return {
+            dimension: [
+                emploi for emploi in self.index[dimension].get((creneau_id, ressource), ())
+                if exclure is None or emploi.pk != exclure
+            ] if ressource is not None else []
+            for dimension, ressource in ressources.items()
+        }
+
+    def conflits_de(self, emploi):
+        return self.conflits(
+            emploi.creneau_id, emploi.professeur_id, emploi.salle_id, emploi.classe_id, exclure=emploi.pk
+        )
+
+    def tous(self):
+        """
+        Tous les conflits de la période : (dimension, créneau, ressource,
+        cours) pour chaque ressource occupée par plusieurs cours au même
+        créneau
+        """
+        return [
+            (dimension, creneau_id, ressource_id, cours)
+            for dimension in DIMENSIONS
+            for (creneau_id, ressource_id), cours in self.index[dimension].items()
+            if len(cours) > 1
+        ]
+
+
+def annoter(emplois):
+    """
+    Précharge les conflits de chaque cours (conflits_precharges, lu par
+    EmploiDuTemps.a_des_conflits) : une requête par période présente
+    """
+    par_periode = defaultdict(list)
+    for emploi in emplois:
+        par_periode[emploi.annee_scolaire, emploi.semestre].append(emploi)
+    for (annee_scolaire, semestre), cours in par_periode.items():
+        moteur = ConflitsEmploi.charger(annee_scolaire, semestre, creneaux={emploi.creneau_id for emploi in cours})
+        for emploi in cours:
+            emploi.conflits_precharges = moteur.conflits_de(emploi)
+    return emplois
@@ -1,4 +1,4 @@
-from .permissions import get_user_type
+from .roles import resoudre_role
 
 
 def user_context(request):
@@ -12,7 +12,7 @@ def user_context(request):
     }
     
     if request.user.is_authenticated:
-        user_type = get_user_type(request.user)
+        user_type, _ = resoudre_role(request)
         context.update({
             'user_type': user_type,
             'is_eleve': user_type == 'eleve',
@@ -0,0 +1,116 @@
+"""
+Cache des tableaux de bord
+
+Les données de chaque tableau de bord sont mises en cache sous une clé
+(tableau de bord, profil, versions). Les versions sont des compteurs par
+portée (élève, classe, professeur, utilisateur, communications, structure,
+global) incrémentés par les signaux à chaque modification des données
+concernées : une entrée périmée n'est jamais relue, elle expire.
+
+Un compteur absent du cache (première lecture, éviction) est initialisé à
+partir de l'horloge, jamais à une valeur déjà utilisée. Les succès et échecs
+de lecture sont comptés par tableau de bord.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+DUREE_CACHE = 24 * 60 * 60  # Simple limite de rétention, l'invalidation passe par les versions
+DASHBOARDS = ('eleve', 'professeur', 'parent', 'admin')
+
+
+def _cle_version(portee):
+    return f'dashboard:version:{portee}'
+
+
+def _cle_metrique(nom, resultat):
+    return f'dashboard:metrique:{nom}:{resultat}'
+
+
+def versions(portees):
+    """Retourne les versions courantes des portées, dans l'ordre"""
+    cles = [_cle_version(portee) for portee in portees]
+    trouvees = cache.get_many(cles)
+    manquantes = [cle for cle in cles if cle not in trouvees]
+    if manquantes:
+        for cle in manquantes:
+            cache.add(cle, time.time_ns() // 1000, None)
+        trouvees.update(cache.get_many(manquantes))
+    return [trouvees.get(cle, 0) for cle in cles]
+
+
+def invalider(*portees):
+    """
+    Incrémente les versions des portées, après validation de la transaction
+    en cours pour qu'aucune lecture concurrente ne remette en cache des
+    données non encore visibles
+    """
+    portees = {portee for portee in portees if portee is not None}
+    if not portees:
+        return
+
+    def incrementer():
+        for portee in portees:
+            try:
+                cache.incr(_cle_version(portee))
+            except ValueError:
+                # Compteur absent : il sera initialisé à une valeur nouvelle
+                pass
+
+    transaction.on_commit(incrementer)
+
+
+def invalider_notes(eleve_ids, professeur_ids=()):
+    """Invalide les tableaux de bord touchés par des notes créées, modifiées ou supprimées"""
+    invalider(
+        'global',
+        *(f'eleve:{eleve_id}' for eleve_id in eleve_ids),
+        *(f'professeur:{professeur_id}' for professeur_id in professeur_ids)
+    )
+
+
+def _compter(nom, resultat):
+    cle = _cle_metrique(nom, resultat)
+    try:
+        cache.incr(cle)
+    except ValueError:
+        if not cache.add(cle, 1, None):
+            cache.incr(cle)
+
+
+def contexte_dashboard(nom, identifiant, portees, calculer):
+    """
+    Retourne les données du tableau de bord nom pour identifiant
+
+    calculer() n'est appelé qu'en l'absence d'une entrée à jour ; il doit
+    retourner un dictionnaire sérialisable (listes plutôt que QuerySets).
+    """
+    cle = f'dashboard:{nom}:{identifiant}:' + '.'.join(str(version) for version in versions(portees))
+    contexte = cache.get(cle)
+    if contexte is not None:
+        _compter(nom, 'hit')
+        return contexte
+
+    _compter(nom, 'miss')
+    contexte = calculer()
+    cache.set(cle, contexte, DUREE_CACHE)
+    return contexte
+
+
+def statistiques_dashboards():
+    """Succès, échecs et taux de succès du cache pour chaque tableau de bord"""
+    valeurs = cache.get_many([
+        _cle_metrique(nom, resultat) for nom in DASHBOARDS for resultat in ('hit', 'miss')
+    ])
+    statistiques = {}
+    for nom in DASHBOARDS:
+        hits = valeurs.get(_cle_metrique(nom, 'hit'), 0)
+        misses = valeurs.get(_cle_metrique(nom, 'miss'), 0)
+        statistiques[nom] = {
+            'hits': hits,
+            'misses': misses,
+            'taux_succes': round(hits * 100 / (hits + misses), 1) if hits + misses else None,
+        }
+    return statistiques
@@ -0,0 +1,346 @@
+"""
+Disponibilité des salles
+
+Index en mémoire, dans chaque processus, de l'occupation des salles : les
+réservations confirmées (intervalles datés) et les cours actifs de l'emploi
+du temps (intervalles hebdomadaires, par année scolaire et semestre). Les
+intervalles de chaque salle sont fusionnés et triés, si bien que savoir si
+une salle est libre entre deux instants est une recherche dichotomique, sans
+requête SQL.
+
+L'index suit un compteur de version partagé par le cache. Toute
+modification d'une réservation, d'un cours, d'une salle, d'un créneau ou
+d'une année scolaire incrémente le compteur après validation de la
+transaction, et inscrit l'objet modifié au journal sous la nouvelle version.
+Un processus en retard relit seulement les objets journalisés depuis sa
+version et recalcule les salles concernées. Il reconstruit tout l'index si
+le journal est incomplet (éviction, compteur réinitialisé) ou si un créneau
+ou une année scolaire a changé.
+
+Les cours d'une année scolaire s'appliquent entre ses dates de début et de
+fin ; le second semestre commence le 1er février (DEBUT_SEMESTRE_2). Les
+écritures en masse (update(), bulk_create) n'envoient pas de signal :
+appeler ensuite invalider_disponibilites().
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import datetime, timedelta
+from datetime import time as heure
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AnneeScolaire, Creneau, EmploiDuTemps, ReservationSalle, Salle
+
+
+JOURS = [jour for jour, _ in Creneau.JOURS_SEMAINE]  # Indice = datetime.weekday()
+DEBUT_SEMESTRE_2 = (2, 1)  # (mois, jour)
+CLE_VERSION = 'disponibilites:version'
+DUREE_JOURNAL = 24 * 60 * 60
+MAX_JOURNAL = 1000  # Au-delà, relire tout l'index coûte moins que le journal
+
+# Entrées du journal qui imposent une reconstruction complète
+RECONSTRUCTION = ('creneau', 'annee')
+
+
+def _cle_journal(version):
+    return f'disponibilites:journal:{version}'
+
+
+def _version():
+    version = cache.get(CLE_VERSION)
+    if version is None:
+        cache.add(CLE_VERSION, time.time_ns() // 1000, None)
+        version = cache.get(CLE_VERSION)
+    return version
+
+
+def _journaliser(entree):
+    try:
+        version = cache.incr(CLE_VERSION)
+    except ValueError:
+        # Compteur absent : tous les processus reconstruiront leur index
+        return
+    if entree is not None:
+        cache.set(_cle_journal(version), entree, DUREE_JOURNAL)
+
+
+def signaler(modele, pk):
+    """
+    Signale la modification d'un objet ('reservation', 'emploi', 'salle',
+    'creneau' ou 'annee'), après validation de la transaction en cours
+    """
+    transaction.on_commit(lambda: _journaliser((modele, pk)))
+
+
+def invalider_disponibilites():
+    """Impose la reconstruction complète de l'index dans tous les processus"""
+    transaction.on_commit(lambda: _journaliser(None))
+
+
+def _fusionner(intervalles):
+    """Union d'intervalles [début, fin[ : listes triées des débuts et des fins, disjoints"""
+    debuts, fins = [], []
+    for debut, fin in sorted(intervalles):
+        if fins and debut <= fins[-1]:
+            fins[-1] = max(fins[-1], fin)
+        else:
+            debuts.append(debut)
+            fins.append(fin)
+    return debuts, fins
+
+
+def _chevauche(occupation, debut, fin):
+    debuts, fins = occupation
+    i = bisect_left(debuts, fin) - 1
+    return i >= 0 and fins[i] > debut
+
+
+def _aware(valeur):
+    return timezone.make_aware(valeur) if timezone.is_naive(valeur) else valeur
+
+
+class IndexDisponibilites:
+    """
+    Occupation des salles actives
+
+    occupation : salle → union des réservations confirmées (secondes epoch)
+    cours : (année, semestre) → salle → union des cours (minutes de la semaine)
+    """
+
+    def __init__(self):
+        self.verrou = threading.Lock()
+        self.version = None
+
+    # --- Construction ---
+
+    def a_jour(self):
+        """Rattrape les modifications journalisées depuis la version de l'index"""
+        version = _version()
+        if version == self.version:
+            return
+        entrees = None
+        if self.version is not None and 0 < version - self.version <= MAX_JOURNAL:
+            cles = [_cle_journal(v) for v in range(self.version + 1, version + 1)]
+            trouvees = cache.get_many(cles)
+            if len(trouvees) == len(cles):
+                entrees = list(trouvees.values())
+        if entrees is None or any(modele in RECONSTRUCTION for modele, _ in entrees):
+            self.construire()
+        else:
+            self.appliquer(entrees)
+        self.version = version
+
+    def construire(self):
+        self.annees = sorted(AnneeScolaire.objects.values_list('date_debut', 'date_fin', 'annee'))
+        self.creneaux = {}
+        for pk, jour, debut, fin, pause in Creneau.objects.values_list(
+            'id', 'jour', 'heure_debut', 'heure_fin', 'pause'
+        ):
+            base = JOURS.index(jour) * 24 * 60
+            self.creneaux[pk] = (
+                jour, debut, fin, pause, base + debut.hour * 60 + debut.minute, base + fin.hour * 60 + fin.minute
+            )
+        self.salles = {}
+        self.reservations = {}
+        self.reservations_par_salle = defaultdict(dict)
+        self.occupation = {}
+        self.emplois = {}
+        self.emplois_par_cle = defaultdict(dict)
+        self.cours = defaultdict(dict)
+        self.appliquer([('salle', None), ('reservation', None), ('emploi', None)])
+
+    def appliquer(self, entrees):
+        """Relit les objets des entrées (modèle, pk) ; pk None relit tout le modèle"""
+        pks = defaultdict(set)
+        for modele, pk in entrees:
+            pks[modele].add(pk)
+        if 'salle' in pks:
+            self._salles(pks['salle'])
+        if 'reservation' in pks:
+            self._reservations(pks['reservation'])
+        if 'emploi' in pks:
+            self._emplois(pks['emploi'])
+
+    def _salles(self, pks):
+        salles = Salle.objects.filter(active=True)
+        if None not in pks:
+            salles = salles.filter(pk__in=pks)
+            for pk in pks:
+                self.salles.pop(pk, None)
+        for salle in salles.values('id', 'nom', 'numero', 'capacite', 'type_salle'):
+            self.salles[salle['id']] = salle
+        self.ordre = sorted(self.salles.values(), key=lambda salle: salle['numero'])
+
+    def _reservations(self, pks):
+        reservations = ReservationSalle.objects.filter(statut='CONFIRME')
+        if None not in pks:
+            reservations = reservations.filter(pk__in=pks)
+        touchees = set()
+        for pk in pks - {None}:
+            salle_id = self.reservations.pop(pk, None)
+            if salle_id is not None:
+                del self.reservations_par_salle[salle_id][pk]
+                touchees.add(salle_id)
+        for pk, salle_id, debut, fin in reservations.values_list('id', 'salle_id', 'date_debut', 'date_fin'):
+            self.reservations[pk] = salle_id
+            self.reservations_par_salle[salle_id][pk] = (debut.timestamp(), fin.timestamp())
+            touchees.add(salle_id)
+        for salle_id in touchees:
+            intervalles = self.reservations_par_salle[salle_id].values()
+            if intervalles:
+                self.occupation[salle_id] = _fusionner(intervalles)
+            else:
+                self.occupation.pop(salle_id, None)
+
+    def _emplois(self, pks):
+        emplois = EmploiDuTemps.objects.filter(actif=True)
+        if None not in pks:
+            emplois = emplois.filter(pk__in=pks)
+        touchees = set()
+        for pk in pks - {None}:
+            cle = self.emplois.pop(pk, None)
+            if cle is not None:
+                del self.emplois_par_cle[cle][pk]
+                touchees.add(cle)
+        for pk, salle_id, annee, semestre, creneau_id in emplois.values_list(
+            'id', 'salle_id', 'annee_scolaire', 'semestre', 'creneau_id'
+        ):
+            cle = (annee, semestre, salle_id)
+            self.emplois[pk] = cle
+            self.emplois_par_cle[cle][pk] = self.creneaux[creneau_id][4:]
+            touchees.add(cle)
+        for annee, semestre, salle_id in touchees:
+            intervalles = self.emplois_par_cle[annee, semestre, salle_id].values()
+            if intervalles:
+                self.cours[annee, semestre][salle_id] = _fusionner(intervalles)
+            else:
+                self.cours[annee, semestre].pop(salle_id, None)
+
+    # --- Requêtes ---
+
+    def periode(self, jour):
+        """(année scolaire, semestre) dont relève le jour"""
+        for debut, fin, annee in self.annees:
+            if debut <= jour <= fin:
+                break
+        else:
+            rentree = jour.year if jour.month >= 9 else jour.year - 1
+            annee = f'{rentree}-{rentree + 1}'
+        return annee, 2 if DEBUT_SEMESTRE_2 <= (jour.month, jour.day) < (9, 1) else 1
+
+    def segments(self, debut, fin):
+        """
+        Découpe [debut, fin[ en (année, semestre, minute de début, minute de
+        fin) de la semaine, jour par jour, en heure locale
+        """
+        debut = timezone.localtime(debut).replace(tzinfo=None)
+        fin = timezone.localtime(fin).replace(tzinfo=None)
+        segments = set()
+        jour = debut.date()
+        while datetime.combine(jour, heure()) < fin:
+            minuit = datetime.combine(jour, heure())
+            d = max(debut, minuit) - minuit
+            f = min(fin, minuit + timedelta(days=1)) - minuit
+            base = jour.weekday() * 24 * 60
+            segments.add((*self.periode(jour), base + d.total_seconds() / 60, base + f.total_seconds() / 60))
+            jour += timedelta(days=1)
+        return segments
+
+    def candidates(self, capacite_min=0, type_salle=None):
+        return [
+            salle for salle in self.ordre
+            if salle['capacite'] >= capacite_min and (type_salle is None or salle['type_salle'] == type_salle)
+        ]
+
+    def libres(self, salles, debut, fin):
+        """Salles parmi salles libres sur [debut, fin["""
+        instants = (debut.timestamp(), fin.timestamp())
+        cours = [
+            (self.cours[annee, semestre], d, f)
+            for annee, semestre, d, f in self.segments(debut, fin) if self.cours.get((annee, semestre))
+        ]
+        libres = []
+        for salle in salles:
+            salle_id = salle['id']
+            occupation = self.occupation.get(salle_id)
+            if occupation is not None and _chevauche(occupation, *instants):
+                continue
+            if any(
+                salle_id in par_salle and _chevauche(par_salle[salle_id], d, f) for par_salle, d, f in cours
+            ):
+                continue
+            libres.append(salle)
+        return libres
+
+    def conflits(self, salle_id, debut, fin, exclure_reservation=None):
+        d, f = debut.timestamp(), fin.timestamp()
+        reservations = sorted(
+            pk for pk, (debut_r, fin_r) in self.reservations_par_salle.get(salle_id, {}).items()
+            if pk != exclure_reservation and debut_r < f and fin_r > d
+        )
+        emplois = sorted({
+            pk
+            for annee, semestre, debut_s, fin_s in self.segments(debut, fin)
+            for pk, (debut_c, fin_c) in self.emplois_par_cle.get((annee, semestre, salle_id), {}).items()
+            if debut_c < fin_s and fin_c > debut_s
+        })
+        return reservations, emplois
+
+
+_index = IndexDisponibilites()
+
+
+def salles_libres(debut, fin, capacite_min=0, type_salle=None):
+    """
+    Salles actives libres sur [debut, fin[ (ni réservation confirmée, ni
+    cours), de capacité au moins capacite_min et du type demandé ;
+    dictionnaires id, nom, numero, capacite, type_salle triés par numéro
+    """
+    debut, fin = _aware(debut), _aware(fin)
+    with _index.verrou:
+        _index.a_jour()
+        return _index.libres(_index.candidates(capacite_min, type_salle), debut, fin)
+
+
+def salles_libres_lot(intervalles, capacite_min=0, type_salle=None):
+    """salles_libres() pour chaque intervalle (debut, fin) : listes d'ids, dans l'ordre des intervalles"""
+    with _index.verrou:
+        _index.a_jour()
+        candidates = _index.candidates(capacite_min, type_salle)
+        return [
+            [salle['id'] for salle in _index.libres(candidates, _aware(debut), _aware(fin))]
+            for debut, fin in intervalles
+        ]
+
+
+def grille_salles_libres(jour, capacite_min=0, type_salle=None):
+    """
+    Salles libres à chaque créneau (hors pauses) de la semaine du jour :
+    dictionnaire id de créneau → ids de salles
+    """
+    lundi = jour - timedelta(days=jour.weekday())
+    with _index.verrou:
+        _index.a_jour()
+        creneaux = {
+            pk: (
+                timezone.make_aware(datetime.combine(lundi + timedelta(days=JOURS.index(code)), debut)),
+                timezone.make_aware(datetime.combine(lundi + timedelta(days=JOURS.index(code)), fin)),
+            )
+            for pk, (code, debut, fin, pause, _, _) in _index.creneaux.items() if not pause
+        }
+        candidates = _index.candidates(capacite_min, type_salle)
+        return {
+            pk: [salle['id'] for salle in _index.libres(candidates, debut, fin)]
+            for pk, (debut, fin) in creneaux.items()
+        }
+
+
+def conflits_salle(salle_id, debut, fin, exclure_reservation=None):
+    """Ids des réservations confirmées et des cours qui occupent la salle sur [debut, fin[ : (réservations, cours)"""
+    with _index.verrou:
+        _index.a_jour()
+        return _index.conflits(salle_id, _aware(debut), _aware(fin), exclure_reservation)
@@ -0,0 +1,745 @@
+"""
+Génération d'une école synthétique à grande échelle
+
+Peuple la base de classes, professeurs, élèves, parents, emplois du temps,
+évaluations, notes, absences, conversations et logs d'audit au volume d'un collège, d'un
+district ou d'une ville, pour mesurer les performances de l'application sur
+des données réalistes (commande seed_school).
+
+La génération est déterministe : une même graine et une même date de
+référence produisent les mêmes lignes. Les données couvrent les
+DUREE_PERIODE jours qui précèdent la date de référence.
+
+Les tables volumineuses sont écrites par lots de tuples déjà convertis au
+format de la base (executemany, COPY sous PostgreSQL), avec des identifiants
+attribués d'avance : aucun modèle n'est instancié et aucun signal n'est
+envoyé. Les données dérivées (état de lecture des conversations, moyennes
+par matière, statistiques d'audit) sont donc calculées par la génération
+elle-même, au fil des lots.
+"""
+import io
+import math
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from datetime import time as heure
+from decimal import Decimal
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connections, models, router, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from .analytics import invalider_analyse_resultats
+from .dashboard_cache import invalider
+from .disponibilites import invalider_disponibilites
+from .grille_emploi import invalider_grilles
+from .models import (
+    Absence, AnneeScolaire, AuditLog, Classe, Conversation, Creneau, Eleve, EmploiDuTemps, Evaluation, Matiere,
+    Message, MoyenneEleveMatiere, Note, Parent, Participant, Professeur, Salle, StatistiqueAuditAction,
+    StatistiqueAuditUtilisateur
+)
+from .moyennes import _agreger
+
+
+# Volumes par échelle ; les notes et les logs d'audit dominent
+ECHELLES = {
+    'small': {
+        'classes': 20, 'eleves_par_classe': 25, 'evaluations_par_trimestre': 2, 'absences_par_eleve': 6,
+        'conversations_par_classe': 3, 'messages_par_conversation': 40, 'logs_par_utilisateur': 20,
+    },
+    'district': {
+        'classes': 200, 'eleves_par_classe': 25, 'evaluations_par_trimestre': 2, 'absences_par_eleve': 6,
+        'conversations_par_classe': 3, 'messages_par_conversation': 40, 'logs_par_utilisateur': 20,
+    },
+    'city': {
+        'classes': 1600, 'eleves_par_classe': 25, 'evaluations_par_trimestre': 2, 'absences_par_eleve': 6,
+        'conversations_par_classe': 3, 'messages_par_conversation': 40, 'logs_par_utilisateur': 20,
+    },
+}
+
+TAILLE_LOT = 10000
+CACHE_SQLITE_KO = 256 * 1024
+DUREE_PERIODE = 300  # Jours couverts, trois trimestres de 100 jours
+CLASSES_PAR_PROFESSEUR = 5
+JOURS_COURS = ('LUNDI', 'MARDI', 'MERCREDI', 'JEUDI', 'VENDREDI')
+HEURES_COURS = (8, 9, 10, 11, 13, 14, 15, 16)
+
+MATIERES = [
+    ('MATH', 'Mathématiques', 4), ('FRA', 'Français', 4), ('HG', 'Histoire-Géographie', 3),
+    ('ANG', 'Anglais', 3), ('SVT', 'Sciences de la vie et de la Terre', 2), ('PC', 'Physique-Chimie', 2),
+    ('EPS', 'Éducation physique et sportive', 1), ('ART', 'Arts plastiques', 1),
+]
+NIVEAUX = ('6e', '5e', '4e', '3e')
+PRENOMS = {
+    'F': ('Emma', 'Jade', 'Louise', 'Alice', 'Chloé', 'Lina', 'Léa', 'Manon', 'Rose', 'Anna', 'Inès', 'Camille',
+          'Lola', 'Zoé', 'Juliette', 'Sarah', 'Léonie', 'Agathe', 'Mila', 'Romane'),
+    'M': ('Gabriel', 'Léo', 'Raphaël', 'Arthur', 'Louis', 'Lucas', 'Adam', 'Jules', 'Hugo', 'Maël', 'Liam',
+          'Noah', 'Paul', 'Nathan', 'Sacha', 'Tom', 'Ethan', 'Théo', 'Nolan', 'Victor'),
+}
+NOMS = ('Martin', 'Bernard', 'Thomas', 'Petit', 'Robert', 'Richard', 'Durand', 'Dubois', 'Moreau', 'Laurent',
+        'Simon', 'Michel', 'Lefebvre', 'Leroy', 'Roux', 'David', 'Bertrand', 'Morel', 'Fournier', 'Girard',
+        'Bonnet', 'Dupont', 'Lambert', 'Fontaine', 'Rousseau', 'Vincent', 'Muller', 'Lefevre', 'Faure', 'Andre')
+VILLES = ('Lyon', 'Paris', 'Marseille', 'Toulouse', 'Nantes', 'Lille', 'Rennes', 'Grenoble', 'Dijon', 'Metz')
+TYPES_EVALUATION = ('DS', 'DS', 'CC', 'CC', 'DM', 'EX', 'TP', 'OR')
+MOTIFS_ABSENCE = ('M', 'M', 'M', 'F', 'A', 'NJ')
+MESSAGES = (
+    'Bonjour, pouvez-vous me rappeler la date du prochain contrôle ?',
+    'Merci pour votre retour, nous en parlerons à la maison.',
+    'Les résultats du trimestre sont en ligne.',
+    'Mon enfant sera absent demain matin pour un rendez-vous médical.',
+    'Pensez à signer le carnet de correspondance.',
+    'Le travail a bien été rendu, merci.',
+)
+# (action, poids, modèle concerné)
+ACTIONS_AUDIT = (
+    ('VIEW', 50, 'Eleve'), ('LOGIN', 15, 'User'), ('LOGOUT', 10, 'User'), ('NOTE_SAVE', 8, 'Evaluation'),
+    ('UPDATE', 7, 'Eleve'), ('CREATE', 5, 'Absence'), ('ABSENCE_CREATE', 3, 'Absence'), ('DELETE', 2, 'Note'),
+)
+NAVIGATEURS = (
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/124.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_4) AppleWebKit/605.1.15 Version/17.4 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+)
+NOTES_DEMI_POINT = [Decimal(n) / 2 for n in range(41)]
+NOTE_SUR = Decimal(20)
+
+
+# =============== INSERTION EN MASSE ===============
+
+def _valeur_copy(valeur):
+    """Valeur au format texte de COPY"""
+    if valeur is None:
+        return '\\N'
+    if valeur is True:
+        return 't'
+    if valeur is False:
+        return 'f'
+    if isinstance(valeur, str):
+        return valeur.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return str(valeur)
+
+
+def _copier(curseur, table, colonnes, lot):
+    tampon = io.StringIO()
+    for ligne in lot:
+        tampon.write('\t'.join(map(_valeur_copy, ligne)))
+        tampon.write('\n')
+    sql = f'COPY {table} ({", ".join(colonnes)}) FROM STDIN'
+    if hasattr(curseur.cursor, 'copy_expert'):
+        tampon.seek(0)
+        curseur.cursor.copy_expert(sql, tampon)
+    else:
+        # psycopg 3
+        with curseur.cursor.copy(sql) as copie:
+            copie.write(tampon.getvalue())
+
+
+@contextmanager
+def chargement_en_masse(connexion):
+    """
+    SQLite : agrandit le cache de pages le temps d'un chargement
+
+    Avec le cache par défaut (2 Mo), la mise à jour des index des grandes
+    tables relit sans cesse les mêmes pages et divise le débit par deux.
+    """
+    if connexion.vendor != 'sqlite':
+        yield
+        return
+    with connexion.cursor() as curseur:
+        curseur.execute('PRAGMA cache_size')
+        precedent = curseur.fetchone()[0]
+        curseur.execute(f'PRAGMA cache_size = {-CACHE_SQLITE_KO}')
+    try:
+        yield
+    finally:
+        with connexion.cursor() as curseur:
+            curseur.execute(f'PRAGMA cache_size = {int(precedent)}')
+
+
+def _conversion(champ, connexion):
+    """
+    Conversion vers la base des valeurs d'une colonne fournie, None si inutile
+
+    Les valeurs générées sont déjà du bon type : les adaptateurs du moteur
+    sont appelés directement, sans les vérifications de get_db_prep_save.
+    Les décimaux, en petit nombre de valeurs distinctes, sont mémorisés.
+    """
+    ops = connexion.ops
+    if isinstance(champ, models.DateTimeField):
+        if connexion.vendor == 'sqlite' and settings.USE_TZ:
+            # Même texte que adapt_datetimefield_value : heure naïve dans le fuseau de la connexion
+            fuseau = connexion.timezone
+            return lambda valeur: None if valeur is None else str(valeur.astimezone(fuseau).replace(tzinfo=None))
+        return lambda valeur: None if valeur is None else ops.adapt_datetimefield_value(valeur)
+    if isinstance(champ, models.DateField):
+        return ops.adapt_datefield_value
+    if isinstance(champ, models.DecimalField):
+        memoire = {None: None}
+
+        def convertir(valeur):
+            try:
+                return memoire[valeur]
+            except KeyError:
+                memoire[valeur] = adaptee = ops.adapt_decimalfield_value(
+                    valeur, champ.max_digits, champ.decimal_places
+                )
+                return adaptee
+        return convertir
+    return None
+
+
+def inserer(modele, champs, lignes, maintenant=None):
+    """
+    Insère des lignes par lots de TAILLE_LOT, sans instancier de modèles
+
+    lignes est un itérable de tuples dans l'ordre de champs (attnames, par
+    exemple 'classe_id'). Les colonnes absentes de champs reçoivent la valeur
+    par défaut du champ, ou maintenant pour les dates automatiques ; la clé
+    primaire absente est attribuée par la base. Retourne le nombre de lignes.
+    """
+    connexion = connections[router.db_for_write(modele)]
+    qn = connexion.ops.quote_name
+    champs_modele = {champ.attname: champ for champ in modele._meta.concrete_fields}
+    fournis = [champs_modele[nom] for nom in champs]
+
+    constantes = []
+    for champ in modele._meta.concrete_fields:
+        if champ.attname in champs or (champ.primary_key and isinstance(champ, models.AutoField)):
+            continue
+        if getattr(champ, 'auto_now', False) or getattr(champ, 'auto_now_add', False):
+            valeur = maintenant or timezone.now()
+        else:
+            valeur = champ.get_default()
+        fournis.append(champ)
+        constantes.append(champ.get_db_prep_save(valeur, connexion))
+    constantes = tuple(constantes)
+
+    conversions = [
+        (position, conversion) for position, conversion in enumerate(
+            _conversion(champ, connexion) for champ in fournis[:len(champs)]
+        )
+        if conversion is not None
+    ]
+    table = qn(modele._meta.db_table)
+    colonnes = [qn(champ.column) for champ in fournis]
+    sql = f'INSERT INTO {table} ({", ".join(colonnes)}) VALUES ({", ".join(["%s"] * len(colonnes))})'
+
+    nombre = 0
+    lignes = iter(lignes)
+    with connexion.cursor() as curseur:
+        while True:
+            lot = list(islice(lignes, TAILLE_LOT))
+            if not lot:
+                break
+            if conversions:
+                for i, ligne in enumerate(lot):
+                    ligne = list(ligne)
+                    for position, conversion in conversions:
+                        ligne[position] = conversion(ligne[position])
+                    lot[i] = ligne
+            lot = [tuple(ligne) + constantes for ligne in lot]
+            if connexion.vendor == 'postgresql':
+                _copier(curseur, table, colonnes, lot)
+            else:
+                curseur.executemany(sql, lot)
+            nombre += len(lot)
+    return nombre
+
+
+def _premier_id(modele):
+    return (modele.objects.aggregate(dernier=Max('pk'))['dernier'] or 0) + 1
+
+
+# =============== GÉNÉRATION ===============
+
+def annee_scolaire_de(jour):
+    """Année scolaire ('2024-2025') contenant le jour, rentrée en septembre"""
+    debut = jour.year if jour.month >= 9 else jour.year - 1
+    return f'{debut}-{debut + 1}'
+
+
+class GenerateurEcole:
+    """
+    Génère une école complète dans une seule transaction
+
+    Les comptes (élèves, parents, professeurs) ont pour identifiant
+    s<graine>-eleve<n>, s<graine>-parent<n>, s<graine>-prof<n>, celui de
+    l'administrateur s<graine>-admin ; tous partagent le même mot de passe. generer() retourne le bilan (table, lignes, durée
+    en secondes), durée de génération des lignes comprise.
+    """
+
+    def __init__(self, echelle, graine=0, reference=None, mot_de_passe='motdepasse'):
+        self.parametres = ECHELLES[echelle]
+        self.graine = graine
+        self.rng = random.Random(graine)
+        self.prefixe = f's{graine}-'
+        self.reference = reference or timezone.localdate()
+        self.fin = timezone.make_aware(datetime.combine(self.reference, heure(18)))
+        self.debut = self.fin - timedelta(days=DUREE_PERIODE)
+        self.annee_scolaire = annee_scolaire_de((self.debut + timedelta(days=DUREE_PERIODE // 2)).date())
+        self.mot_de_passe = mot_de_passe
+        self.bilan = {}
+
+    def generer(self):
+        if User.objects.filter(username__startswith=self.prefixe).exists():
+            raise ValueError(
+                f'Des comptes {self.prefixe}* existent déjà : école déjà générée avec la graine {self.graine}'
+            )
+        self.mot_de_passe_chiffre = make_password(self.mot_de_passe)
+        with transaction.atomic(), chargement_en_masse(connections[router.db_for_write(Note)]):
+            self._annee_scolaire()
+            self._matieres()
+            self._administrateur()
+            self._professeurs_et_classes()
+            self._emplois_du_temps()
+            self._eleves_et_parents()
+            self._evaluations_et_notes()
+            self._absences()
+            self._messagerie()
+            self._audit()
+            self._remettre_sequences()
+            invalider_analyse_resultats()
+            invalider('global', 'structure')
+            invalider_disponibilites()
+            invalider_grilles()
+        return [(libelle, nombre, duree) for libelle, (nombre, duree) in self.bilan.items()]
+
+    # --- Outils ---
+
+    def _inserer(self, libelle, modele, champs, lignes):
+        debut = time.perf_counter()
+        nombre = inserer(modele, champs, lignes, maintenant=self.debut)
+        cumul = self.bilan.setdefault(libelle, [0, 0.0])
+        cumul[0] += nombre
+        cumul[1] += time.perf_counter() - debut
+        return nombre
+
+    def _ids(self, modele, nombre):
+        premier = _premier_id(modele)
+        return range(premier, premier + nombre)
+
+    def _date(self, jour_min, jour_max):
+        """Datetime aléatoire entre deux jours de la période, en heures de cours"""
+        alea = self.rng.random
+        jour = self.debut + timedelta(days=jour_min + int(alea() * (jour_max - jour_min + 1)))
+        return jour.replace(hour=8 + int(alea() * 9), minute=30 * int(alea() * 2), second=0, microsecond=0)
+
+    def _professeur(self, c, j):
+        """Indice du professeur de la matière j dans la classe c"""
+        return j * self.groupes + c // CLASSES_PAR_PROFESSEUR
+
+    def _identite(self):
+        sexe = self.rng.choice('FM')
+        return sexe, self.rng.choice(PRENOMS[sexe]), self.rng.choice(NOMS)
+
+    def _utilisateurs(self, libelle, role, identites):
+        """Crée un compte par identité (prénom, nom), retourne leurs ids"""
+        ids = self._ids(User, len(identites))
+        champs = ('id', 'username', 'password', 'first_name', 'last_name', 'email', 'date_joined')
+        self._inserer(libelle, User, champs, (
+            (
+                user_id, f'{self.prefixe}{role}{n}', self.mot_de_passe_chiffre, prenom, nom,
+                f'{self.prefixe}{role}{n}@ecole.test', self.debut
+            )
+            for n, (user_id, (prenom, nom)) in enumerate(zip(ids, identites))
+        ))
+        return list(ids)
+
+    # --- Structure ---
+
+    def _annee_scolaire(self):
+        AnneeScolaire.objects.get_or_create(annee=self.annee_scolaire, defaults={
+            'date_debut': self.debut.date(),
+            'date_fin': self.reference,
+            'active': not AnneeScolaire.objects.filter(active=True).exists(),
+        })
+
+    def _matieres(self):
+        self.matieres = []
+        for code, nom, coefficient in MATIERES:
+            matiere = Matiere.objects.filter(Q(code=code) | Q(nom=nom)).first()
+            if matiere is None:
+                matiere = Matiere.objects.create(code=code, nom=nom, coefficient=coefficient)
+            self.matieres.append(matiere.pk)
+
+    def _administrateur(self):
+        champs = ('username', 'password', 'first_name', 'last_name', 'email', 'is_staff', 'is_superuser', 'date_joined')
+        self._inserer('Comptes administrateurs', User, champs, [(
+            f'{self.prefixe}admin', self.mot_de_passe_chiffre, 'Direction', 'Collège',
+            f'{self.prefixe}admin@ecole.test', True, True, self.debut
+        )])
+
+    def _professeurs_et_classes(self):
+        """
+        Chaque professeur enseigne une matière dans CLASSES_PAR_PROFESSEUR
+        classes ; le professeur principal d'une classe est l'un de ses
+        professeurs, distinct pour chaque classe
+        """
+        nb_classes = self.parametres['classes']
+        self.groupes = math.ceil(nb_classes / CLASSES_PAR_PROFESSEUR)
+        nb_professeurs = len(self.matieres) * self.groupes
+
+        identites = [self._identite() for _ in range(nb_professeurs)]
+        users = self._utilisateurs('Comptes professeurs', 'prof', [identite[1:] for identite in identites])
+        self.professeurs = list(self._ids(Professeur, nb_professeurs))
+        self.users_professeurs = users
+        self._inserer('Professeurs', Professeur, ('id', 'user_id', 'civilite', 'date_embauche'), (
+            (
+                professeur_id, user_id, 'Mme' if sexe == 'F' else 'M',
+                self.debut.date() - timedelta(days=365 * (1 + p % 20))
+            )
+            for p, (professeur_id, user_id, (sexe, _, _)) in enumerate(zip(self.professeurs, users, identites))
+        ))
+
+        self.classes = list(self._ids(Classe, nb_classes))
+        self.noms_classes = [
+            f'{self.prefixe}{NIVEAUX[c % len(NIVEAUX)]}-{c // len(NIVEAUX) + 1}' for c in range(nb_classes)
+        ]
+        self.principal_de = [self._professeur(c, c % len(self.matieres)) for c in range(nb_classes)]
+        self._inserer('Classes', Classe, ('id', 'nom', 'niveau', 'annee_scolaire', 'prof_principal_id'), (
+            (
+                classe_id, self.noms_classes[c], NIVEAUX[c % len(NIVEAUX)], self.annee_scolaire,
+                self.professeurs[self.principal_de[c]]
+            )
+            for c, classe_id in enumerate(self.classes)
+        ))
+        self._inserer('Professeurs ↔ matières', Professeur.matieres.through, ('professeur_id', 'matiere_id'), (
+            (self.professeurs[j * self.groupes + g], matiere_id)
+            for j, matiere_id in enumerate(self.matieres) for g in range(self.groupes)
+        ))
+        self._inserer('Professeurs ↔ classes', Professeur.classes.through, ('professeur_id', 'classe_id'), (
+            (self.professeurs[self._professeur(c, j)], classe_id)
+            for c, classe_id in enumerate(self.classes) for j in range(len(self.matieres))
+        ))
+
+    def _emplois_du_temps(self):
+        """
+        Un cours hebdomadaire par matière et par classe, dans la salle de la
+        classe ; les classes d'un même professeur décalent leurs cours d'une
+        journée, de sorte qu'aucun professeur n'a deux cours au même créneau
+        """
+        existants = {(c.jour, c.heure_debut): c.pk for c in Creneau.objects.filter(jour__in=JOURS_COURS)}
+        creneaux = []
+        for jour in JOURS_COURS:
+            for h in HEURES_COURS:
+                if (jour, heure(h)) not in existants:
+                    existants[jour, heure(h)] = Creneau.objects.create(
+                        jour=jour, heure_debut=heure(h), heure_fin=heure(h, 55)
+                    ).pk
+                creneaux.append(existants[jour, heure(h)])
+
+        salles = list(self._ids(Salle, len(self.classes)))
+        self._inserer('Salles', Salle, ('id', 'nom', 'numero'), (
+            (salle_id, f'{self.prefixe}Salle {c + 1}', f'{self.prefixe}{c}') for c, salle_id in enumerate(salles)
+        ))
+        par_jour = len(HEURES_COURS)
+        champs = ('classe_id', 'matiere_id', 'professeur_id', 'salle_id', 'creneau_id', 'annee_scolaire')
+        self._inserer('Emplois du temps', EmploiDuTemps, champs, (
+            (
+                classe_id, matiere_id, self.professeurs[self._professeur(c, j)], salles[c],
+                creneaux[(j + par_jour * (c % CLASSES_PAR_PROFESSEUR)) % len(creneaux)], self.annee_scolaire
+            )
+            for c, classe_id in enumerate(self.classes) for j, matiere_id in enumerate(self.matieres)
+        ))
+
+    def _eleves_et_parents(self):
+        """Élèves regroupés en familles de 1 à 3 enfants, chaque famille a 1 ou 2 parents"""
+        par_classe = self.parametres['eleves_par_classe']
+        nb_eleves = len(self.classes) * par_classe
+        ordre = list(range(nb_eleves))
+        self.rng.shuffle(ordre)
+        familles = []
+        while ordre:
+            taille = self.rng.choices((1, 2, 3), (70, 25, 5))[0]
+            familles.append(ordre[:taille])
+            ordre = ordre[taille:]
+        nom_famille = [None] * nb_eleves
+        for famille in familles:
+            nom = self.rng.choice(NOMS)
+            for e in famille:
+                nom_famille[e] = nom
+
+        identites = []
+        for e in range(nb_eleves):
+            sexe = self.rng.choice('FM')
+            identites.append((sexe, self.rng.choice(PRENOMS[sexe]), nom_famille[e]))
+        users = self._utilisateurs('Comptes élèves', 'eleve', [identite[1:] for identite in identites])
+        self.eleves = list(self._ids(Eleve, nb_eleves))
+        self.users_eleves = users
+        annee_rentree = self.debut.year if self.debut.month >= 9 else self.debut.year - 1
+        self._inserer('Élèves', Eleve, (
+            'id', 'user_id', 'nom', 'prenom', 'date_naissance', 'lieu_naissance', 'sexe', 'numero_etudiant',
+            'classe_id', 'date_inscription', 'adresse'
+        ), (
+            (
+                eleve_id, user_id, nom, prenom,
+                # 11 ans à la rentrée en 6e
+                date(annee_rentree - 11 - (e // par_classe) % len(NIVEAUX), 1, 1)
+                + timedelta(days=self.rng.randint(0, 364)),
+                self.rng.choice(VILLES), sexe, f'{self.prefixe}{e:07d}', self.classes[e // par_classe],
+                self.debut.date(), f'{self.rng.randint(1, 120)} rue {self.rng.choice(NOMS)}'
+            )
+            for e, (eleve_id, user_id, (sexe, prenom, nom)) in enumerate(zip(self.eleves, users, identites))
+        ))
+
+        parents = []  # (famille, sexe, prénom, relation)
+        for f, famille in enumerate(familles):
+            if self.rng.random() < 0.6:
+                parents.append((f, 'F', self.rng.choice(PRENOMS['F']), 'MERE'))
+                parents.append((f, 'M', self.rng.choice(PRENOMS['M']), 'PERE'))
+            else:
+                relation = self.rng.choices(('MERE', 'PERE', 'TUTEUR'), (60, 30, 10))[0]
+                sexe = 'M' if relation == 'PERE' else 'F'
+                parents.append((f, sexe, self.rng.choice(PRENOMS[sexe]), relation))
+        users = self._utilisateurs(
+            'Comptes parents', 'parent', [(prenom, nom_famille[familles[f][0]]) for f, _, prenom, _ in parents]
+        )
+        ids = self._ids(Parent, len(parents))
+        self._inserer('Parents', Parent, ('id', 'user_id', 'nom', 'prenom', 'sexe', 'relation', 'telephone', 'email'), (
+            (
+                parent_id, user_id, nom_famille[familles[f][0]], prenom, sexe, relation,
+                f'06{self.rng.randint(0, 99999999):08d}', f'{self.prefixe}parent{p}@ecole.test'
+            )
+            for p, (parent_id, user_id, (f, sexe, prenom, relation)) in enumerate(zip(ids, users, parents))
+        ))
+
+        # Comptes parents par classe, pour la messagerie
+        self.users_parents = users
+        self.parents_par_classe = [[] for _ in self.classes]
+        liens = []
+        for parent_id, user_id, (f, _, _, _) in zip(ids, users, parents):
+            for e in familles[f]:
+                liens.append((self.eleves[e], parent_id))
+                self.parents_par_classe[e // par_classe].append(user_id)
+        self._inserer('Élèves ↔ parents', Eleve.parents.through, ('eleve_id', 'parent_id'), liens)
+
+    # --- Scolarité ---
+
+    def _evaluations_et_notes(self):
+        """
+        Évaluations réparties sur les trois trimestres et notes autour du
+        niveau de chaque élève, par lots de classes ; les moyennes par matière
+        de chaque lot sont agrégées comme le fait moyennes.reconstruire_moyennes
+        """
+        par_classe = self.parametres['eleves_par_classe']
+        evaluations = []  # (classe, matière, trimestre, coefficient, date)
+        lignes = []
+        for c, classe_id in enumerate(self.classes):
+            for j, matiere_id in enumerate(self.matieres):
+                for trimestre in (1, 2, 3):
+                    for k in range(self.parametres['evaluations_par_trimestre']):
+                        quand = self._date((trimestre - 1) * 100, trimestre * 100 - 5)
+                        type_evaluation = self.rng.choice(TYPES_EVALUATION)
+                        coefficient = Decimal(2 if type_evaluation == 'EX' else 1)
+                        evaluations.append((c, matiere_id, trimestre, coefficient, quand))
+                        lignes.append((
+                            f'{dict(Evaluation.TYPE_CHOICES)[type_evaluation]} {k + 1}', matiere_id, classe_id,
+                            self.professeurs[self._professeur(c, j)], quand, type_evaluation, coefficient,
+                            trimestre, self.annee_scolaire
+                        ))
+        ids = self._ids(Evaluation, len(lignes))
+        self._inserer('Évaluations', Evaluation, (
+            'id', 'titre', 'matiere_id', 'classe_id', 'professeur_id', 'date_evaluation', 'type_evaluation',
+            'coefficient', 'trimestre', 'annee_scolaire'
+        ), ((evaluation_id,) + ligne for evaluation_id, ligne in zip(ids, lignes)))
+
+        niveaux = [self.rng.gauss(12, 3) for _ in self.eleves]
+        decalages_saisie = [timedelta(days=jours) for jours in range(1, 11)]
+        alea, gauss = self.rng.random, self.rng.gauss
+        par_classe_evaluations = len(lignes) // len(self.classes)
+        classes_par_lot = max(1, TAILLE_LOT // (par_classe * par_classe_evaluations))
+        for premiere in range(0, len(self.classes), classes_par_lot):
+            tranche = slice(premiere * par_classe_evaluations, (premiere + classes_par_lot) * par_classe_evaluations)
+            notes, a_agreger = [], []
+            for evaluation_id, evaluation in zip(ids[tranche], evaluations[tranche]):
+                c, matiere_id, trimestre, coefficient, quand = evaluation
+                cle = (matiere_id, trimestre, self.annee_scolaire)
+                for e in range(c * par_classe, (c + 1) * par_classe):
+                    eleve_id = self.eleves[e]
+                    saisie = min(quand + decalages_saisie[int(alea() * 10)], self.fin)
+                    if alea() < 0.03:
+                        notes.append((eleve_id, evaluation_id, None, True, saisie))
+                        continue
+                    demi_points = round((niveaux[e] + gauss(0, 3)) * 2)
+                    note = NOTES_DEMI_POINT[min(max(demi_points, 0), 40)]
+                    notes.append((eleve_id, evaluation_id, note, False, saisie))
+                    a_agreger.append(((eleve_id,) + cle, note, NOTE_SUR, coefficient))
+            self._inserer('Notes', Note, ('eleve_id', 'evaluation_id', 'note', 'absent', 'date_saisie'), notes)
+            # Élèves nouveaux : aucun agrégat existant à fusionner
+            self._inserer('Moyennes par matière', MoyenneEleveMatiere, (
+                'eleve_id', 'matiere_id', 'trimestre', 'annee_scolaire', 'nombre_notes', 'somme_notes',
+                'somme_ponderee', 'somme_coefficients', 'note_min', 'note_max'
+            ), (
+                cle + (
+                    agregat['nombre_notes'], agregat['somme_notes'],
+                    agregat['somme_ponderee'].quantize(Decimal('0.0001')), agregat['somme_coefficients'],
+                    agregat['note_min'], agregat['note_max']
+                )
+                for cle, agregat in _agreger(a_agreger).items()
+            ))
+
+    def _absences(self):
+        moyenne = self.parametres['absences_par_eleve']
+        durees = [timedelta(hours=heures) for heures in (1, 2, 2, 4, 8, 32)]
+        alea = self.rng.random
+
+        def absences():
+            for eleve_id in self.eleves:
+                for _ in range(int(alea() * (2 * moyenne + 1))):
+                    debut = self._date(0, DUREE_PERIODE - 1)
+                    yield (
+                        eleve_id, debut, debut + durees[int(alea() * len(durees))],
+                        MOTIFS_ABSENCE[int(alea() * len(MOTIFS_ABSENCE))], alea() < 0.6
+                    )
+
+        self._inserer('Absences', Absence, ('eleve_id', 'date_debut', 'date_fin', 'motif', 'justifiee'), absences())
+
+    # --- Messagerie ---
+
+    def _messagerie(self):
+        """
+        Conversations professeur principal - parents d'une classe
+
+        L'état de lecture est celui qu'aurait laissé enregistrer_message puis
+        marquer_conversation_lue : chaque participant a lu jusqu'à un message
+        postérieur à son dernier envoi, les suivants comptent comme non lus.
+        """
+        moyenne = self.parametres['messages_par_conversation']
+        conversations, messages, participants = [], [], []
+        id_conversation = _premier_id(Conversation)
+        id_message = _premier_id(Message)
+        for c, classe_id in enumerate(self.classes):
+            parents_classe = self.parents_par_classe[c]
+            if not parents_classe:
+                continue
+            createur = self.users_professeurs[self.principal_de[c]]
+            for _ in range(self.parametres['conversations_par_classe']):
+                membres = [createur] + sorted(set(self.rng.sample(parents_classe, min(4, len(parents_classe)))))
+                creation = self._date(0, DUREE_PERIODE // 2)
+                nb_messages = self.rng.randint(moyenne // 2, moyenne * 3 // 2)
+                secondes = int((self.fin - creation).total_seconds())
+                dates = sorted(creation + timedelta(seconds=self.rng.randint(60, secondes)) for _ in range(nb_messages))
+                expediteurs = [self.rng.choice(membres) for _ in range(nb_messages)]
+
+                # Position (exclue) jusqu'à laquelle chaque membre a lu
+                lu_jusqua = {}
+                for membre in membres:
+                    propres = [i for i, expediteur in enumerate(expediteurs) if expediteur == membre]
+                    lu_jusqua[membre] = max(nb_messages - self.rng.randint(0, 6), propres[-1] + 1 if propres else 0, 0)
+                for i, (envoi, expediteur) in enumerate(zip(dates, expediteurs)):
+                    lu = any(lu_jusqua[membre] > i for membre in membres if membre != expediteur)
+                    messages.append((
+                        id_message + i, id_conversation, expediteur, self.rng.choice(MESSAGES), envoi, lu,
+                        envoi + timedelta(hours=1) if lu else None
+                    ))
+                for membre in membres:
+                    position = lu_jusqua[membre]
+                    participants.append((
+                        id_conversation, membre, creation, id_message + position - 1 if position else None,
+                        sum(1 for expediteur in expediteurs[position:] if expediteur != membre)
+                    ))
+                conversations.append((
+                    id_conversation, f'Suivi de la {self.noms_classes[c][len(self.prefixe):]}', 'PROF_PARENT',
+                    classe_id, createur, creation, dates[-1] if dates else creation,
+                    id_message + nb_messages - 1 if nb_messages else None, dates[-1] if dates else None
+                ))
+                id_conversation += 1
+                id_message += nb_messages
+
+        self._inserer('Conversations', Conversation, (
+            'id', 'titre', 'type_conversation', 'classe_id', 'createur_id', 'date_creation', 'date_modification',
+            'dernier_message_id', 'date_dernier_message'
+        ), conversations)
+        self._inserer('Messages', Message, (
+            'id', 'conversation_id', 'expediteur_id', 'contenu', 'date_envoi', 'lu', 'date_lecture'
+        ), messages)
+        self._inserer('Participants', Participant, (
+            'conversation_id', 'user_id', 'date_ajout', 'dernier_message_lu_id', 'nombre_non_lus'
+        ), participants)
+
+    def _audit(self):
+        """
+        Logs d'audit jour par jour, en ordre chronologique comme écrits au fil
+        de l'eau, moins nombreux le week-end
+
+        Les statistiques journalières sont comptées à la génération : celles
+        des nouveaux comptes sont insérées, celles par action s'ajoutent aux
+        compteurs existants des mêmes jours.
+        """
+        comptes = [
+            (user_id, f'{self.prefixe}{role}{n}')
+            for role, users in (('prof', self.users_professeurs), ('eleve', self.users_eleves),
+                                ('parent', self.users_parents))
+            for n, user_id in enumerate(users)
+        ]
+        nombre = len(comptes) * self.parametres['logs_par_utilisateur']
+        jours = [(self.debut + timedelta(days=d)).date() for d in range(DUREE_PERIODE)]
+        poids_jours = [1 if jour.weekday() < 5 else 0.3 for jour in jours]
+        poids_actions = [poids for _, poids, _ in ACTIONS_AUDIT]
+        adresses = [
+            f'10.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}'
+            for _ in range(len(comptes) // 4 + 1)
+        ]
+        alea = self.rng.random  # Plus rapide que randint dans les boucles
+        par_action = Counter()
+
+        logs, par_utilisateur = [], Counter()
+        for jour, poids in zip(jours, poids_jours):
+            minuit = timezone.make_aware(datetime.combine(jour, heure()))
+            nombre_jour = round(nombre * poids / sum(poids_jours))
+            secondes = sorted(7 * 3600 + int(alea() * 15 * 3600) for _ in range(nombre_jour))
+            actions = self.rng.choices(ACTIONS_AUDIT, poids_actions, k=nombre_jour)
+            for seconde, (action, _, modele) in zip(secondes, actions):
+                user_id, username = comptes[int(alea() * len(comptes))]
+                if modele == 'User':
+                    object_id, representation = user_id, username
+                else:
+                    object_id = 1 + int(alea() * 100000)
+                    representation = f'{modele} #{object_id}'
+                logs.append((
+                    user_id, action, modele, object_id, representation, adresses[int(alea() * len(adresses))],
+                    NAVIGATEURS[int(alea() * len(NAVIGATEURS))], minuit + timedelta(seconds=seconde)
+                ))
+                par_action[(jour, action)] += 1
+                par_utilisateur[(jour, user_id)] += 1
+            if len(logs) >= TAILLE_LOT or jour == jours[-1]:
+                self._inserer('Logs d\'audit', AuditLog, (
+                    'user_id', 'action', 'model_name', 'object_id', 'object_repr', 'ip_address', 'user_agent',
+                    'timestamp'
+                ), logs)
+                self._inserer(
+                    'Statistiques d\'audit par utilisateur', StatistiqueAuditUtilisateur, ('date', 'user_id', 'nombre'),
+                    (jour_utilisateur + (compte,) for jour_utilisateur, compte in par_utilisateur.items())
+                )
+                logs, par_utilisateur = [], Counter()
+
+        existantes = StatistiqueAuditAction.objects.filter(date__in=jours).values_list('date', 'action', 'nombre')
+        for jour, action, compte in existantes:
+            par_action[(jour, action)] += compte
+        StatistiqueAuditAction.objects.bulk_create(
+            [
+                StatistiqueAuditAction(date=jour, action=action, nombre=compte)
+                for (jour, action), compte in par_action.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['date', 'action'],
+            update_fields=['nombre'],
+            batch_size=1000
+        )
+
+    # --- Finalisation ---
+
+    def _remettre_sequences(self):
+        """Recale les séquences PostgreSQL après les identifiants attribués d'avance"""
+        connexion = connections[router.db_for_write(Eleve)]
+        modeles = [User, Professeur, Classe, Salle, Eleve, Parent, Evaluation, Conversation, Message]
+        with connexion.cursor() as curseur:
+            for sql in connexion.ops.sequence_reset_sql(no_style(), modeles):
+                curseur.execute(sql)
@@ -0,0 +1,155 @@
+"""
+Diffusion des nouveaux messages en temps réel
+
+Chaque nouveau message est publié, après validation de la transaction, sur
+le canal de chaque participant actif. Le flux (server-sent events ou
+long-poll) de messaging_views.message_stream s'abonne au canal de
+l'utilisateur connecté et attend sans occuper de thread ni interroger la
+base.
+
+Le backend est choisi par le réglage MESSAGERIE_PUBSUB :
+- BackendMemoire (défaut) : abonnés en mémoire du processus, suffisant quand
+  l'envoi et le flux sont servis par le même processus ASGI, et pour les
+  tests ;
+- BackendRedis : canaux Redis, pour plusieurs processus ou serveurs
+  (nécessite le paquet redis).
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+
+logger = logging.getLogger('school_management')
+
+TAILLE_FILE_ABONNE = 1000
+
+
+def canal_utilisateur(user_id):
+    return f'messagerie:utilisateur:{user_id}'
+
+
+def _deposer(file, donnees):
+    try:
+        file.put_nowait(donnees)
+    except asyncio.QueueFull:
+        # Abonné trop lent : il se resynchronisera avec Last-Event-ID
+        pass
+
+
+class BackendMemoire:
+    """Pub/sub en mémoire du processus, les abonnés sont des files asyncio"""
+
+    def __init__(self, **options):
+        self._verrou = threading.Lock()
+        self._abonnes = {}
+
+    def publier(self, canal, donnees):
+        """Publie depuis n'importe quel thread"""
+        with self._verrou:
+            abonnes = list(self._abonnes.get(canal, ()))
+        for boucle, file in abonnes:
+            try:
+                boucle.call_soon_threadsafe(_deposer, file, donnees)
+            except RuntimeError:
+                # Boucle fermée : l'abonné a disparu sans se désinscrire
+                self._retirer(canal, (boucle, file))
+
+    @contextlib.asynccontextmanager
+    async def abonner(self, canal):
+        """Retourne une file asyncio recevant les publications du canal"""
+        abonne = (asyncio.get_running_loop(), asyncio.Queue(maxsize=TAILLE_FILE_ABONNE))
+        with self._verrou:
+            self._abonnes.setdefault(canal, set()).add(abonne)
+        try:
+            yield abonne[1]
+        finally:
+            self._retirer(canal, abonne)
+
+    def nombre_abonnes(self, canal=None):
+        with self._verrou:
+            if canal is not None:
+                return len(self._abonnes.get(canal, ()))
+            return sum(len(abonnes) for abonnes in self._abonnes.values())
+
+    def _retirer(self, canal, abonne):
+        with self._verrou:
+            abonnes = self._abonnes.get(canal)
+            if abonnes is not None:
+                abonnes.discard(abonne)
+                if not abonnes:
+                    del self._abonnes[canal]
+
+
+class BackendRedis:
+    """Pub/sub Redis, partagé entre processus et serveurs"""
+
+    def __init__(self, url=None, **options):
+        try:
+            import redis  # noqa: F401
+        except ImportError:
+            raise ImproperlyConfigured('BackendRedis nécessite le paquet redis')
+        self.url = url or 'redis://127.0.0.1:6379/0'
+        self._client = None
+
+    def publier(self, canal, donnees):
+        import redis
+
+        if self._client is None:
+            self._client = redis.Redis.from_url(self.url)
+        self._client.publish(canal, json.dumps(donnees))
+
+    @contextlib.asynccontextmanager
+    async def abonner(self, canal):
+        import redis.asyncio as aioredis
+
+        client = aioredis.Redis.from_url(self.url)
+        pubsub = client.pubsub()
+        await pubsub.subscribe(canal)
+        file = asyncio.Queue(maxsize=TAILLE_FILE_ABONNE)
+
+        async def lire():
+            async for publication in pubsub.listen():
+                if publication['type'] == 'message':
+                    _deposer(file, json.loads(publication['data']))
+
+        tache = asyncio.create_task(lire())
+        try:
+            yield file
+        finally:
+            tache.cancel()
+            await pubsub.unsubscribe(canal)
+            await pubsub.close()
+            await client.close()
+
+
+_backend = None
+_verrou_backend = threading.Lock()
+
+
+def obtenir_backend():
+    """Instance unique du backend configuré par MESSAGERIE_PUBSUB"""
+    global _backend
+    if _backend is None:
+        with _verrou_backend:
+            if _backend is None:
+                configuration = getattr(settings, 'MESSAGERIE_PUBSUB', {})
+                classe = import_string(configuration.get('BACKEND', 'school_management.evenements.BackendMemoire'))
+                _backend = classe(**configuration.get('OPTIONS', {}))
+    return _backend
+
+
+def publier_message(donnees, user_ids):
+    """Publie un message sérialisé sur le canal de chaque destinataire"""
+    backend = obtenir_backend()
+    for user_id in user_ids:
+        try:
+            backend.publier(canal_utilisateur(user_id), donnees)
+        except Exception:
+            # La diffusion ne doit jamais faire échouer l'envoi : le flux se resynchronise
+            logger.exception('Erreur lors de la diffusion du message %s', donnees.get('id'))
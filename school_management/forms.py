@@ -682,21 +682,22 @@ class ReservationSalleForm(forms.ModelForm):
             if date_debut >= date_fin:
                 raise forms.ValidationError("L'heure de fin doit être postérieure à l'heure de début.")
             
-            # Vérifier les conflits de réservation
+            # Vérifier les conflits avec les réservations confirmées et les cours
             if salle:
-                conflits = ReservationSalle.objects.filter(
-                    salle=salle,
-                    statut='CONFIRME',
-                    date_debut__lt=date_fin,
-                    date_fin__gt=date_debut
-                )
-                if self.instance.pk:
-                    conflits = conflits.exclude(pk=self.instance.pk)
-                
-                if conflits.exists():
+                from .disponibilites import conflits_salle
+
+                reservations, emplois = conflits_salle(salle.pk, date_debut, date_fin, self.instance.pk)
+                if reservations:
+                    titres = ReservationSalle.objects.filter(pk__in=reservations).values_list('titre', flat=True)
                     raise forms.ValidationError(
                         f"Cette salle est déjà réservée pendant cette période. "
-                        f"Conflit avec: {', '.join([r.titre for r in conflits])}"
+                        f"Conflit avec: {', '.join(titres)}"
+                    )
+                if emplois:
+                    cours = EmploiDuTemps.objects.filter(pk__in=emplois).select_related('classe', 'matiere', 'creneau')
+                    raise forms.ValidationError(
+                        f"Cette salle est occupée par un cours pendant cette période. "
+                        f"Conflit avec: {', '.join(f'{e.classe} - {e.matiere} ({e.creneau})' for e in cours)}"
                     )
         
         return cleaned_data
@@ -713,6 +714,49 @@ class ValidationReservationForm(forms.ModelForm):
         }
 
 
+class GenerationEmploiForm(forms.Form):
+    """Formulaire de génération automatique de l'emploi du temps d'un semestre"""
+    annee_scolaire = forms.CharField(
+        max_length=9,
+        initial='2024-2025',
+        label="Année scolaire",
+        widget=forms.TextInput(attrs={'class': 'form-control'})
+    )
+    semestre = forms.TypedChoiceField(
+        choices=[(1, 'Semestre 1'), (2, 'Semestre 2')],
+        coerce=int,
+        label="Semestre",
+        widget=forms.Select(attrs={'class': 'form-control'})
+    )
+    classes = forms.ModelMultipleChoiceField(
+        queryset=Classe.objects.all(),
+        required=False,
+        label="Classes",
+        help_text="Toutes les classes de l'année si aucune n'est sélectionnée",
+        widget=forms.SelectMultiple(attrs={'class': 'form-control', 'size': 8})
+    )
+    # La recherche tourne dans la requête : bien en deçà du timeout de gunicorn (30 s),
+    # chargement et enregistrement compris. Au-delà, commande generer_emploi_du_temps.
+    duree = forms.IntegerField(
+        min_value=1,
+        max_value=15,
+        initial=10,
+        label="Temps de recherche (secondes)",
+        help_text="15 secondes au plus ; pour une recherche plus longue, utiliser la commande generer_emploi_du_temps",
+        widget=forms.NumberInput(attrs={'class': 'form-control'})
+    )
+    remplacer = forms.BooleanField(
+        required=False,
+        label="Remplacer les cours existants des classes",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+    simulation = forms.BooleanField(
+        required=False,
+        label="Simulation (ne rien enregistrer)",
+        widget=forms.CheckboxInput(attrs={'class': 'form-check-input'})
+    )
+
+
 # ===== FORMULAIRES DE GESTION DES UTILISATEURS =====
 
 class CustomUserCreationForm(UserCreationForm):
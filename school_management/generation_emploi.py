@@ -0,0 +1,555 @@
+"""
+Génération automatique de l'emploi du temps
+
+Le problème (cours à placer, professeurs, salles, occupation déjà fixée par
+les classes non concernées) est chargé en quelques requêtes puis résolu
+sans accès à la base : plusieurs recherches de graines différentes tournent
+en parallèle et la meilleure solution est enregistrée par bulk_create.
+
+Un cours est une paire (classe, matière) : la contrainte d'unicité
+(classe, matière, année scolaire, semestre) d'EmploiDuTemps limite chaque
+matière à un créneau hebdomadaire par classe. Les matières d'une classe
+sont celles de ses professeurs (Professeur.classes et Professeur.matieres) ;
+chaque cours reçoit l'un d'eux avant la recherche, en équilibrant leur
+charge.
+
+Contraintes dures : une classe ou un professeur n'a qu'un cours par
+créneau, et un créneau n'accueille pas plus de cours que de salles libres.
+Contraintes souples, pondérées dans le coût : trous dans la journée des
+classes, journées chargées inégalement, cours sans salle du type adapté à
+la matière (TYPES_SALLE). Les salles sont attribuées créneau par créneau à
+la fin : type adapté puis plus petite capacité suffisante.
+
+La recherche place d'abord les cours par propagation de contraintes (le
+cours au plus petit domaine restant en premier, au créneau le moins
+coûteux), puis améliore la solution par recuit simulé (déplacement d'un
+cours, échange des créneaux de deux cours d'une classe) jusqu'à épuisement
+du temps alloué.
+"""
+import heapq
+import math
+import random
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from django.db import connections, transaction
+from django.db.models import Count
+
+from .disponibilites import invalider_disponibilites
+from .grille_emploi import invalider_grilles
+from .models import Classe, Creneau, EmploiDuTemps, Matiere, Professeur, Salle
+
+
+# Type de salle attendu par code de matière ; les autres matières vont en salle de cours
+TYPES_SALLE = {'EPS': 'SPORT', 'SVT': 'LABO', 'PC': 'LABO', 'INFO': 'INFO', 'NSI': 'INFO', 'TECH': 'INFO'}
+
+POIDS_DUR = 1000
+POIDS_TROU = 3
+POIDS_CHARGE = 1  # Par carré du nombre de cours d'une journée : étale la semaine
+POIDS_TYPE = 2
+TEMPERATURE_INITIALE = 4.0
+TEMPERATURE_FINALE = 0.05
+PROBABILITE_ECHANGE = 0.3
+# Sans conflit et sans amélioration depuis autant d'itérations, la recherche s'arrête avant l'échéance
+ITERATIONS_SANS_PROGRES = 200000
+TAILLE_LOT = 1000
+
+
+def _initialiser_processus():
+    import django
+
+    django.setup()
+
+
+class Probleme:
+    """
+    Données du problème, sans objet ORM : transmissibles aux processus
+
+    creneaux : (id, jour) des créneaux hors pause, triés par jour et heure
+    cours : (classe, matière, professeur, effectif, type de salle attendu)
+    salles_libres : par créneau, (capacité, type, id) des salles libres
+    """
+
+    def __init__(self, creneaux, cours, salles_libres, profs_occupes, ignorees):
+        self.creneaux = creneaux
+        self.cours = cours
+        self.salles_libres = salles_libres
+        self.profs_occupes = profs_occupes
+        self.classes_ignorees = ignorees
+
+
+def charger_probleme(annee_scolaire, semestre, classes=None, remplacer=False, graine=0):
+    """
+    Cours à placer pour les classes données (par défaut celles de l'année)
+
+    Sans remplacer, les classes qui ont déjà des cours sur la période sont
+    ignorées ; les cours actifs des autres classes occupent leurs
+    professeurs et leurs salles.
+    """
+    periode = EmploiDuTemps.objects.filter(annee_scolaire=annee_scolaire, semestre=semestre)
+    classes = Classe.objects.filter(annee_scolaire=annee_scolaire) if classes is None else classes
+    classes = list(classes.annotate(effectif=Count('eleves')).order_by('nom'))
+    ignorees = []
+    if not remplacer:
+        planifiees = set(periode.values_list('classe_id', flat=True).distinct())
+        ignorees = [classe.nom for classe in classes if classe.pk in planifiees]
+        classes = [classe for classe in classes if classe.pk not in planifiees]
+    cibles = {classe.pk: classe for classe in classes}
+
+    ordre_jours = [jour for jour, _ in Creneau.JOURS_SEMAINE]
+    creneaux = sorted(
+        Creneau.objects.filter(pause=False).values_list('id', 'jour', 'heure_debut'),
+        key=lambda creneau: (ordre_jours.index(creneau[1]), creneau[2])
+    )
+    indices = {creneau_id: t for t, (creneau_id, _, _) in enumerate(creneaux)}
+
+    salles = list(Salle.objects.filter(active=True).values_list('capacite', 'type_salle', 'id'))
+    salles_occupees = defaultdict(set)
+    profs_occupes = defaultdict(set)
+    for creneau_id, professeur_id, salle_id in periode.filter(actif=True).exclude(
+        classe_id__in=cibles
+    ).values_list('creneau_id', 'professeur_id', 'salle_id'):
+        if creneau_id in indices:
+            salles_occupees[indices[creneau_id]].add(salle_id)
+            profs_occupes[professeur_id].add(indices[creneau_id])
+    salles_libres = [
+        sorted(salle for salle in salles if salle[2] not in salles_occupees[t]) for t in range(len(creneaux))
+    ]
+
+    # Professeurs possibles pour chaque (classe, matière)
+    matieres_prof = defaultdict(set)
+    for professeur_id, matiere_id in Professeur.matieres.through.objects.values_list('professeur_id', 'matiere_id'):
+        matieres_prof[professeur_id].add(matiere_id)
+    possibles = defaultdict(list)
+    for professeur_id, classe_id in Professeur.classes.through.objects.filter(
+        classe_id__in=cibles
+    ).order_by('professeur_id').values_list('professeur_id', 'classe_id'):
+        for matiere_id in matieres_prof[professeur_id]:
+            possibles[classe_id, matiere_id].append(professeur_id)
+
+    # Chaque cours reçoit le professeur possible le moins chargé, les cours les plus contraints d'abord
+    rng = random.Random(graine)
+    charge = {professeur_id: len(creneaux_occupes) for professeur_id, creneaux_occupes in profs_occupes.items()}
+    types = dict(Matiere.objects.values_list('id', 'code'))
+    cours = []
+    for (classe_id, matiere_id), professeurs in sorted(possibles.items(), key=lambda item: (len(item[1]), item[0])):
+        professeur_id = min(professeurs, key=lambda p: (charge.get(p, 0), rng.random()))
+        charge[professeur_id] = charge.get(professeur_id, 0) + 1
+        cours.append((
+            classe_id, matiere_id, professeur_id, cibles[classe_id].effectif,
+            TYPES_SALLE.get(types[matiere_id], 'COURS')
+        ))
+    cours.sort()
+    return Probleme(
+        [(creneau_id, ordre_jours.index(jour)) for creneau_id, jour, _ in creneaux], cours, salles_libres,
+        dict(profs_occupes), ignorees
+    )
+
+
+class Recherche:
+    """État d'une recherche : un créneau par cours et les compteurs d'occupation"""
+
+    def __init__(self, probleme, graine):
+        self.rng = random.Random(graine)
+        self.nb_creneaux = len(probleme.creneaux)
+        self.jour = [jour for _, jour in probleme.creneaux]
+        self.creneaux_du_jour = defaultdict(list)
+        for t, jour in enumerate(self.jour):
+            self.creneaux_du_jour[jour].append(t)
+
+        classes = sorted({cours[0] for cours in probleme.cours})
+        professeurs = sorted({cours[2] for cours in probleme.cours})
+        types = sorted({cours[4] for cours in probleme.cours})
+        indice_classe = {classe_id: i for i, classe_id in enumerate(classes)}
+        indice_prof = {professeur_id: i for i, professeur_id in enumerate(professeurs)}
+        indice_type = {type_salle: i for i, type_salle in enumerate(types)}
+        self.classe = [indice_classe[cours[0]] for cours in probleme.cours]
+        self.prof = [indice_prof[cours[2]] for cours in probleme.cours]
+        self.type = [indice_type[cours[4]] for cours in probleme.cours]
+        self.cours_classe = defaultdict(list)
+        self.cours_prof = defaultdict(list)
+        for i in range(len(probleme.cours)):
+            self.cours_classe[self.classe[i]].append(i)
+            self.cours_prof[self.prof[i]].append(i)
+
+        T = self.nb_creneaux
+        self.occ_classe = [[0] * T for _ in classes]
+        self.occ_prof = [[0] * T for _ in professeurs]
+        for professeur_id, occupes in probleme.profs_occupes.items():
+            if professeur_id in indice_prof:
+                for t in occupes:
+                    self.occ_prof[indice_prof[professeur_id]][t] += 1
+        self.occ_creneau = [0] * T
+        self.capacite = [len(libres) for libres in probleme.salles_libres]
+        self.occ_type = [[0] * len(types) for _ in range(T)]
+        self.capacite_type = [
+            [sum(1 for _, type_salle, _ in libres if type_salle == t) for t in types] for libres in probleme.salles_libres
+        ]
+        self.creneau = [None] * len(probleme.cours)
+
+    # --- Coût ---
+
+    def cout_jour(self, c, jour):
+        occupation = self.occ_classe[c]
+        positions = [p for p, t in enumerate(self.creneaux_du_jour[jour]) if occupation[t]]
+        if not positions:
+            return 0
+        trous = positions[-1] - positions[0] + 1 - len(positions)
+        return POIDS_TROU * trous + POIDS_CHARGE * len(positions) ** 2
+
+    def cout_total(self):
+        """(violations des contraintes dures, coût souple)"""
+        dur = sum(max(0, n - 1) for occupation in self.occ_classe + self.occ_prof for n in occupation)
+        dur += sum(max(0, n - capacite) for n, capacite in zip(self.occ_creneau, self.capacite))
+        souple = sum(
+            self.cout_jour(c, jour) for c in range(len(self.occ_classe)) for jour in self.creneaux_du_jour
+        )
+        souple += POIDS_TYPE * sum(
+            max(0, n - capacite)
+            for occupation, capacites in zip(self.occ_type, self.capacite_type)
+            for n, capacite in zip(occupation, capacites)
+        )
+        return dur, souple
+
+    def _dur_retrait(self, i, t):
+        return (
+            (self.occ_classe[self.classe[i]][t] >= 2) + (self.occ_prof[self.prof[i]][t] >= 2)
+            + (self.occ_creneau[t] > self.capacite[t])
+        )
+
+    def _dur_ajout(self, i, t):
+        return (
+            (self.occ_classe[self.classe[i]][t] >= 1) + (self.occ_prof[self.prof[i]][t] >= 1)
+            + (self.occ_creneau[t] >= self.capacite[t])
+        )
+
+    def _type_retrait(self, i, t):
+        return POIDS_TYPE * (self.occ_type[t][self.type[i]] > self.capacite_type[t][self.type[i]])
+
+    def _type_ajout(self, i, t):
+        return POIDS_TYPE * (self.occ_type[t][self.type[i]] >= self.capacite_type[t][self.type[i]])
+
+    def _occuper(self, i, t, sens):
+        self.occ_classe[self.classe[i]][t] += sens
+        self.occ_prof[self.prof[i]][t] += sens
+        self.occ_creneau[t] += sens
+        self.occ_type[t][self.type[i]] += sens
+
+    def placer(self, i, t):
+        self.creneau[i] = t
+        self._occuper(i, t, 1)
+
+    def retirer(self, i):
+        self._occuper(i, self.creneau[i], -1)
+        self.creneau[i] = None
+
+    # --- Construction ---
+
+    def libre(self, i, t):
+        return (
+            not self.occ_classe[self.classe[i]][t] and not self.occ_prof[self.prof[i]][t]
+            and self.occ_creneau[t] < self.capacite[t]
+        )
+
+    def construire(self):
+        """
+        Place les cours un à un, le plus petit domaine d'abord (tas à mise à
+        jour paresseuse) ; un cours sans créneau libre va au moins mauvais
+        """
+        T = range(self.nb_creneaux)
+        nb_cours = len(self.creneau)
+        domaine = [sum(1 for t in T if self.libre(i, t)) for i in range(nb_cours)]
+        tas = [(domaine[i], self.rng.random(), i) for i in range(nb_cours)]
+        heapq.heapify(tas)
+        while tas:
+            taille, _, i = heapq.heappop(tas)
+            if self.creneau[i] is not None or taille != domaine[i]:
+                continue
+            candidats = [t for t in T if self.libre(i, t)] or list(T)
+            t = min(candidats, key=lambda t: (self._delta_ajout(i, t), self.rng.random()))
+
+            voisins = set(self.cours_classe[self.classe[i]]) | set(self.cours_prof[self.prof[i]])
+            if self.occ_creneau[t] + 1 >= self.capacite[t]:
+                voisins = range(nb_cours)
+            voisins = [j for j in voisins if j != i and self.creneau[j] is None]
+            avant = [self.libre(j, t) for j in voisins]
+            self.placer(i, t)
+            for j, etait_libre in zip(voisins, avant):
+                if etait_libre and not self.libre(j, t):
+                    domaine[j] -= 1
+                    heapq.heappush(tas, (domaine[j], self.rng.random(), j))
+
+    def _delta_ajout(self, i, t):
+        c, jour = self.classe[i], self.jour[t]
+        avant = self.cout_jour(c, jour)
+        dur = self._dur_ajout(i, t)
+        souple = self._type_ajout(i, t)
+        self._occuper(i, t, 1)
+        apres = self.cout_jour(c, jour)
+        self._occuper(i, t, -1)
+        return POIDS_DUR * dur + souple + apres - avant
+
+    # --- Recherche locale ---
+
+    def delta_deplacement(self, i, t):
+        ancien = self.creneau[i]
+        c = self.classe[i]
+        jours = {self.jour[ancien], self.jour[t]}
+        avant = sum(self.cout_jour(c, jour) for jour in jours)
+        dur = -self._dur_retrait(i, ancien)
+        souple = -self._type_retrait(i, ancien)
+        self._occuper(i, ancien, -1)
+        dur += self._dur_ajout(i, t)
+        souple += self._type_ajout(i, t)
+        self._occuper(i, t, 1)
+        apres = sum(self.cout_jour(c, jour) for jour in jours)
+        self._occuper(i, t, -1)
+        self._occuper(i, ancien, 1)
+        return dur, souple + apres - avant
+
+    def delta_echange(self, i, j):
+        """Échange des créneaux de deux cours d'une même classe : seuls professeurs et types changent"""
+        a, b = self.creneau[i], self.creneau[j]
+        dur = souple = 0
+        for cours, depart, arrivee in ((i, a, b), (j, b, a)):
+            dur -= self._dur_retrait(cours, depart)
+            souple -= self._type_retrait(cours, depart)
+            self._occuper(cours, depart, -1)
+        for cours, depart, arrivee in ((i, a, b), (j, b, a)):
+            dur += self._dur_ajout(cours, arrivee)
+            souple += self._type_ajout(cours, arrivee)
+            self._occuper(cours, arrivee, 1)
+        for cours, depart, arrivee in ((i, a, b), (j, b, a)):
+            self._occuper(cours, arrivee, -1)
+            self._occuper(cours, depart, 1)
+        return dur, souple
+
+    def ameliorer(self, duree):
+        """
+        Recuit simulé jusqu'à l'échéance, ou plus tôt quand la meilleure
+        solution est sans conflit et ne progresse plus ; retourne le nombre
+        d'itérations
+        """
+        nb_cours = len(self.creneau)
+        if not nb_cours or self.nb_creneaux < 2:
+            return 0
+        dur, souple = self.cout_total()
+        meilleur = (dur, souple, list(self.creneau))
+        debut = time.monotonic()
+        iterations = 0
+        derniere_amelioration = 0
+        temperature = TEMPERATURE_INITIALE
+        rng = self.rng
+        while True:
+            if iterations % 500 == 0:
+                avancement = (time.monotonic() - debut) / duree if duree > 0 else 1
+                if avancement >= 1 or (dur == 0 and souple == 0):
+                    break
+                if meilleur[0] == 0 and iterations - derniere_amelioration >= ITERATIONS_SANS_PROGRES:
+                    break
+                temperature = TEMPERATURE_INITIALE * (TEMPERATURE_FINALE / TEMPERATURE_INITIALE) ** avancement
+            iterations += 1
+            i = rng.randrange(nb_cours)
+            if rng.random() < PROBABILITE_ECHANGE:
+                autres = self.cours_classe[self.classe[i]]
+                j = autres[rng.randrange(len(autres))]
+                if j == i:
+                    continue
+                delta_dur, delta_souple = self.delta_echange(i, j)
+                mouvement = (i, self.creneau[j], j, self.creneau[i])
+            else:
+                t = rng.randrange(self.nb_creneaux)
+                if t == self.creneau[i]:
+                    continue
+                delta_dur, delta_souple = self.delta_deplacement(i, t)
+                mouvement = (i, t, None, None)
+            delta = POIDS_DUR * delta_dur + delta_souple
+            if delta > 0 and rng.random() >= math.exp(-delta / temperature):
+                continue
+            i, t, j, u = mouvement
+            self.retirer(i)
+            if j is not None:
+                self.retirer(j)
+                self.placer(j, u)
+            self.placer(i, t)
+            dur += delta_dur
+            souple += delta_souple
+            if (dur, souple) < meilleur[:2]:
+                meilleur = (dur, souple, list(self.creneau))
+                derniere_amelioration = iterations
+        for i in range(nb_cours):
+            self.retirer(i)
+        for i, t in enumerate(meilleur[2]):
+            self.placer(i, t)
+        return iterations
+
+
+def attribuer_salles(probleme, creneaux):
+    """
+    Salle de chaque cours, créneau par créneau : type attendu puis plus
+    petite capacité suffisante, sinon toute salle assez grande, sinon la
+    plus grande ; None quand le créneau n'a plus de salle libre
+    """
+    salles = [None] * len(creneaux)
+    par_creneau = defaultdict(list)
+    for i, t in enumerate(creneaux):
+        par_creneau[t].append(i)
+    for t, cours in par_creneau.items():
+        libres = defaultdict(list)
+        for salle in probleme.salles_libres[t]:
+            libres[salle[1]].append(salle)
+        # Les plus grands effectifs d'abord, pour ne pas perdre les grandes salles
+        for i in sorted(cours, key=lambda i: -probleme.cours[i][3]):
+            effectif, type_salle = probleme.cours[i][3], probleme.cours[i][4]
+            choix = None
+            liste = libres.get(type_salle, [])
+            k = bisect_left(liste, (effectif,))
+            if k < len(liste):
+                choix = liste[k]
+            else:
+                suffisantes = [
+                    autre[bisect_left(autre, (effectif,))] for autre in libres.values()
+                    if autre and autre[-1][0] >= effectif
+                ]
+                if suffisantes:
+                    choix = min(suffisantes)
+                elif any(libres.values()):
+                    choix = max(autre[-1] for autre in libres.values() if autre)
+            if choix is not None:
+                libres[choix[1]].remove(choix)
+                salles[i] = choix
+    return salles
+
+
+def evaluer(probleme, creneaux, salles):
+    """Indicateurs de qualité d'une solution et score sur 100 (0 en cas de conflit)"""
+    nb_jours = len({jour for _, jour in probleme.creneaux}) or 1
+    conflits = 0
+    occupation = defaultdict(int)
+    for i, t in enumerate(creneaux):
+        classe_id, _, professeur_id, _, _ = probleme.cours[i]
+        occupation['classe', classe_id, t] += 1
+        occupation['prof', professeur_id, t] += 1
+    for (genre, ressource, t), n in occupation.items():
+        conflits += n - 1
+        if genre == 'prof' and t in probleme.profs_occupes.get(ressource, ()):
+            conflits += 1
+    sans_salle = sum(1 for salle in salles if salle is None)
+    # Un type de salle absent de l'établissement ne pénalise pas le score
+    types_existants = {salle[1] for libres in probleme.salles_libres for salle in libres}
+    inadaptees = sum(
+        1 for i, salle in enumerate(salles)
+        if salle is not None and salle[1] != probleme.cours[i][4] and probleme.cours[i][4] in types_existants
+    )
+    trop_petites = sum(
+        1 for i, salle in enumerate(salles) if salle is not None and salle[0] < probleme.cours[i][3]
+    )
+
+    par_classe_jour = defaultdict(list)
+    for i, t in enumerate(creneaux):
+        par_classe_jour[probleme.cours[i][0], probleme.creneaux[t][1]].append(t)
+    cours_par_classe = defaultdict(int)
+    for cours in probleme.cours:
+        cours_par_classe[cours[0]] += 1
+    trous = surcharge = 0
+    for (classe_id, _), positions in par_classe_jour.items():
+        positions = sorted(set(positions))
+        trous += positions[-1] - positions[0] + 1 - len(positions)
+        surcharge += max(0, len(positions) - math.ceil(cours_par_classe[classe_id] / nb_jours))
+
+    penalites = trous + inadaptees + 2 * trop_petites + surcharge
+    nb_cours = len(probleme.cours)
+    return {
+        'cours': nb_cours,
+        'conflits': conflits + sans_salle,
+        'sans_salle': sans_salle,
+        'trous': trous,
+        'salles_inadaptees': inadaptees,
+        'salles_trop_petites': trop_petites,
+        'surcharge': surcharge,
+        'score': 0.0 if conflits + sans_salle else round(100 * max(0.0, 1 - penalites / max(nb_cours, 1)), 1),
+    }
+
+
+def resoudre(probleme, duree, graine=0):
+    """Une recherche complète : (indicateurs, créneau par cours, salle par cours, itérations)"""
+    recherche = Recherche(probleme, graine)
+    recherche.construire()
+    iterations = recherche.ameliorer(duree)
+    salles = attribuer_salles(probleme, recherche.creneau)
+    return evaluer(probleme, recherche.creneau, salles), recherche.creneau, salles, iterations
+
+
+def _meilleure(solutions):
+    return min(solutions, key=lambda solution: (solution[0]['conflits'], -solution[0]['score']))
+
+
+def resoudre_en_parallele(probleme, duree, processus=1, graine=0):
+    """
+    processus recherches indépendantes de graines graine, graine + 1...
+    sur chacune des cœurs ; retourne la meilleure solution et le nombre
+    total d'itérations
+    """
+    if processus <= 1:
+        solution = resoudre(probleme, duree, graine)
+        return solution, solution[3]
+    # Les processus fils ne lisent pas la base mais ne doivent pas hériter des connexions
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=processus, initializer=_initialiser_processus) as executor:
+        solutions = list(executor.map(
+            resoudre, [probleme] * processus, [duree] * processus, range(graine, graine + processus)
+        ))
+    return _meilleure(solutions), sum(solution[3] for solution in solutions)
+
+
+def enregistrer(probleme, creneaux, salles, annee_scolaire, semestre, remplacer=False):
+    """
+    Écrit la solution (bulk_create) ; avec remplacer, supprime d'abord les
+    cours des classes concernées sur la période. Retourne le nombre de cours.
+    """
+    classes = {cours[0] for cours in probleme.cours}
+    with transaction.atomic():
+        if remplacer:
+            EmploiDuTemps.objects.filter(
+                annee_scolaire=annee_scolaire, semestre=semestre, classe_id__in=classes
+            ).delete()
+        EmploiDuTemps.objects.bulk_create(
+            (
+                EmploiDuTemps(
+                    classe_id=classe_id, matiere_id=matiere_id, professeur_id=professeur_id,
+                    salle_id=salles[i][2], creneau_id=probleme.creneaux[creneaux[i]][0],
+                    annee_scolaire=annee_scolaire, semestre=semestre
+                )
+                for i, (classe_id, matiere_id, professeur_id, _, _) in enumerate(probleme.cours)
+            ),
+            batch_size=TAILLE_LOT
+        )
+        invalider_disponibilites()
+        invalider_grilles(classes, {cours[2] for cours in probleme.cours})
+    return len(probleme.cours)
+
+
+def generer_emploi_du_temps(annee_scolaire, semestre, classes=None, duree=10, processus=1, graine=0,
+                            remplacer=False, simulation=False):
+    """
+    Charge, résout et, sauf simulation, enregistre l'emploi du temps
+
+    Retourne (indicateurs, classes ignorées, itérations). Lève ValueError si
+    la meilleure solution garde des conflits : rien n'est alors écrit.
+    """
+    probleme = charger_probleme(annee_scolaire, semestre, classes, remplacer, graine)
+    if not probleme.creneaux:
+        raise ValueError('Aucun créneau hors pause : créer les créneaux avant de générer l\'emploi du temps')
+    if not probleme.cours:
+        return evaluer(probleme, [], []), probleme.classes_ignorees, 0
+    (indicateurs, creneaux, salles, _), iterations = resoudre_en_parallele(probleme, duree, processus, graine)
+    if indicateurs['conflits']:
+        raise ValueError(
+            f'{indicateurs["conflits"]} conflit(s) restant(s) après {iterations} itérations : '
+            f'emploi du temps non enregistré (allonger la durée ou ajouter des salles et créneaux)'
+        )
+    if not simulation:
+        enregistrer(probleme, creneaux, salles, annee_scolaire, semestre, remplacer)
+    return indicateurs, probleme.classes_ignorees, iterations
@@ -0,0 +1,177 @@
+"""
+Moteur de calcul des résultats d'une classe
+
+Charge en une seule requête toutes les notes d'une classe pour un trimestre et
+une année scolaire, les range dans une matrice dense élève × matière, puis
+calcule en une passe les moyennes par matière, les moyennes générales, les
+rangs, la moyenne de la classe et le nombre d'échecs de chaque élève.
+
+Règles de calcul :
+    - moyenne d'une matière : moyenne des notes ramenées sur 20, pondérée par
+      le coefficient de chaque évaluation ;
+    - moyenne générale : moyenne des moyennes de matières, pondérée par le
+      coefficient de chaque matière ;
+    - rang : 1 + nombre d'élèves ayant une moyenne générale strictement
+      supérieure (les ex æquo partagent le même rang) ;
+    - échec : moyenne de matière inférieure à SEUIL_REUSSITE ;
+    - effectif : nombre d'élèves inscrits dans la classe, notés ou non.
+
+Ces règles remplacent trois calculs qui divergeaient : la génération depuis
+l'interface faisait la moyenne simple des notes de chaque matière, la
+commande generate_bulletins et Bulletin pondéraient chaque note par le
+coefficient de sa matière, et Bulletin comptait comme effectif les bulletins
+validés ou en attente. Le coefficient des évaluations n'était jamais pris en
+compte. Un bulletin déjà enregistré garde ses valeurs jusqu'à ce qu'il soit
+régénéré ou recalculé (recalculer_tous_les_champs).
+"""
+from decimal import Decimal
+
+from .models import Eleve, Matiere, Note
+
+
+SEUIL_REUSSITE = 10
+
+
+def arrondir(valeur):
+    """Arrondit une moyenne à deux décimales pour l'enregistrer en base"""
+    if valeur is None:
+        return None
+    return Decimal(str(round(valeur, 2)))
+
+
+class ResultatsClasse:
+    """Résultats calculés pour une classe, un trimestre et une année scolaire"""
+
+    def __init__(self, classe, trimestre, annee_scolaire, eleve_ids, matieres,
+                 moyennes_matieres, moyennes_generales):
+        self.classe = classe
+        self.trimestre = trimestre
+        self.annee_scolaire = annee_scolaire
+        self.eleve_ids = eleve_ids
+        self.matieres = matieres
+        # Matrice élève × matière (None si l'élève n'a aucune note dans la matière)
+        self.moyennes_matieres = moyennes_matieres
+        self.moyennes_generales = moyennes_generales
+        self.index_eleves = {eleve_id: i for i, eleve_id in enumerate(eleve_ids)}
+
+        self.rangs = self._calculer_rangs()
+        self.echecs = [
+            sum(1 for moyenne in ligne if moyenne is not None and moyenne < SEUIL_REUSSITE)
+            for ligne in moyennes_matieres
+        ]
+
+        notees = [moyenne for moyenne in moyennes_generales if moyenne is not None]
+        self.moyenne_classe = round(sum(notees) / len(notees), 2) if notees else None
+
+    def _calculer_rangs(self):
+        """Classe les élèves par moyenne générale décroissante"""
+        rangs = [None] * len(self.eleve_ids)
+        classes = sorted(
+            (i for i, moyenne in enumerate(self.moyennes_generales) if moyenne is not None),
+            key=lambda i: self.moyennes_generales[i],
+            reverse=True
+        )
+
+        rang = 0
+        precedente = None
+        for position, i in enumerate(classes, start=1):
+            if self.moyennes_generales[i] != precedente:
+                rang = position
+                precedente = self.moyennes_generales[i]
+            rangs[i] = rang
+        return rangs
+
+    @property
+    def effectif(self):
+        """Élèves inscrits dans la classe, y compris ceux qui n'ont aucune note"""
+        return len(self.eleve_ids)
+
+    def contient(self, eleve_id):
+        return eleve_id in self.index_eleves
+
+    def moyenne_generale(self, eleve_id):
+        return self.moyennes_generales[self.index_eleves[eleve_id]]
+
+    def rang(self, eleve_id):
+        return self.rangs[self.index_eleves[eleve_id]]
+
+    def nb_echecs(self, eleve_id):
+        return self.echecs[self.index_eleves[eleve_id]]
+
+    def moyennes_par_matiere(self, eleve_id):
+        """Retourne {matière: moyenne} pour les matières où l'élève est noté"""
+        ligne = self.moyennes_matieres[self.index_eleves[eleve_id]]
+        return {
+            matiere: moyenne
+            for matiere, moyenne in zip(self.matieres, ligne)
+            if moyenne is not None
+        }
+
+
+def calculer_resultats_classe(classe, trimestre, annee_scolaire):
+    """
+    Calcule les résultats de toute une classe pour un trimestre
+
+    Trois requêtes au total, quel que soit l'effectif : les élèves, les notes
+    et les matières concernées.
+    """
+    eleve_ids = list(
+        Eleve.objects.filter(classe=classe).order_by('id').values_list('id', flat=True)
+    )
+    lignes = list(
+        Note.objects.filter(
+            eleve__classe=classe,
+            evaluation__trimestre=trimestre,
+            evaluation__annee_scolaire=annee_scolaire,
+            note__isnull=False
+        ).values_list(
+            'eleve_id', 'evaluation__matiere_id', 'note',
+            'evaluation__note_sur', 'evaluation__coefficient'
+        )
+    )
+
+    matiere_ids = {matiere_id for _, matiere_id, _, _, _ in lignes}
+    matieres = list(Matiere.objects.filter(id__in=matiere_ids).order_by('nom')) if matiere_ids else []
+    index_matieres = {matiere.id: j for j, matiere in enumerate(matieres)}
+    index_eleves = {eleve_id: i for i, eleve_id in enumerate(eleve_ids)}
+
+    # Accumulation des points et des poids dans deux matrices denses
+    nb_matieres = len(matieres)
+    points = [[0.0] * nb_matieres for _ in eleve_ids]
+    poids = [[0.0] * nb_matieres for _ in eleve_ids]
+
+    for eleve_id, matiere_id, note, note_sur, coefficient in lignes:
+        i = index_eleves.get(eleve_id)
+        if i is None:
+            continue
+        j = index_matieres[matiere_id]
+        note_sur_20 = float(note) * 20 / float(note_sur) if note_sur else float(note)
+        coefficient = float(coefficient or 1)
+        points[i][j] += note_sur_20 * coefficient
+        poids[i][j] += coefficient
+
+    coefficients_matieres = [float(matiere.coefficient or 1) for matiere in matieres]
+
+    moyennes_matieres = []
+    moyennes_generales = []
+    for ligne_points, ligne_poids in zip(points, poids):
+        ligne = [
+            round(p / w, 2) if w > 0 else None
+            for p, w in zip(ligne_points, ligne_poids)
+        ]
+        moyennes_matieres.append(ligne)
+
+        total_points = 0.0
+        total_coefficients = 0.0
+        for moyenne, coefficient in zip(ligne, coefficients_matieres):
+            if moyenne is not None:
+                total_points += moyenne * coefficient
+                total_coefficients += coefficient
+        moyennes_generales.append(
+            round(total_points / total_coefficients, 2) if total_coefficients > 0 else None
+        )
+
+    return ResultatsClasse(
+        classe, trimestre, annee_scolaire, eleve_ids, matieres,
+        moyennes_matieres, moyennes_generales
+    )
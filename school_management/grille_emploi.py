@@ -0,0 +1,116 @@
+"""
+Grille hebdomadaire de l'emploi du temps
+
+La semaine d'une classe ou d'un professeur est lue en une requête (plus
+celle des créneaux) et mise en forme une fois pour toutes : une ligne par
+horaire, une cellule par jour, chaque cours réduit aux valeurs affichées.
+La grille est mise en cache par (classe ou professeur, année scolaire,
+semestre) sous les versions de dashboard_cache :
+
+- emploi:classe:<id>, emploi:professeur:<id> : cours de la classe ou du
+  professeur, incrémentées par les signaux d'EmploiDuTemps, et par ceux
+  de User quand un professeur change de nom ;
+- emplois : créneaux et salles, et écritures en masse (bulk_create,
+  update()) qui n'envoient pas de signal : appeler ensuite
+  invalider_grilles() ;
+- structure : noms des matières, professeurs et classes.
+"""
+from datetime import date
+
+from django.core.cache import cache
+
+from .dashboard_cache import DUREE_CACHE, invalider, versions
+from .disponibilites import DEBUT_SEMESTRE_2
+from .models import Creneau, EmploiDuTemps
+
+
+def semestre_courant(jour=None):
+    """Semestre dont relève le jour (aujourd'hui par défaut)"""
+    jour = jour or date.today()
+    return 2 if DEBUT_SEMESTRE_2 <= (jour.month, jour.day) < (9, 1) else 1
+
+
+def invalider_grilles(classe_ids=None, professeur_ids=()):
+    """Invalide les grilles des classes et professeurs donnés, toutes sans argument"""
+    if classe_ids is None and not professeur_ids:
+        invalider('emplois')
+        return
+    invalider(
+        *(f'emploi:classe:{classe_id}' for classe_id in classe_ids or ()),
+        *(f'emploi:professeur:{professeur_id}' for professeur_id in professeur_ids)
+    )
+
+
+def _construire(filtre, annee_scolaire, semestre):
+    creneaux = list(Creneau.objects.values_list('id', 'jour', 'heure_debut', 'heure_fin', 'pause'))
+    ordre_jours = [jour for jour, _ in Creneau.JOURS_SEMAINE]
+    jours = [(jour, libelle) for jour, libelle in Creneau.JOURS_SEMAINE if any(c[1] == jour for c in creneaux)]
+    colonnes = {jour: i for i, (jour, _) in enumerate(jours)}
+
+    # Une ligne par horaire : les créneaux de même début et fin partagent la ligne
+    lignes = {}
+    position = {}
+    for creneau_id, jour, heure_debut, heure_fin, pause in sorted(
+        creneaux, key=lambda c: (c[2], c[3], ordre_jours.index(c[1]))
+    ):
+        ligne = lignes.setdefault((heure_debut, heure_fin), {
+            'heure_debut': heure_debut,
+            'heure_fin': heure_fin,
+            'pause': True,
+            'cellules': [None] * len(jours),
+        })
+        ligne['pause'] = ligne['pause'] and pause
+        position[creneau_id] = (ligne, colonnes[jour])
+
+    nb_cours = 0
+    for emploi in EmploiDuTemps.objects.filter(
+        annee_scolaire=annee_scolaire, semestre=semestre, actif=True, **filtre
+    ).select_related('classe', 'matiere', 'professeur__user', 'salle'):
+        if emploi.creneau_id not in position:
+            continue
+        ligne, colonne = position[emploi.creneau_id]
+        ligne['cellules'][colonne] = {
+            'pk': emploi.pk,
+            'matiere': emploi.matiere.nom,
+            'professeur': emploi.professeur.nom_complet,
+            'classe': emploi.classe.nom,
+            'salle': emploi.salle.nom,
+            'salle_numero': emploi.salle.numero,
+            'type_cours': emploi.get_type_cours_display(),
+        }
+        nb_cours += 1
+
+    return {
+        'jours': jours,
+        'lignes': list(lignes.values()),
+        'nb_cours': nb_cours,
+        'jours_de_cours': sum(
+            1 for colonne in range(len(jours)) if any(ligne['cellules'][colonne] for ligne in lignes.values())
+        ),
+    }
+
+
+def _grille(portee, filtre, annee_scolaire, semestre):
+    cle = f'grille_emploi:{portee}:{annee_scolaire}:{semestre}:' + '.'.join(
+        str(version) for version in versions(('emplois', 'structure', f'emploi:{portee}'))
+    )
+    grille = cache.get(cle)
+    if grille is None:
+        grille = _construire(filtre, annee_scolaire, semestre)
+        cache.set(cle, grille, DUREE_CACHE)
+    return grille
+
+
+def grille_classe(classe_id, annee_scolaire, semestre):
+    """
+    Grille de la semaine d'une classe : {'jours': [(code, libellé)],
+    'lignes': [{'heure_debut', 'heure_fin', 'pause', 'cellules'}],
+    'nb_cours', 'jours_de_cours'} ; une cellule vaut None ou le cours
+    (pk, matiere, professeur, classe, salle, salle_numero, type_cours)
+    """
+    return _grille(f'classe:{classe_id}', {'classe_id': classe_id}, annee_scolaire, int(semestre))
+
+
+def grille_professeur(professeur_id, annee_scolaire, semestre):
+    """Grille de la semaine d'un professeur, au format de grille_classe"""
+    return _grille(f'professeur:{professeur_id}', {'professeur_id': professeur_id}, annee_scolaire, int(semestre))
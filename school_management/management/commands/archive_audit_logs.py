@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand, CommandError
+from school_management.audit_archive import archiver_mois, mois_a_archiver, recalculer_statistiques_audit
+
+
+class Command(BaseCommand):
+    help = 'Archive les logs d\'audit anciens dans des fichiers compressés et tient à jour les statistiques journalières'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mois',
+            type=int,
+            default=12,
+            help='Nombre de mois complets à conserver dans la table, en plus du mois en cours (défaut: 12)'
+        )
+        parser.add_argument(
+            '--dossier',
+            type=str,
+            help='Dossier de destination des archives (défaut: AUDIT_ARCHIVE_DIR)'
+        )
+        parser.add_argument(
+            '--statistiques',
+            action='store_true',
+            help='Recalculer les statistiques journalières de tous les logs encore en table'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Afficher les mois à archiver sans rien modifier'
+        )
+
+    def handle(self, *args, **options):
+        if options['mois'] < 0:
+            raise CommandError('--mois doit être positif')
+
+        if options['statistiques'] and not options['dry_run']:
+            recalculer_statistiques_audit()
+            self.stdout.write(self.style.SUCCESS('Statistiques journalières recalculées'))
+
+        mois = mois_a_archiver(options['mois'])
+        if not mois:
+            self.stdout.write('Aucun log d\'audit à archiver')
+            return
+
+        total = 0
+        for debut_mois in mois:
+            if options['dry_run']:
+                self.stdout.write(f'  • {debut_mois.strftime("%m/%Y")} serait archivé')
+                continue
+
+            archive = archiver_mois(debut_mois, options.get('dossier'))
+            if archive is None:
+                continue
+            total += archive.nombre_logs
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'  ✅ {debut_mois.strftime("%m/%Y")}: {archive.nombre_logs} log(s) → '
+                    f'{archive.fichier} ({archive.taille} octets)'
+                )
+            )
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Archivage terminé: {total} log(s) archivé(s)'))
@@ -0,0 +1,200 @@
+import json
+import os
+import shutil
+import subprocess
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from school_management.charge_http import PERCENTILES, comparer, executer
+
+
+class Command(BaseCommand):
+    help = (
+        'Test de charge HTTP par rôle (élèves, parents, professeurs, administrateurs) sur une école générée '
+        'par seed_school : latences p50/p95/p99, débit et requêtes SQL par page, référence JSON comparable'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            default='http://127.0.0.1:8000',
+            help='Adresse du serveur à tester (défaut: http://127.0.0.1:8000)'
+        )
+        parser.add_argument(
+            '--gunicorn',
+            action='store_true',
+            help='Démarrer gunicorn (gunicorn.conf.py) sur le port de --url pour la durée du test'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Avec --gunicorn : nombre de workers (défaut: celui de gunicorn.conf.py)'
+        )
+        parser.add_argument(
+            '--utilisateurs',
+            type=int,
+            default=20,
+            help='Utilisateurs virtuels simultanés (défaut: 20)'
+        )
+        parser.add_argument(
+            '--duree',
+            type=float,
+            default=60,
+            help='Durée mesurée en secondes (défaut: 60)'
+        )
+        parser.add_argument(
+            '--echauffement',
+            type=float,
+            default=10,
+            help='Secondes de charge non mesurées avant la mesure (défaut: 10)'
+        )
+        parser.add_argument(
+            '--graine',
+            type=int,
+            default=0,
+            help='Graine de l\'école générée par seed_school, et du tirage des pages (défaut: 0)'
+        )
+        parser.add_argument(
+            '--mot-de-passe',
+            default='motdepasse',
+            help='Mot de passe des comptes générés (défaut: motdepasse)'
+        )
+        parser.add_argument(
+            '--sortie',
+            help='Fichier JSON où enregistrer le résultat, à utiliser comme référence'
+        )
+        parser.add_argument(
+            '--comparer',
+            help='Fichier JSON d\'un passage précédent auquel comparer le résultat'
+        )
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.1,
+            help='Écart relatif de latence ou de débit toléré avant régression (défaut: 0.1)'
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Terminer en erreur en cas de régression par rapport à --comparer'
+        )
+
+    def handle(self, *args, **options):
+        if options['utilisateurs'] < 1 or options['duree'] <= 0:
+            raise CommandError('--utilisateurs et --duree doivent être positifs')
+        reference = None
+        if options['comparer']:
+            try:
+                with open(options['comparer'], encoding='utf-8') as fichier:
+                    reference = json.load(fichier)
+            except (OSError, ValueError) as erreur:
+                raise CommandError(f'Référence illisible: {erreur}')
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING(
+                'DEBUG est actif : les mesures ne sont pas représentatives de la production'
+            ))
+
+        url = options['url'].rstrip('/')
+        serveur = self.demarrer_gunicorn(url, options['workers']) if options['gunicorn'] else None
+        try:
+            self.attendre_serveur(url, serveur)
+            self.stdout.write(
+                f'{options["utilisateurs"]} utilisateur(s) virtuel(s) sur {url} : '
+                f'{options["echauffement"]:g} s d\'échauffement puis {options["duree"]:g} s de mesure...'
+            )
+            resultat = executer(
+                url, options['utilisateurs'], options['duree'], options['echauffement'],
+                prefixe=f's{options["graine"]}-', mot_de_passe=options['mot_de_passe'], graine=options['graine']
+            )
+        except ValueError as erreur:
+            raise CommandError(str(erreur))
+        finally:
+            if serveur is not None:
+                serveur.terminate()
+                serveur.wait(timeout=30)
+
+        for refus in resultat['connexions_refusees']:
+            self.stdout.write(self.style.WARNING(f'  ⚠️  {refus}'))
+        self.afficher(resultat)
+        if options['sortie']:
+            with open(options['sortie'], 'w', encoding='utf-8') as fichier:
+                json.dump(resultat, fichier, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f'Résultat enregistré dans {options["sortie"]}'))
+        if reference is not None:
+            if reference.get('parametres', {}).get('utilisateurs') != options['utilisateurs']:
+                self.stdout.write(self.style.WARNING(
+                    'La référence a été mesurée avec un autre nombre d\'utilisateurs virtuels : '
+                    'débits et latences ne sont pas comparables'
+                ))
+            self.afficher_comparaison(comparer(reference, resultat, options['tolerance']), options['strict'])
+
+    def demarrer_gunicorn(self, url, workers):
+        executable = shutil.which('gunicorn')
+        if executable is None:
+            raise CommandError('gunicorn est introuvable : pip install -r requirements.txt')
+        port = urllib.parse.urlsplit(url).port or 80
+        commande = [
+            executable, 'school_system.wsgi:application', '--config', 'gunicorn.conf.py',
+            '--bind', f'127.0.0.1:{port}', '--access-logfile', '/dev/null',
+        ]
+        if workers:
+            commande += ['--workers', str(workers)]
+        environnement = {**os.environ, 'METRIQUES_EN_TETES': 'True', 'METRIQUES_ECHANTILLONNAGE': '1'}
+        self.stdout.write(f'Démarrage de gunicorn sur 127.0.0.1:{port}...')
+        return subprocess.Popen(commande, cwd=settings.BASE_DIR, env=environnement)
+
+    def attendre_serveur(self, url, serveur, delai=30):
+        limite = time.monotonic() + delai
+        while True:
+            try:
+                with urllib.request.urlopen(f'{url}/login/', timeout=5):
+                    return
+            except urllib.error.HTTPError:
+                return
+            except OSError as erreur:
+                if (serveur is not None and serveur.poll() is not None) or time.monotonic() > limite:
+                    raise CommandError(f'Serveur injoignable sur {url}: {erreur}')
+            time.sleep(0.5)
+
+    def afficher(self, resultat):
+        entete = ''.join(f'{f"p{p}":>9}' for p in PERCENTILES)
+        self.stdout.write(f'  {"":<24}{"req.":>7}{"req/s":>9}{entete}{"erreurs":>9}{"SQL/page":>10}')
+        lignes = [('global', resultat['global'])] + [
+            (f'rôle {role}', synthese) for role, synthese in resultat['roles'].items()
+        ] + list(resultat['vues'].items())
+        for nom, synthese in lignes:
+            centiles = ''.join(
+                f'{synthese[f"p{p}_ms"]:>7.1f}ms' if synthese[f'p{p}_ms'] is not None else f'{"-":>9}'
+                for p in PERCENTILES
+            )
+            sql = f'{synthese["sql_moyenne"]:>10.1f}' if synthese['sql_moyenne'] is not None else f'{"n/d":>10}'
+            ligne = (
+                f'  {nom:<24}{synthese["requetes"]:>7}{synthese["debit_rps"]:>9.1f}{centiles}'
+                f'{synthese["erreurs"]:>9}{sql}'
+            )
+            self.stdout.write(self.style.WARNING(ligne) if synthese['erreurs'] else ligne)
+        if resultat['global']['sql_moyenne'] is None:
+            self.stdout.write(
+                'Requêtes SQL non disponibles : activer METRIQUES_EN_TETES sur le serveur (implicite avec --gunicorn)'
+            )
+
+    def afficher_comparaison(self, ecarts, strict):
+        regressions = 0
+        for vue, indicateur, avant, apres, regression in ecarts:
+            ligne = f'  {vue:<24}{indicateur:<12}{avant:>10} → {apres:<10}'
+            if regression:
+                regressions += 1
+                self.stdout.write(self.style.WARNING(f'{ligne} ⚠️  régression'))
+            else:
+                self.stdout.write(ligne)
+        if regressions:
+            message = f'{regressions} régression(s) par rapport à la référence'
+            if strict:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS('Aucune régression par rapport à la référence'))
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand, CommandError
+from school_management.plans_requetes import catalogue, expliquer
+
+
+class Command(BaseCommand):
+    help = 'Affiche le plan d\'exécution des requêtes fréquentes et signale les parcours séquentiels de table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'requetes',
+            nargs='*',
+            help='Noms des requêtes à expliquer (défaut: tout le catalogue)'
+        )
+        parser.add_argument(
+            '--forcer-index',
+            action='store_true',
+            help='PostgreSQL : désactiver les parcours séquentiels pour vérifier qu\'un index convient'
+        )
+        parser.add_argument(
+            '--strict',
+            action='store_true',
+            help='Terminer en erreur si une requête parcourt une table séquentiellement'
+        )
+
+    def handle(self, *args, **options):
+        requetes = catalogue()
+        if options['requetes']:
+            noms = {nom for nom, _ in requetes}
+            inconnues = set(options['requetes']) - noms
+            if inconnues:
+                raise CommandError(
+                    f'Requête(s) inconnue(s): {", ".join(sorted(inconnues))}. '
+                    f'Disponibles: {", ".join(sorted(noms))}'
+                )
+            requetes = [(nom, queryset) for nom, queryset in requetes if nom in options['requetes']]
+
+        signalees = []
+        for nom, queryset in requetes:
+            lignes, parcours = expliquer(queryset, options['forcer_index'])
+            if parcours:
+                signalees.append(nom)
+                self.stdout.write(
+                    self.style.WARNING(f'  ⚠️  {nom}: parcours séquentiel de {", ".join(parcours)}')
+                )
+            else:
+                self.stdout.write(self.style.SUCCESS(f'  ✅ {nom}'))
+            if parcours or options['verbosity'] >= 2:
+                for ligne in lignes:
+                    self.stdout.write(f'        {ligne}')
+
+        if signalees:
+            message = f'{len(signalees)} requête(s) sur {len(requetes)} parcourent une table séquentiellement'
+            if options['strict']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(message))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(requetes)} requête(s) servies par des index'))
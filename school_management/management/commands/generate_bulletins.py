@@ -1,12 +1,181 @@
-from django.core.management.base import BaseCommand
-from django.db import transaction
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
 from django.utils import timezone
 from school_management.models import (
-    Bulletin, NoteBulletin, Eleve, Classe, Matiere, 
-    Note, Evaluation, Professeur
+    Bulletin, NoteBulletin, Classe, Matiere,
+    Note, Evaluation, ProgressionGenerationBulletins
 )
-from django.contrib.auth.models import User
-from django.db.models import Avg
+from school_management.dashboard_cache import invalider
+from school_management.grade_engine import arrondir, calculer_resultats_classe
+
+
+CHAMPS_RESULTATS = [
+    'classe', 'moyenne_generale', 'rang', 'moyenne_classe',
+    'effectif_classe', 'date_modification'
+]
+
+
+def eleves_complets(classe, eleve_ids, trimestre, annee_scolaire):
+    """
+    Retourne les élèves dont toutes les évaluations du trimestre sont notées
+
+    Chaque matière enseignée dans la classe doit avoir au moins une évaluation
+    et l'élève doit avoir une note pour chacune d'elles. Deux requêtes pour
+    toute la classe.
+    """
+    matiere_ids = set(
+        Matiere.objects.filter(professeurs__classes=classe).values_list('id', flat=True)
+    )
+    if not matiere_ids:
+        return set(eleve_ids)
+
+    evaluations = list(
+        Evaluation.objects.filter(
+            classe=classe,
+            matiere_id__in=matiere_ids,
+            trimestre=trimestre,
+            annee_scolaire=annee_scolaire
+        ).values_list('id', 'matiere_id')
+    )
+    if {matiere_id for _, matiere_id in evaluations} != matiere_ids:
+        return set()
+
+    evaluation_ids = {evaluation_id for evaluation_id, _ in evaluations}
+    notees = defaultdict(set)
+    for eleve_id, evaluation_id in Note.objects.filter(
+        evaluation_id__in=evaluation_ids,
+        eleve_id__in=eleve_ids,
+        note__isnull=False
+    ).values_list('eleve_id', 'evaluation_id'):
+        notees[eleve_id].add(evaluation_id)
+
+    return {eleve_id for eleve_id in eleve_ids if notees[eleve_id] >= evaluation_ids}
+
+
+def generer_bulletins_classe(classe_id, trimestre, annee_scolaire, force=False):
+    """
+    Génère les bulletins d'une classe en écritures groupées
+
+    Exécutée dans le processus principal ou dans un worker : ne reçoit et ne
+    retourne que des valeurs simples. La classe est traitée dans une seule
+    transaction puis marquée comme terminée dans la table de progression.
+    """
+    classe = Classe.objects.select_related('prof_principal').get(pk=classe_id)
+    bilan = {
+        'classe': classe.nom,
+        'crees': 0,
+        'mis_a_jour': 0,
+        'ignores': 0,
+        'incomplets': [],
+        'erreur': None,
+    }
+
+    try:
+        eleves = list(classe.eleves.all())
+        eleve_ids = [eleve.id for eleve in eleves]
+        resultats = calculer_resultats_classe(classe, trimestre, annee_scolaire)
+        complets = eleves_complets(classe, eleve_ids, trimestre, annee_scolaire)
+        existants = {
+            bulletin.eleve_id: bulletin
+            for bulletin in Bulletin.objects.filter(
+                eleve_id__in=eleve_ids,
+                annee_scolaire=annee_scolaire,
+                trimestre=trimestre
+            )
+        }
+
+        a_creer = []
+        a_mettre_a_jour = []
+        maintenant = timezone.now()
+
+        for eleve in eleves:
+            bulletin = existants.get(eleve.id)
+
+            if bulletin is not None and not force:
+                bilan['ignores'] += 1
+                continue
+
+            if eleve.id not in complets:
+                bilan['incomplets'].append(eleve.nom_complet)
+                continue
+
+            if bulletin is None:
+                bulletin = Bulletin(
+                    eleve=eleve,
+                    classe=classe,
+                    annee_scolaire=annee_scolaire,
+                    trimestre=trimestre,
+                    cree_par_id=classe.prof_principal.user_id,
+                    statut='BROUILLON'
+                )
+                a_creer.append(bulletin)
+            else:
+                bulletin.classe = classe
+                bulletin.date_modification = maintenant
+                a_mettre_a_jour.append(bulletin)
+
+            bulletin.appliquer_resultats(resultats)
+
+        with transaction.atomic():
+            Bulletin.objects.bulk_create(a_creer, batch_size=500)
+            Bulletin.objects.bulk_update(a_mettre_a_jour, CHAMPS_RESULTATS, batch_size=500)
+
+            # Certains moteurs ne renvoient pas les clés après un bulk_create
+            if any(bulletin.pk is None for bulletin in a_creer):
+                ids = dict(
+                    Bulletin.objects.filter(
+                        eleve_id__in=[bulletin.eleve_id for bulletin in a_creer],
+                        annee_scolaire=annee_scolaire,
+                        trimestre=trimestre
+                    ).values_list('eleve_id', 'id')
+                )
+                for bulletin in a_creer:
+                    bulletin.pk = ids[bulletin.eleve_id]
+
+            bulletins = a_creer + a_mettre_a_jour
+            NoteBulletin.objects.filter(bulletin__in=bulletins).delete()
+            NoteBulletin.objects.bulk_create([
+                NoteBulletin(
+                    bulletin=bulletin,
+                    matiere=matiere,
+                    moyenne_matiere=arrondir(moyenne_matiere),
+                    coefficient=matiere.coefficient,
+                    appreciation=''  # À remplir par le professeur
+                )
+                for bulletin in bulletins
+                if resultats.contient(bulletin.eleve_id)
+                for matiere, moyenne_matiere in resultats.moyennes_par_matiere(bulletin.eleve_id).items()
+            ], batch_size=1000)
+
+            ProgressionGenerationBulletins.objects.update_or_create(
+                classe=classe,
+                annee_scolaire=annee_scolaire,
+                trimestre=trimestre,
+                defaults={'bulletins_generes': len(bulletins)}
+            )
+            # bulk_create et bulk_update n'envoient pas de signaux
+            invalider('global')
+
+        bilan['crees'] = len(a_creer)
+        bilan['mis_a_jour'] = len(a_mettre_a_jour)
+
+    except Exception as e:
+        bilan['erreur'] = str(e)
+
+    return bilan
+
+
+def initialiser_worker():
+    """Prépare Django dans un processus worker"""
+    import django
+
+    django.setup()
+    # Ne jamais réutiliser une connexion héritée du processus parent
+    connections.close_all()
 
 
 class Command(BaseCommand):
@@ -35,12 +204,26 @@ class Command(BaseCommand):
             action='store_true',
             help='Forcer la régénération même si le bulletin existe déjà'
         )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Nombre de processus répartissant les classes (défaut: 1). '
+                 'Avec SQLite, garder 1 : la base ne supporte pas les écritures concurrentes.'
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='Reprendre une génération interrompue en sautant les classes déjà terminées'
+        )
 
     def handle(self, *args, **options):
         trimestre = options['trimestre']
         annee_scolaire = options['annee']
         classe_nom = options.get('classe')
         force = options['force']
+        workers = options['workers']
+        resume = options['resume']
 
         if not trimestre:
             self.stdout.write(
@@ -48,6 +231,9 @@ class Command(BaseCommand):
             )
             return
 
+        if workers < 1:
+            raise CommandError('--workers doit être supérieur ou égal à 1')
+
         self.stdout.write(
             self.style.SUCCESS(
                 f'Génération des bulletins pour le trimestre {trimestre} '
@@ -60,225 +246,89 @@ class Command(BaseCommand):
         if classe_nom:
             classes_query = classes_query.filter(nom=classe_nom)
 
-        bulletins_crees = 0
-        bulletins_ignores = 0
-        erreurs = 0
-
+        progressions = ProgressionGenerationBulletins.objects.filter(
+            classe__in=classes_query,
+            annee_scolaire=annee_scolaire,
+            trimestre=trimestre
+        )
+        if resume:
+            deja_traitees = set(progressions.values_list('classe_id', flat=True))
+            if deja_traitees:
+                self.stdout.write(f'Reprise : {len(deja_traitees)} classe(s) déjà terminée(s) ignorée(s)')
+            classes_query = classes_query.exclude(id__in=deja_traitees)
+        else:
+            progressions.delete()
+
+        classe_ids = []
         for classe in classes_query:
-            self.stdout.write(f'\nTraitement de la classe: {classe.nom}')
-            
             # Vérifier qu'il y a un professeur principal
-            if not classe.prof_principal:
+            if not classe.prof_principal_id:
                 self.stdout.write(
                     self.style.WARNING(
                         f'  ⚠️  Aucun professeur principal défini pour {classe.nom}'
                     )
                 )
                 continue
-
-            for eleve in classe.eleves.all():
-                try:
-                    with transaction.atomic():
-                        # Vérifier si le bulletin existe déjà
-                        bulletin, created = Bulletin.objects.get_or_create(
-                            eleve=eleve,
-                            classe=classe,
-                            annee_scolaire=annee_scolaire,
-                            trimestre=trimestre,
-                            defaults={
-                                'cree_par': classe.prof_principal.user,
-                                'statut': 'BROUILLON'
-                            }
-                        )
-
-                        if not created and not force:
-                            self.stdout.write(f'  ⏭️  Bulletin existant pour {eleve.nom_complet}')
-                            bulletins_ignores += 1
-                            continue
-
-                        # Vérifier si toutes les évaluations sont complètes
-                        if not self.verifier_evaluations_completes(eleve, classe, trimestre, annee_scolaire):
-                            self.stdout.write(
-                                self.style.WARNING(
-                                    f'  ⚠️  Évaluations incomplètes pour {eleve.nom_complet}'
-                                )
-                            )
-                            continue
-
-                        # Générer le bulletin
-                        self.generer_bulletin(bulletin, eleve, classe, trimestre, annee_scolaire)
-                        
-                        if created:
-                            self.stdout.write(f'  ✅ Bulletin créé pour {eleve.nom_complet}')
-                            bulletins_crees += 1
-                        else:
-                            self.stdout.write(f'  🔄 Bulletin mis à jour pour {eleve.nom_complet}')
-                            bulletins_crees += 1
-
-                except Exception as e:
-                    self.stdout.write(
-                        self.style.ERROR(
-                            f'  ❌ Erreur pour {eleve.nom_complet}: {str(e)}'
-                        )
-                    )
-                    erreurs += 1
+            classe_ids.append(classe.id)
+
+        debut = time.monotonic()
+        totaux = {'crees': 0, 'mis_a_jour': 0, 'ignores': 0, 'incomplets': 0, 'erreurs': 0}
+
+        if workers == 1 or len(classe_ids) <= 1:
+            for classe_id in classe_ids:
+                bilan = generer_bulletins_classe(classe_id, trimestre, annee_scolaire, force)
+                self.afficher_bilan(bilan, totaux)
+        else:
+            # Les processus fils ouvrent leurs propres connexions
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=initialiser_worker) as executor:
+                futures = [
+                    executor.submit(generer_bulletins_classe, classe_id, trimestre, annee_scolaire, force)
+                    for classe_id in classe_ids
+                ]
+                for future in as_completed(futures):
+                    self.afficher_bilan(future.result(), totaux)
+
+        duree = time.monotonic() - debut
+        generes = totaux['crees'] + totaux['mis_a_jour']
+        debit = generes / duree if duree > 0 else 0
 
         # Résumé
         self.stdout.write('\n' + '='*50)
         self.stdout.write(
             self.style.SUCCESS(
                 f'Génération terminée:\n'
-                f'  • Bulletins créés/mis à jour: {bulletins_crees}\n'
-                f'  • Bulletins ignorés: {bulletins_ignores}\n'
-                f'  • Erreurs: {erreurs}'
+                f'  • Bulletins créés: {totaux["crees"]}\n'
+                f'  • Bulletins mis à jour: {totaux["mis_a_jour"]}\n'
+                f'  • Bulletins ignorés: {totaux["ignores"]}\n'
+                f'  • Évaluations incomplètes: {totaux["incomplets"]}\n'
+                f'  • Erreurs: {totaux["erreurs"]}\n'
+                f'  • Durée: {duree:.2f} s ({debit:.1f} bulletins/s, {workers} worker(s))'
             )
         )
 
-    def verifier_evaluations_completes(self, eleve, classe, trimestre, annee_scolaire):
-        """Vérifie si toutes les évaluations sont complètes pour l'élève"""
-        # Récupérer toutes les matières enseignées dans la classe
-        matieres = Matiere.objects.filter(
-            professeurs__classes=classe
-        ).distinct()
-
-        for matiere in matieres:
-            # Vérifier qu'il y a au moins une évaluation pour cette matière
-            evaluations = Evaluation.objects.filter(
-                matiere=matiere,
-                trimestre=trimestre,
-                annee_scolaire=annee_scolaire
-            )
-
-            if not evaluations.exists():
-                return False
+    def afficher_bilan(self, bilan, totaux):
+        """Affiche le bilan d'une classe et l'ajoute aux totaux"""
+        self.stdout.write(f'\nTraitement de la classe: {bilan["classe"]}')
 
-            # Vérifier que l'élève a une note pour chaque évaluation
-            for evaluation in evaluations:
-                if not Note.objects.filter(
-                    eleve=eleve,
-                    evaluation=evaluation,
-                    note__isnull=False
-                ).exists():
-                    return False
-
-        return True
-
-    def generer_bulletin(self, bulletin, eleve, classe, trimestre, annee_scolaire):
-        """Génère le contenu du bulletin"""
-        # Calculer la moyenne générale
-        moyenne_generale = self.calculer_moyenne_generale(eleve, trimestre, annee_scolaire)
-        bulletin.moyenne_generale = moyenne_generale
-
-        # Calculer le rang
-        bulletin.rang = self.calculer_rang(eleve, classe, trimestre, annee_scolaire, moyenne_generale)
-
-        # Informations sur la classe
-        bulletin.effectif_classe = classe.eleves.count()
-        bulletin.moyenne_classe = self.calculer_moyenne_classe(classe, trimestre, annee_scolaire)
-
-        # Générer les notes détaillées par matière
-        self.generer_notes_detaillees(bulletin, eleve, trimestre, annee_scolaire)
-
-        # Recalculer automatiquement tous les champs
-        bulletin.recalculer_tous_les_champs()
-
-    def calculer_moyenne_generale(self, eleve, trimestre, annee_scolaire):
-        """Calcule la moyenne générale de l'élève"""
-        notes = Note.objects.filter(
-            eleve=eleve,
-            evaluation__trimestre=trimestre,
-            evaluation__annee_scolaire=annee_scolaire,
-            note__isnull=False
-        ).select_related('evaluation__matiere')
-
-        if not notes.exists():
-            return None
-
-        total_points = 0
-        total_coefficients = 0
-
-        for note in notes:
-            coefficient = note.evaluation.matiere.coefficient
-            note_sur_20 = note.note_sur_20 or 0
-            total_points += note_sur_20 * coefficient
-            total_coefficients += coefficient
-
-        if total_coefficients > 0:
-            return round(total_points / total_coefficients, 2)
-        return None
-
-    def calculer_rang(self, eleve, classe, trimestre, annee_scolaire, moyenne_generale):
-        """Calcule le rang de l'élève dans sa classe"""
-        if not moyenne_generale:
-            return None
-
-        # Compter le nombre d'élèves avec une moyenne supérieure
-        bulletins_superieurs = Bulletin.objects.filter(
-            classe=classe,
-            annee_scolaire=annee_scolaire,
-            trimestre=trimestre,
-            moyenne_generale__gt=moyenne_generale,
-            statut__in=['VALIDE', 'EN_ATTENTE']
-        ).count()
-
-        return bulletins_superieurs + 1
-
-    def calculer_moyenne_classe(self, classe, trimestre, annee_scolaire):
-        """Calcule la moyenne de la classe"""
-        bulletins = Bulletin.objects.filter(
-            classe=classe,
-            annee_scolaire=annee_scolaire,
-            trimestre=trimestre,
-            moyenne_generale__isnull=False,
-            statut__in=['VALIDE', 'EN_ATTENTE']
-        )
-
-        if bulletins.exists():
-            moyenne = bulletins.aggregate(avg=Avg('moyenne_generale'))['avg']
-            return round(moyenne, 2) if moyenne else None
-        return None
-
-    def generer_notes_detaillees(self, bulletin, eleve, trimestre, annee_scolaire):
-        """Génère les notes détaillées par matière"""
-        # Supprimer les anciennes notes détaillées
-        bulletin.notes_detaillees.all().delete()
-
-        # Récupérer toutes les matières avec leurs notes
-        matieres = Matiere.objects.filter(
-            professeurs__classes=bulletin.classe
-        ).distinct()
-
-        for matiere in matieres:
-            # Calculer la moyenne de la matière
-            notes_matiere = Note.objects.filter(
-                eleve=eleve,
-                evaluation__matiere=matiere,
-                evaluation__trimestre=trimestre,
-                evaluation__annee_scolaire=annee_scolaire,
-                note__isnull=False
+        if bilan['erreur']:
+            self.stdout.write(
+                self.style.ERROR(f'  ❌ Erreur pour {bilan["classe"]}: {bilan["erreur"]}')
             )
+            totaux['erreurs'] += 1
+            return
 
-            if notes_matiere.exists():
-                # Calculer la moyenne pondérée
-                total_points = 0
-                total_coefficients = 0
-
-                for note in notes_matiere:
-                    coefficient = note.evaluation.matiere.coefficient
-                    note_sur_20 = note.note_sur_20 or 0
-                    total_points += note_sur_20 * coefficient
-                    total_coefficients += coefficient
-
-                if total_coefficients > 0:
-                    moyenne_matiere = round(total_points / total_coefficients, 2)
-                    
-                    # Créer la note détaillée
-                    NoteBulletin.objects.create(
-                        bulletin=bulletin,
-                        matiere=matiere,
-                        moyenne_matiere=moyenne_matiere,
-                        coefficient=matiere.coefficient,
-                        appreciation=''  # À remplir par le professeur
-                    )
+        for nom in bilan['incomplets']:
+            self.stdout.write(
+                self.style.WARNING(f'  ⚠️  Évaluations incomplètes pour {nom}')
+            )
 
+        self.stdout.write(
+            f'  ✅ {bilan["crees"]} créé(s), {bilan["mis_a_jour"]} mis à jour, '
+            f'{bilan["ignores"]} ignoré(s)'
+        )
 
+        totaux['crees'] += bilan['crees']
+        totaux['mis_a_jour'] += bilan['mis_a_jour']
+        totaux['ignores'] += bilan['ignores']
+        totaux['incomplets'] += len(bilan['incomplets'])
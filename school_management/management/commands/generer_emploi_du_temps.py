@@ -0,0 +1,112 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from school_management.generation_emploi import generer_emploi_du_temps
+from school_management.models import AnneeScolaire, Classe
+
+
+class Command(BaseCommand):
+    help = (
+        'Génère un emploi du temps sans conflit pour un semestre : un créneau et une salle par matière de '
+        'chaque classe, recherches parallèles de graines différentes, score de qualité'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--annee',
+            type=str,
+            help='Année scolaire (défaut: année active, sinon 2024-2025)'
+        )
+        parser.add_argument(
+            '--semestre',
+            type=int,
+            choices=[1, 2],
+            default=1,
+            help='Semestre à planifier (défaut: 1)'
+        )
+        parser.add_argument(
+            '--classe',
+            type=str,
+            action='append',
+            help='Nom d\'une classe à planifier, répétable (défaut: toutes les classes de l\'année)'
+        )
+        parser.add_argument(
+            '--duree',
+            type=float,
+            default=10,
+            help='Temps de recherche en secondes, par processus (défaut: 10)'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count() or 1,
+            help='Recherches indépendantes lancées en parallèle, la meilleure est gardée (défaut: nombre de cœurs)'
+        )
+        parser.add_argument(
+            '--graine',
+            type=int,
+            default=0,
+            help='Graine de la première recherche, les suivantes prennent les graines suivantes (défaut: 0)'
+        )
+        parser.add_argument(
+            '--remplacer',
+            action='store_true',
+            help='Remplacer les cours existants des classes sur la période au lieu d\'ignorer ces classes'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Calculer et afficher le résultat sans rien enregistrer'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers doit être supérieur ou égal à 1')
+        if options['duree'] < 0:
+            raise CommandError('--duree doit être positive')
+
+        annee_scolaire = options['annee']
+        if not annee_scolaire:
+            active = AnneeScolaire.objects.filter(active=True).first()
+            annee_scolaire = active.annee if active else '2024-2025'
+        classes = None
+        if options['classe']:
+            classes = Classe.objects.filter(nom__in=options['classe'])
+            inconnues = set(options['classe']) - set(classes.values_list('nom', flat=True))
+            if inconnues:
+                raise CommandError(f'Classe(s) introuvable(s): {", ".join(sorted(inconnues))}')
+
+        self.stdout.write(
+            f'Génération de l\'emploi du temps {annee_scolaire}, semestre {options["semestre"]} : '
+            f'{options["workers"]} recherche(s) de {options["duree"]:g} s...'
+        )
+        debut = time.monotonic()
+        try:
+            indicateurs, ignorees, iterations = generer_emploi_du_temps(
+                annee_scolaire, options['semestre'], classes, options['duree'], options['workers'],
+                options['graine'], options['remplacer'], options['dry_run']
+            )
+        except ValueError as erreur:
+            raise CommandError(str(erreur))
+        duree = time.monotonic() - debut
+
+        if ignorees:
+            self.stdout.write(self.style.WARNING(
+                f'  ⚠️  {len(ignorees)} classe(s) déjà planifiée(s) ignorée(s) (--remplacer pour les refaire): '
+                f'{", ".join(ignorees)}'
+            ))
+        self.stdout.write('\n' + '='*50)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'{"Simulation" if options["dry_run"] else "Génération"} terminée:\n'
+                f'  • Cours placés: {indicateurs["cours"]}\n'
+                f'  • Conflits: {indicateurs["conflits"]}\n'
+                f'  • Trous dans les journées: {indicateurs["trous"]}\n'
+                f'  • Cours au-delà de la charge journalière équilibrée: {indicateurs["surcharge"]}\n'
+                f'  • Salles de type inadapté: {indicateurs["salles_inadaptees"]}\n'
+                f'  • Salles trop petites: {indicateurs["salles_trop_petites"]}\n'
+                f'  • Score: {indicateurs["score"]}/100\n'
+                f'  • Durée: {duree:.2f} s ({iterations} itérations)'
+            )
+        )
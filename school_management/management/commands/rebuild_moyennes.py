@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+from school_management.moyennes import reconstruire_moyennes
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit la table des moyennes par élève et par matière à partir des notes'
+
+    def handle(self, *args, **options):
+        debut = time.monotonic()
+        nb_lignes = reconstruire_moyennes()
+        duree = time.monotonic() - debut
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Moyennes reconstruites: {nb_lignes} ligne(s) en {duree:.2f} s')
+        )
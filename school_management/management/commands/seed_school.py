@@ -0,0 +1,70 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from school_management.donnees_synthetiques import ECHELLES, GenerateurEcole
+
+
+class Command(BaseCommand):
+    help = (
+        'Génère une école synthétique (élèves, parents, emplois du temps, notes, absences, messages, '
+        'logs d\'audit) pour les mesures de performance'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--scale',
+            choices=list(ECHELLES),
+            default='small',
+            help='Volume à générer : small (500 élèves), district (5 000), city (40 000) (défaut: small)'
+        )
+        parser.add_argument(
+            '--graine',
+            type=int,
+            default=0,
+            help='Graine du générateur ; préfixe aussi les identifiants des comptes (défaut: 0)'
+        )
+        parser.add_argument(
+            '--reference',
+            type=date.fromisoformat,
+            help='Date de référence AAAA-MM-JJ, fin de la période générée (défaut: aujourd\'hui)'
+        )
+        parser.add_argument(
+            '--mot-de-passe',
+            default='motdepasse',
+            help='Mot de passe de tous les comptes générés (défaut: motdepasse)'
+        )
+
+    def handle(self, *args, **options):
+        generateur = GenerateurEcole(
+            options['scale'], options['graine'], options['reference'], options['mot_de_passe']
+        )
+        self.stdout.write(
+            f'Génération de l\'échelle {options["scale"]} (graine {options["graine"]}, '
+            f'du {generateur.debut:%d/%m/%Y} au {generateur.fin:%d/%m/%Y})...'
+        )
+
+        debut = time.monotonic()
+        try:
+            bilan = generateur.generer()
+        except ValueError as erreur:
+            raise CommandError(str(erreur))
+        duree = time.monotonic() - debut
+
+        total_lignes = 0
+        duree_insertion = 0
+        for table, lignes, duree_table in bilan:
+            total_lignes += lignes
+            duree_insertion += duree_table
+            debit = lignes / duree_table if duree_table else 0
+            self.stdout.write(f'  • {table}: {lignes} ligne(s) en {duree_table:.2f} s ({debit:.0f} lignes/s)')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'{total_lignes} ligne(s) insérée(s) à {total_lignes / duree_insertion:.0f} lignes/s, '
+            f'{duree:.1f} s au total'
+        ))
+        self.stdout.write(
+            f'Comptes : {generateur.prefixe}eleve0, {generateur.prefixe}parent0, {generateur.prefixe}prof0..., '
+            f'{generateur.prefixe}admin '
+            f'(mot de passe : {options["mot_de_passe"]})'
+        )
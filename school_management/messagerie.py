@@ -0,0 +1,111 @@
+"""
+État de lecture des conversations
+
+Chaque Participant porte le dernier message qu'il a lu et son nombre de
+messages non lus ; chaque Conversation porte son dernier message. Ces valeurs
+sont tenues à jour à l'envoi d'un message et à la lecture d'une
+conversation (un seul UPDATE jusqu'au dernier message lu), si bien que les
+badges de messages non lus et le tri des conversations lisent une ligne
+indexée par conversation au lieu de parcourir tous les messages.
+"""
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .dashboard_cache import invalider
+from .evenements import publier_message
+from .models import Conversation, Message, Participant
+
+
+def enregistrer_message(message):
+    """Enregistre un nouveau message et met à jour les compteurs de la conversation"""
+    with transaction.atomic():
+        message.save()
+        Conversation.objects.filter(pk=message.conversation_id).update(
+            dernier_message=message,
+            date_dernier_message=message.date_envoi,
+            date_modification=message.date_envoi
+        )
+        participants = Participant.objects.filter(conversation_id=message.conversation_id, actif=True)
+        participants.exclude(user_id=message.expediteur_id).update(nombre_non_lus=F('nombre_non_lus') + 1)
+        # L'expéditeur a lu tout ce qui précède son propre message
+        participants.filter(user_id=message.expediteur_id).update(dernier_message_lu=message, nombre_non_lus=0)
+
+        # Diffusion aux flux ouverts, une fois le message visible en base
+        donnees = serialiser_message(message)
+        destinataires = list(participants.values_list('user_id', flat=True))
+        transaction.on_commit(lambda: publier_message(donnees, destinataires))
+    return message
+
+
+def serialiser_message(message):
+    """Représentation JSON d'un message, pour l'API et les flux"""
+    return {
+        'id': message.id,
+        'conversation_id': message.conversation_id,
+        'contenu': message.contenu,
+        'expediteur': message.expediteur.get_full_name(),
+        'expediteur_id': message.expediteur_id,
+        'date_envoi': message.date_envoi.isoformat(),
+        'lu': message.lu
+    }
+
+
+def messages_depuis(user, apres_id, limite=100):
+    """Messages des conversations de l'utilisateur postérieurs au message apres_id"""
+    return list(
+        Message.objects.filter(
+            conversation__participants__user=user,
+            conversation__participants__actif=True,
+            id__gt=apres_id
+        ).select_related('expediteur').order_by('id')[:limite]
+    )
+
+
+def marquer_conversation_lue(conversation, user, jusqu_a=None):
+    """
+    Marque comme lus les messages reçus jusqu'au message jusqu_a inclus
+    (par défaut le dernier de la conversation)
+
+    Une seule requête UPDATE quel que soit le nombre de messages ; le repère
+    de lecture du participant ne recule jamais. Retourne le Participant à
+    jour, ou None si l'utilisateur ne participe pas à la conversation.
+    """
+    with transaction.atomic():
+        participant = (
+            Participant.objects.select_for_update()
+            .filter(conversation=conversation, user=user)
+            .first()
+        )
+        if participant is None:
+            return None
+
+        # Relu sous verrou : un message a pu arriver depuis le chargement de la conversation
+        dernier_id = Conversation.objects.filter(pk=conversation.pk).values_list('dernier_message_id', flat=True).first()
+        if dernier_id is None:
+            return participant
+        jusqu_a = dernier_id if jusqu_a is None else min(int(jusqu_a), dernier_id)
+        if participant.dernier_message_lu_id is not None and participant.dernier_message_lu_id >= jusqu_a:
+            return participant
+
+        recus = Message.objects.filter(conversation=conversation).exclude(expediteur=user)
+        recus.filter(id__lte=jusqu_a, lu=False).update(lu=True, date_lecture=timezone.now())
+
+        participant.dernier_message_lu_id = jusqu_a
+        participant.nombre_non_lus = 0 if jusqu_a == dernier_id else recus.filter(id__gt=jusqu_a).count()
+        participant.save(update_fields=['dernier_message_lu', 'nombre_non_lus'])
+
+    invalider(f'user:{user.pk}')
+    return participant
+
+
+def compteurs_messagerie(user):
+    """Nombre de conversations actives et de messages non lus de l'utilisateur, en une requête"""
+    compteurs = Participant.objects.filter(user=user, actif=True).aggregate(
+        conversations_count=Count('id', filter=Q(conversation__active=True)),
+        unread_messages_count=Sum('nombre_non_lus')
+    )
+    return {
+        'conversations_count': compteurs['conversations_count'],
+        'unread_messages_count': compteurs['unread_messages_count'] or 0,
+    }
@@ -1,17 +1,51 @@
+import asyncio
+import json
+import time
+
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.handlers.asgi import ASGIRequest
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from django.urls import reverse_lazy, reverse
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from django.db.models import Q, Count, Max
-from django.core.paginator import Paginator
+from django.db.models import Q, F
 
-from .models import Conversation, Message, Participant, Classe, User
+from .models import Conversation, Participant, Classe, User
 from .forms import ConversationForm, MessageForm, ParticipantForm
 from .permissions import get_user_type
+from .evenements import canal_utilisateur, obtenir_backend
+from .pagination import CurseurInvalide, paginer_par_curseur
+from .messagerie import (
+    compteurs_messagerie, enregistrer_message, marquer_conversation_lue, messages_depuis, serialiser_message
+)
+
+
+# Pagination des messages, servie par l'index (conversation, date_envoi, id)
+ORDRE_MESSAGES = ('date_envoi', 'id')
+MESSAGES_PAR_PAGE = 20
+MESSAGES_PAR_PAGE_MAX = 100
+
+# Flux temps réel des messages
+DUREE_FLUX = 300  # secondes, le client se reconnecte ensuite avec Last-Event-ID
+BATTEMENT_FLUX = 15
+ATTENTE_LONG_POLL = 25
+DELAI_RECONNEXION_MS = 3000
+# Servie en WSGI, la page interroge le flux à intervalle fixe au lieu d'attendre
+INTERVALLE_SONDAGE_MS = 30000
+
+
+def sert_en_asgi(request):
+    """
+    Vrai si la requête est servie par un serveur ASGI
+
+    En WSGI (gunicorn à workers synchrones), une connexion ouverte occupe un
+    worker entier pendant toute son attente : le flux n'y attend jamais.
+    """
+    return isinstance(request, ASGIRequest)
 
 
 class ConversationListView(LoginRequiredMixin, ListView):
@@ -32,12 +66,11 @@ class ConversationListView(LoginRequiredMixin, ListView):
             participants__actif=True,
             active=True
         ).annotate(
-            last_message_time=Max('messages__date_envoi'),
-            unread_count=Count('messages', filter=Q(
-                messages__lu=False,
-                messages__expediteur__isnull=False
-            ) & ~Q(messages__expediteur=user))
-        ).order_by('-last_message_time', '-date_modification')
+            # Ligne Participant de l'utilisateur, jointe par le filtre ci-dessus
+            unread_count=F('participants__nombre_non_lus')
+        ).select_related(
+            'dernier_message__expediteur'
+        ).order_by(F('date_dernier_message').desc(nulls_last=True), '-date_modification')
         
         # Filtrer selon le type d'utilisateur
         if user_type == 'professeur':
@@ -89,25 +122,34 @@ class ConversationDetailView(LoginRequiredMixin, DetailView):
     
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        conversation = self.get_object()
+        conversation = self.object
         user = self.request.user
         
-        # Récupérer les messages de la conversation
-        messages_list = conversation.messages.all().order_by('date_envoi')
+        # Marquer les messages comme lus, en une requête
+        marquer_conversation_lue(conversation, user)
         
-        # Marquer les messages comme lus
-        for message in messages_list:
-            if message.expediteur != user and not message.lu:
-                message.marquer_comme_lu()
-        
-        # Pagination des messages
-        paginator = Paginator(messages_list, 20)
-        page_number = self.request.GET.get('page')
-        messages_page = paginator.get_page(page_number)
+        # Pagination par curseur : seuls les messages de la page affichée sont
+        # chargés, les plus récents par défaut
+        try:
+            messages_page = paginer_par_curseur(
+                conversation.messages.select_related('expediteur'),
+                ORDRE_MESSAGES,
+                MESSAGES_PAR_PAGE,
+                avant=self.request.GET.get('avant'),
+                apres=self.request.GET.get('apres'),
+                depuis_la_fin=True
+            )
+        except CurseurInvalide:
+            messages_page = paginer_par_curseur(
+                conversation.messages.select_related('expediteur'), ORDRE_MESSAGES, MESSAGES_PAR_PAGE, depuis_la_fin=True
+            )
         
         context['messages'] = messages_page
+        context['dernier_message_id'] = messages_page.object_list[-1].pk if messages_page else 0
+        context['flux_temps_reel'] = sert_en_asgi(self.request)
+        context['intervalle_sondage_ms'] = INTERVALLE_SONDAGE_MS
         context['message_form'] = MessageForm()
-        context['participants'] = conversation.get_participants()
+        context['participants'] = conversation.get_participants().select_related('user')
         context['user_type'] = get_user_type(user)
         
         # Vérifier les permissions du créateur
@@ -196,11 +238,8 @@ def send_message(request, conversation_id):
             message = form.save(commit=False)
             message.conversation = conversation
             message.expediteur = request.user
-            message.save()
-            
-            # Mettre à jour la date de modification de la conversation
-            conversation.date_modification = timezone.now()
-            conversation.save()
+            # Met aussi à jour le dernier message et les messages non lus des participants
+            enregistrer_message(message)
             
             if request.headers.get('Content-Type') == 'application/json':
                 return JsonResponse({
@@ -306,37 +345,171 @@ def get_conversation_messages(request, conversation_id):
         participants__actif=True
     )
     
-    # Récupérer les messages depuis une date donnée
+    messages_list = conversation.messages.select_related('expediteur')
+    
+    # Ancien paramètre : messages postérieurs à une date, converti en curseur
     since = request.GET.get('since')
-    if since:
+    apres = request.GET.get('apres')
+    if since and not apres:
         try:
             since_date = timezone.datetime.fromisoformat(since.replace('Z', '+00:00'))
-            messages_list = conversation.messages.filter(
-                date_envoi__gt=since_date
-            ).order_by('date_envoi')
+            messages_list = messages_list.filter(date_envoi__gt=since_date)
         except ValueError:
-            messages_list = conversation.messages.all().order_by('-date_envoi')[:10]
-    else:
-        messages_list = conversation.messages.all().order_by('-date_envoi')[:10]
-    
-    # Marquer les messages comme lus
-    for message in messages_list:
-        if message.expediteur != request.user and not message.lu:
-            message.marquer_comme_lu()
-    
-    messages_data = []
-    for message in messages_list:
-        messages_data.append({
-            'id': message.id,
-            'contenu': message.contenu,
-            'expediteur': message.expediteur.get_full_name(),
-            'date_envoi': message.date_envoi.isoformat(),
-            'lu': message.lu
-        })
+            pass
+    
+    try:
+        taille = min(int(request.GET.get('taille', MESSAGES_PAR_PAGE)), MESSAGES_PAR_PAGE_MAX)
+    except ValueError:
+        taille = MESSAGES_PAR_PAGE
+    try:
+        page = paginer_par_curseur(
+            messages_list,
+            ORDRE_MESSAGES,
+            max(taille, 1),
+            avant=request.GET.get('avant'),
+            apres=apres,
+            depuis_la_fin=not since
+        )
+    except CurseurInvalide:
+        return JsonResponse({'success': False, 'error': 'Curseur invalide'}, status=400)
+    
+    # Marquer comme lus les messages transmis
+    if page:
+        marquer_conversation_lue(conversation, request.user, max(message.id for message in page))
+    
+    return JsonResponse({
+        'messages': [serialiser_message(message) for message in page],
+        'conversation_id': conversation.id,
+        'curseurs': {
+            'plus_anciens': page.curseur_precedent,
+            'plus_recents': page.curseur_suivant,
+        }
+    })
+
+
+def _evenement_sse(donnees):
+    return f"id: {donnees['id']}\nevent: message\ndata: {json.dumps(donnees)}\n\n"
+
+
+async def message_stream(request):
+    """
+    Flux des nouveaux messages de l'utilisateur
+
+    Par défaut en server-sent events ; avec ?mode=poll, long-poll renvoyant
+    du JSON dès qu'un message arrive. Les messages manqués depuis
+    Last-Event-ID (ou ?apres=, obligatoire en mode poll) sont relus en base
+    à la connexion.
     
+    L'attente a lieu pendant la diffusion de la réponse, hors de la chaîne
+    des middlewares synchrones : servie par un serveur ASGI, une connexion
+    ouverte n'occupe aucun thread. Servie en WSGI, la vue n'attend pas :
+    ?mode=poll renvoie aussitôt les messages postérieurs à ?apres=, et le
+    flux SSE répond 204, ce qui arrête les reconnexions d'EventSource.
+    """
+    user = await sync_to_async(lambda: request.user if request.user.is_authenticated else None)()
+    if user is None:
+        return JsonResponse({'success': False, 'error': 'Authentification requise'}, status=401)
+    
+    apres = request.headers.get('Last-Event-ID') or request.GET.get('apres')
+    # Sans point de départ, un sondage relirait les plus anciens messages de l'utilisateur
+    if apres is None and request.GET.get('mode') == 'poll':
+        return JsonResponse({'success': False, 'error': 'apres requis'}, status=400)
+    try:
+        apres_id = int(apres or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'apres invalide'}, status=400)
+    
+    if not sert_en_asgi(request):
+        if request.GET.get('mode') != 'poll':
+            return HttpResponse(status=204)
+        manques = await sync_to_async(messages_depuis)(user, apres_id)
+        response = JsonResponse({'messages': [serialiser_message(message) for message in manques]})
+        response['Cache-Control'] = 'no-cache'
+        return response
+    
+    backend = obtenir_backend()
+    canal = canal_utilisateur(user.pk)
+    
+    async def long_poll():
+        # Abonnement avant la relecture en base, pour ne rien perdre entre les deux
+        async with backend.abonner(canal) as file:
+            manques = await sync_to_async(messages_depuis)(user, apres_id) if apres_id else []
+            messages_data = [serialiser_message(message) for message in manques]
+            if not messages_data:
+                try:
+                    messages_data.append(await asyncio.wait_for(file.get(), ATTENTE_LONG_POLL))
+                except asyncio.TimeoutError:
+                    pass
+            while not file.empty():
+                messages_data.append(file.get_nowait())
+        vus = set()
+        messages_data = [
+            donnees for donnees in messages_data
+            if donnees['id'] > apres_id and not (donnees['id'] in vus or vus.add(donnees['id']))
+        ]
+        yield json.dumps({'messages': messages_data})
+    
+    async def flux():
+        dernier_envoye = apres_id
+        fin = time.monotonic() + DUREE_FLUX
+        async with backend.abonner(canal) as file:
+            yield f'retry: {DELAI_RECONNEXION_MS}\n\n'
+            if apres_id:
+                for message in await sync_to_async(messages_depuis)(user, apres_id):
+                    dernier_envoye = message.id
+                    yield _evenement_sse(serialiser_message(message))
+            while time.monotonic() < fin:
+                try:
+                    donnees = await asyncio.wait_for(file.get(), min(BATTEMENT_FLUX, max(fin - time.monotonic(), 0)))
+                except asyncio.TimeoutError:
+                    # Commentaire SSE : garde la connexion ouverte à travers les proxys
+                    yield ': ping\n\n'
+                    continue
+                if donnees['id'] > dernier_envoye:
+                    dernier_envoye = donnees['id']
+                    yield _evenement_sse(donnees)
+    
+    if request.GET.get('mode') == 'poll':
+        response = StreamingHttpResponse(long_poll(), content_type='application/json')
+        response['Cache-Control'] = 'no-cache'
+        return response
+    
+    response = StreamingHttpResponse(flux(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required
+def mark_messages_read(request, conversation_id):
+    """Vue AJAX : accusé de lecture jusqu'à un message (par défaut le dernier)"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Méthode non autorisée'}, status=405)
+    
+    conversation = get_object_or_404(
+        Conversation,
+        id=conversation_id,
+        participants__user=request.user,
+        participants__actif=True
+    )
+    
+    message_id = request.POST.get('message_id')
+    if request.content_type == 'application/json':
+        try:
+            message_id = json.loads(request.body or '{}').get('message_id')
+        except (ValueError, AttributeError):
+            return JsonResponse({'success': False, 'error': 'JSON invalide'}, status=400)
+    try:
+        message_id = int(message_id) if message_id not in (None, '') else None
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'message_id invalide'}, status=400)
+    
+    participant = marquer_conversation_lue(conversation, request.user, message_id)
     return JsonResponse({
-        'messages': messages_data,
-        'conversation_id': conversation.id
+        'success': True,
+        'conversation_id': conversation.id,
+        'dernier_message_lu': participant.dernier_message_lu_id,
+        'nombre_non_lus': participant.nombre_non_lus,
     })
 
 
@@ -346,31 +519,17 @@ def messaging_dashboard(request):
     user = request.user
     user_type = get_user_type(user)
     
-    # Statistiques
-    conversations_count = Conversation.objects.filter(
-        participants__user=user,
-        participants__actif=True,
-        active=True
-    ).count()
-    
-    unread_messages_count = Message.objects.filter(
-        conversation__participants__user=user,
-        conversation__participants__actif=True,
-        lu=False
-    ).exclude(expediteur=user).count()
-    
     # Conversations récentes
     recent_conversations = Conversation.objects.filter(
         participants__user=user,
         participants__actif=True,
         active=True
-    ).annotate(
-        last_message_time=Max('messages__date_envoi')
-    ).order_by('-last_message_time')[:5]
+    ).select_related(
+        'dernier_message'
+    ).order_by(F('date_dernier_message').desc(nulls_last=True))[:5]
     
     context = {
-        'conversations_count': conversations_count,
-        'unread_messages_count': unread_messages_count,
+        **compteurs_messagerie(user),
         'recent_conversations': recent_conversations,
         'user_type': user_type
     }
@@ -0,0 +1,361 @@
+"""
+Métriques de requêtes SQL et de latence par vue
+
+MetriquesRequetesMiddleware mesure une fraction des requêtes HTTP (réglage
+METRIQUES_ECHANTILLONNAGE) : un execute_wrapper compte les requêtes SQL et
+leur durée, Template.render est chronométré pour isoler le temps de rendu,
+et le reste de la durée est attribué à la vue elle-même. Une même requête
+SQL répétée au moins SEUIL_N_PLUS_1 fois dans une requête HTTP est signalée
+comme un N+1, avec son empreinte (SQL sans les valeurs).
+
+Les mesures sont agrégées par nom d'URL résolu dans chaque processus :
+cumuls depuis le démarrage (exposition au format Prometheus sur /metrics) et
+agrégats par minute sur FENETRE_MINUTES (page de synthèse des
+administrateurs). Chaque processus publie son instantané dans le cache au
+plus toutes les INTERVALLE_PUBLICATION secondes, les lectures fusionnent les
+instantanés de tous les processus. L'instantané porte aussi les compteurs
+de l'écriture différée des logs d'audit (audit_sink), exposés sur /metrics.
+"""
+import contextvars
+import copy
+import functools
+import logging
+import os
+import re
+import socket
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+logger = logging.getLogger('school_management')
+
+SEUIL_N_PLUS_1 = 5
+NB_EMPREINTES = 5
+TAILLE_EMPREINTE = 300
+BUCKETS_DUREE = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+FENETRE_MINUTES = 60
+INTERVALLE_PUBLICATION = 30  # secondes
+DUREE_VIE_INSTANTANE = 300  # secondes sans publication avant d'oublier un processus
+CLE_PROCESSUS = 'metriques:processus'
+
+
+def taux_echantillonnage():
+    return getattr(settings, 'METRIQUES_ECHANTILLONNAGE', 1.0)
+
+
+# =============== MESURE D'UNE REQUÊTE ===============
+
+_collecte = contextvars.ContextVar('collecte_metriques', default=None)
+
+
+class Collecte:
+    """Mesures d'une requête HTTP échantillonnée, utilisée comme execute_wrapper"""
+
+    def __init__(self):
+        self.debut = time.perf_counter()
+        self.nb_requetes = 0
+        self.temps_sql = 0.0
+        self.temps_sql_templates = 0.0
+        self.temps_templates = 0.0
+        self.en_template = False
+        self.requetes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = time.perf_counter() - debut
+            self.nb_requetes += 1
+            self.temps_sql += duree
+            if self.en_template:
+                # Querysets évalués par le template : comptés en SQL, pas en rendu
+                self.temps_sql_templates += duree
+            self.requetes[sql] += 1
+
+    def activer(self):
+        return _collecte.set(self)
+
+    @staticmethod
+    def desactiver(jeton):
+        _collecte.reset(jeton)
+
+
+def installer_mesure_templates():
+    """Chronomètre le rendu des templates racines (une seule fois par processus)"""
+    from django.template.base import Template
+
+    if getattr(Template.render, 'mesure_metriques', False):
+        return
+    render = Template.render
+
+    @functools.wraps(render)
+    def render_mesure(self, context):
+        collecte = _collecte.get()
+        # Les include et extends sont comptés dans le template racine
+        if collecte is None or collecte.en_template:
+            return render(self, context)
+        collecte.en_template = True
+        debut = time.perf_counter()
+        try:
+            return render(self, context)
+        finally:
+            collecte.temps_templates += time.perf_counter() - debut
+            collecte.en_template = False
+
+    render_mesure.mesure_metriques = True
+    Template.render = render_mesure
+
+
+_LISTE_PARAMETRES = re.compile(r'\((?:%s, )+%s\)')
+
+
+def empreinte(sql):
+    """SQL sans les valeurs, les listes IN de longueur variable ramenées à une seule forme"""
+    return _LISTE_PARAMETRES.sub('(%s, ...)', sql)[:TAILLE_EMPREINTE]
+
+
+def mesure_requete(collecte, statut):
+    """Agrégat d'une seule requête HTTP, au format de _vide()"""
+    duree = time.perf_counter() - collecte.debut
+    temps_templates = max(collecte.temps_templates - collecte.temps_sql_templates, 0.0)
+
+    repetitions = Counter()
+    for sql, nombre in collecte.requetes.items():
+        repetitions[empreinte(sql)] += nombre
+    doublons = {sql: nombre for sql, nombre in repetitions.most_common(NB_EMPREINTES) if nombre >= SEUIL_N_PLUS_1}
+
+    mesure = _vide()
+    mesure.update({
+        'requetes': 1,
+        'erreurs': int(statut >= 500),
+        'requetes_sql': collecte.nb_requetes,
+        'max_requetes_sql': collecte.nb_requetes,
+        'temps_sql': collecte.temps_sql,
+        'temps_templates': temps_templates,
+        'temps_vue': max(duree - collecte.temps_sql - temps_templates, 0.0),
+        'duree': duree,
+        'max_duree': duree,
+        'n_plus_1': int(bool(doublons)),
+        'empreintes': doublons,
+    })
+    for i, borne in enumerate(BUCKETS_DUREE):
+        if duree <= borne:
+            break
+    else:
+        i = len(BUCKETS_DUREE)
+    mesure['buckets'][i] = 1
+    return mesure
+
+
+# =============== AGRÉGATS ===============
+
+SOMMES = ('requetes', 'erreurs', 'requetes_sql', 'temps_sql', 'temps_templates', 'temps_vue', 'duree', 'n_plus_1')
+MAXIMUMS = ('max_requetes_sql', 'max_duree')
+
+
+def _vide():
+    agregat = dict.fromkeys(SOMMES + MAXIMUMS, 0)
+    # Nombre de requêtes par intervalle de durée (non cumulé), la dernière case pour +Inf
+    agregat['buckets'] = [0] * (len(BUCKETS_DUREE) + 1)
+    agregat['empreintes'] = {}
+    return agregat
+
+
+def _fusionner(cible, source):
+    for champ in SOMMES:
+        cible[champ] += source[champ]
+    for champ in MAXIMUMS:
+        cible[champ] = max(cible[champ], source[champ])
+    cible['buckets'] = [a + b for a, b in zip(cible['buckets'], source['buckets'])]
+    if source['empreintes']:
+        empreintes = Counter(cible['empreintes'])
+        for sql, nombre in source['empreintes'].items():
+            empreintes[sql] = max(empreintes[sql], nombre)
+        cible['empreintes'] = dict(empreintes.most_common(NB_EMPREINTES))
+    return cible
+
+
+class Registre:
+    """Agrégats par vue du processus courant"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.cumuls = {}
+        self.minutes = {}
+        self.derniere_publication = 0.0
+
+    def enregistrer(self, vue, mesure):
+        minute = int(time.time() // 60)
+        with self._verrou:
+            _fusionner(self.cumuls.setdefault(vue, _vide()), mesure)
+            _fusionner(self.minutes.setdefault(minute, {}).setdefault(vue, _vide()), mesure)
+            for ancienne in [m for m in self.minutes if m <= minute - FENETRE_MINUTES]:
+                del self.minutes[ancienne]
+
+    def instantane(self):
+        with self._verrou:
+            return {'cumuls': copy.deepcopy(self.cumuls), 'minutes': copy.deepcopy(self.minutes)}
+
+
+registre = Registre()
+
+
+def enregistrer_requete(request, response, collecte):
+    """Ajoute la mesure aux agrégats de la vue ; les URL non résolues (fichiers statiques, 404) sont ignorées"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return
+    registre.enregistrer(match.view_name, mesure_requete(collecte, response.status_code))
+    publier()
+
+
+# =============== PARTAGE ENTRE PROCESSUS ===============
+
+def _identifiant_processus():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+COMPTEURS_AUDIT = ('evenements_ecrits', 'evenements_perdus', 'lots_ecrits', 'en_attente')
+
+
+def _statistiques_audit():
+    from .audit_sink import audit_sink
+
+    statistiques = audit_sink.statistiques()
+    return {champ: statistiques[champ] for champ in COMPTEURS_AUDIT}
+
+
+def publier(force=False):
+    """Publie l'instantané du processus dans le cache, au plus toutes les INTERVALLE_PUBLICATION secondes"""
+    maintenant = time.monotonic()
+    if not force and maintenant - registre.derniere_publication < INTERVALLE_PUBLICATION:
+        return
+    registre.derniere_publication = maintenant
+    identifiant = _identifiant_processus()
+    try:
+        instantane = registre.instantane()
+        instantane['audit'] = _statistiques_audit()
+        cache.set(f'metriques:{identifiant}', instantane, DUREE_VIE_INSTANTANE)
+        # Liste partagée sans verrou : un processus perdu dans une course se réinscrit à la publication suivante
+        processus = cache.get(CLE_PROCESSUS) or []
+        if identifiant not in processus:
+            cache.set(CLE_PROCESSUS, [*processus, identifiant], None)
+    except Exception:
+        logger.exception('Erreur lors de la publication des métriques')
+
+
+def instantanes():
+    """Instantanés de tous les processus ayant publié récemment"""
+    publier(force=True)
+    processus = cache.get(CLE_PROCESSUS) or []
+    valeurs = cache.get_many([f'metriques:{identifiant}' for identifiant in processus])
+    actifs = [identifiant for identifiant in processus if f'metriques:{identifiant}' in valeurs]
+    if len(actifs) != len(processus):
+        cache.set(CLE_PROCESSUS, actifs, None)
+    return list(valeurs.values())
+
+
+def cumuls():
+    """Cumuls par vue depuis le démarrage, tous processus confondus"""
+    resultat = {}
+    for instantane in instantanes():
+        for vue, agregat in instantane['cumuls'].items():
+            _fusionner(resultat.setdefault(vue, _vide()), agregat)
+    return resultat
+
+
+def statistiques_audit():
+    """Compteurs de l'écriture différée des logs d'audit, sommés sur tous les processus"""
+    totaux = dict.fromkeys(COMPTEURS_AUDIT, 0)
+    for instantane in instantanes():
+        for champ, valeur in instantane.get('audit', {}).items():
+            totaux[champ] += valeur
+    return totaux
+
+
+def synthese(minutes=FENETRE_MINUTES):
+    """Lignes par vue sur les dernières minutes, les vues les plus coûteuses en SQL d'abord"""
+    depuis = int(time.time() // 60) - minutes
+    agregats = {}
+    for instantane in instantanes():
+        for minute, vues in instantane['minutes'].items():
+            if minute <= depuis:
+                continue
+            for vue, agregat in vues.items():
+                _fusionner(agregats.setdefault(vue, _vide()), agregat)
+
+    lignes = []
+    for vue, agregat in agregats.items():
+        nombre = agregat['requetes'] or 1
+        lignes.append({
+            'vue': vue,
+            'requetes': agregat['requetes'],
+            'erreurs': agregat['erreurs'],
+            'requetes_sql_moyenne': agregat['requetes_sql'] / nombre,
+            'requetes_sql_max': agregat['max_requetes_sql'],
+            'temps_sql_ms': agregat['temps_sql'] * 1000 / nombre,
+            'temps_templates_ms': agregat['temps_templates'] * 1000 / nombre,
+            'temps_vue_ms': agregat['temps_vue'] * 1000 / nombre,
+            'duree_ms': agregat['duree'] * 1000 / nombre,
+            'duree_max_ms': agregat['max_duree'] * 1000,
+            'n_plus_1': agregat['n_plus_1'],
+            'empreintes': sorted(agregat['empreintes'].items(), key=lambda item: -item[1]),
+        })
+    lignes.sort(key=lambda ligne: (-ligne['requetes_sql_moyenne'], -ligne['duree_ms']))
+    return lignes
+
+
+# =============== EXPOSITION PROMETHEUS ===============
+
+def _etiquette(valeur):
+    return str(valeur).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def exposition_prometheus():
+    """Cumuls au format texte Prometheus"""
+    agregats = cumuls()
+    lignes = [
+        '# HELP school_metriques_echantillonnage Fraction des requêtes HTTP mesurées',
+        '# TYPE school_metriques_echantillonnage gauge',
+        f'school_metriques_echantillonnage {taux_echantillonnage()}',
+    ]
+    compteurs = (
+        ('school_requetes_http_total', 'counter', 'Requêtes HTTP échantillonnées', 'requetes'),
+        ('school_requetes_http_erreurs_total', 'counter', 'Réponses 5xx échantillonnées', 'erreurs'),
+        ('school_requetes_sql_total', 'counter', 'Requêtes SQL exécutées', 'requetes_sql'),
+        ('school_requetes_sql_max', 'gauge', 'Maximum de requêtes SQL pour une requête HTTP', 'max_requetes_sql'),
+        ('school_temps_sql_secondes_total', 'counter', 'Temps passé en SQL', 'temps_sql'),
+        ('school_temps_templates_secondes_total', 'counter', 'Temps de rendu des templates hors SQL', 'temps_templates'),
+        ('school_temps_vue_secondes_total', 'counter', 'Temps de la vue hors SQL et templates', 'temps_vue'),
+        ('school_requetes_n_plus_1_total', 'counter', 'Requêtes HTTP répétant une même requête SQL', 'n_plus_1'),
+    )
+    for nom, type_metrique, description, champ in compteurs:
+        lignes += [f'# HELP {nom} {description}', f'# TYPE {nom} {type_metrique}']
+        lignes += [f'{nom}{{vue="{_etiquette(vue)}"}} {agregat[champ]}' for vue, agregat in sorted(agregats.items())]
+
+    nom = 'school_duree_requete_secondes'
+    lignes += [f'# HELP {nom} Durée des requêtes HTTP échantillonnées', f'# TYPE {nom} histogram']
+    for vue, agregat in sorted(agregats.items()):
+        etiquette = _etiquette(vue)
+        cumul = 0
+        for borne, nombre in zip((*BUCKETS_DUREE, '+Inf'), agregat['buckets']):
+            cumul += nombre
+            lignes.append(f'{nom}_bucket{{vue="{etiquette}",le="{borne}"}} {cumul}')
+        lignes.append(f'{nom}_sum{{vue="{etiquette}"}} {agregat["duree"]}')
+        lignes.append(f'{nom}_count{{vue="{etiquette}"}} {agregat["requetes"]}')
+
+    audit = statistiques_audit()
+    for nom, type_metrique, description, champ in (
+        ('school_audit_evenements_ecrits_total', 'counter', "Logs d'audit écrits en base", 'evenements_ecrits'),
+        ('school_audit_evenements_perdus_total', 'counter', "Logs d'audit perdus (file pleine, erreur)",
+         'evenements_perdus'),
+        ('school_audit_lots_ecrits_total', 'counter', "Lots de logs d'audit écrits", 'lots_ecrits'),
+        ('school_audit_en_attente', 'gauge', "Logs d'audit en attente d'écriture", 'en_attente'),
+    ):
+        lignes += [f'# HELP {nom} {description}', f'# TYPE {nom} {type_metrique}', f'{nom} {audit[champ]}']
+    return '\n'.join(lignes) + '\n'
@@ -1,80 +1,136 @@
+import random
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
 from django.shortcuts import redirect
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
 from django.contrib import messages
+from .permissions import get_user_type
+from .roles import resoudre_role
+
+
+class MetriquesRequetesMiddleware:
+    """
+    Mesure les requêtes SQL, le rendu des templates et la durée d'une
+    fraction des requêtes (school_management.metriques). Placé en tête de
+    MIDDLEWARE pour couvrir toute la chaîne ; désactivé par METRIQUES_ACTIVES.
+    Avec METRIQUES_EN_TETES, les réponses mesurées portent leur nombre de
+    requêtes SQL, pour les tests de charge.
+    """
+    
+    def __init__(self, get_response):
+        from .metriques import installer_mesure_templates
+        
+        if not getattr(settings, 'METRIQUES_ACTIVES', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        installer_mesure_templates()
+
+    def __call__(self, request):
+        from .metriques import Collecte, enregistrer_requete, taux_echantillonnage
+        
+        if random.random() >= taux_echantillonnage():
+            return self.get_response(request)
+        
+        collecte = Collecte()
+        jeton = collecte.activer()
+        try:
+            with ExitStack() as pile:
+                for connexion in connections.all():
+                    pile.enter_context(connexion.execute_wrapper(collecte))
+                response = self.get_response(request)
+        finally:
+            collecte.desactiver(jeton)
+        enregistrer_requete(request, response, collecte)
+        if getattr(settings, 'METRIQUES_EN_TETES', False):
+            response['X-Requetes-SQL'] = collecte.nb_requetes
+            response['Server-Timing'] = f'sql;dur={collecte.temps_sql * 1000:.1f}'
+        return response
+
+
+class RoleUtilisateurMiddleware:
+    """
+    Résout une fois par requête le rôle et le profil de l'utilisateur connecté
+    (request.role_utilisateur, request.profil_utilisateur).
+    """
+    
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        resoudre_role(request)
+        return self.get_response(request)
+
+
+# Tableau de bord de chaque type d'utilisateur (nom d'URL)
+DASHBOARD_PAR_TYPE = {
+    'eleve': 'school_management:eleve_dashboard',
+    'professeur': 'school_management:professeur_dashboard',
+    'parent': 'school_management:parent_dashboard',
+}
+
+# Tableaux de bord spécialisés : types autorisés et ordre de repli pour les autres
+ACCES_DASHBOARDS = {
+    'school_management:professeur_dashboard': (('professeur', 'admin'), ('eleve',)),
+    'school_management:eleve_dashboard': (('eleve', 'admin'), ('professeur', 'parent')),
+    'school_management:parent_dashboard': (('parent', 'admin'), ('eleve', 'professeur')),
+}
 
 
 class UserTypeRedirectMiddleware:
     """
     Middleware pour rediriger automatiquement les utilisateurs vers leur tableau de bord approprié
     selon leur type (élève, professeur, admin) après connexion.
+
+    La décision est prise avant l'appel de la vue : une requête redirigée
+    n'exécute jamais les requêtes du tableau de bord. Les chemins sont résolus
+    une seule fois, à la première requête.
     """
     
     def __init__(self, get_response):
         self.get_response = get_response
+        self._chemins = None
+
+    @property
+    def chemins(self):
+        if self._chemins is None:
+            self._chemins = {
+                nom: reverse(nom)
+                for nom in ('school_management:dashboard', *DASHBOARD_PAR_TYPE.values())
+            }
+        return self._chemins
 
     def __call__(self, request):
-        response = self.get_response(request)
-        
-        # Si l'utilisateur est authentifié et accède à la page d'accueil principale
-        if (request.user.is_authenticated and 
-            request.path == reverse('school_management:dashboard')):
-            
-            # Déterminer le type d'utilisateur et rediriger vers le bon dashboard
-            user_type = self.get_user_type(request.user)
-            
-            if user_type == 'eleve':
-                return redirect('school_management:eleve_dashboard')
-            elif user_type == 'professeur':
-                return redirect('school_management:professeur_dashboard')
-            elif user_type == 'parent':
-                return redirect('school_management:parent_dashboard')
-            elif user_type == 'admin':
-                # Les admins restent sur le dashboard principal
-                pass
-        
-        # Vérifier les autorisations d'accès aux dashboards spécialisés
         if request.user.is_authenticated:
+            redirection = self.redirection(request)
+            if redirection is not None:
+                return redirection
+        return self.get_response(request)
+
+    def redirection(self, request):
+        """Retourne la redirection à appliquer à la requête, ou None pour laisser passer"""
+        chemins = self.chemins
+        accueil = chemins['school_management:dashboard']
+        if request.path == accueil:
+            # Les admins restent sur le dashboard principal
+            dashboard = DASHBOARD_PAR_TYPE.get(self.get_user_type(request.user))
+            return redirect(chemins[dashboard]) if dashboard else None
+
+        for dashboard, (autorises, replis) in ACCES_DASHBOARDS.items():
+            if request.path != chemins[dashboard]:
+                continue
             user_type = self.get_user_type(request.user)
-            
-            # Empêcher les élèves d'accéder au dashboard professeur
-            if (request.path == reverse('school_management:professeur_dashboard') and 
-                user_type != 'professeur' and user_type != 'admin'):
-                messages.error(request, 'Accès non autorisé à cette section.')
-                return redirect('school_management:eleve_dashboard' if user_type == 'eleve' 
-                              else 'school_management:dashboard')
-            
-            # Empêcher les professeurs d'accéder au dashboard élève
-            if (request.path == reverse('school_management:eleve_dashboard') and 
-                user_type != 'eleve' and user_type != 'admin'):
-                messages.error(request, 'Accès non autorisé à cette section.')
-                return redirect('school_management:professeur_dashboard' if user_type == 'professeur' 
-                              else 'school_management:parent_dashboard' if user_type == 'parent'
-                              else 'school_management:dashboard')
-            
-            # Empêcher l'accès non autorisé au dashboard parent
-            if (request.path == reverse('school_management:parent_dashboard') and 
-                user_type != 'parent' and user_type != 'admin'):
-                messages.error(request, 'Accès non autorisé à cette section.')
-                return redirect('school_management:eleve_dashboard' if user_type == 'eleve'
-                              else 'school_management:professeur_dashboard' if user_type == 'professeur'
-                              else 'school_management:dashboard')
-        
-        return response
+            if user_type in autorises:
+                return None
+            messages.error(request, 'Accès non autorisé à cette section.')
+            cible = DASHBOARD_PAR_TYPE[user_type] if user_type in replis else 'school_management:dashboard'
+            return redirect(chemins[cible])
+        return None
     
     def get_user_type(self, user):
         """Détermine le type d'utilisateur"""
-        try:
-            if hasattr(user, 'eleve'):
-                return 'eleve'
-            elif hasattr(user, 'professeur'):
-                return 'professeur'
-            elif hasattr(user, 'parent'):
-                return 'parent'
-            elif user.is_staff or user.is_superuser:
-                return 'admin'
-        except:
-            pass
-        return None
-
+        return get_user_type(user)
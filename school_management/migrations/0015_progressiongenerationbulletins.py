@@ -0,0 +1,32 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:01
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0014_add_unique_prof_principal_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProgressionGenerationBulletins',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('annee_scolaire', models.CharField(default='2024-2025', max_length=9)),
+                ('trimestre', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(3)])),
+                ('bulletins_generes', models.PositiveIntegerField(default=0)),
+                ('date_traitement', models.DateTimeField(auto_now=True)),
+                ('classe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progressions_bulletins', to='school_management.classe')),
+            ],
+            options={
+                'verbose_name': 'Progression de génération des bulletins',
+                'verbose_name_plural': 'Progressions de génération des bulletins',
+                'ordering': ['-date_traitement'],
+                'unique_together': {('classe', 'annee_scolaire', 'trimestre')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:05
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0015_progressiongenerationbulletins'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MoyenneEleveMatiere',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trimestre', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(3)])),
+                ('annee_scolaire', models.CharField(default='2024-2025', max_length=9)),
+                ('nombre_notes', models.PositiveIntegerField(default=0)),
+                ('somme_notes', models.DecimalField(decimal_places=2, default=0, max_digits=9)),
+                ('somme_ponderee', models.DecimalField(decimal_places=4, default=0, help_text="Somme des notes sur 20 multipliées par le coefficient de l'évaluation", max_digits=12)),
+                ('somme_coefficients', models.DecimalField(decimal_places=1, default=0, max_digits=8)),
+                ('note_min', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('note_max', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('date_mise_a_jour', models.DateTimeField(auto_now=True)),
+                ('eleve', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moyennes_matieres', to='school_management.eleve')),
+                ('matiere', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='moyennes_eleves', to='school_management.matiere')),
+            ],
+            options={
+                'verbose_name': 'Moyenne élève par matière',
+                'verbose_name_plural': 'Moyennes élèves par matière',
+                'ordering': ['matiere__nom'],
+                'unique_together': {('eleve', 'matiere', 'trimestre', 'annee_scolaire')},
+            },
+        ),
+    ]
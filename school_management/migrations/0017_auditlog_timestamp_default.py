@@ -0,0 +1,19 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:08
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0016_moyenneelevematiere'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Date et heure'),
+        ),
+    ]
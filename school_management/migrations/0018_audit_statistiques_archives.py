@@ -0,0 +1,62 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('school_management', '0017_auditlog_timestamp_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveAuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mois', models.DateField(help_text='Premier jour du mois', verbose_name='Mois archivé')),
+                ('fichier', models.CharField(max_length=500, verbose_name='Chemin du fichier')),
+                ('nombre_logs', models.PositiveIntegerField(default=0, verbose_name='Nombre de logs')),
+                ('taille', models.PositiveBigIntegerField(default=0, verbose_name='Taille (octets)')),
+                ('date_archivage', models.DateTimeField(auto_now_add=True, verbose_name="Date d'archivage")),
+            ],
+            options={
+                'verbose_name': "Archive des logs d'audit",
+                'verbose_name_plural': "Archives des logs d'audit",
+                'ordering': ['-mois'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StatistiqueAuditAction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Jour')),
+                ('action', models.CharField(choices=[('CREATE', 'Création'), ('UPDATE', 'Modification'), ('DELETE', 'Suppression'), ('VIEW', 'Consultation'), ('LOGIN', 'Connexion'), ('LOGOUT', 'Déconnexion'), ('NOTE_SAVE', 'Saisie de notes'), ('ABSENCE_CREATE', "Création d'absence")], max_length=20, verbose_name='Action')),
+                ('nombre', models.PositiveIntegerField(default=0, verbose_name="Nombre d'événements")),
+            ],
+            options={
+                'verbose_name': "Statistique d'audit par action",
+                'verbose_name_plural': "Statistiques d'audit par action",
+                'ordering': ['-date', 'action'],
+                'unique_together': {('date', 'action')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StatistiqueAuditUtilisateur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Jour')),
+                ('nombre', models.PositiveIntegerField(default=0, verbose_name="Nombre d'événements")),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': "Statistique d'audit par utilisateur",
+                'verbose_name_plural': "Statistiques d'audit par utilisateur",
+                'ordering': ['-date'],
+                'unique_together': {('date', 'user')},
+            },
+        ),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:16
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+
+def initialiser_etats_lecture(apps, schema_editor):
+    """Dernier message de chaque conversation et messages non lus de chaque participant"""
+    Conversation = apps.get_model('school_management', 'Conversation')
+    Message = apps.get_model('school_management', 'Message')
+    Participant = apps.get_model('school_management', 'Participant')
+
+    derniers = Message.objects.filter(conversation=OuterRef('pk')).order_by('-date_envoi', '-id')
+    Conversation.objects.update(
+        dernier_message=Subquery(derniers.values('id')[:1]),
+        date_dernier_message=Subquery(derniers.values('date_envoi')[:1])
+    )
+
+    non_lus = (
+        Message.objects.filter(conversation=OuterRef('conversation'), lu=False)
+        .exclude(expediteur=OuterRef('user'))
+        .order_by()
+        .values('conversation')
+        .annotate(nombre=Count('id'))
+        .values('nombre')
+    )
+    Participant.objects.update(nombre_non_lus=Coalesce(Subquery(non_lus), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0018_audit_statistiques_archives'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='date_dernier_message',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='dernier_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='school_management.message'),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='dernier_message_lu',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='school_management.message'),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='nombre_non_lus',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['user', 'actif'], name='participant_user_actif_idx'),
+        ),
+        migrations.RunPython(initialiser_etats_lecture, migrations.RunPython.noop),
+    ]
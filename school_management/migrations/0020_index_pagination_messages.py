@@ -0,0 +1,17 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0019_etat_lecture_conversations'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'date_envoi', 'id'], name='message_conv_date_id_idx'),
+        ),
+    ]
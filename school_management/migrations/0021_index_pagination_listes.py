@@ -0,0 +1,33 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0020_index_pagination_messages'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='absence',
+            index=models.Index(fields=['date_debut', 'id'], name='absence_date_debut_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='absence',
+            index=models.Index(fields=['eleve', 'date_debut', 'id'], name='absence_eleve_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp', 'id'], name='auditlog_timestamp_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['date_saisie', 'id'], name='note_date_saisie_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['eleve', 'date_saisie', 'id'], name='note_eleve_date_id_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.5 on 2026-10-17 04:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0021_index_pagination_listes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='bulletin',
+            index=models.Index(fields=['classe', 'trimestre', 'statut'], name='bulletin_classe_trim_stat_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emploidutemps',
+            index=models.Index(condition=models.Q(('actif', True)), fields=['professeur', 'annee_scolaire', 'semestre', 'creneau'], name='edt_prof_periode_actif_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emploidutemps',
+            index=models.Index(condition=models.Q(('actif', True)), fields=['salle', 'annee_scolaire', 'semestre', 'creneau'], name='edt_salle_periode_actif_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emploidutemps',
+            index=models.Index(condition=models.Q(('actif', True)), fields=['creneau', 'annee_scolaire', 'semestre'], name='edt_creneau_periode_actif_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluation',
+            index=models.Index(fields=['classe', 'annee_scolaire', 'trimestre'], name='evaluation_classe_periode_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='evaluation',
+            index=models.Index(fields=['professeur', 'date_evaluation'], name='evaluation_prof_date_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.5 on 2026-10-17 09:12
+
+from django.db import migrations
+
+from school_management.audit_archive import remplir_statistiques_audit
+
+
+def remplir_statistiques(apps, schema_editor):
+    """Statistiques journalières des logs écrits avant la création des tables de statistiques"""
+    AuditLog = apps.get_model('school_management', 'AuditLog')
+    remplir_statistiques_audit(
+        AuditLog.objects.order_by(),
+        apps.get_model('school_management', 'StatistiqueAuditAction'),
+        apps.get_model('school_management', 'StatistiqueAuditUtilisateur')
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('school_management', '0022_index_requetes_frequentes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remplir_statistiques, migrations.RunPython.noop),
+    ]
@@ -201,6 +201,12 @@ class Evaluation(models.Model):
         verbose_name = "Évaluation"
         verbose_name_plural = "Évaluations"
         ordering = ['-date_evaluation']
+        indexes = [
+            # Résultats et bulletins d'une classe pour une période
+            models.Index(fields=['classe', 'annee_scolaire', 'trimestre'], name='evaluation_classe_periode_idx'),
+            # Évaluations récentes d'un professeur (tableau de bord)
+            models.Index(fields=['professeur', 'date_evaluation'], name='evaluation_prof_date_idx'),
+        ]
     
     def __str__(self):
         return f"{self.titre} - {self.matiere.nom} ({self.classe.nom})"
@@ -229,6 +235,11 @@ class Note(models.Model):
         verbose_name_plural = "Notes"
         unique_together = ['eleve', 'evaluation']
         ordering = ['-date_saisie']
+        indexes = [
+            # Pagination par curseur des listes de notes, globale et par élève
+            models.Index(fields=['date_saisie', 'id'], name='note_date_saisie_id_idx'),
+            models.Index(fields=['eleve', 'date_saisie', 'id'], name='note_eleve_date_id_idx'),
+        ]
     
     def __str__(self):
         if self.absent:
@@ -249,6 +260,45 @@ class Note(models.Model):
         return self.note
 
 
+class MoyenneEleveMatiere(models.Model):
+    """Agrégats des notes d'un élève dans une matière pour un trimestre, tenus à jour à chaque saisie"""
+    eleve = models.ForeignKey(Eleve, on_delete=models.CASCADE, related_name='moyennes_matieres')
+    matiere = models.ForeignKey(Matiere, on_delete=models.CASCADE, related_name='moyennes_eleves')
+    trimestre = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(3)])
+    annee_scolaire = models.CharField(max_length=9, default="2024-2025")
+    nombre_notes = models.PositiveIntegerField(default=0)
+    somme_notes = models.DecimalField(max_digits=9, decimal_places=2, default=0)
+    somme_ponderee = models.DecimalField(max_digits=12, decimal_places=4, default=0,
+                                         help_text="Somme des notes sur 20 multipliées par le coefficient de l'évaluation")
+    somme_coefficients = models.DecimalField(max_digits=8, decimal_places=1, default=0)
+    note_min = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    note_max = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    date_mise_a_jour = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Moyenne élève par matière"
+        verbose_name_plural = "Moyennes élèves par matière"
+        unique_together = ['eleve', 'matiere', 'trimestre', 'annee_scolaire']
+        ordering = ['matiere__nom']
+
+    def __str__(self):
+        return f"{self.eleve.nom_complet} - {self.matiere.nom} - Trimestre {self.trimestre} ({self.annee_scolaire})"
+
+    @property
+    def moyenne(self):
+        """Moyenne simple des notes brutes"""
+        if not self.nombre_notes:
+            return None
+        return self.somme_notes / self.nombre_notes
+
+    @property
+    def moyenne_ponderee(self):
+        """Moyenne des notes sur 20 pondérée par les coefficients des évaluations"""
+        if not self.somme_coefficients:
+            return None
+        return self.somme_ponderee / self.somme_coefficients
+
+
 class Absence(models.Model):
     """Modèle pour gérer les absences"""
     MOTIF_CHOICES = [
@@ -270,6 +320,11 @@ class Absence(models.Model):
         verbose_name = "Absence"
         verbose_name_plural = "Absences"
         ordering = ['-date_debut']
+        indexes = [
+            # Pagination par curseur des listes d'absences, globale et par élève
+            models.Index(fields=['date_debut', 'id'], name='absence_date_debut_id_idx'),
+            models.Index(fields=['eleve', 'date_debut', 'id'], name='absence_eleve_date_id_idx'),
+        ]
     
     def __str__(self):
         return f"{self.eleve.nom_complet} - {self.date_debut.date()}"
@@ -326,7 +381,8 @@ class AuditLog(models.Model):
     details = models.TextField(blank=True, verbose_name="Détails")
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name="Adresse IP")
     user_agent = models.TextField(blank=True, verbose_name="User Agent")
-    timestamp = models.DateTimeField(auto_now_add=True, verbose_name="Date et heure")
+    # Horodaté à la création de l'objet et non à l'écriture, qui peut être différée
+    timestamp = models.DateTimeField(default=timezone.now, editable=False, verbose_name="Date et heure")
     
     class Meta:
         verbose_name = "Log d'audit"
@@ -336,6 +392,7 @@ class AuditLog(models.Model):
             models.Index(fields=['user', 'timestamp']),
             models.Index(fields=['action', 'timestamp']),
             models.Index(fields=['model_name', 'timestamp']),
+            models.Index(fields=['timestamp', 'id'], name='auditlog_timestamp_id_idx'),
         ]
     
     def __str__(self):
@@ -358,6 +415,55 @@ class AuditLog(models.Model):
         return 'unknown'
 
 
+class StatistiqueAuditAction(models.Model):
+    """Nombre de logs d'audit par jour et par action"""
+    date = models.DateField(verbose_name="Jour")
+    action = models.CharField(max_length=20, choices=AuditLog.ACTION_CHOICES, verbose_name="Action")
+    nombre = models.PositiveIntegerField(default=0, verbose_name="Nombre d'événements")
+    
+    class Meta:
+        verbose_name = "Statistique d'audit par action"
+        verbose_name_plural = "Statistiques d'audit par action"
+        unique_together = ['date', 'action']
+        ordering = ['-date', 'action']
+    
+    def __str__(self):
+        return f"{self.date} - {self.action} : {self.nombre}"
+
+
+class StatistiqueAuditUtilisateur(models.Model):
+    """Nombre de logs d'audit par jour et par utilisateur"""
+    date = models.DateField(verbose_name="Jour")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name="Utilisateur")
+    nombre = models.PositiveIntegerField(default=0, verbose_name="Nombre d'événements")
+    
+    class Meta:
+        verbose_name = "Statistique d'audit par utilisateur"
+        verbose_name_plural = "Statistiques d'audit par utilisateur"
+        unique_together = ['date', 'user']
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"{self.date} - {self.user.username} : {self.nombre}"
+
+
+class ArchiveAuditLog(models.Model):
+    """Fichier compressé contenant les logs d'audit d'un mois, retirés de la table AuditLog"""
+    mois = models.DateField(verbose_name="Mois archivé", help_text="Premier jour du mois")
+    fichier = models.CharField(max_length=500, verbose_name="Chemin du fichier")
+    nombre_logs = models.PositiveIntegerField(default=0, verbose_name="Nombre de logs")
+    taille = models.PositiveBigIntegerField(default=0, verbose_name="Taille (octets)")
+    date_archivage = models.DateTimeField(auto_now_add=True, verbose_name="Date d'archivage")
+    
+    class Meta:
+        verbose_name = "Archive des logs d'audit"
+        verbose_name_plural = "Archives des logs d'audit"
+        ordering = ['-mois']
+    
+    def __str__(self):
+        return f"Logs d'audit {self.mois.strftime('%m/%Y')} ({self.nombre_logs})"
+
+
 class Parent(models.Model):
     """Modèle pour représenter un parent d'élève"""
     SEXE_CHOICES = [
@@ -542,6 +648,10 @@ class Bulletin(models.Model):
         verbose_name_plural = "Bulletins"
         unique_together = ['eleve', 'annee_scolaire', 'trimestre']
         ordering = ['-trimestre', 'eleve__user__last_name']
+        indexes = [
+            # Bulletins d'une classe par trimestre et par statut (publication, suivi)
+            models.Index(fields=['classe', 'trimestre', 'statut'], name='bulletin_classe_trim_stat_idx'),
+        ]
     
     def __str__(self):
         return f"Bulletin {self.trimestre} - {self.eleve.nom_complet} ({self.annee_scolaire})"
@@ -549,94 +659,55 @@ class Bulletin(models.Model):
     def get_absolute_url(self):
         return reverse('school_management:bulletin_detail', kwargs={'pk': self.pk})
     
-    def calculer_moyenne_generale(self):
-        """Calcule la moyenne générale du bulletin"""
-        from django.db.models import Avg, F
+    def get_resultats_classe(self):
+        """Calcule les résultats de toute la classe pour le trimestre du bulletin"""
+        from .grade_engine import calculer_resultats_classe
         
-        # Récupérer toutes les notes de l'élève pour ce trimestre
-        notes = Note.objects.filter(
-            eleve=self.eleve,
-            evaluation__trimestre=self.trimestre,
-            evaluation__annee_scolaire=self.annee_scolaire,
-            note__isnull=False
-        ).select_related('evaluation__matiere')
+        return calculer_resultats_classe(self.classe, self.trimestre, self.annee_scolaire)
+    
+    def calculer_moyenne_generale(self, resultats=None):
+        """Calcule la moyenne générale du bulletin"""
+        from .grade_engine import arrondir
         
-        if not notes.exists():
+        resultats = resultats or self.get_resultats_classe()
+        if not resultats.contient(self.eleve_id):
             return None
-        
-        # Calculer la moyenne pondérée par coefficient
-        total_points = 0
-        total_coefficients = 0
-        
-        for note in notes:
-            coefficient = note.evaluation.matiere.coefficient
-            note_sur_20 = note.note_sur_20 or 0
-            total_points += note_sur_20 * coefficient
-            total_coefficients += coefficient
-        
-        if total_coefficients > 0:
-            return round(total_points / total_coefficients, 2)
-        return None
+        return arrondir(resultats.moyenne_generale(self.eleve_id))
     
-    def calculer_rang(self):
+    def calculer_rang(self, resultats=None):
         """Calcule le rang de l'élève dans sa classe"""
-        if not self.moyenne_generale:
+        resultats = resultats or self.get_resultats_classe()
+        if not resultats.contient(self.eleve_id):
             return None
-        
-        # Compter le nombre d'élèves avec une moyenne supérieure
-        bulletins_superieurs = Bulletin.objects.filter(
-            classe=self.classe,
-            annee_scolaire=self.annee_scolaire,
-            trimestre=self.trimestre,
-            moyenne_generale__gt=self.moyenne_generale,
-            statut__in=['VALIDE', 'EN_ATTENTE']
-        ).count()
-        
-        return bulletins_superieurs + 1
+        return resultats.rang(self.eleve_id)
     
-    def calculer_moyenne_classe(self):
+    def calculer_moyenne_classe(self, resultats=None):
         """Calcule la moyenne générale de la classe"""
-        from django.db.models import Avg
-        
-        # Récupérer toutes les moyennes générales de la classe pour ce trimestre
-        bulletins_classe = Bulletin.objects.filter(
-            classe=self.classe,
-            annee_scolaire=self.annee_scolaire,
-            trimestre=self.trimestre,
-            moyenne_generale__isnull=False,
-            statut__in=['VALIDE', 'EN_ATTENTE']
-        )
+        from .grade_engine import arrondir
         
-        if bulletins_classe.exists():
-            moyenne = bulletins_classe.aggregate(
-                moyenne=Avg('moyenne_generale')
-            )['moyenne']
-            return round(moyenne, 2) if moyenne else None
+        resultats = resultats or self.get_resultats_classe()
+        return arrondir(resultats.moyenne_classe)
+    
+    def calculer_effectif_classe(self, resultats=None):
+        """Calcule l'effectif de la classe : élèves inscrits, et non plus bulletins validés"""
+        resultats = resultats or self.get_resultats_classe()
+        return resultats.effectif
+    
+    def appliquer_resultats(self, resultats):
+        """Reporte sur le bulletin les résultats déjà calculés pour la classe"""
+        self.moyenne_generale = self.calculer_moyenne_generale(resultats)
+        self.rang = self.calculer_rang(resultats)
+        self.moyenne_classe = self.calculer_moyenne_classe(resultats)
+        self.effectif_classe = self.calculer_effectif_classe(resultats)
+    
+    def recalculer_tous_les_champs(self, resultats=None):
+        """
+        Recalcule automatiquement tous les champs du bulletin
         
-        return None
-    
-    def calculer_effectif_classe(self):
-        """Calcule l'effectif de la classe"""
-        return Bulletin.objects.filter(
-            classe=self.classe,
-            annee_scolaire=self.annee_scolaire,
-            trimestre=self.trimestre,
-            statut__in=['VALIDE', 'EN_ATTENTE']
-        ).count()
-    
-    def recalculer_tous_les_champs(self):
-        """Recalcule automatiquement tous les champs du bulletin"""
-        # Calculer la moyenne générale
-        self.moyenne_generale = self.calculer_moyenne_generale()
-        
-        # Calculer le rang
-        self.rang = self.calculer_rang()
-        
-        # Calculer la moyenne de la classe
-        self.moyenne_classe = self.calculer_moyenne_classe()
-        
-        # Calculer l'effectif de la classe
-        self.effectif_classe = self.calculer_effectif_classe()
+        Les résultats de la classe peuvent être fournis pour éviter de les
+        recalculer lorsque plusieurs bulletins de la même classe sont traités.
+        """
+        self.appliquer_resultats(resultats or self.get_resultats_classe())
         
         # Sauvegarder les modifications
         self.save(update_fields=['moyenne_generale', 'rang', 'moyenne_classe', 'effectif_classe'])
@@ -701,6 +772,24 @@ class NoteBulletin(models.Model):
         return f"{self.bulletin} - {self.matiere.nom}: {self.moyenne_matiere}"
 
 
+class ProgressionGenerationBulletins(models.Model):
+    """Point de reprise de la génération des bulletins, enregistré par classe"""
+    classe = models.ForeignKey(Classe, on_delete=models.CASCADE, related_name='progressions_bulletins')
+    annee_scolaire = models.CharField(max_length=9, default="2024-2025")
+    trimestre = models.PositiveIntegerField(validators=[MinValueValidator(1), MaxValueValidator(3)])
+    bulletins_generes = models.PositiveIntegerField(default=0)
+    date_traitement = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = "Progression de génération des bulletins"
+        verbose_name_plural = "Progressions de génération des bulletins"
+        unique_together = ['classe', 'annee_scolaire', 'trimestre']
+        ordering = ['-date_traitement']
+    
+    def __str__(self):
+        return f"{self.classe.nom} - Trimestre {self.trimestre} ({self.annee_scolaire})"
+
+
 # =============== MODÈLES POUR LES PLANNINGS ===============
 
 class Salle(models.Model):
@@ -796,6 +885,23 @@ class EmploiDuTemps(models.Model):
             ['classe', 'creneau', 'annee_scolaire', 'semestre'],
             ['classe', 'matiere', 'annee_scolaire', 'semestre']  # Une matière ne peut être assignée qu'à un seul prof par classe
         ]
+        # Index partiels sur les cours actifs : grilles hebdomadaires (préfixe
+        # sans créneau) et détection des conflits (avec créneau). Les conflits
+        # de classe sont servis par l'index de la première contrainte d'unicité.
+        indexes = [
+            models.Index(
+                fields=['professeur', 'annee_scolaire', 'semestre', 'creneau'],
+                name='edt_prof_periode_actif_idx', condition=models.Q(actif=True)
+            ),
+            models.Index(
+                fields=['salle', 'annee_scolaire', 'semestre', 'creneau'],
+                name='edt_salle_periode_actif_idx', condition=models.Q(actif=True)
+            ),
+            models.Index(
+                fields=['creneau', 'annee_scolaire', 'semestre'],
+                name='edt_creneau_periode_actif_idx', condition=models.Q(actif=True)
+            ),
+        ]
     
     def __str__(self):
         return f"{self.classe} - {self.matiere} - {self.creneau}"
@@ -825,35 +931,29 @@ class EmploiDuTemps(models.Model):
                     f"semestre {self.semestre}."
                 )
     
+    def conflits(self):
+        """
+        Cours qui partagent le créneau et le professeur, la salle ou la classe :
+        dimension → cours, préchargés par conflits_emploi.annoter() ou chargés
+        ici en une requête
+        """
+        if getattr(self, 'conflits_precharges', None) is None:
+            from .conflits_emploi import ConflitsEmploi
+            moteur = ConflitsEmploi.charger(self.annee_scolaire, self.semestre, creneaux=[self.creneau_id])
+            self.conflits_precharges = moteur.conflits_de(self)
+        return self.conflits_precharges
+    
     def conflit_professeur(self):
         """Vérifie s'il y a un conflit avec un autre cours du professeur"""
-        return EmploiDuTemps.objects.filter(
-            professeur=self.professeur,
-            creneau=self.creneau,
-            annee_scolaire=self.annee_scolaire,
-            semestre=self.semestre,
-            actif=True
-        ).exclude(pk=self.pk).exists()
+        return bool(self.conflits()['professeur'])
     
     def conflit_salle(self):
         """Vérifie s'il y a un conflit avec une autre utilisation de la salle"""
-        return EmploiDuTemps.objects.filter(
-            salle=self.salle,
-            creneau=self.creneau,
-            annee_scolaire=self.annee_scolaire,
-            semestre=self.semestre,
-            actif=True
-        ).exclude(pk=self.pk).exists()
+        return bool(self.conflits()['salle'])
     
     def conflit_classe(self):
         """Vérifie s'il y a un conflit avec un autre cours de la classe"""
-        return EmploiDuTemps.objects.filter(
-            classe=self.classe,
-            creneau=self.creneau,
-            annee_scolaire=self.annee_scolaire,
-            semestre=self.semestre,
-            actif=True
-        ).exclude(pk=self.pk).exists()
+        return bool(self.conflits()['classe'])
     
     def a_des_conflits(self):
         """Vérifie s'il y a des conflits"""
@@ -1009,6 +1109,9 @@ class Conversation(models.Model):
     date_creation = models.DateTimeField(auto_now_add=True)
     date_modification = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
+    # Activité, tenue à jour à l'envoi de chaque message
+    dernier_message = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    date_dernier_message = models.DateTimeField(null=True, blank=True, db_index=True)
     
     class Meta:
         verbose_name = "Conversation"
@@ -1027,6 +1130,8 @@ class Conversation(models.Model):
     
     def get_last_message(self):
         """Retourne le dernier message de la conversation"""
+        if self.dernier_message_id is not None:
+            return self.dernier_message
         return self.messages.order_by('-date_envoi').first()
     
     def get_unread_count(self, user):
@@ -1061,12 +1166,18 @@ class Participant(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversations_participant')
     date_ajout = models.DateTimeField(auto_now_add=True)
     actif = models.BooleanField(default=True)
+    # État de lecture du participant dans la conversation
+    dernier_message_lu = models.ForeignKey('Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    nombre_non_lus = models.PositiveIntegerField(default=0)
     
     class Meta:
         verbose_name = "Participant"
         verbose_name_plural = "Participants"
         unique_together = ['conversation', 'user']
         ordering = ['date_ajout']
+        indexes = [
+            models.Index(fields=['user', 'actif'], name='participant_user_actif_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.get_full_name()} dans {self.conversation.titre}"
@@ -1085,6 +1196,10 @@ class Message(models.Model):
         verbose_name = "Message"
         verbose_name_plural = "Messages"
         ordering = ['date_envoi']
+        indexes = [
+            # Pagination par curseur des messages d'une conversation
+            models.Index(fields=['conversation', 'date_envoi', 'id'], name='message_conv_date_id_idx'),
+        ]
     
     def __str__(self):
         return f"Message de {self.expediteur.get_full_name()} dans {self.conversation.titre}"
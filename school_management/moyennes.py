@@ -0,0 +1,204 @@
+"""
+Maintenance de la table agrégée MoyenneEleveMatiere
+
+Chaque ligne résume les notes d'un élève dans une matière pour un trimestre et
+une année scolaire (nombre, somme, somme pondérée, min et max). Les lignes
+touchées par une saisie sont recalculées en une requête groupée ; les pages
+qui affichent des moyennes lisent ensuite ces agrégats au lieu de parcourir
+toutes les notes de l'élève.
+"""
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from .analytics import invalider_analyse_resultats
+from .models import MoyenneEleveMatiere, Note
+
+
+CHAMPS_AGREGATS = [
+    'nombre_notes', 'somme_notes', 'somme_ponderee', 'somme_coefficients',
+    'note_min', 'note_max', 'date_mise_a_jour'
+]
+
+_etat = threading.local()
+
+
+def cle_note(note):
+    """Clé (eleve, matière, trimestre, année) de l'agrégat concerné par une note"""
+    evaluation = note.evaluation
+    return (note.eleve_id, evaluation.matiere_id, evaluation.trimestre, evaluation.annee_scolaire)
+
+
+def _agreger(lignes):
+    """Construit les agrégats à partir de lignes (clé, note, note_sur, coefficient)"""
+    agregats = {}
+    for cle, note, note_sur, coefficient in lignes:
+        note_sur_20 = (note * 20) / note_sur if note_sur and note_sur != 20 else note
+        coefficient = coefficient or Decimal('1')
+
+        agregat = agregats.get(cle)
+        if agregat is None:
+            agregats[cle] = agregat = {
+                'nombre_notes': 0,
+                'somme_notes': Decimal('0'),
+                'somme_ponderee': Decimal('0'),
+                'somme_coefficients': Decimal('0'),
+                'note_min': note,
+                'note_max': note,
+            }
+        agregat['nombre_notes'] += 1
+        agregat['somme_notes'] += note
+        agregat['somme_ponderee'] += note_sur_20 * coefficient
+        agregat['somme_coefficients'] += coefficient
+        agregat['note_min'] = min(agregat['note_min'], note)
+        agregat['note_max'] = max(agregat['note_max'], note)
+    return agregats
+
+
+def _lignes_notes(queryset, chunk_size=None):
+    lignes = queryset.values_list(
+        'eleve_id', 'evaluation__matiere_id', 'evaluation__trimestre', 'evaluation__annee_scolaire',
+        'note', 'evaluation__note_sur', 'evaluation__coefficient'
+    )
+    if chunk_size:
+        lignes = lignes.iterator(chunk_size=chunk_size)
+    for eleve_id, matiere_id, trimestre, annee_scolaire, note, note_sur, coefficient in lignes:
+        yield (eleve_id, matiere_id, trimestre, annee_scolaire), note, note_sur, coefficient
+
+
+def _instancier(agregats):
+    return [
+        MoyenneEleveMatiere(
+            eleve_id=eleve_id,
+            matiere_id=matiere_id,
+            trimestre=trimestre,
+            annee_scolaire=annee_scolaire,
+            somme_ponderee=agregat.pop('somme_ponderee').quantize(Decimal('0.0001')),
+            **agregat
+        )
+        for (eleve_id, matiere_id, trimestre, annee_scolaire), agregat in agregats.items()
+    ]
+
+
+def recalculer_moyennes(cles):
+    """
+    Recalcule les agrégats correspondant aux clés données
+
+    Une requête de lecture des notes concernées, un upsert groupé des agrégats
+    non vides et une suppression des agrégats devenus vides. L'instantané de
+    l'analyse des résultats, qui dépend des mêmes notes, est invalidé.
+    """
+    cles = set(cles)
+    if getattr(_etat, 'en_attente', None) is not None:
+        _etat.en_attente.update(cles)
+        return
+    if not cles:
+        return
+
+    eleve_ids, matiere_ids, trimestres, annees = (set(valeurs) for valeurs in zip(*cles))
+    notes = Note.objects.filter(
+        eleve_id__in=eleve_ids,
+        evaluation__matiere_id__in=matiere_ids,
+        evaluation__trimestre__in=trimestres,
+        evaluation__annee_scolaire__in=annees,
+        note__isnull=False
+    )
+    agregats = {
+        cle: agregat
+        for cle, agregat in _agreger(_lignes_notes(notes)).items()
+        if cle in cles
+    }
+
+    vides = cles - set(agregats)
+    with transaction.atomic():
+        MoyenneEleveMatiere.objects.bulk_create(
+            _instancier(agregats),
+            update_conflicts=True,
+            unique_fields=['eleve', 'matiere', 'trimestre', 'annee_scolaire'],
+            update_fields=CHAMPS_AGREGATS,
+            batch_size=500
+        )
+        if vides:
+            filtre = Q()
+            for eleve_id, matiere_id, trimestre, annee_scolaire in vides:
+                filtre |= Q(eleve_id=eleve_id, matiere_id=matiere_id,
+                            trimestre=trimestre, annee_scolaire=annee_scolaire)
+            MoyenneEleveMatiere.objects.filter(filtre).delete()
+
+    invalider_analyse_resultats()
+
+
+@contextmanager
+def differer_moyennes():
+    """
+    Regroupe les recalculs déclenchés dans le bloc en un seul recalcul final
+
+    Utilisé par les saisies en masse pour éviter un recalcul par note enregistrée.
+    """
+    if getattr(_etat, 'en_attente', None) is not None:
+        # Déjà dans un bloc différé : le bloc englobant fera le recalcul
+        yield
+        return
+
+    _etat.en_attente = set()
+    try:
+        yield
+    finally:
+        cles = _etat.en_attente
+        _etat.en_attente = None
+    recalculer_moyennes(cles)
+
+
+def reconstruire_moyennes():
+    """Reconstruit entièrement la table à partir des notes, retourne le nombre de lignes"""
+    notes = Note.objects.filter(note__isnull=False).order_by()
+    agregats = _agreger(_lignes_notes(notes, chunk_size=5000))
+    with transaction.atomic():
+        MoyenneEleveMatiere.objects.all().delete()
+        MoyenneEleveMatiere.objects.bulk_create(_instancier(agregats), batch_size=1000)
+    invalider_analyse_resultats()
+    return len(agregats)
+
+
+# =============== LECTURE ===============
+
+def moyennes_par_matiere(eleve_ids, ponderee=False, **filtres):
+    """
+    Retourne {eleve_id: {matière: moyenne}} en une requête
+
+    Sans pondération, la moyenne est celle des notes brutes ; avec
+    pondération, celle des notes sur 20 pondérée par les coefficients des
+    évaluations. Les filtres optionnels (trimestre, annee_scolaire)
+    restreignent les agrégats pris en compte.
+    """
+    cumuls = defaultdict(lambda: defaultdict(lambda: [Decimal('0'), Decimal('0')]))
+    agregats = MoyenneEleveMatiere.objects.filter(
+        eleve_id__in=eleve_ids, **filtres
+    ).select_related('matiere')
+
+    for agregat in agregats:
+        cumul = cumuls[agregat.eleve_id][agregat.matiere]
+        if ponderee:
+            cumul[0] += agregat.somme_ponderee
+            cumul[1] += agregat.somme_coefficients
+        else:
+            cumul[0] += agregat.somme_notes
+            cumul[1] += agregat.nombre_notes
+
+    return {
+        eleve_id: {
+            matiere: round(float(total / poids), 2)
+            for matiere, (total, poids) in par_matiere.items()
+            if poids
+        }
+        for eleve_id, par_matiere in cumuls.items()
+    }
+
+
+def moyennes_eleve(eleve, ponderee=False, **filtres):
+    """Retourne {matière: moyenne} pour un élève"""
+    return moyennes_par_matiere([eleve.pk], ponderee=ponderee, **filtres).get(eleve.pk, {})
@@ -0,0 +1,229 @@
+"""
+Pagination par curseur (keyset)
+
+Une page est délimitée par les valeurs des champs de tri de l'élément qui la
+borde, et non par un numéro de page : pas de COUNT(*) ni d'OFFSET, la
+requête reste un parcours d'index de longueur constante quelle que soit la
+position dans la liste. Le dernier champ de tri doit être unique (id) pour
+que l'ordre soit total.
+
+Les curseurs sont opaques pour le client : valeurs des champs de tri en JSON,
+encodées en base64 URL.
+
+Pour les listes paginées (vues génériques avec PaginationCurseurMixin, vues
+fonctions avec paginer_requete), les curseurs circulent dans les paramètres
+GET apres / avant, à côté des filtres de la page. Le nombre total de lignes
+n'est calculé qu'à la demande, borné ou estimé (compter_approximativement).
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import Q
+
+
+# Au-delà, le nombre de lignes est estimé au lieu d'être compté
+LIMITE_COMPTE = 10000
+PARAMETRES_PAGINATION = ('apres', 'avant', 'page')
+
+
+class CurseurInvalide(ValueError):
+    """Curseur illisible ou ne correspondant pas aux champs de tri"""
+
+
+def _champs(ordre):
+    return [(champ.lstrip('-'), champ.startswith('-')) for champ in ordre]
+
+
+def _valeur_json(valeur):
+    # isoformat garde les microsecondes, que DjangoJSONEncoder tronque
+    if hasattr(valeur, 'isoformat'):
+        return valeur.isoformat()
+    return str(valeur)
+
+
+def encoder_curseur(objet, ordre):
+    valeurs = [getattr(objet, nom) for nom, _ in _champs(ordre)]
+    brut = json.dumps(valeurs, default=_valeur_json, separators=(',', ':'))
+    return base64.urlsafe_b64encode(brut.encode()).decode().rstrip('=')
+
+
+def decoder_curseur(curseur, modele, ordre):
+    champs = _champs(ordre)
+    try:
+        brut = base64.urlsafe_b64decode(curseur + '=' * (-len(curseur) % 4))
+        valeurs = json.loads(brut)
+    except (ValueError, TypeError):
+        raise CurseurInvalide(curseur)
+    # null serait refusé par filter() : les champs de tri ne sont jamais nuls
+    if not isinstance(valeurs, list) or len(valeurs) != len(champs) or None in valeurs:
+        raise CurseurInvalide(curseur)
+    try:
+        return [modele._meta.get_field(nom).to_python(valeur) for (nom, _), valeur in zip(champs, valeurs)]
+    except (ValidationError, TypeError, ValueError):
+        # to_python laisse passer TypeError pour un objet ou une liste JSON à la place d'une date
+        raise CurseurInvalide(curseur)
+
+
+def _apres(ordre, valeurs):
+    """Condition « strictement après valeurs » dans l'ordre donné"""
+    condition = Q()
+    egalites = {}
+    for (nom, decroissant), valeur in zip(_champs(ordre), valeurs):
+        comparaison = 'lt' if decroissant else 'gt'
+        condition |= Q(**egalites, **{f'{nom}__{comparaison}': valeur})
+        egalites[nom] = valeur
+    return condition
+
+
+def _inverser(ordre):
+    return [champ[1:] if champ.startswith('-') else f'-{champ}' for champ in ordre]
+
+
+class PageCurseur:
+    """Page de résultats avec les curseurs des pages voisines"""
+
+    def __init__(self, objets, ordre, a_precedente, a_suivante):
+        self.object_list = objets
+        self.ordre = ordre
+        self.has_previous = a_precedente and bool(objets)
+        self.has_next = a_suivante and bool(objets)
+        # Renseignés par paginer_requete
+        self.parametres = None
+        self.compte = None
+        self.compte_exact = True
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    @property
+    def curseur_precedent(self):
+        return encoder_curseur(self.object_list[0], self.ordre) if self.has_previous else None
+
+    @property
+    def curseur_suivant(self):
+        return encoder_curseur(self.object_list[-1], self.ordre) if self.has_next else None
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    def _lien(self, **curseur):
+        parametres = self.parametres.copy()
+        for nom, valeur in curseur.items():
+            parametres[nom] = valeur
+        return f'?{parametres.urlencode()}' if parametres else '?'
+
+    @property
+    def lien_premiere(self):
+        return self._lien()
+
+    @property
+    def lien_precedent(self):
+        return self._lien(avant=self.curseur_precedent) if self.has_previous else None
+
+    @property
+    def lien_suivant(self):
+        return self._lien(apres=self.curseur_suivant) if self.has_next else None
+
+    @property
+    def lien_derniere(self):
+        return self._lien(avant='') if self.has_next else None
+
+
+def paginer_par_curseur(queryset, ordre, taille, avant=None, apres=None, depuis_la_fin=False):
+    """
+    Retourne la PageCurseur de taille éléments au plus
+
+    apres : éléments qui suivent ce curseur ; avant : éléments qui le
+    précèdent. Sans curseur, première page, ou dernière si depuis_la_fin
+    (par exemple les messages les plus récents d'une conversation).
+    Lève CurseurInvalide pour un curseur mal formé.
+    """
+    modele = queryset.model
+    if apres:
+        lignes = list(queryset.filter(_apres(ordre, decoder_curseur(apres, modele, ordre))).order_by(*ordre)[:taille + 1])
+        return PageCurseur(lignes[:taille], ordre, True, len(lignes) > taille)
+
+    if avant or depuis_la_fin:
+        inverse = _inverser(ordre)
+        if avant:
+            queryset = queryset.filter(_apres(inverse, decoder_curseur(avant, modele, ordre)))
+        lignes = list(queryset.order_by(*inverse)[:taille + 1])
+        objets = lignes[:taille][::-1]
+        return PageCurseur(objets, ordre, len(lignes) > taille, bool(avant))
+
+    lignes = list(queryset.order_by(*ordre)[:taille + 1])
+    return PageCurseur(lignes[:taille], ordre, False, len(lignes) > taille)
+
+
+def compter_approximativement(queryset, limite=LIMITE_COMPTE):
+    """
+    Nombre de lignes du queryset, exact jusqu'à limite
+
+    Retourne (nombre, exact). Au-delà de limite, le comptage s'arrête : sous
+    PostgreSQL le nombre est alors l'estimation du planificateur, ailleurs
+    la limite elle-même (« plus de »).
+    """
+    nombre = queryset.order_by()[:limite + 1].count()
+    if nombre <= limite:
+        return nombre, True
+
+    connexion = connections[queryset.db]
+    if connexion.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connexion.cursor() as curseur:
+            curseur.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = curseur.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return max(int(plan[0]['Plan']['Plan Rows']), nombre), False
+    return limite, False
+
+
+def paginer_requete(request, queryset, ordre, taille, compte_approximatif=False):
+    """
+    Page de la liste désignée par les paramètres GET apres / avant
+
+    avant vide désigne la dernière page. Un curseur invalide (lien périmé,
+    saisie manuelle) ramène à la première page. Les autres paramètres GET
+    (filtres) sont conservés dans les liens de la page.
+    """
+    apres = request.GET.get('apres')
+    avant = request.GET.get('avant')
+    try:
+        page = paginer_par_curseur(
+            queryset, ordre, taille, avant=avant or None, apres=apres, depuis_la_fin=avant == ''
+        )
+    except CurseurInvalide:
+        page = paginer_par_curseur(queryset, ordre, taille)
+
+    page.parametres = request.GET.copy()
+    for nom in PARAMETRES_PAGINATION:
+        page.parametres.pop(nom, None)
+    if compte_approximatif:
+        page.compte, page.compte_exact = compter_approximativement(queryset)
+    return page
+
+
+class PaginationCurseurMixin:
+    """
+    Pagination par curseur pour les ListView
+
+    Remplace la pagination par numéro de page (COUNT(*) et OFFSET) : le
+    contexte garde page_obj et is_paginated, paginator vaut None. ordre_curseur
+    doit se terminer par un champ unique et correspondre à un index.
+    """
+    ordre_curseur = ('-id',)
+    compte_approximatif = False
+
+    def paginate_queryset(self, queryset, page_size):
+        page = paginer_requete(self.request, queryset, self.ordre_curseur, page_size, self.compte_approximatif)
+        return None, page, page.object_list, page.has_other_pages
@@ -2,8 +2,9 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.db.models import Q
-from django.core.paginator import Paginator
-from .models import Eleve, Note, Absence, Communication, Evaluation, Matiere, Conversation, Message
+from .models import Eleve, Note, Absence, Communication, Evaluation, Matiere, Conversation
+from .dashboard_cache import contexte_dashboard
+from .pagination import paginer_requete
 
 
 @login_required
@@ -20,80 +21,58 @@ def parent_dashboard(request):
     except:
         raise PermissionDenied("Profil parent non trouvé")
     
-    # Récupérer tous les enfants du parent
-    enfants = parent.eleves.all()
-    
-    # Statistiques générales
-    total_enfants = enfants.count()
-    total_absences = Absence.objects.filter(eleve__in=enfants).count()
-    total_notes = Note.objects.filter(eleve__in=enfants).count()
-    
-    # Absences récentes
-    absences_recentes = Absence.objects.filter(
-        eleve__in=enfants
-    ).order_by('-date_debut')[:5]
-    
-    # Notes récentes
-    notes_recentes = Note.objects.filter(
-        eleve__in=enfants
-    ).select_related('evaluation', 'evaluation__matiere').order_by('-date_saisie')[:10]
-    
-    # Communications récentes
-    communications_recentes = Communication.objects.filter(
-        Q(destinataires__in=['TOUS', 'PARENTS']) |
-        Q(destinataires='CLASSE', classe_cible__in=enfants.values_list('classe', flat=True))
-    ).filter(active=True).order_by('-date_creation')[:5]
-    
-    # Données de messagerie
-    conversations_count = Conversation.objects.filter(
-        participants__user=request.user,
-        participants__actif=True,
-        active=True
-    ).count()
-    
-    unread_messages_count = Message.objects.filter(
-        conversation__participants__user=request.user,
-        conversation__participants__actif=True,
-        lu=False
-    ).exclude(expediteur=request.user).count()
-    
-    recent_conversations = Conversation.objects.filter(
-        participants__user=request.user,
-        participants__actif=True,
-        active=True
-    ).order_by('-date_modification')[:5]
-    
-    # Moyennes par enfant et par matière
-    moyennes_par_enfant = {}
-    for enfant in enfants:
-        moyennes_par_matiere = {}
-        notes_enfant = Note.objects.filter(eleve=enfant, note__isnull=False)
+    def calculer():
+        from .moyennes import moyennes_par_matiere
+        from .messagerie import compteurs_messagerie
+        
+        # Récupérer tous les enfants du parent
+        enfants = list(parent.eleves.select_related('user', 'classe'))
+        enfant_ids = [enfant.pk for enfant in enfants]
         
-        for note in notes_enfant:
-            matiere = note.evaluation.matiere
-            if matiere not in moyennes_par_matiere:
-                moyennes_par_matiere[matiere] = []
-            moyennes_par_matiere[matiere].append(float(note.note))
+        # Absences récentes
+        absences_recentes = Absence.objects.filter(
+            eleve_id__in=enfant_ids
+        ).select_related('eleve__user').order_by('-date_debut')[:5]
         
-        # Calculer les moyennes
-        for matiere, notes in moyennes_par_matiere.items():
-            moyennes_par_matiere[matiere] = round(sum(notes) / len(notes), 2)
+        # Notes récentes
+        notes_recentes = Note.objects.filter(
+            eleve_id__in=enfant_ids
+        ).select_related('eleve__user', 'evaluation', 'evaluation__matiere').order_by('-date_saisie')[:10]
         
-        moyennes_par_enfant[enfant] = moyennes_par_matiere
+        # Communications récentes
+        communications_recentes = Communication.objects.filter(
+            Q(destinataires__in=['TOUS', 'PARENTS']) |
+            Q(destinataires='CLASSE', classe_cible__in={enfant.classe_id for enfant in enfants})
+        ).filter(active=True).order_by('-date_creation')[:5]
+        
+        recent_conversations = Conversation.objects.filter(
+            participants__user=request.user,
+            participants__actif=True,
+            active=True
+        ).prefetch_related('participants').order_by('-date_modification')[:5]
+        
+        # Moyennes par enfant et par matière, lues dans la table agrégée
+        moyennes = moyennes_par_matiere(enfant_ids)
+        
+        return {
+            'enfants': enfants,
+            'total_enfants': len(enfants),
+            'total_absences': Absence.objects.filter(eleve_id__in=enfant_ids).count(),
+            'total_notes': Note.objects.filter(eleve_id__in=enfant_ids).count(),
+            'absences_recentes': list(absences_recentes),
+            'notes_recentes': list(notes_recentes),
+            'communications_recentes': list(communications_recentes),
+            'moyennes_par_enfant': {enfant: moyennes.get(enfant.pk, {}) for enfant in enfants},
+            'recent_conversations': list(recent_conversations),
+            **compteurs_messagerie(request.user),
+        }
+    
+    portees = ['structure', 'communications', f'user:{request.user.pk}']
+    portees += [f'eleve:{eleve_id}' for eleve_id in parent.eleves.values_list('id', flat=True)]
     
     context = {
         'parent': parent,
-        'enfants': enfants,
-        'total_enfants': total_enfants,
-        'total_absences': total_absences,
-        'total_notes': total_notes,
-        'absences_recentes': absences_recentes,
-        'notes_recentes': notes_recentes,
-        'communications_recentes': communications_recentes,
-        'moyennes_par_enfant': moyennes_par_enfant,
-        'conversations_count': conversations_count,
-        'unread_messages_count': unread_messages_count,
-        'recent_conversations': recent_conversations,
+        **contexte_dashboard('parent', parent.pk, portees, calculer),
     }
     
     return render(request, 'school_management/dashboards/parent.html', context)
@@ -124,17 +103,9 @@ def parent_enfant_detail(request, eleve_id):
     absences = Absence.objects.filter(eleve=enfant).order_by('-date_debut')
     evaluations = Evaluation.objects.filter(classe=enfant.classe).order_by('-date_evaluation')
     
-    # Calculer les moyennes par matière
-    moyennes_par_matiere = {}
-    for note in notes.filter(note__isnull=False):
-        matiere = note.evaluation.matiere
-        if matiere not in moyennes_par_matiere:
-            moyennes_par_matiere[matiere] = []
-        moyennes_par_matiere[matiere].append(float(note.note))
-    
-    # Calculer les moyennes finales
-    for matiere, notes_list in moyennes_par_matiere.items():
-        moyennes_par_matiere[matiere] = round(sum(notes_list) / len(notes_list), 2)
+    # Moyennes par matière lues dans la table agrégée
+    from .moyennes import moyennes_eleve
+    moyennes_par_matiere = moyennes_eleve(enfant)
     
     # Statistiques
     total_notes = notes.count()
@@ -194,10 +165,8 @@ def parent_notes(request):
     if matiere_id:
         notes = notes.filter(evaluation__matiere_id=matiere_id)
     
-    # Pagination
-    paginator = Paginator(notes, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur, servie par l'index (eleve, date_saisie, id)
+    page_obj = paginer_requete(request, notes, ('-date_saisie', '-id'), 20)
     
     # Récupérer les matières pour le filtre
     matieres = Matiere.objects.filter(
@@ -255,10 +224,8 @@ def parent_absences(request):
     elif justifiee == 'false':
         absences = absences.filter(justifiee=False)
     
-    # Pagination
-    paginator = Paginator(absences, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Pagination par curseur, servie par l'index (eleve, date_debut, id)
+    page_obj = paginer_requete(request, absences, ('-date_debut', '-id'), 20)
     
     context = {
         'parent': parent,
@@ -3,19 +3,22 @@ from django.shortcuts import get_object_or_404
 from django.contrib.auth.mixins import LoginRequiredMixin
 from functools import wraps
 from .models import Eleve, Professeur
+from .roles import determiner_role
 
 
 def get_user_type(user):
-    """Détermine le type d'utilisateur"""
-    if hasattr(user, 'eleve'):
-        return 'eleve'
-    elif hasattr(user, 'professeur'):
-        return 'professeur'
-    elif hasattr(user, 'parent'):
-        return 'parent'
-    elif user.is_staff or user.is_superuser:
-        return 'admin'
-    return None
+    """
+    Détermine le type d'utilisateur
+
+    Le résultat est mémorisé sur l'instance : request.user, déjà résolu par
+    RoleUtilisateurMiddleware, ne coûte aucune requête.
+    """
+    if not hasattr(user, '_type_utilisateur'):
+        user_type, _ = determiner_role(user)
+        if not user.is_authenticated:
+            return user_type
+        user._type_utilisateur = user_type
+    return user._type_utilisateur
 
 
 def eleve_required(view_func):
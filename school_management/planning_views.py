@@ -7,10 +7,11 @@ from django.http import JsonResponse
 from django.views.generic import (
     ListView, DetailView, CreateView, UpdateView, DeleteView, TemplateView
 )
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.db.models import Q
 from django.utils import timezone
-from datetime import datetime, timedelta
+from collections import Counter
+from datetime import date, datetime, timedelta
 
 from .models import (
     Salle, Creneau, EmploiDuTemps, EvenementCalendrier, ReservationSalle,
@@ -18,7 +19,7 @@ from .models import (
 )
 from .forms import (
     SalleForm, CreneauForm, EmploiDuTempsForm, EvenementCalendrierForm,
-    ReservationSalleForm, ValidationReservationForm
+    ReservationSalleForm, ValidationReservationForm, GenerationEmploiForm
 )
 from .permissions import get_user_type
 
@@ -228,7 +229,11 @@ class EmploiDuTempsListView(LoginRequiredMixin, ListView):
         return queryset.order_by('classe', 'creneau__jour', 'creneau__heure_debut')
     
     def get_context_data(self, **kwargs):
+        from .conflits_emploi import annoter
+
         context = super().get_context_data(**kwargs)
+        # Conflits de la page en une requête par période, au lieu de trois par cours
+        annoter(context['emplois'])
         context['classes'] = Classe.objects.all().order_by('niveau', 'nom')
         context['professeurs'] = Professeur.objects.all().order_by('user__last_name')
         return context
@@ -323,29 +328,15 @@ class EmploiDuTempsDeleteView(LoginRequiredMixin, DeleteView):
 @login_required
 def emploi_du_temps_classe(request, classe_id):
     """Vue pour afficher l'emploi du temps d'une classe"""
+    from .grille_emploi import grille_classe
+
     classe = get_object_or_404(Classe, pk=classe_id)
     annee_scolaire = request.GET.get('annee_scolaire', '2024-2025')
     semestre = request.GET.get('semestre', 1)
     
-    emplois = EmploiDuTemps.objects.filter(
-        classe=classe,
-        annee_scolaire=annee_scolaire,
-        semestre=semestre,
-        actif=True
-    ).select_related('matiere', 'professeur', 'salle', 'creneau').order_by(
-        'creneau__jour', 'creneau__heure_debut'
-    )
-    
-    # Organiser par jour et créneau
-    emplois_par_jour = {}
-    jours = ['LUNDI', 'MARDI', 'MERCREDI', 'JEUDI', 'VENDREDI', 'SAMEDI']
-    
-    for jour in jours:
-        emplois_par_jour[jour] = emplois.filter(creneau__jour=jour)
-    
     context = {
         'classe': classe,
-        'emplois_par_jour': emplois_par_jour,
+        'grille': grille_classe(classe.pk, annee_scolaire, semestre),
         'annee_scolaire': annee_scolaire,
         'semestre': semestre,
     }
@@ -356,34 +347,96 @@ def emploi_du_temps_classe(request, classe_id):
 @login_required
 def emploi_du_temps_professeur(request, professeur_id):
     """Vue pour afficher l'emploi du temps d'un professeur"""
-    professeur = get_object_or_404(Professeur, pk=professeur_id)
+    from .grille_emploi import grille_professeur
+
+    professeur = get_object_or_404(Professeur.objects.select_related('user'), pk=professeur_id)
     annee_scolaire = request.GET.get('annee_scolaire', '2024-2025')
     semestre = request.GET.get('semestre', 1)
     
-    emplois = EmploiDuTemps.objects.filter(
-        professeur=professeur,
-        annee_scolaire=annee_scolaire,
-        semestre=semestre,
-        actif=True
-    ).select_related('classe', 'matiere', 'salle', 'creneau').order_by(
-        'creneau__jour', 'creneau__heure_debut'
-    )
+    context = {
+        'professeur': professeur,
+        'grille': grille_professeur(professeur.pk, annee_scolaire, semestre),
+        'annee_scolaire': annee_scolaire,
+        'semestre': semestre,
+    }
     
-    # Organiser par jour et créneau
-    emplois_par_jour = {}
-    jours = ['LUNDI', 'MARDI', 'MERCREDI', 'JEUDI', 'VENDREDI', 'SAMEDI']
+    return render(request, 'school_management/planning/emploi_professeur.html', context)
+
+
+@login_required
+def rapport_conflits_emploi(request):
+    """Vue pour lister tous les conflits de l'emploi du temps d'une année scolaire et d'un semestre"""
+    from .conflits_emploi import ConflitsEmploi
+
+    if get_user_type(request.user) != 'admin':
+        raise PermissionDenied("Accès réservé aux administrateurs.")
     
-    for jour in jours:
-        emplois_par_jour[jour] = emplois.filter(creneau__jour=jour)
+    annee_scolaire = request.GET.get('annee_scolaire', '2024-2025')
+    semestre = request.GET.get('semestre', 1)
+    
+    # Tout l'emploi du temps en une requête, les conflits en un passage
+    moteur = ConflitsEmploi.charger(
+        annee_scolaire, semestre,
+        select_related=('classe', 'matiere', 'professeur__user', 'salle', 'creneau')
+    )
+    ordre_jours = [jour for jour, _ in Creneau.JOURS_SEMAINE]
+    conflits = sorted(
+        (
+            {'dimension': dimension, 'ressource': getattr(cours[0], dimension), 'creneau': cours[0].creneau,
+             'cours': cours}
+            for dimension, _, _, cours in moteur.tous()
+        ),
+        key=lambda conflit: (ordre_jours.index(conflit['creneau'].jour), conflit['creneau'].heure_debut)
+    )
     
     context = {
-        'professeur': professeur,
-        'emplois_par_jour': emplois_par_jour,
+        'conflits': conflits,
+        'totaux': Counter(conflit['dimension'] for conflit in conflits),
         'annee_scolaire': annee_scolaire,
         'semestre': semestre,
     }
     
-    return render(request, 'school_management/planning/emploi_professeur.html', context)
+    return render(request, 'school_management/planning/conflits_emploi.html', context)
+
+
+@login_required
+def generer_emploi_du_temps(request):
+    """Vue pour générer automatiquement l'emploi du temps d'un semestre"""
+    from .generation_emploi import generer_emploi_du_temps as generer
+
+    if get_user_type(request.user) != 'admin':
+        raise PermissionDenied("Accès réservé aux administrateurs.")
+    
+    indicateurs = None
+    form = GenerationEmploiForm(request.POST or None)
+    if request.method == 'POST' and form.is_valid():
+        donnees = form.cleaned_data
+        try:
+            # Une seule recherche dans la requête : les recherches parallèles passent par la commande
+            indicateurs, ignorees, _ = generer(
+                donnees['annee_scolaire'], donnees['semestre'], donnees['classes'] or None, donnees['duree'],
+                remplacer=donnees['remplacer'], simulation=donnees['simulation']
+            )
+        except ValueError as erreur:
+            messages.error(request, str(erreur))
+        else:
+            if ignorees:
+                messages.warning(
+                    request, f"Classes déjà planifiées ignorées : {', '.join(ignorees)}."
+                )
+            if not donnees['simulation'] and indicateurs['cours']:
+                messages.success(
+                    request, f"{indicateurs['cours']} cours générés (score {indicateurs['score']}/100)."
+                )
+                return redirect(
+                    f"{reverse('school_management:emploi_list')}?annee_scolaire={donnees['annee_scolaire']}"
+                    f"&semestre={donnees['semestre']}"
+                )
+    
+    return render(request, 'school_management/planning/generer_emploi.html', {
+        'form': form,
+        'indicateurs': indicateurs,
+    })
 
 
 # =============== VUES POUR LE CALENDRIER ===============
@@ -606,83 +659,76 @@ def valider_reservation(request, pk):
 
 @login_required
 def get_salles_disponibles(request):
-    """Vue AJAX pour récupérer les salles disponibles à une heure donnée"""
+    """
+    Vue AJAX pour récupérer les salles disponibles à une heure donnée, hors
+    réservations confirmées et cours de l'emploi du temps ; filtres
+    facultatifs capacite_min et type_salle. Avec ?jour=AAAA-MM-JJ au lieu
+    des dates, salles libres à chaque créneau de la semaine du jour.
+    """
+    from .disponibilites import grille_salles_libres, salles_libres
+
     date_debut = request.GET.get('date_debut')
     date_fin = request.GET.get('date_fin')
+    jour = request.GET.get('jour')
+    type_salle = request.GET.get('type_salle') or None
     
-    if not date_debut or not date_fin:
+    if not jour and (not date_debut or not date_fin):
         return JsonResponse({'error': 'Dates manquantes'}, status=400)
     
     try:
-        date_debut = datetime.fromisoformat(date_debut.replace('Z', '+00:00'))
-        date_fin = datetime.fromisoformat(date_fin.replace('Z', '+00:00'))
+        capacite_min = int(request.GET.get('capacite_min') or 0)
+        if jour:
+            jour = date.fromisoformat(jour)
+        else:
+            date_debut = datetime.fromisoformat(date_debut.replace('Z', '+00:00'))
+            date_fin = datetime.fromisoformat(date_fin.replace('Z', '+00:00'))
     except ValueError:
         return JsonResponse({'error': 'Format de date invalide'}, status=400)
     
-    # Salles occupées pendant cette période
-    salles_occupees = ReservationSalle.objects.filter(
-        statut='CONFIRME',
-        date_debut__lt=date_fin,
-        date_fin__gt=date_debut
-    ).values_list('salle_id', flat=True)
+    if jour:
+        # Toute la semaine sous un seul verrou de l'index, au lieu d'un appel par créneau
+        grille = grille_salles_libres(jour, capacite_min, type_salle)
+        return JsonResponse({'creneaux': {str(creneau_id): salles for creneau_id, salles in grille.items()}})
     
-    # Salles disponibles
-    salles_disponibles = Salle.objects.filter(
-        active=True
-    ).exclude(id__in=salles_occupees).values('id', 'nom', 'numero', 'capacite')
+    salles = salles_libres(date_debut, date_fin, capacite_min, type_salle)
     
     return JsonResponse({
-        'salles': list(salles_disponibles)
+        'salles': [
+            {'id': salle['id'], 'nom': salle['nom'], 'numero': salle['numero'], 'capacite': salle['capacite']}
+            for salle in salles
+        ]
     })
 
 
 @login_required
 def get_conflits_emploi(request):
     """Vue AJAX pour vérifier les conflits dans l'emploi du temps"""
-    classe_id = request.GET.get('classe_id')
-    professeur_id = request.GET.get('professeur_id')
-    salle_id = request.GET.get('salle_id')
-    creneau_id = request.GET.get('creneau_id')
+    from .conflits_emploi import ConflitsEmploi
+
     annee_scolaire = request.GET.get('annee_scolaire', '2024-2025')
-    semestre = request.GET.get('semestre', 1)
+    try:
+        ressources = {
+            nom: int(request.GET[nom]) if request.GET.get(nom) else None
+            for nom in ('classe_id', 'professeur_id', 'salle_id', 'creneau_id')
+        }
+        semestre = int(request.GET.get('semestre', 1))
+    except ValueError:
+        return JsonResponse({'error': 'Paramètres invalides'}, status=400)
     
     conflits = []
-    
-    # Conflit professeur
-    if professeur_id and creneau_id:
-        conflit_prof = EmploiDuTemps.objects.filter(
-            professeur_id=professeur_id,
-            creneau_id=creneau_id,
-            annee_scolaire=annee_scolaire,
-            semestre=semestre,
-            actif=True
-        ).first()
-        if conflit_prof:
-            conflits.append(f"Le professeur a déjà un cours à ce créneau ({conflit_prof.classe})")
-    
-    # Conflit salle
-    if salle_id and creneau_id:
-        conflit_salle = EmploiDuTemps.objects.filter(
-            salle_id=salle_id,
-            creneau_id=creneau_id,
-            annee_scolaire=annee_scolaire,
-            semestre=semestre,
-            actif=True
-        ).first()
-        if conflit_salle:
-            conflits.append(f"La salle est déjà occupée à ce créneau ({conflit_salle.classe})")
-    
-    # Conflit classe
-    if classe_id and creneau_id:
-        conflit_classe = EmploiDuTemps.objects.filter(
-            classe_id=classe_id,
-            creneau_id=creneau_id,
-            annee_scolaire=annee_scolaire,
-            semestre=semestre,
-            actif=True
-        ).first()
-        if conflit_classe:
-            conflits.append(f"La classe a déjà un cours à ce créneau ({conflit_classe.matiere})")
+    creneau_id = ressources.pop('creneau_id')
+    if creneau_id:
+        # Cours du créneau chargés en une requête, pour les trois dimensions
+        moteur = ConflitsEmploi.charger(
+            annee_scolaire, semestre, creneaux=[creneau_id], select_related=('classe', 'matiere')
+        )
+        trouves = moteur.conflits(creneau_id, **ressources)
+        if trouves['professeur']:
+            conflits.append(f"Le professeur a déjà un cours à ce créneau ({trouves['professeur'][0].classe})")
+        if trouves['salle']:
+            conflits.append(f"La salle est déjà occupée à ce créneau ({trouves['salle'][0].classe})")
+        if trouves['classe']:
+            conflits.append(f"La classe a déjà un cours à ce créneau ({trouves['classe'][0].matiere})")
     
     return JsonResponse({
         'conflits': conflits,
@@ -693,6 +739,8 @@ def get_conflits_emploi(request):
 @login_required
 def emploi_du_temps_eleve(request):
     """Vue pour l'emploi du temps d'un élève"""
+    from .grille_emploi import grille_classe, semestre_courant
+
     user_type = get_user_type(request.user)
     
     if user_type != 'eleve':
@@ -703,28 +751,10 @@ def emploi_du_temps_eleve(request):
     except:
         raise PermissionDenied("Profil élève non trouvé.")
     
-    # Récupérer l'emploi du temps de la classe de l'élève
-    emplois = EmploiDuTemps.objects.filter(
-        classe=eleve.classe,
-        actif=True
-    ).select_related('matiere', 'professeur', 'salle', 'creneau').order_by('creneau__jour', 'creneau__heure_debut')
-    
-    # Organiser par jour et créneau
-    emploi_par_jour = {}
-    jours = ['LUNDI', 'MARDI', 'MERCREDI', 'JEUDI', 'VENDREDI', 'SAMEDI']
-    
-    # Récupérer tous les créneaux pour construire la grille
-    creneaux = Creneau.objects.all().order_by('heure_debut')
-    
-    for jour in jours:
-        emploi_par_jour[jour] = {}
-        for creneau in creneaux:
-            emploi_par_jour[jour][creneau.id] = None
-    
-    # Remplir avec les emplois existants
-    for emploi in emplois:
-        if emploi.creneau.jour in emploi_par_jour:
-            emploi_par_jour[emploi.creneau.jour][emploi.creneau.id] = emploi
+    # Emploi du temps de la classe pour l'année de la classe et le semestre en cours, sauf choix contraire
+    annee_scolaire = request.GET.get('annee_scolaire', eleve.classe.annee_scolaire)
+    semestre = request.GET.get('semestre', semestre_courant())
+    grille = grille_classe(eleve.classe_id, annee_scolaire, semestre)
     
     # Récupérer les événements de la classe
     evenements = EvenementCalendrier.objects.filter(
@@ -735,9 +765,9 @@ def emploi_du_temps_eleve(request):
     
     context = {
         'eleve': eleve,
-        'emploi_par_jour': emploi_par_jour,
-        'jours': jours,
-        'creneaux': creneaux,
+        'grille': grille,
+        'annee_scolaire': annee_scolaire,
+        'semestre': semestre,
         'evenements': evenements,
         'classe': eleve.classe,
     }
@@ -0,0 +1,140 @@
+"""
+Plans d'exécution des requêtes fréquentes
+
+Catalogue des querysets des chemins chauds de l'application (tableaux de
+bord, résultats de classe, listes paginées, emplois du temps, messagerie),
+construits comme dans les vues avec des valeurs prises en base. La commande
+explain_queries affiche leur plan et signale les parcours séquentiels de
+table, qui trahissent un index manquant.
+
+Sous PostgreSQL, le planificateur préfère un parcours séquentiel sur une
+petite table même quand un index convient : forcer_index désactive les
+parcours séquentiels le temps de l'EXPLAIN pour vérifier qu'un index existe.
+"""
+import json
+import re
+
+from django.db import connections, transaction
+
+from .models import (
+    Absence, AuditLog, Bulletin, Classe, Creneau, EmploiDuTemps, Eleve, Evaluation, Message, Note,
+    Participant, Professeur, Salle
+)
+
+
+def _valeur(modele, champ='id', defaut=1):
+    """Valeur d'exemple lue en base, defaut si la table est vide"""
+    valeur = modele.objects.order_by().values_list(champ, flat=True).first()
+    return defaut if valeur is None else valeur
+
+
+def catalogue():
+    """Liste (nom, queryset) des requêtes fréquentes de l'application"""
+    eleve_id = _valeur(Eleve)
+    classe_id = _valeur(Classe)
+    professeur_id = _valeur(Professeur)
+    salle_id = _valeur(Salle)
+    creneau_id = _valeur(Creneau)
+    annee_scolaire = _valeur(Evaluation, 'annee_scolaire', '2024-2025')
+    annee_edt = _valeur(EmploiDuTemps, 'annee_scolaire', '2024-2025')
+    conversation_id = _valeur(Message, 'conversation_id')
+    user_id = _valeur(Participant, 'user_id')
+
+    return [
+        ('notes_eleve_trimestre', Note.objects.filter(
+            eleve_id=eleve_id, evaluation__trimestre=1, evaluation__annee_scolaire=annee_scolaire
+        )),
+        ('notes_classe_trimestre', Note.objects.filter(
+            eleve__classe_id=classe_id, evaluation__trimestre=1, evaluation__annee_scolaire=annee_scolaire,
+            note__isnull=False
+        )),
+        ('liste_notes', Note.objects.order_by('-date_saisie', '-id')[:51]),
+        ('evaluations_classe_periode', Evaluation.objects.filter(
+            classe_id=classe_id, trimestre=1, annee_scolaire=annee_scolaire
+        )),
+        ('evaluations_professeur', Evaluation.objects.filter(
+            professeur_id=professeur_id
+        ).order_by('-date_evaluation')[:10]),
+        ('absences_eleve', Absence.objects.filter(eleve_id=eleve_id).order_by('-date_debut', '-id')[:21]),
+        ('liste_absences', Absence.objects.order_by('-date_debut', '-id')[:21]),
+        ('emploi_classe', EmploiDuTemps.objects.filter(
+            classe_id=classe_id, annee_scolaire=annee_edt, semestre=1, actif=True
+        )),
+        ('emploi_professeur', EmploiDuTemps.objects.filter(
+            professeur_id=professeur_id, annee_scolaire=annee_edt, semestre=1, actif=True
+        )),
+        ('conflit_professeur', EmploiDuTemps.objects.filter(
+            professeur_id=professeur_id, creneau_id=creneau_id, annee_scolaire=annee_edt, semestre=1, actif=True
+        )),
+        ('conflit_salle', EmploiDuTemps.objects.filter(
+            salle_id=salle_id, creneau_id=creneau_id, annee_scolaire=annee_edt, semestre=1, actif=True
+        )),
+        ('conflit_classe', EmploiDuTemps.objects.filter(
+            classe_id=classe_id, creneau_id=creneau_id, annee_scolaire=annee_edt, semestre=1, actif=True
+        )),
+        ('occupation_creneau', EmploiDuTemps.objects.filter(
+            creneau_id=creneau_id, annee_scolaire=annee_edt, semestre=1, actif=True
+        )),
+        ('bulletins_a_publier', Bulletin.objects.filter(
+            classe_id=classe_id, trimestre=1, statut__in=['BROUILLON', 'EN_ATTENTE']
+        )),
+        ('messages_conversation', Message.objects.filter(
+            conversation_id=conversation_id
+        ).order_by('-date_envoi', '-id')[:21]),
+        ('conversations_utilisateur', Participant.objects.filter(user_id=user_id, actif=True)),
+        ('journal_audit', AuditLog.objects.order_by('-timestamp', '-id')[:51]),
+    ]
+
+
+def _noeuds_postgresql(noeud):
+    yield noeud
+    for enfant in noeud.get('Plans', ()):
+        yield from _noeuds_postgresql(enfant)
+
+
+def _expliquer_postgresql(connexion, sql, params, forcer_index):
+    with transaction.atomic(using=connexion.alias), connexion.cursor() as curseur:
+        if forcer_index:
+            # Limité à la transaction
+            curseur.execute('SET LOCAL enable_seqscan = off')
+        curseur.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = curseur.fetchone()[0]
+        curseur.execute(f'EXPLAIN {sql}', params)
+        lignes = [ligne[0] for ligne in curseur.fetchall()]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    parcours = [
+        noeud['Relation Name'] for noeud in _noeuds_postgresql(plan[0]['Plan'])
+        if noeud['Node Type'] == 'Seq Scan'
+    ]
+    return lignes, parcours
+
+
+# « SCAN table » sans index ; « SCAN table USING [COVERING] INDEX » parcourt un index
+_SCAN_SQLITE = re.compile(r'^SCAN (?:TABLE )?(\w+)(?: AS \w+)?$')
+
+
+def _expliquer_sqlite(connexion, sql, params):
+    with connexion.cursor() as curseur:
+        curseur.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        lignes = [ligne[-1] for ligne in curseur.fetchall()]
+    parcours = [
+        correspondance.group(1) for correspondance in map(_SCAN_SQLITE.match, lignes) if correspondance
+    ]
+    return lignes, parcours
+
+
+def expliquer(queryset, forcer_index=False):
+    """
+    Plan d'exécution d'un queryset
+
+    Retourne (lignes du plan, tables parcourues séquentiellement). Sur les
+    bases autres que PostgreSQL et SQLite, seul le plan brut est disponible.
+    """
+    connexion = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    if connexion.vendor == 'postgresql':
+        return _expliquer_postgresql(connexion, sql, params, forcer_index)
+    if connexion.vendor == 'sqlite':
+        return _expliquer_sqlite(connexion, sql, params)
+    return queryset.explain().splitlines(), []
@@ -0,0 +1,61 @@
+"""
+Résolution du rôle de l'utilisateur connecté
+
+Le rôle (eleve, professeur, parent, admin) et l'objet profil sont déterminés
+une seule fois par requête. Les trois profils possibles sont chargés avec une
+seule requête jointe puis placés dans le cache de l'instance User, si bien
+que les tests hasattr(user, 'eleve') qui suivent ne déclenchent plus de
+requête. SchoolAuthBackend.get_user charge déjà ces profils avec
+l'utilisateur de la session : le rôle se lit alors sans requête, et n'est
+pas conservé en session, où il pourrait survivre à un changement de profil.
+"""
+from django.contrib.auth.models import User
+
+
+RELATIONS_PROFIL = ('eleve', 'professeur', 'parent')
+
+
+def _relation(nom):
+    return User._meta.get_field(nom)
+
+
+def profils_charges(user):
+    return all(_relation(nom).is_cached(user) for nom in RELATIONS_PROFIL)
+
+
+def charger_profils(user):
+    """Charge les profils élève, professeur et parent de l'utilisateur en une requête"""
+    if user.pk is None or profils_charges(user):
+        return
+    complet = User.objects.select_related(*RELATIONS_PROFIL).get(pk=user.pk)
+    for nom in RELATIONS_PROFIL:
+        relation = _relation(nom)
+        relation.set_cached_value(user, relation.get_cached_value(complet, default=None))
+
+
+def determiner_role(user):
+    """Retourne (rôle, profil) à partir des profils déjà chargés sur l'utilisateur"""
+    if not user.is_authenticated:
+        return None, None
+    charger_profils(user)
+    for nom in RELATIONS_PROFIL:
+        profil = _relation(nom).get_cached_value(user, default=None)
+        if profil is not None:
+            return nom, profil
+    if user.is_staff or user.is_superuser:
+        return 'admin', None
+    return None, None
+
+
+def resoudre_role(request):
+    """Attache request.role_utilisateur et request.profil_utilisateur"""
+    if hasattr(request, 'role_utilisateur'):
+        return request.role_utilisateur, request.profil_utilisateur
+
+    role, profil = determiner_role(request.user)
+    if request.user.is_authenticated:
+        request.user._type_utilisateur = role
+
+    request.role_utilisateur = role
+    request.profil_utilisateur = profil
+    return role, profil
@@ -0,0 +1,166 @@
+"""
+Saisie groupée des notes d'une évaluation
+
+La grille complète est d'abord validée, puis enregistrée en un nombre constant
+de requêtes : lecture des notes existantes, upsert groupé sur la contrainte
+unique (eleve, evaluation) et recalcul des moyennes des élèves concernés.
+"""
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from .dashboard_cache import invalider_notes
+from .models import Note
+from .moyennes import recalculer_moyennes
+
+
+class GrilleInvalide(Exception):
+    """Grille de notes rejetée, avec les erreurs indexées par élève"""
+
+    def __init__(self, erreurs):
+        super().__init__('Grille de notes invalide')
+        self.erreurs = erreurs
+
+
+def _valider_ligne(evaluation, valeur, absent, commentaire):
+    """Retourne la ligne normalisée ou lève ValueError avec le message d'erreur"""
+    if valeur in (None, ''):
+        note = None
+    else:
+        try:
+            note = Decimal(str(valeur).strip().replace(',', '.'))
+        except InvalidOperation:
+            raise ValueError(f"Note invalide : {valeur}")
+        if not note.is_finite() or note < 0 or note > evaluation.note_sur:
+            raise ValueError(f"La note doit être comprise entre 0 et {evaluation.note_sur}")
+        note = note.quantize(Decimal('0.01'))
+
+    if not isinstance(absent, bool):
+        raise ValueError("Le champ absent doit être un booléen")
+    if commentaire is not None and not isinstance(commentaire, str):
+        raise ValueError("Le commentaire doit être un texte")
+
+    return {'note': note, 'absent': absent, 'commentaire': commentaire or ''}
+
+
+def lire_grille_formulaire(data, evaluation, eleves):
+    """
+    Lit la grille envoyée par le formulaire HTML
+
+    Chaque élève de la classe a une ligne, même vide, comme dans la saisie
+    d'origine.
+    """
+    lignes = {}
+    erreurs = {}
+    for eleve in eleves:
+        try:
+            lignes[eleve.id] = _valider_ligne(
+                evaluation,
+                data.get(f'note_{eleve.id}'),
+                data.get(f'absent_{eleve.id}') == 'on',
+                data.get(f'commentaire_{eleve.id}', '')
+            )
+        except ValueError as e:
+            erreurs[eleve.id] = str(e)
+
+    if erreurs:
+        raise GrilleInvalide(erreurs)
+    return lignes
+
+
+def lire_grille_json(corps, evaluation, eleves):
+    """
+    Lit une grille JSON de la forme
+    {"notes": [{"eleve": 12, "note": 15.5, "absent": false, "commentaire": ""}, ...]}
+
+    Seuls les élèves présents dans la grille sont modifiés.
+    """
+    try:
+        donnees = json.loads(corps)
+        notes = donnees['notes']
+        if not isinstance(notes, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        raise GrilleInvalide({'__all__': 'Corps JSON invalide : une liste "notes" est attendue'})
+
+    eleve_ids = {eleve.id for eleve in eleves}
+    lignes = {}
+    erreurs = {}
+    for position, element in enumerate(notes):
+        if not isinstance(element, dict):
+            erreurs[f'ligne_{position}'] = 'Chaque ligne doit être un objet'
+            continue
+
+        eleve_id = element.get('eleve')
+        # type() et non isinstance() : true serait sinon lu comme l'élève 1
+        if type(eleve_id) is not int:
+            erreurs[f'ligne_{position}'] = f"Identifiant d'élève invalide : {eleve_id!r}"
+            continue
+        if eleve_id not in eleve_ids:
+            erreurs[f'ligne_{position}'] = f"Élève inconnu dans cette classe : {eleve_id}"
+            continue
+        if eleve_id in lignes or eleve_id in erreurs:
+            erreurs[eleve_id] = 'Élève présent plusieurs fois dans la grille'
+            continue
+
+        try:
+            lignes[eleve_id] = _valider_ligne(
+                evaluation,
+                element.get('note'),
+                element.get('absent', False),
+                element.get('commentaire', '')
+            )
+        except ValueError as e:
+            erreurs[eleve_id] = str(e)
+
+    if erreurs:
+        raise GrilleInvalide(erreurs)
+    return lignes
+
+
+def enregistrer_grille(evaluation, lignes):
+    """
+    Enregistre une grille validée et retourne les compteurs de la saisie
+
+    Les lignes identiques aux notes existantes ne sont pas réécrites.
+    """
+    existantes = {
+        eleve_id: (note, absent, commentaire)
+        for eleve_id, note, absent, commentaire in Note.objects.filter(
+            evaluation=evaluation,
+            eleve_id__in=list(lignes)
+        ).values_list('eleve_id', 'note', 'absent', 'commentaire')
+    }
+
+    a_enregistrer = []
+    crees = 0
+    for eleve_id, ligne in lignes.items():
+        existante = existantes.get(eleve_id)
+        if existante == (ligne['note'], ligne['absent'], ligne['commentaire']):
+            continue
+        if existante is None:
+            crees += 1
+        a_enregistrer.append(Note(eleve_id=eleve_id, evaluation=evaluation, **ligne))
+
+    with transaction.atomic():
+        Note.objects.bulk_create(
+            a_enregistrer,
+            update_conflicts=True,
+            unique_fields=['eleve', 'evaluation'],
+            update_fields=['note', 'absent', 'commentaire', 'date_saisie'],
+            batch_size=500
+        )
+        # bulk_create n'envoie pas de signaux : recalcul explicite des moyennes
+        recalculer_moyennes(
+            (note.eleve_id, evaluation.matiere_id, evaluation.trimestre, evaluation.annee_scolaire)
+            for note in a_enregistrer
+        )
+        invalider_notes([note.eleve_id for note in a_enregistrer], [evaluation.professeur_id])
+
+    return {
+        'crees': crees,
+        'mis_a_jour': len(a_enregistrer) - crees,
+        'inchanges': len(lignes) - len(a_enregistrer),
+        'saisies': sum(1 for ligne in lignes.values() if ligne['note'] is not None or ligne['absent']),
+    }
@@ -0,0 +1,239 @@
+"""
+Signaux de maintenance des données dérivées
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .dashboard_cache import invalider, invalider_notes
+from .disponibilites import signaler
+from .grille_emploi import invalider_grilles
+from .models import (
+    Absence, AnneeScolaire, Bulletin, Classe, Communication, Conversation, Creneau, Eleve, EmploiDuTemps,
+    Evaluation, Matiere, Message, Note, Parent, Participant, Professeur, ReservationSalle, Salle
+)
+from .moyennes import cle_note, recalculer_moyennes
+
+
+# =============== MOYENNES PAR MATIÈRE ===============
+
+@receiver(post_save, sender=Note)
+def mettre_a_jour_moyenne_note(sender, instance, raw=False, **kwargs):
+    """Recalcule l'agrégat de la note enregistrée"""
+    if raw:
+        return
+    recalculer_moyennes([cle_note(instance)])
+    invalider_notes([instance.eleve_id], [instance.evaluation.professeur_id])
+
+
+@receiver(post_delete, sender=Note)
+def retirer_moyenne_note(sender, instance, **kwargs):
+    """Recalcule l'agrégat de la note supprimée"""
+    try:
+        cle = cle_note(instance)
+    except Evaluation.DoesNotExist:
+        invalider_notes([instance.eleve_id])
+        return
+    recalculer_moyennes([cle])
+    invalider_notes([instance.eleve_id], [instance.evaluation.professeur_id])
+
+
+@receiver(pre_save, sender=Evaluation)
+def memoriser_cle_evaluation(sender, instance, raw=False, **kwargs):
+    """Mémorise matière, trimestre et année avant modification d'une évaluation"""
+    if raw or not instance.pk:
+        return
+    precedente = (
+        Evaluation.objects.filter(pk=instance.pk)
+        .values_list('matiere_id', 'trimestre', 'annee_scolaire', 'classe_id', 'professeur_id')
+        .first()
+    )
+    if precedente:
+        instance._cle_moyennes_precedente = precedente[:3]
+        instance._classe_professeur_precedents = precedente[3:]
+
+
+@receiver(post_save, sender=Evaluation)
+def mettre_a_jour_moyennes_evaluation(sender, instance, created, raw=False, **kwargs):
+    """Recalcule les agrégats des élèves notés quand une évaluation change"""
+    if raw or created:
+        return
+
+    eleve_ids = list(instance.notes.values_list('eleve_id', flat=True))
+    if not eleve_ids:
+        return
+
+    cles_evaluation = {(instance.matiere_id, instance.trimestre, instance.annee_scolaire)}
+    precedente = getattr(instance, '_cle_moyennes_precedente', None)
+    if precedente:
+        cles_evaluation.add(precedente)
+
+    recalculer_moyennes(
+        (eleve_id,) + cle
+        for eleve_id in eleve_ids
+        for cle in cles_evaluation
+    )
+
+
+# =============== CACHE DES TABLEAUX DE BORD ===============
+
+@receiver(post_save, sender=Evaluation)
+@receiver(post_delete, sender=Evaluation)
+def invalider_dashboards_evaluation(sender, instance, **kwargs):
+    """Évaluations à venir de la classe, évaluations du professeur"""
+    classe_id, professeur_id = getattr(instance, '_classe_professeur_precedents', (None, None))
+    invalider(
+        'global',
+        f'classe:{instance.classe_id}',
+        f'professeur:{instance.professeur_id}',
+        classe_id and f'classe:{classe_id}',
+        professeur_id and f'professeur:{professeur_id}'
+    )
+
+
+@receiver(post_save, sender=Absence)
+@receiver(post_delete, sender=Absence)
+def invalider_dashboards_absence(sender, instance, **kwargs):
+    invalider('global', f'eleve:{instance.eleve_id}')
+
+
+@receiver(post_save, sender=Communication)
+@receiver(post_delete, sender=Communication)
+def invalider_dashboards_communication(sender, instance, **kwargs):
+    invalider('global', 'communications')
+
+
+@receiver(post_save, sender=Bulletin)
+@receiver(post_delete, sender=Bulletin)
+def invalider_dashboards_bulletin(sender, instance, **kwargs):
+    invalider('global')
+
+
+def _invalider_participants(conversation_id):
+    invalider(*(
+        f'user:{user_id}'
+        for user_id in Participant.objects.filter(conversation_id=conversation_id).values_list('user_id', flat=True)
+    ))
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_delete, sender=Message)
+def invalider_dashboards_message(sender, instance, **kwargs):
+    """Messages non lus de chaque participant"""
+    _invalider_participants(instance.conversation_id)
+
+
+@receiver(post_save, sender=Conversation)
+def invalider_dashboards_conversation(sender, instance, created, **kwargs):
+    if not created:
+        _invalider_participants(instance.pk)
+
+
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def invalider_dashboards_participant(sender, instance, **kwargs):
+    invalider(f'user:{instance.user_id}')
+
+
+@receiver(post_save, sender=Eleve)
+@receiver(post_delete, sender=Eleve)
+@receiver(post_save, sender=Professeur)
+@receiver(post_delete, sender=Professeur)
+@receiver(post_save, sender=Parent)
+@receiver(post_delete, sender=Parent)
+@receiver(post_save, sender=Classe)
+@receiver(post_delete, sender=Classe)
+@receiver(post_save, sender=Matiere)
+@receiver(post_delete, sender=Matiere)
+@receiver(m2m_changed, sender=Professeur.classes.through)
+@receiver(m2m_changed, sender=Professeur.matieres.through)
+@receiver(m2m_changed, sender=Eleve.parents.through)
+def invalider_dashboards_structure(sender, **kwargs):
+    """Effectifs, affectations et liens de parenté, rarement modifiés"""
+    if kwargs.get('action', 'post_')[:5] == 'post_':
+        invalider('structure')
+
+
+# =============== DISPONIBILITÉ DES SALLES ===============
+
+MODELES_DISPONIBILITES = {
+    ReservationSalle: 'reservation',
+    EmploiDuTemps: 'emploi',
+    Salle: 'salle',
+    Creneau: 'creneau',
+    AnneeScolaire: 'annee',
+}
+
+
+@receiver(post_save, sender=ReservationSalle)
+@receiver(post_delete, sender=ReservationSalle)
+@receiver(post_save, sender=EmploiDuTemps)
+@receiver(post_delete, sender=EmploiDuTemps)
+@receiver(post_save, sender=Salle)
+@receiver(post_delete, sender=Salle)
+@receiver(post_save, sender=Creneau)
+@receiver(post_delete, sender=Creneau)
+@receiver(post_save, sender=AnneeScolaire)
+@receiver(post_delete, sender=AnneeScolaire)
+def signaler_disponibilites(sender, instance, **kwargs):
+    """Index d'occupation des salles (school_management.disponibilites)"""
+    signaler(MODELES_DISPONIBILITES[sender], instance.pk)
+
+
+# =============== GRILLES DE L'EMPLOI DU TEMPS ===============
+
+@receiver(pre_save, sender=EmploiDuTemps)
+def memoriser_classe_professeur_emploi(sender, instance, raw=False, **kwargs):
+    """Mémorise classe et professeur avant modification d'un cours"""
+    if raw or not instance.pk:
+        return
+    instance._classe_professeur_precedents = (
+        EmploiDuTemps.objects.filter(pk=instance.pk).values_list('classe_id', 'professeur_id').first()
+    )
+
+
+@receiver(post_save, sender=EmploiDuTemps)
+@receiver(post_delete, sender=EmploiDuTemps)
+def invalider_grilles_emploi(sender, instance, **kwargs):
+    """Grilles de la classe et du professeur du cours, avant et après modification"""
+    classe_ids, professeur_ids = {instance.classe_id}, {instance.professeur_id}
+    precedents = getattr(instance, '_classe_professeur_precedents', None)
+    if precedents:
+        classe_ids.add(precedents[0])
+        professeur_ids.add(precedents[1])
+    invalider_grilles(classe_ids, professeur_ids)
+
+
+CHAMPS_NOM = ('first_name', 'last_name')
+
+
+@receiver(pre_save, sender=User)
+def memoriser_nom_utilisateur(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    Mémorise le nom avant modification d'un utilisateur ; ignoré quand seuls
+    d'autres champs sont enregistrés (last_login à chaque connexion)
+    """
+    if raw or not instance.pk or (update_fields is not None and not set(CHAMPS_NOM) & set(update_fields)):
+        return
+    instance._nom_precedent = User.objects.filter(pk=instance.pk).values_list(*CHAMPS_NOM).first()
+
+
+@receiver(post_save, sender=User)
+def invalider_grilles_nom_professeur(sender, instance, **kwargs):
+    """Grilles du professeur renommé et des classes où il enseigne"""
+    precedent = getattr(instance, '_nom_precedent', None)
+    if precedent is None or precedent == tuple(getattr(instance, champ) for champ in CHAMPS_NOM):
+        return
+    professeur_id = Professeur.objects.filter(user=instance).values_list('pk', flat=True).first()
+    if professeur_id is not None:
+        classe_ids = set(EmploiDuTemps.objects.filter(professeur_id=professeur_id).values_list('classe_id', flat=True))
+        invalider_grilles(classe_ids, [professeur_id])
+
+
+@receiver(post_save, sender=Creneau)
+@receiver(post_delete, sender=Creneau)
+@receiver(post_save, sender=Salle)
+@receiver(post_delete, sender=Salle)
+def invalider_grilles_structure(sender, instance, **kwargs):
+    """Lignes des grilles et noms des salles"""
+    invalider_grilles()
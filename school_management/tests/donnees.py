@@ -0,0 +1,155 @@
+"""
+Jeu de données d'une école réaliste pour les tests
+
+Plusieurs lignes pour chaque relation parcourue par les vues (classes,
+élèves, évaluations, notes, absences, messages...), afin qu'une requête
+exécutée par ligne se voie dans le nombre de requêtes.
+"""
+import datetime
+from types import SimpleNamespace
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from ..messagerie import enregistrer_message
+from ..moyennes import reconstruire_moyennes
+from ..models import (
+    Absence, AnneeScolaire, Bulletin, Classe, Communication, Conversation, Creneau, EmploiDuTemps, Eleve,
+    Evaluation, EvenementCalendrier, Matiere, Message, Note, Parent, Participant, Professeur, ReservationSalle,
+    Salle
+)
+
+ANNEE_SCOLAIRE = '2024-2025'
+JOURS = ('LUNDI', 'MARDI')
+HEURES = (8, 9, 10)
+
+
+def creer_ecole(nb_classes=3, nb_eleves=6, nb_matieres=4, nb_evaluations=2):
+    """
+    Crée l'école et retourne ses objets de référence
+
+    Le professeur enseigne dans les deux premières classes et est professeur
+    principal de la première ; l'élève de référence est dans cette classe et
+    son parent a un second enfant dans la classe suivante.
+    """
+    maintenant = timezone.now()
+    AnneeScolaire.objects.create(
+        annee=ANNEE_SCOLAIRE, date_debut=datetime.date(2024, 9, 1), date_fin=datetime.date(2025, 7, 4), active=True
+    )
+    admin = User.objects.create_superuser('admin', 'admin@ecole.test', 'motdepasse')
+
+    matieres = [
+        Matiere.objects.create(nom=f'Matière {j}', code=f'MAT{j}', coefficient=j + 1)
+        for j in range(nb_matieres)
+    ]
+    professeurs = []
+    for p in range(nb_classes):
+        user = User.objects.create_user(f'prof{p}', password='motdepasse', first_name='Prof', last_name=f'N{p}')
+        professeur = Professeur.objects.create(user=user, civilite='M', date_embauche=datetime.date(2015, 9, 1))
+        professeur.matieres.set(matieres)
+        professeurs.append(professeur)
+
+    classes = []
+    eleves_par_classe = []
+    for c in range(nb_classes):
+        classe = Classe.objects.create(nom=f'6e{c}', niveau='6e', prof_principal=professeurs[c])
+        professeurs[c].classes.add(classe)
+        classes.append(classe)
+        eleves = []
+        for e in range(nb_eleves):
+            user = User.objects.create_user(f'eleve{c}_{e}', password='motdepasse', first_name=f'E{e}', last_name=f'C{c}')
+            eleves.append(Eleve.objects.create(
+                user=user, nom=f'C{c}', prenom=f'E{e}', date_naissance=datetime.date(2012, 1, 1 + e),
+                lieu_naissance='Lyon', sexe='M' if e % 2 else 'F', numero_etudiant=f'ETU{c:02d}{e:03d}',
+                classe=classe, adresse='1 rue de l\'École'
+            ))
+        eleves_par_classe.append(eleves)
+    professeur = professeurs[0]
+    professeur.classes.add(classes[1])
+
+    for c, classe in enumerate(classes):
+        for j, matiere in enumerate(matieres):
+            for k in range(nb_evaluations):
+                evaluation = Evaluation.objects.create(
+                    titre=f'Contrôle {k + 1}', matiere=matiere, classe=classe,
+                    professeur=professeur if c < 2 else professeurs[c],
+                    date_evaluation=maintenant - datetime.timedelta(days=7 * (k + 1) + j),
+                    type_evaluation='DS', trimestre=1, annee_scolaire=ANNEE_SCOLAIRE
+                )
+                Note.objects.bulk_create(
+                    Note(eleve=eleve, evaluation=evaluation, note=8 + (i + j + k) % 12)
+                    for i, eleve in enumerate(eleves_par_classe[c])
+                )
+        for i, eleve in enumerate(eleves_par_classe[c]):
+            for a in range(2):
+                debut = maintenant - datetime.timedelta(days=3 * (i + a + 1))
+                Absence.objects.create(
+                    eleve=eleve, date_debut=debut, date_fin=debut + datetime.timedelta(hours=2),
+                    motif='M', justifiee=bool(a)
+                )
+            Bulletin.objects.create(
+                eleve=eleve, classe=classe, trimestre=1, annee_scolaire=ANNEE_SCOLAIRE,
+                statut='PUBLIE' if i % 2 else 'BROUILLON', moyenne_generale=10 + i % 8, cree_par=admin
+            )
+
+    eleve = eleves_par_classe[0][0]
+    user_parent = User.objects.create_user('parent', password='motdepasse', first_name='Parent', last_name='C0')
+    parent = Parent.objects.create(user=user_parent, nom='C0', prenom='Parent', sexe='F')
+    parent.eleves.set([eleve, eleves_par_classe[1][0]])
+
+    for destinataires in ('TOUS', 'PARENTS', 'ELEVES'):
+        Communication.objects.create(
+            titre=f'Information {destinataires.lower()}', contenu='Contenu', auteur=admin, destinataires=destinataires
+        )
+
+    salles = [Salle.objects.create(nom=f'Salle {s}', numero=f'S{s}') for s in range(3)]
+    creneaux = [
+        Creneau.objects.create(jour=jour, heure_debut=datetime.time(heure), heure_fin=datetime.time(heure, 55))
+        for jour in JOURS for heure in HEURES
+    ]
+    for c, classe in enumerate(classes):
+        for j, matiere in enumerate(matieres[:len(creneaux)]):
+            creneau = creneaux[(c + j) % len(creneaux)]
+            EmploiDuTemps.objects.create(
+                classe=classe, matiere=matiere, professeur=professeur if c < 2 else professeurs[c],
+                salle=salles[(c + j) % len(salles)], creneau=creneau, annee_scolaire=ANNEE_SCOLAIRE
+            )
+    evenement = EvenementCalendrier.objects.create(
+        titre='Conseil de classe', type_evenement='REUNION', organisateur=admin,
+        date_debut=maintenant + datetime.timedelta(days=2), date_fin=maintenant + datetime.timedelta(days=2, hours=2)
+    )
+    reservation = ReservationSalle.objects.create(
+        salle=salles[0], utilisateur=professeur.user, titre='Soutien',
+        date_debut=maintenant + datetime.timedelta(days=1), date_fin=maintenant + datetime.timedelta(days=1, hours=1)
+    )
+
+    conversation = Conversation.objects.create(
+        titre='Suivi de la classe', type_conversation='PROF_PARENT', classe=classes[0], createur=professeur.user
+    )
+    membres = [professeur.user, user_parent, eleve.user] + [autre.user for autre in eleves_par_classe[0][1:3]]
+    Participant.objects.bulk_create(Participant(conversation=conversation, user=membre) for membre in membres)
+    for m in range(12):
+        enregistrer_message(Message(
+            conversation=conversation, expediteur=membres[m % len(membres)], contenu=f'Message {m}'
+        ))
+    # Les notes créées en masse n'envoient pas de signal : agrégats des moyennes recalculés en une fois
+    reconstruire_moyennes()
+
+    return SimpleNamespace(
+        admin=admin,
+        professeur=professeur,
+        eleve=eleve,
+        parent=parent,
+        classe=classes[0],
+        evaluation=Evaluation.objects.filter(classe=classes[0], professeur=professeur).first(),
+        absence=eleve.absences.first(),
+        bulletin=eleve.bulletins.first(),
+        communication=Communication.objects.first(),
+        matiere=matieres[0],
+        salle=salles[0],
+        creneau=creneaux[0],
+        emploi=EmploiDuTemps.objects.filter(classe=classes[0]).first(),
+        evenement=evenement,
+        reservation=reservation,
+        conversation=conversation,
+    )
@@ -0,0 +1,159 @@
+"""
+Statistiques journalières et archivage des logs d'audit
+"""
+import datetime
+import gzip
+import json
+import os
+import tempfile
+from importlib import import_module
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from ..audit_archive import archiver_mois, incrementer_statistiques_audit, indicateurs_audit, mois_a_archiver
+from ..models import ArchiveAuditLog, AuditLog, StatistiqueAuditAction, StatistiqueAuditUtilisateur
+
+
+def horodatage(annee, mois, jour, heure=10):
+    return timezone.make_aware(datetime.datetime(annee, mois, jour, heure))
+
+
+def statistiques():
+    return (
+        {(s.date, s.action): s.nombre for s in StatistiqueAuditAction.objects.all()},
+        {(s.date, s.user_id): s.nombre for s in StatistiqueAuditUtilisateur.objects.all()},
+    )
+
+
+class AuditArchiveTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.alice = User.objects.create_user('alice')
+        cls.bob = User.objects.create_user('bob')
+        maintenant = timezone.now()
+        # Écrits sans passer par le sink : aucune statistique n'existe encore
+        cls.logs = AuditLog.objects.bulk_create([
+            AuditLog(user=cls.alice, action='CREATE', model_name='Note', object_repr='mars 1',
+                     timestamp=horodatage(2024, 3, 4)),
+            AuditLog(user=cls.alice, action='UPDATE', model_name='Note', object_repr='mars 2',
+                     timestamp=horodatage(2024, 3, 4, 23)),
+            AuditLog(user=cls.bob, action='CREATE', model_name='Absence', object_repr='mars 3',
+                     timestamp=horodatage(2024, 3, 28)),
+            AuditLog(user=cls.bob, action='LOGIN', model_name='User', object_repr='avril',
+                     timestamp=horodatage(2024, 4, 2)),
+            AuditLog(user=cls.alice, action='LOGIN', model_name='User', object_repr='récent 1', timestamp=maintenant),
+            AuditLog(user=cls.alice, action='CREATE', model_name='Note', object_repr='récent 2', timestamp=maintenant),
+        ])
+        cls.aujourd_hui = timezone.localdate(maintenant)
+
+    def remplir(self):
+        migration = import_module('school_management.migrations.0023_remplir_statistiques_audit')
+        migration.remplir_statistiques(apps, None)
+
+    def test_incrementer(self):
+        incrementer_statistiques_audit(self.logs[:3])
+        incrementer_statistiques_audit(self.logs[2:])
+
+        par_action, par_utilisateur = statistiques()
+        self.assertEqual(par_action, {
+            (datetime.date(2024, 3, 4), 'CREATE'): 1,
+            (datetime.date(2024, 3, 4), 'UPDATE'): 1,
+            # Le troisième log est compté deux fois : l'incrément ne dédoublonne pas
+            (datetime.date(2024, 3, 28), 'CREATE'): 2,
+            (datetime.date(2024, 4, 2), 'LOGIN'): 1,
+            (self.aujourd_hui, 'LOGIN'): 1,
+            (self.aujourd_hui, 'CREATE'): 1,
+        })
+        self.assertEqual(par_utilisateur[(datetime.date(2024, 3, 4), self.alice.pk)], 2)
+        self.assertEqual(par_utilisateur[(self.aujourd_hui, self.alice.pk)], 2)
+
+    def test_remplissage_par_la_migration(self):
+        StatistiqueAuditAction.objects.create(date=datetime.date(2024, 3, 28), action='CREATE', nombre=7)
+        self.remplir()
+
+        par_action, par_utilisateur = statistiques()
+        # Le recalcul remplace les valeurs existantes des jours présents dans la table
+        self.assertEqual(par_action[(datetime.date(2024, 3, 28), 'CREATE')], 1)
+        self.assertEqual(sum(par_action.values()), len(self.logs))
+        self.assertEqual(par_utilisateur, {
+            (datetime.date(2024, 3, 4), self.alice.pk): 2,
+            (datetime.date(2024, 3, 28), self.bob.pk): 1,
+            (datetime.date(2024, 4, 2), self.bob.pk): 1,
+            (self.aujourd_hui, self.alice.pk): 2,
+        })
+
+    def test_mois_a_archiver(self):
+        self.assertEqual(mois_a_archiver(1)[:2], [datetime.date(2024, 3, 1), datetime.date(2024, 4, 1)])
+        self.assertNotIn(self.aujourd_hui.replace(day=1), mois_a_archiver(0))
+
+    def test_archiver_mois(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            archive = archiver_mois(datetime.date(2024, 3, 1), dossier)
+
+            with gzip.open(archive.fichier, 'rt', encoding='utf-8') as fichier:
+                lignes = [json.loads(ligne) for ligne in fichier]
+            self.assertEqual(os.path.getsize(archive.fichier), archive.taille)
+
+        self.assertEqual([ligne['object_repr'] for ligne in lignes], ['mars 1', 'mars 2', 'mars 3'])
+        self.assertEqual(lignes[2]['username'], 'bob')
+        self.assertEqual(datetime.datetime.fromisoformat(lignes[0]['timestamp']), horodatage(2024, 3, 4))
+
+        self.assertEqual(ArchiveAuditLog.objects.get(), archive)
+        self.assertEqual((archive.mois, archive.nombre_logs), (datetime.date(2024, 3, 1), 3))
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('object_repr', flat=True)), ['avril', 'récent 1', 'récent 2']
+        )
+        # Les statistiques du mois archivé restent consultables
+        par_action, _ = statistiques()
+        self.assertEqual(par_action[(datetime.date(2024, 3, 4), 'UPDATE')], 1)
+
+    def test_archiver_mois_vide(self):
+        with tempfile.TemporaryDirectory() as dossier:
+            self.assertIsNone(archiver_mois(datetime.date(2024, 5, 1), dossier))
+            self.assertEqual(os.listdir(dossier), [])
+        self.assertFalse(ArchiveAuditLog.objects.exists())
+
+    def test_indicateurs_depuis_les_statistiques(self):
+        self.remplir()
+        with tempfile.TemporaryDirectory() as dossier:
+            archiver_mois(datetime.date(2024, 3, 1), dossier)
+
+        # Les mois archivés restent comptés : les indicateurs ne lisent pas AuditLog
+        with self.assertNumQueries(4):
+            indicateurs = indicateurs_audit(AuditLog.objects.all())
+            self.assertEqual((indicateurs['total_logs'], indicateurs['today_logs']), (6, 2))
+            self.assertEqual(indicateurs['frequent_actions'][0], {'action': 'CREATE', 'count': 3})
+            self.assertEqual(
+                [(ligne['user__username'], ligne['count']) for ligne in indicateurs['active_users']],
+                [('alice', 4), ('bob', 2)]
+            )
+
+        indicateurs = indicateurs_audit(AuditLog.objects.all(), action='LOGIN', date_from='2024-04-01')
+        self.assertEqual(indicateurs['total_logs'], 2)
+        self.assertEqual([ligne['action'] for ligne in indicateurs['frequent_actions']], ['LOGIN'])
+
+    def test_indicateurs_repli_sur_les_logs(self):
+        self.remplir()
+        with tempfile.TemporaryDirectory() as dossier:
+            archiver_mois(datetime.date(2024, 3, 1), dossier)
+
+        # Une recherche textuelle ne peut pas utiliser les statistiques : seuls les logs restants comptent
+        logs = AuditLog.objects.filter(object_repr__icontains='récent')
+        indicateurs = indicateurs_audit(logs, search='récent')
+        self.assertEqual((indicateurs['total_logs'], indicateurs['today_logs']), (2, 2))
+        self.assertEqual(
+            sorted((ligne['action'], ligne['count']) for ligne in indicateurs['frequent_actions']),
+            [('CREATE', 1), ('LOGIN', 1)]
+        )
+
+        # Filtre utilisateur : les actions viennent des logs, les utilisateurs des statistiques
+        logs = AuditLog.objects.filter(user=self.bob)
+        indicateurs = indicateurs_audit(logs, user_id=str(self.bob.pk))
+        self.assertEqual(
+            [(ligne['action'], ligne['count']) for ligne in indicateurs['frequent_actions']], [('LOGIN', 1)]
+        )
+        self.assertEqual(indicateurs['total_logs'], 2)
@@ -0,0 +1,115 @@
+"""
+Écriture différée des logs d'audit : lots, délai, arrêt, file pleine et
+lignes invalides
+"""
+import os
+import queue
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from ..audit_sink import AuditSink
+from ..metriques import exposition_prometheus
+from ..models import AuditLog
+
+
+def evenements(user, nombre, action='CREATE'):
+    return [AuditLog(user=user, action=action, model_name='Note', object_repr=f'note {n}') for n in range(nombre)]
+
+
+class AuditSinkTests(TestCase):
+
+    def test_lot_avec_ligne_invalide(self):
+        user = User.objects.create_user('auditeur')
+        lot = [
+            AuditLog(user=user, action='CREATE', model_name='Note', object_repr='valide 1'),
+            AuditLog(user=user, action=None, model_name='Note', object_repr='invalide'),
+            AuditLog(user=user, action='UPDATE', model_name='Note', object_repr='valide 2'),
+        ]
+        sink = AuditSink()
+        sink._ecrire(lot)
+
+        self.assertEqual(
+            sorted(AuditLog.objects.values_list('object_repr', flat=True)), ['valide 1', 'valide 2']
+        )
+        statistiques = sink.statistiques()
+        self.assertEqual(statistiques['evenements_ecrits'], 2)
+        self.assertEqual(statistiques['evenements_perdus'], 1)
+
+    @override_settings(AUDIT_ASYNC=True, AUDIT_QUEUE_MAX_SIZE=2)
+    def test_file_pleine(self):
+        user = User.objects.create_user('auditeur')
+        sink = AuditSink()
+        # File sans thread d'écriture : elle reste pleine
+        sink._demarrer = lambda: None
+        sink._file = queue.Queue(maxsize=2)
+        sink._pid = os.getpid()
+        for log in evenements(user, 3):
+            sink.enregistrer(log)
+
+        statistiques = sink.statistiques()
+        self.assertEqual(statistiques['en_attente'], 2)
+        self.assertEqual(statistiques['evenements_perdus'], 1)
+        self.assertFalse(AuditLog.objects.exists())
+
+    def test_compteurs_exposes(self):
+        from ..audit_sink import audit_sink
+
+        exposition = exposition_prometheus()
+        for nom in ('school_audit_evenements_ecrits_total', 'school_audit_evenements_perdus_total',
+                    'school_audit_lots_ecrits_total', 'school_audit_en_attente'):
+            self.assertIn(f'# TYPE {nom} ', exposition)
+        perdus = audit_sink.statistiques()['evenements_perdus']
+        self.assertIn(f'school_audit_evenements_perdus_total {perdus}\n', exposition)
+
+
+@override_settings(AUDIT_ASYNC=True, AUDIT_QUEUE_MAX_SIZE=100)
+class AuditSinkThreadTests(TransactionTestCase):
+    """Thread d'écriture réel, sur sa propre connexion"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('auditeur')
+        self.sink = AuditSink()
+        self.addCleanup(self.sink.arreter)
+
+    def attendre(self, nombre, delai=5.0):
+        fin = time.monotonic() + delai
+        while AuditLog.objects.count() < nombre and time.monotonic() < fin:
+            time.sleep(0.02)
+        return AuditLog.objects.count()
+
+    @override_settings(AUDIT_BATCH_SIZE=3, AUDIT_FLUSH_INTERVAL=60)
+    def test_lot_plein(self):
+        for log in evenements(self.user, 4):
+            self.sink.enregistrer(log)
+
+        # Le lot de trois part aussitôt, le quatrième attend le délai
+        self.assertEqual(self.attendre(3), 3)
+        time.sleep(0.2)
+        self.assertEqual(AuditLog.objects.count(), 3)
+        self.assertEqual(self.sink.statistiques()['lots_ecrits'], 1)
+
+    @override_settings(AUDIT_BATCH_SIZE=100, AUDIT_FLUSH_INTERVAL=0.2)
+    def test_delai_ecoule(self):
+        with mock.patch('school_management.audit_sink.close_old_connections') as recycler:
+            for log in evenements(self.user, 2):
+                self.sink.enregistrer(log)
+            self.assertEqual(self.attendre(2), 2)
+
+        # La connexion du thread est vérifiée avant chaque lot
+        self.assertTrue(recycler.called)
+        statistiques = self.sink.statistiques()
+        self.assertEqual((statistiques['evenements_ecrits'], statistiques['lots_ecrits']), (2, 1))
+
+    @override_settings(AUDIT_BATCH_SIZE=100, AUDIT_FLUSH_INTERVAL=60)
+    def test_arret_vide_la_file(self):
+        for log in evenements(self.user, 5):
+            self.sink.enregistrer(log)
+
+        self.sink.arreter()
+
+        self.assertFalse(self.sink._thread.is_alive())
+        self.assertEqual(AuditLog.objects.count(), 5)
+        self.assertEqual(self.sink.statistiques()['evenements_ecrits'], 5)
@@ -0,0 +1,78 @@
+"""
+Connexion par nom d'utilisateur ou numéro étudiant (SchoolAuthBackend)
+"""
+import datetime
+from unittest import mock
+
+from django.contrib.auth import SESSION_KEY, authenticate
+from django.contrib.auth.hashers import MD5PasswordHasher
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Classe, Eleve, Professeur
+
+
+class SchoolAuthBackendTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        classe = Classe.objects.create(nom='6eA', niveau='6e')
+        cls.user_eleve = User.objects.create_user('eleve', password='motdepasse')
+        Eleve.objects.create(
+            user=cls.user_eleve, nom='Eleve', prenom='Un', date_naissance=datetime.date(2012, 1, 1),
+            lieu_naissance='Lyon', sexe='F', numero_etudiant='ETU001', classe=classe, adresse='1 rue de l\'École'
+        )
+        cls.user_prof = User.objects.create_user('prof', password='motdepasse')
+        Professeur.objects.create(user=cls.user_prof, civilite='M', date_embauche=datetime.date(2015, 9, 1))
+        # Nom d'utilisateur identique au numéro étudiant de l'élève
+        cls.homonyme = User.objects.create_user('ETU001', password='autre', is_staff=True)
+
+    def test_par_nom_utilisateur(self):
+        self.assertEqual(authenticate(username='prof', password='motdepasse'), self.user_prof)
+        self.assertEqual(authenticate(username='eleve', password='motdepasse'), self.user_eleve)
+
+    def test_par_numero_etudiant(self):
+        user = authenticate(username='ETU001', password='motdepasse', user_type='eleve')
+        self.assertEqual(user, self.user_eleve)
+        self.assertEqual(user.backend, 'school_management.backends.SchoolAuthBackend')
+
+    def test_homonyme_selon_type(self):
+        self.assertEqual(authenticate(username='ETU001', password='autre', user_type='admin'), self.homonyme)
+        self.assertEqual(authenticate(username='ETU001', password='motdepasse', user_type='eleve'), self.user_eleve)
+        # Le type choisi désigne le compte vérifié : le mot de passe de l'autre compte est refusé
+        self.assertIsNone(authenticate(username='ETU001', password='motdepasse', user_type='admin'))
+        self.assertIsNone(authenticate(username='ETU001', password='autre', user_type='eleve'))
+
+    def test_une_requete_un_hachage(self):
+        """Mot de passe erroné, identifiant inconnu ou connexion réussie : une requête et un hachage"""
+        cas = [('prof', 'faux', None), ('inconnu', 'motdepasse', None), ('prof', 'motdepasse', self.user_prof)]
+        for username, password, attendu in cas:
+            # encode calcule le hachage, y compris pour verify
+            hachage = mock.patch.object(
+                MD5PasswordHasher, 'encode', autospec=True, side_effect=MD5PasswordHasher.encode
+            )
+            with self.subTest(username=username, password=password), hachage as encode, self.assertNumQueries(1):
+                self.assertEqual(authenticate(username=username, password=password), attendu)
+                self.assertEqual(encode.call_count, 1)
+
+    def test_refus(self):
+        self.assertIsNone(authenticate(username='prof', password='faux'))
+        self.assertIsNone(authenticate(username='inconnu', password='motdepasse'))
+        self.user_prof.is_active = False
+        self.user_prof.save()
+        self.assertIsNone(authenticate(username='prof', password='motdepasse'))
+
+    def test_formulaire_de_connexion(self):
+        reponse = self.client.post(
+            reverse('school_management:login'), {'username': 'ETU001', 'password': 'motdepasse', 'user_type': 'eleve'}
+        )
+        self.assertEqual(reponse.status_code, 302)
+        self.assertEqual(int(self.client.session[SESSION_KEY]), self.user_eleve.pk)
+
+    def test_session_ancien_backend(self):
+        """Une session ouverte avec un ancien chemin de backend reste valide"""
+        self.client.force_login(self.user_prof, backend='school_management.backends.ProfesseurAuthBackend')
+        reponse = self.client.get(reverse('school_management:dashboard'))
+        self.assertTrue(reponse.wsgi_request.user.is_authenticated)
+        self.assertEqual(reponse.wsgi_request.user, self.user_prof)
@@ -0,0 +1,309 @@
+"""
+Budgets de requêtes SQL par URL et par rôle
+
+Chaque URL de school_management/urls.py est appelée en GET par chaque rôle,
+cache vidé, sur l'école de creer_ecole() : le nombre de requêtes SQL ne doit
+pas dépasser le budget déclaré dans BUDGETS. Une boucle qui réintroduit une
+requête par ligne (élève, évaluation, message...) dépasse le budget de la
+vue. Une URL ajoutée sans budget fait échouer test_toutes_les_urls_ont_un_budget.
+
+Lancement, sur SQLite en mémoire :
+    python manage.py test school_management --settings=school_system.settings_test
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, reverse
+
+from .. import urls as urls_application
+from ..models import Bulletin, Evaluation, ReservationSalle
+from .donnees import creer_ecole
+
+
+ROLES = ('admin', 'professeur', 'eleve', 'parent')
+
+# Nombre maximal de requêtes SQL par nom d'URL : un entier pour tous les
+# rôles, ou un budget par rôle. À abaisser quand une vue est optimisée.
+BUDGETS = {
+    'dashboard': 5,
+    'login': 5,
+    'eleve_dashboard': {'admin': 5, 'professeur': 5, 'eleve': 12, 'parent': 5},
+    'professeur_dashboard': {'admin': 5, 'professeur': 17, 'eleve': 5, 'parent': 5},
+    'parent_dashboard': {'admin': 5, 'professeur': 5, 'eleve': 5, 'parent': 17},
+    'eleve_list': {'admin': 8, 'professeur': 9, 'eleve': 8, 'parent': 8},
+    'eleve_create': {'admin': 6, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'eleve_detail': {'admin': 11, 'professeur': 15, 'eleve': 11, 'parent': 6},
+    'eleve_update': {'admin': 7, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'eleve_delete': {'admin': 7, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'professeur_list': {'admin': 23, 'professeur': 14, 'eleve': 14, 'parent': 23},
+    'professeur_create': {'admin': 7, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'professeur_detail': {'admin': 37, 'professeur': 38, 'eleve': 37, 'parent': 37},
+    'professeur_update': {'admin': 11, 'professeur': 12, 'eleve': 11, 'parent': 11},
+    'professeur_delete': {'admin': 11, 'professeur': 12, 'eleve': 11, 'parent': 11},
+    'classe_list': {'admin': 16, 'professeur': 14, 'eleve': 16, 'parent': 16},
+    'classe_create': 5,
+    'classe_detail': {'admin': 35, 'professeur': 38, 'eleve': 35, 'parent': 35},
+    'classe_update': {'admin': 11, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'classe_delete': {'admin': 17, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'matiere_list': {'admin': 26, 'professeur': 27, 'eleve': 26, 'parent': 26},
+    'matiere_create': 5,
+    'matiere_detail': {'admin': 30, 'professeur': 31, 'eleve': 30, 'parent': 30},
+    'matiere_update': {'admin': 6, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'matiere_delete': {'admin': 13, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'evaluation_list': {'admin': 27, 'professeur': 24, 'eleve': 16, 'parent': 27},
+    'evaluation_create': {'admin': 11, 'professeur': 12, 'eleve': 5, 'parent': 11},
+    'evaluation_detail': {'admin': 13, 'professeur': 15, 'eleve': 15, 'parent': 6},
+    'evaluation_update': {'admin': 12, 'professeur': 13, 'eleve': 5, 'parent': 12},
+    'evaluation_delete': {'admin': 10, 'professeur': 11, 'eleve': 5, 'parent': 10},
+    'saisir_notes': {'admin': 13, 'professeur': 14, 'eleve': 5, 'parent': 13},
+    'note_list': {'admin': 7, 'professeur': 8, 'eleve': 7, 'parent': 7},
+    'notes_eleve': {'admin': 10, 'professeur': 12, 'eleve': 10, 'parent': 6},
+    'absence_list': {'admin': 46, 'professeur': 47, 'eleve': 10, 'parent': 46},
+    'absence_create': {'admin': 24, 'professeur': 25, 'eleve': 5, 'parent': 24},
+    'absence_detail': {'admin': 9, 'professeur': 11, 'eleve': 9, 'parent': 6},
+    'absence_update': {'admin': 25, 'professeur': 26, 'eleve': 5, 'parent': 25},
+    'absence_delete': {'admin': 9, 'professeur': 10, 'eleve': 5, 'parent': 9},
+    'rapports': {'admin': 21, 'professeur': 22, 'eleve': 21, 'parent': 21},
+    'rapport_classe': {'admin': 9, 'professeur': 10, 'eleve': 9, 'parent': 9},
+    'bulletin_eleve': {'admin': 9, 'professeur': 10, 'eleve': 9, 'parent': 9},
+    'audit_logs': {'admin': 74, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'parent_list': {'admin': 12, 'professeur': 13, 'eleve': 12, 'parent': 12},
+    'parent_create': {'admin': 24, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'parent_detail': {'admin': 12, 'professeur': 13, 'eleve': 14, 'parent': 13},
+    'parent_update': {'admin': 27, 'professeur': 5, 'eleve': 5, 'parent': 27},
+    'parent_delete': {'admin': 12, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'communication_list': {'admin': 10, 'professeur': 9, 'eleve': 10, 'parent': 9},
+    'communication_create': {'admin': 6, 'professeur': 7, 'eleve': 5, 'parent': 5},
+    'communication_detail': {'admin': 7, 'professeur': 6, 'eleve': 7, 'parent': 6},
+    'communication_update': {'admin': 7, 'professeur': 7, 'eleve': 5, 'parent': 5},
+    'user_profile': {'admin': 5, 'professeur': 6, 'eleve': 5, 'parent': 5},
+    'change_password': {'admin': 5, 'professeur': 6, 'eleve': 5, 'parent': 5},
+    'generate_bulletin': {'admin': 118, 'professeur': 119, 'eleve': 6, 'parent': 119},
+    'absence_statistics': {'admin': 40, 'professeur': 41, 'eleve': 40, 'parent': 40},
+    'results_analysis': {'admin': 13, 'professeur': 14, 'eleve': 13, 'parent': 13},
+    'export_user_data': {'admin': 29, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'sync_user_accounts': {'admin': 8, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'communication_delete': {'admin': 7, 'professeur': 7, 'eleve': 5, 'parent': 5},
+    'parent_enfant_detail': {'admin': 5, 'professeur': 5, 'eleve': 5, 'parent': 25},
+    'parent_notes': {'admin': 5, 'professeur': 5, 'eleve': 5, 'parent': 42},
+    'parent_absences': {'admin': 5, 'professeur': 5, 'eleve': 5, 'parent': 17},
+    'bulletin_list': {'admin': 5, 'professeur': 6, 'eleve': 7, 'parent': 9},
+    'bulletin_detail': {'admin': 11, 'professeur': 15, 'eleve': 14, 'parent': 16},
+    'bulletin_prof_list': {'admin': 5, 'professeur': 16, 'eleve': 5, 'parent': 5},
+    'bulletin_prof_detail': {'admin': 11, 'professeur': 15, 'eleve': 6, 'parent': 6},
+    'bulletin_update': {'admin': 9, 'professeur': 14, 'eleve': 6, 'parent': 6},
+    'prof_principal_bulletins': {'admin': 13, 'professeur': 13, 'eleve': 5, 'parent': 5},
+    'generer_bulletins_classe': {'admin': 6, 'professeur': 7, 'eleve': 6, 'parent': 6},
+    'publier_bulletins_classe': {'admin': 11, 'professeur': 12, 'eleve': 6, 'parent': 6},
+    'bulletin_detaille': {'admin': 9, 'professeur': 11, 'eleve': 9, 'parent': 10},
+    'publier_bulletin': {'admin': 8, 'professeur': 10, 'eleve': 6, 'parent': 6},
+    'mes_bulletins': {'admin': 6, 'professeur': 5, 'eleve': 6, 'parent': 6},
+    'bulletin_valider': 5,
+    'bulletin_generer_eleve': 5,
+    'admin_dashboard': {'admin': 20, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_statistics': {'admin': 31, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_metriques': 5,
+    'metrics': 5,
+    'admin_users': {'admin': 11, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_prof_principal': {'admin': 27, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_user_management': {'admin': 13, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_create_user': 5,
+    'admin_edit_user': {'admin': 7, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_users_without_accounts': {'admin': 8, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_create_eleve_user': {'admin': 9, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_edit_eleve_user': {'admin': 9, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_create_professeur_user': {'admin': 4, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_edit_professeur_user': {'admin': 4, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_create_parent_user': {'admin': 7, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_edit_parent_user': {'admin': 7, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_user_details': {'admin': 9, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'admin_reset_user_password': {'admin': 8, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'planning_dashboard': {'admin': 12, 'professeur': 13, 'eleve': 13, 'parent': 11},
+    'salle_list': {'admin': 7, 'professeur': 8, 'eleve': 7, 'parent': 7},
+    'salle_create': {'admin': 5, 'professeur': 6, 'eleve': 5, 'parent': 5},
+    'salle_detail': 3,
+    'salle_update': {'admin': 6, 'professeur': 7, 'eleve': 5, 'parent': 5},
+    'salle_delete': {'admin': 6, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'creneau_list': {'admin': 6, 'professeur': 7, 'eleve': 6, 'parent': 6},
+    'creneau_create': 5,
+    'creneau_update': {'admin': 6, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'creneau_delete': {'admin': 6, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'emploi_list': {'admin': 25, 'professeur': 26, 'eleve': 25, 'parent': 25},
+    'emploi_create': {'admin': 13, 'professeur': 14, 'eleve': 5, 'parent': 5},
+    'emploi_detail': {'admin': 13, 'professeur': 14, 'eleve': 13, 'parent': 13},
+    'emploi_update': {'admin': 14, 'professeur': 15, 'eleve': 5, 'parent': 5},
+    'emploi_delete': {'admin': 13, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'emploi_classe': {'admin': 11, 'professeur': 12, 'eleve': 11, 'parent': 11},
+    'emploi_professeur': {'admin': 9, 'professeur': 10, 'eleve': 9, 'parent': 9},
+    'emploi_conflits': {'admin': 6, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'emploi_generer': {'admin': 6, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'emploi_eleve': {'admin': 5, 'professeur': 5, 'eleve': 9, 'parent': 5},
+    'calendrier': {'admin': 8, 'professeur': 9, 'eleve': 8, 'parent': 8},
+    'evenement_list': {'admin': 9, 'professeur': 10, 'eleve': 9, 'parent': 9},
+    'evenement_create': {'admin': 10, 'professeur': 11, 'eleve': 5, 'parent': 5},
+    'evenement_detail': 3,
+    'evenement_update': {'admin': 13, 'professeur': 14, 'eleve': 5, 'parent': 5},
+    'evenement_delete': {'admin': 8, 'professeur': 5, 'eleve': 5, 'parent': 5},
+    'reservation_list': {'admin': 8, 'professeur': 9, 'eleve': 8, 'parent': 8},
+    'reservation_create': {'admin': 6, 'professeur': 7, 'eleve': 6, 'parent': 6},
+    'reservation_detail': 3,
+    'reservation_update': {'admin': 9, 'professeur': 10, 'eleve': 7, 'parent': 7},
+    'reservation_delete': {'admin': 5, 'professeur': 5, 'eleve': 7, 'parent': 7},
+    'reservation_valider': {'admin': 4, 'professeur': 4, 'eleve': 6, 'parent': 6},
+    'salles_disponibles': 5,
+    'conflits_emploi': 5,
+    'messaging_dashboard': {'admin': 7, 'professeur': 9, 'eleve': 8, 'parent': 8},
+    'conversation_list': {'admin': 6, 'professeur': 11, 'eleve': 7, 'parent': 10},
+    'conversation_create': {'admin': 6, 'professeur': 7, 'eleve': 5, 'parent': 5},
+    'conversation_detail': {'admin': 6, 'professeur': 26, 'eleve': 25, 'parent': 23},
+    'conversation_update': {'admin': 6, 'professeur': 8, 'eleve': 8, 'parent': 7},
+    'send_message': 6,
+    'add_participants': {'admin': 6, 'professeur': 30, 'eleve': 7, 'parent': 7},
+    'remove_participant': {'admin': 6, 'professeur': 10, 'eleve': 7, 'parent': 7},
+    'get_conversation_messages': {'admin': 6, 'professeur': 13, 'eleve': 13, 'parent': 11},
+    'mark_messages_read': 5,
+}
+
+URLS_EXCLUES = {
+    'logout': 'termine la session du client',
+    'message_stream': 'flux de longue durée, sans requête SQL pendant l\'attente',
+}
+
+# Réponses normales d'une vue à un GET : page, redirection, ou refus selon le
+# rôle (403, 404 hors de ses conversations), la méthode (405) ou les paramètres (400)
+STATUTS_ATTENDUS = (200, 302, 400, 403, 404, 405)
+
+# Vues en erreur (500) sur les données de test, pour les rôles qui y ont accès :
+# leur nombre de requêtes n'est pas vérifié. À retirer une fois la vue corrigée.
+ECHECS_ATTENDUS = {
+    'salle_detail': 'gabarit planning/salle_detail.html absent',
+    'evenement_detail': 'gabarit planning/evenement_detail.html absent',
+    'reservation_detail': 'gabarit planning/reservation_detail.html absent',
+    'reservation_delete': 'gabarit planning/reservation_confirm_delete.html absent',
+    'reservation_valider': 'gabarit planning/validation_reservation.html absent',
+}
+
+# Modèle désigné par <pk> dans les vues fonctions (les vues génériques ont leur attribut model)
+MODELES_PK = {
+    'saisir_notes': Evaluation,
+    'bulletin_valider': Bulletin,
+    'reservation_valider': ReservationSalle,
+}
+
+# Objet de référence de l'école pour chaque paramètre d'URL nommé
+OBJETS_PAR_PARAMETRE = {
+    'eleve_id': 'eleve',
+    'classe_id': 'classe',
+    'professeur_id': 'professeur',
+    'parent_id': 'parent',
+    'bulletin_id': 'bulletin',
+    'conversation_id': 'conversation',
+}
+
+SEUIL_REPETITIONS = 3
+
+
+def motifs_application():
+    """Motifs d'URL nommés de l'application"""
+    return [
+        motif for motif in urls_application.urlpatterns
+        if isinstance(motif, URLPattern) and motif.name
+    ]
+
+
+def budget(nom, role):
+    valeur = BUDGETS[nom]
+    return valeur if isinstance(valeur, int) else valeur[role]
+
+
+class BudgetsRequetesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ecole = creer_ecole()
+        cls.utilisateurs = {
+            'admin': cls.ecole.admin,
+            'professeur': cls.ecole.professeur.user,
+            'eleve': cls.ecole.eleve.user,
+            'parent': cls.ecole.parent.user,
+        }
+
+    def objet_reference(self, modele):
+        for objet in vars(self.ecole).values():
+            if isinstance(objet, modele):
+                return objet
+        raise LookupError(f'Aucun objet de référence pour {modele.__name__}')
+
+    def url(self, motif):
+        parametres = {}
+        for nom in motif.pattern.converters:
+            if nom == 'pk':
+                vue = getattr(motif.callback, 'view_class', None)
+                modele = MODELES_PK.get(motif.name) or getattr(vue, 'model', None)
+                parametres[nom] = self.objet_reference(modele).pk
+            elif nom == 'user_id':
+                parametres[nom] = self.ecole.eleve.user_id
+            elif nom == 'trimestre':
+                parametres[nom] = 1
+            else:
+                parametres[nom] = getattr(self.ecole, OBJETS_PAR_PARAMETRE[nom]).pk
+        return reverse(f'{urls_application.app_name}:{motif.name}', kwargs=parametres)
+
+    def mesurer(self, role, url):
+        """
+        Code de réponse et requêtes SQL d'un GET sur url, cache vide ; les
+        écritures de la vue sont annulées
+        """
+        client = Client(raise_request_exception=False)
+        client.force_login(self.utilisateurs[role])
+        cache.clear()
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as requetes:
+                reponse = client.get(url)
+            transaction.set_rollback(True)
+        return reponse.status_code, [requete['sql'] for requete in requetes.captured_queries]
+
+    def verifier_budgets(self, role):
+        for motif in motifs_application():
+            if motif.name in URLS_EXCLUES:
+                continue
+            url = self.url(motif)
+            with self.subTest(url=motif.name, role=role):
+                statut, requetes = self.mesurer(role, url)
+                if statut >= 500 and motif.name in ECHECS_ATTENDUS:
+                    continue
+                self.assertIn(statut, STATUTS_ATTENDUS, f'{url} ({role})')
+                maximum = budget(motif.name, role)
+                if len(requetes) > maximum:
+                    repetees = [
+                        f'  {nombre} × {sql[:200]}'
+                        for sql, nombre in Counter(requetes).most_common(5) if nombre >= SEUIL_REPETITIONS
+                    ]
+                    self.fail('\n'.join([
+                        f'{url} ({role}) : {len(requetes)} requêtes SQL pour un budget de {maximum}',
+                        *repetees
+                    ]))
+
+    def test_toutes_les_urls_ont_un_budget(self):
+        noms = {motif.name for motif in motifs_application()} - set(URLS_EXCLUES)
+        self.assertEqual(sorted(noms - set(BUDGETS)), [], 'URL sans budget de requêtes')
+        self.assertEqual(sorted(set(BUDGETS) - noms), [], 'Budget pour une URL inexistante')
+        self.assertEqual(sorted(set(ECHECS_ATTENDUS) - noms), [], 'Échec attendu pour une URL inexistante')
+        for nom, valeur in BUDGETS.items():
+            if not isinstance(valeur, int):
+                self.assertEqual(set(valeur), set(ROLES), f'Budget incomplet pour {nom}')
+
+    def test_budgets_admin(self):
+        self.verifier_budgets('admin')
+
+    def test_budgets_professeur(self):
+        self.verifier_budgets('professeur')
+
+    def test_budgets_eleve(self):
+        self.verifier_budgets('eleve')
+
+    def test_budgets_parent(self):
+        self.verifier_budgets('parent')
@@ -0,0 +1,104 @@
+"""
+Conflits de l'emploi du temps détectés par ConflitsEmploi
+"""
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ..conflits_emploi import ConflitsEmploi, annoter
+from ..models import Classe, Creneau, EmploiDuTemps, Matiere, Professeur, Salle
+
+
+ANNEE_SCOLAIRE = '2024-2025'
+
+
+class ConflitsEmploiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.professeurs = [
+            Professeur.objects.create(
+                user=User.objects.create_user(f'prof{p}', password='motdepasse'), civilite='M',
+                date_embauche=datetime.date(2015, 9, 1)
+            )
+            for p in range(3)
+        ]
+        cls.classes = [Classe.objects.create(nom=f'6e{c}', niveau='6e') for c in range(3)]
+        # Une matière par horaire : une matière n'a qu'un cours par classe
+        cls.matieres = {
+            heure: Matiere.objects.create(nom=f'Matière {heure}h', code=f'M{heure}') for heure in (8, 9)
+        }
+        cls.salles = [Salle.objects.create(nom=f'Salle {s}', numero=f'S{s}') for s in range(3)]
+        cls.lundi_8h, cls.lundi_9h = (
+            Creneau.objects.create(jour='LUNDI', heure_debut=datetime.time(heure), heure_fin=datetime.time(heure, 55))
+            for heure in (8, 9)
+        )
+
+        def cours(classe, professeur, salle, creneau, **autres):
+            return EmploiDuTemps.objects.create(
+                classe=cls.classes[classe], matiere=cls.matieres[creneau.heure_debut.hour],
+                professeur=cls.professeurs[professeur],
+                salle=cls.salles[salle], creneau=creneau, annee_scolaire=ANNEE_SCOLAIRE, **autres
+            )
+
+        # Lundi 8h : prof0 dans deux classes, la salle 1 partagée par deux autres cours
+        cls.prof_a = cours(0, 0, 0, cls.lundi_8h)
+        cls.prof_b = cours(1, 0, 1, cls.lundi_8h)
+        cls.salle_b = cours(2, 1, 1, cls.lundi_8h)
+        # Lundi 9h : aucun conflit parmi les cours actifs du semestre 1
+        cls.seul = cours(0, 2, 2, cls.lundi_9h)
+        cours(1, 2, 2, cls.lundi_9h, actif=False)
+        cours(2, 2, 2, cls.lundi_9h, semestre=2)
+
+    def charger(self):
+        return ConflitsEmploi.charger(ANNEE_SCOLAIRE, 1)
+
+    def test_conflit_professeur(self):
+        conflits = self.charger().conflits_de(self.prof_a)
+        self.assertEqual(conflits, {'professeur': [self.prof_b], 'salle': [], 'classe': []})
+
+    def test_conflit_salle(self):
+        conflits = self.charger().conflits_de(self.salle_b)
+        self.assertEqual(conflits, {'professeur': [], 'salle': [self.prof_b], 'classe': []})
+
+    def test_conflit_classe(self):
+        # Un seul cours actif par classe et créneau en base (unique_together) : index construit en mémoire
+        doublon = EmploiDuTemps(
+            pk=0, classe=self.classes[0], matiere=self.matieres[9], professeur=self.professeurs[1],
+            salle=self.salles[2], creneau=self.lundi_8h, annee_scolaire=ANNEE_SCOLAIRE
+        )
+        moteur = ConflitsEmploi([self.prof_a, doublon])
+        self.assertEqual(moteur.conflits_de(doublon), {'professeur': [], 'salle': [], 'classe': [self.prof_a]})
+
+    def test_cours_envisage(self):
+        moteur = self.charger()
+        conflits = moteur.conflits(
+            self.lundi_9h.pk, professeur_id=self.professeurs[2].pk, salle_id=self.salles[2].pk,
+            classe_id=self.classes[0].pk
+        )
+        self.assertEqual(conflits, {'professeur': [self.seul], 'salle': [self.seul], 'classe': [self.seul]})
+        # Modification du cours lui-même : il n'entre pas en conflit avec sa version enregistrée
+        conflits = moteur.conflits(self.lundi_9h.pk, professeur_id=self.professeurs[2].pk, exclure=self.seul.pk)
+        self.assertEqual(conflits, {'professeur': [], 'salle': [], 'classe': []})
+
+    def test_inactifs_et_autre_semestre_ignores(self):
+        self.assertEqual(self.charger().conflits_de(self.seul), {'professeur': [], 'salle': [], 'classe': []})
+
+    def test_tous(self):
+        conflits = {
+            (dimension, creneau_id, ressource_id): sorted(emploi.pk for emploi in cours)
+            for dimension, creneau_id, ressource_id, cours in self.charger().tous()
+        }
+        self.assertEqual(conflits, {
+            ('professeur', self.lundi_8h.pk, self.professeurs[0].pk): [self.prof_a.pk, self.prof_b.pk],
+            ('salle', self.lundi_8h.pk, self.salles[1].pk): [self.prof_b.pk, self.salle_b.pk],
+        })
+
+    def test_annoter(self):
+        emplois = annoter(list(EmploiDuTemps.objects.filter(semestre=1, actif=True).order_by('pk')))
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [(emploi.conflit_professeur(), emploi.conflit_salle(), emploi.a_des_conflits()) for emploi in emplois],
+                [(True, False, True), (True, True, True), (False, True, True), (False, False, False)]
+            )
@@ -0,0 +1,218 @@
+"""
+Disponibilité des salles : index en mémoire, mises à jour par le journal et
+conflits de réservation
+"""
+import datetime
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import disponibilites
+from ..disponibilites import _chevauche, _fusionner, grille_salles_libres, salles_libres, salles_libres_lot
+from ..forms import ReservationSalleForm
+from ..models import AnneeScolaire, Classe, Creneau, EmploiDuTemps, Matiere, Professeur, ReservationSalle, Salle
+
+
+ANNEE_SCOLAIRE = '2024-2025'
+# Un lundi et un mardi du premier semestre, un lundi du second
+LUNDI = datetime.date(2024, 10, 7)
+MARDI = datetime.date(2024, 10, 8)
+LUNDI_S2 = datetime.date(2025, 2, 10)
+
+
+def instant(jour, heure, minute=0):
+    return timezone.make_aware(datetime.datetime.combine(jour, datetime.time(heure, minute)))
+
+
+def ids(salles):
+    return [salle['id'] for salle in salles]
+
+
+class DisponibilitesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        AnneeScolaire.objects.create(
+            annee=ANNEE_SCOLAIRE, date_debut=datetime.date(2024, 9, 1), date_fin=datetime.date(2025, 7, 4)
+        )
+        cls.user = User.objects.create_user('prof', password='motdepasse')
+        professeur = Professeur.objects.create(user=cls.user, civilite='M', date_embauche=datetime.date(2015, 9, 1))
+        cls.petite = Salle.objects.create(nom='Petite', numero='S1', capacite=15)
+        cls.grande = Salle.objects.create(nom='Grande', numero='S2', capacite=40)
+        cls.labo = Salle.objects.create(nom='Labo', numero='S3', capacite=25, type_salle='LABO')
+        Salle.objects.create(nom='Fermée', numero='S4', active=False)
+        cls.lundi_8h, cls.lundi_9h = (
+            Creneau.objects.create(jour='LUNDI', heure_debut=datetime.time(h), heure_fin=datetime.time(h, 55))
+            for h in (8, 9)
+        )
+        # Cours hebdomadaire du lundi 8h dans la grande salle, au premier semestre
+        cls.cours = EmploiDuTemps.objects.create(
+            classe=Classe.objects.create(nom='6eA', niveau='6e'),
+            matiere=Matiere.objects.create(nom='Physique', code='PHY'),
+            professeur=professeur, salle=cls.grande, creneau=cls.lundi_8h, annee_scolaire=ANNEE_SCOLAIRE
+        )
+        # Trois réservations contiguës ou chevauchantes de la petite salle : 14h-17h une fois fusionnées
+        for debut, fin in (((14, 0), (15, 0)), ((14, 30), (16, 0)), ((16, 0), (17, 0))):
+            cls.reserver(cls.petite, instant(LUNDI, *debut), instant(LUNDI, *fin), statut='CONFIRME')
+        # Une demande non confirmée n'occupe pas la salle
+        cls.reserver(cls.labo, instant(LUNDI, 14), instant(LUNDI, 15))
+
+    @classmethod
+    def reserver(cls, salle, debut, fin, **autres):
+        return ReservationSalle.objects.create(
+            salle=salle, utilisateur=cls.user, titre=f'{salle.nom} {debut:%H:%M}', date_debut=debut, date_fin=fin,
+            **autres
+        )
+
+    def setUp(self):
+        # Version inconnue : chaque test part d'un index reconstruit
+        cache.clear()
+
+    def libres(self, debut, fin, **filtres):
+        return ids(salles_libres(debut, fin, **filtres))
+
+    def test_fusion_des_intervalles(self):
+        occupation = _fusionner([(5, 6), (1, 3), (2, 5), (8, 9)])
+        self.assertEqual(occupation, ([1, 8], [6, 9]))
+        # Intervalles semi-ouverts : se terminer au début d'une occupation n'est pas un chevauchement
+        self.assertFalse(_chevauche(occupation, 0, 1))
+        self.assertTrue(_chevauche(occupation, 0, 2))
+        self.assertFalse(_chevauche(occupation, 6, 8))
+        self.assertTrue(_chevauche(occupation, 7, 10))
+        self.assertFalse(_chevauche(occupation, 9, 12))
+
+    def test_reservations_fusionnees(self):
+        petite = self.petite.pk
+        self.assertIn(petite, self.libres(instant(LUNDI, 13), instant(LUNDI, 14)))
+        self.assertNotIn(petite, self.libres(instant(LUNDI, 15, 50), instant(LUNDI, 16, 10)))
+        self.assertNotIn(petite, self.libres(instant(LUNDI, 16, 30), instant(LUNDI, 18)))
+        self.assertIn(petite, self.libres(instant(LUNDI, 17), instant(LUNDI, 18)))
+        # Demande non confirmée et salle inactive ignorées
+        self.assertEqual(
+            self.libres(instant(LUNDI, 14), instant(LUNDI, 15)), [self.grande.pk, self.labo.pk]
+        )
+
+    def test_filtres_capacite_et_type(self):
+        debut, fin = instant(MARDI, 10), instant(MARDI, 11)
+        self.assertEqual(self.libres(debut, fin), [self.petite.pk, self.grande.pk, self.labo.pk])
+        self.assertEqual(self.libres(debut, fin, capacite_min=20), [self.grande.pk, self.labo.pk])
+        self.assertEqual(self.libres(debut, fin, type_salle='LABO'), [self.labo.pk])
+        self.assertEqual(self.libres(debut, fin, capacite_min=30, type_salle='LABO'), [])
+
+    def test_cours_hebdomadaires(self):
+        grande = self.grande.pk
+        # Tous les lundis du semestre, y compris pour un intervalle à cheval sur le créneau
+        for lundi in (LUNDI, LUNDI + datetime.timedelta(weeks=5)):
+            self.assertNotIn(grande, self.libres(instant(lundi, 8, 30), instant(lundi, 8, 45)))
+            self.assertNotIn(grande, self.libres(instant(lundi, 7), instant(lundi, 8, 1)))
+        self.assertIn(grande, self.libres(instant(LUNDI, 8, 55), instant(LUNDI, 9, 30)))
+        self.assertIn(grande, self.libres(instant(MARDI, 8), instant(MARDI, 9)))
+        # Second semestre et hors de l'année scolaire : le cours n'a pas lieu
+        self.assertIn(grande, self.libres(instant(LUNDI_S2, 8), instant(LUNDI_S2, 9)))
+        rentree = datetime.date(2025, 9, 1)
+        self.assertIn(grande, self.libres(instant(rentree, 8), instant(rentree, 9)))
+        # Intervalle de plusieurs jours qui couvre le lundi matin
+        dimanche = LUNDI - datetime.timedelta(days=1)
+        self.assertNotIn(grande, self.libres(instant(dimanche, 20), instant(LUNDI, 8, 10)))
+
+    def test_mise_a_jour_par_le_journal(self):
+        debut, fin = instant(MARDI, 10), instant(MARDI, 11)
+        self.assertIn(self.labo.pk, self.libres(debut, fin))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation = self.reserver(self.labo, debut, fin, statut='CONFIRME')
+            self.cours.actif = False
+            self.cours.save()
+
+        index = disponibilites._index
+        with mock.patch.object(index, 'construire') as construire, \
+                mock.patch.object(index, 'appliquer', wraps=index.appliquer) as appliquer:
+            self.assertNotIn(self.labo.pk, self.libres(debut, fin))
+            self.assertIn(self.grande.pk, self.libres(instant(LUNDI, 8), instant(LUNDI, 9)))
+        construire.assert_not_called()
+        appliquer.assert_called_once_with([('reservation', reservation.pk), ('emploi', self.cours.pk)])
+
+        # Réservation annulée : la salle redevient libre
+        with self.captureOnCommitCallbacks(execute=True):
+            reservation.statut = 'ANNULE'
+            reservation.save()
+        self.assertIn(self.labo.pk, self.libres(debut, fin))
+
+    def test_reconstruction_complete(self):
+        index = disponibilites._index
+        self.libres(instant(MARDI, 10), instant(MARDI, 11))
+
+        # Un créneau déplacé change les minutes de tous ses cours
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lundi_8h.heure_debut, self.lundi_8h.heure_fin = datetime.time(10), datetime.time(10, 55)
+            self.lundi_8h.save()
+        with mock.patch.object(index, 'construire', wraps=index.construire) as construire:
+            self.assertIn(self.grande.pk, self.libres(instant(LUNDI, 8), instant(LUNDI, 9)))
+            self.assertNotIn(self.grande.pk, self.libres(instant(LUNDI, 10), instant(LUNDI, 11)))
+        construire.assert_called_once_with()
+
+        # Entrée du journal évincée : l'index ne peut pas être rattrapé
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reserver(self.grande, instant(MARDI, 10), instant(MARDI, 11), statut='CONFIRME')
+        cache.delete(disponibilites._cle_journal(cache.get(disponibilites.CLE_VERSION)))
+        with mock.patch.object(index, 'construire', wraps=index.construire) as construire:
+            self.assertNotIn(self.grande.pk, self.libres(instant(MARDI, 10), instant(MARDI, 11)))
+        construire.assert_called_once_with()
+
+    def test_lot(self):
+        intervalles = [
+            (instant(LUNDI, 8), instant(LUNDI, 9)),
+            (instant(LUNDI, 14), instant(LUNDI, 15)),
+            (datetime.datetime.combine(MARDI, datetime.time(8)), datetime.datetime.combine(MARDI, datetime.time(9))),
+        ]
+        self.assertEqual(salles_libres_lot(intervalles), [
+            [self.petite.pk, self.labo.pk],
+            [self.grande.pk, self.labo.pk],
+            [self.petite.pk, self.grande.pk, self.labo.pk],
+        ])
+        self.assertEqual(salles_libres_lot(intervalles, capacite_min=20), [
+            [self.labo.pk], [self.grande.pk, self.labo.pk], [self.grande.pk, self.labo.pk]
+        ])
+
+    def test_grille_de_la_semaine(self):
+        # N'importe quel jour de la semaine désigne la semaine entière
+        grille = grille_salles_libres(LUNDI + datetime.timedelta(days=3))
+        self.assertEqual(grille, {
+            self.lundi_8h.pk: [self.petite.pk, self.labo.pk],
+            self.lundi_9h.pk: [self.petite.pk, self.grande.pk, self.labo.pk],
+        })
+
+        self.client.force_login(self.user)
+        url = reverse('school_management:salles_disponibles')
+        reponse = self.client.get(url, {'jour': LUNDI.isoformat(), 'type_salle': 'LABO'})
+        self.assertEqual(reponse.json(), {
+            'creneaux': {str(self.lundi_8h.pk): [self.labo.pk], str(self.lundi_9h.pk): [self.labo.pk]}
+        })
+        self.assertEqual(self.client.get(url, {'jour': 'lundi'}).status_code, 400)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_formulaire_conflit_avec_un_cours(self):
+        donnees = {
+            'salle': self.grande.pk, 'titre': 'Réunion', 'nombre_personnes': 10,
+            'date_debut': instant(LUNDI + datetime.timedelta(weeks=1), 8, 30).strftime('%Y-%m-%d %H:%M'),
+            'date_fin': instant(LUNDI + datetime.timedelta(weeks=1), 9, 30).strftime('%Y-%m-%d %H:%M'),
+        }
+        form = ReservationSalleForm(donnees)
+        self.assertFalse(form.is_valid())
+        self.assertIn('occupée par un cours', form.non_field_errors()[0])
+        self.assertIn('Physique', form.non_field_errors()[0])
+
+        form = ReservationSalleForm({**donnees, 'salle': self.petite.pk})
+        self.assertTrue(form.is_valid(), form.errors)
+
+    def test_formulaire_conflit_avec_une_reservation(self):
+        form = ReservationSalleForm({
+            'salle': self.petite.pk, 'titre': 'Réunion', 'nombre_personnes': 10,
+            'date_debut': f'{LUNDI} 15:30', 'date_fin': f'{LUNDI} 16:30',
+        })
+        self.assertFalse(form.is_valid())
+        self.assertIn('déjà réservée', form.non_field_errors()[0])
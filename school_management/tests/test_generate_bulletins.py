@@ -0,0 +1,164 @@
+"""
+Commande generate_bulletins : écritures groupées, reprise et workers
+"""
+from concurrent.futures import Future
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from ..management.commands import generate_bulletins
+from ..models import Bulletin, Classe, NoteBulletin, ProgressionGenerationBulletins
+from .donnees import ANNEE_SCOLAIRE, creer_ecole
+
+
+class ExecuteurSynchrone:
+    """Remplace ProcessPoolExecutor : la base de test en mémoire n'est pas visible des processus fils"""
+    instances = []
+
+    def __init__(self, max_workers, initializer):
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self.soumis = []
+        self.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fonction, *args):
+        self.soumis.append(args[0])
+        future = Future()
+        future.set_result(fonction(*args))
+        return future
+
+
+class GenerateBulletinsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ecole = creer_ecole()
+        cls.classes = list(Classe.objects.order_by('id'))
+        # Première classe sans bulletin : créations ; les deux autres : mises à jour avec --force
+        Bulletin.objects.filter(classe=cls.classes[0]).delete()
+        Bulletin.objects.update(moyenne_generale=0, rang=None)
+
+    def generer(self, **options):
+        sortie = StringIO()
+        call_command('generate_bulletins', trimestre=1, annee=ANNEE_SCOLAIRE, stdout=sortie, **options)
+        return sortie.getvalue()
+
+    def resultats(self):
+        return {
+            bulletin.eleve_id: (
+                bulletin.classe_id, bulletin.moyenne_generale, bulletin.rang, bulletin.moyenne_classe,
+                bulletin.effectif_classe,
+                sorted((note.matiere_id, note.moyenne_matiere) for note in bulletin.notes_detaillees.all())
+            )
+            for bulletin in Bulletin.objects.prefetch_related('notes_detaillees')
+        }
+
+    def verifier_bulletin(self, bulletin):
+        """Compare le bulletin écrit en masse aux calculs faits bulletin par bulletin"""
+        self.assertEqual(bulletin.moyenne_generale, bulletin.calculer_moyenne_generale())
+        self.assertEqual(bulletin.rang, bulletin.calculer_rang())
+        self.assertEqual(bulletin.moyenne_classe, bulletin.calculer_moyenne_classe())
+        self.assertEqual(bulletin.effectif_classe, bulletin.calculer_effectif_classe())
+        moyennes = bulletin.get_resultats_classe().moyennes_par_matiere(bulletin.eleve_id)
+        self.assertEqual(
+            {note.matiere_id: note.moyenne_matiere for note in bulletin.notes_detaillees.all()},
+            {matiere.id: generate_bulletins.arrondir(moyenne) for matiere, moyenne in moyennes.items()}
+        )
+
+    def test_creations_et_mises_a_jour(self):
+        sortie = self.generer(force=True)
+
+        self.assertIn('Bulletins créés: 6', sortie)
+        self.assertIn('Bulletins mis à jour: 12', sortie)
+        self.assertEqual(Bulletin.objects.count(), 18)
+        self.assertEqual(NoteBulletin.objects.count(), 18 * 4)
+        for bulletin in Bulletin.objects.select_related('classe'):
+            with self.subTest(bulletin.eleve_id):
+                self.verifier_bulletin(bulletin)
+        self.assertEqual(
+            sorted(ProgressionGenerationBulletins.objects.values_list('classe_id', 'bulletins_generes')),
+            [(classe.id, 6) for classe in self.classes]
+        )
+
+    def test_existants_ignores_sans_force(self):
+        sortie = self.generer()
+
+        self.assertIn('Bulletins créés: 6', sortie)
+        self.assertIn('Bulletins ignorés: 12', sortie)
+        self.assertFalse(
+            Bulletin.objects.filter(classe__in=self.classes[1:]).exclude(moyenne_generale=0).exists()
+        )
+
+    def test_ecritures_groupees(self):
+        with CaptureQueriesContext(connection) as contexte:
+            bilan = generate_bulletins.generer_bulletins_classe(self.classes[1].id, 1, ANNEE_SCOLAIRE, force=True)
+
+        self.assertEqual((bilan['mis_a_jour'], bilan['erreur']), (6, None))
+        # Une seule écriture par table, quel que soit l'effectif de la classe
+        ecritures = [
+            requete['sql'].split(' (')[0].split(' SET ')[0].split(' WHERE ')[0]
+            for requete in contexte.captured_queries if requete['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))
+        ]
+        self.assertEqual(ecritures, [
+            'UPDATE "school_management_bulletin"',
+            'DELETE FROM "school_management_notebulletin"',
+            'INSERT INTO "school_management_notebulletin"',
+            'INSERT INTO "school_management_progressiongenerationbulletins"',
+        ])
+
+    def test_reprise(self):
+        ProgressionGenerationBulletins.objects.create(
+            classe=self.classes[1], annee_scolaire=ANNEE_SCOLAIRE, trimestre=1, bulletins_generes=6
+        )
+        sortie = self.generer(force=True, resume=True)
+
+        self.assertIn('Reprise : 1 classe(s) déjà terminée(s) ignorée(s)', sortie)
+        self.assertNotIn(f'Traitement de la classe: {self.classes[1].nom}\n', sortie)
+        self.assertFalse(Bulletin.objects.filter(classe=self.classes[1]).exclude(moyenne_generale=0).exists())
+        for bulletin in Bulletin.objects.filter(classe__in=[self.classes[0], self.classes[2]]):
+            self.verifier_bulletin(bulletin)
+        self.assertEqual(ProgressionGenerationBulletins.objects.count(), 3)
+
+        # Une seconde reprise n'a plus rien à faire
+        sortie = self.generer(force=True, resume=True)
+        self.assertIn('Reprise : 3 classe(s)', sortie)
+        self.assertIn('Bulletins mis à jour: 0', sortie)
+
+    def test_sans_reprise_tout_est_regenere(self):
+        ProgressionGenerationBulletins.objects.create(
+            classe=self.classes[1], annee_scolaire=ANNEE_SCOLAIRE, trimestre=1, bulletins_generes=6
+        )
+        sortie = self.generer(force=True)
+
+        self.assertIn('Bulletins mis à jour: 12', sortie)
+        self.assertFalse(Bulletin.objects.filter(moyenne_generale=0).exists())
+
+    def test_workers_identiques_au_sequentiel(self):
+        with mock.patch.object(generate_bulletins, 'ProcessPoolExecutor', ExecuteurSynchrone):
+            ExecuteurSynchrone.instances.clear()
+            sortie = self.generer(force=True, workers=2)
+
+        executeur, = ExecuteurSynchrone.instances
+        self.assertEqual((executeur.max_workers, executeur.initializer), (2, generate_bulletins.initialiser_worker))
+        self.assertEqual(sorted(executeur.soumis), [classe.id for classe in self.classes])
+        self.assertIn('Bulletins créés: 6', sortie)
+        self.assertIn('2 worker(s)', sortie)
+        en_parallele = self.resultats()
+
+        Bulletin.objects.filter(classe=self.classes[0]).delete()
+        self.generer(force=True)
+        self.assertEqual(self.resultats(), en_parallele)
+
+    def test_workers_invalide(self):
+        with self.assertRaisesMessage(generate_bulletins.CommandError, '--workers'):
+            self.generer(workers=0)
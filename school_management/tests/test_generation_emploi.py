@@ -0,0 +1,65 @@
+"""
+Génération automatique de l'emploi du temps
+"""
+import datetime
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from ..conflits_emploi import ConflitsEmploi
+from ..forms import GenerationEmploiForm
+from ..generation_emploi import generer_emploi_du_temps
+from ..models import Classe, Creneau, EmploiDuTemps, Matiere, Professeur, Salle
+
+
+ANNEE_SCOLAIRE = '2024-2025'
+
+
+class GenerationEmploiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        # Trois classes, trois matières chacune, deux professeurs partagés
+        cls.classes = [Classe.objects.create(nom=f'6e{c}', niveau='6e') for c in range(3)]
+        matieres = [Matiere.objects.create(nom=f'Matière {j}', code=f'MAT{j}') for j in range(3)]
+        for p in range(2):
+            professeur = Professeur.objects.create(
+                user=User.objects.create_user(f'prof{p}', password='motdepasse'), civilite='M',
+                date_embauche=datetime.date(2015, 9, 1)
+            )
+            professeur.matieres.set(matieres[p::2])
+            professeur.classes.set(cls.classes)
+        for s in range(2):
+            Salle.objects.create(nom=f'Salle {s}', numero=f'S{s}')
+        for jour in ('LUNDI', 'MARDI'):
+            for heure in (8, 9, 10, 11):
+                Creneau.objects.create(jour=jour, heure_debut=datetime.time(heure), heure_fin=datetime.time(heure, 55))
+
+    def test_emploi_sans_conflit(self):
+        indicateurs, ignorees, _ = generer_emploi_du_temps(ANNEE_SCOLAIRE, 1, duree=1)
+
+        self.assertEqual(ignorees, [])
+        self.assertEqual(indicateurs['conflits'], 0)
+        self.assertEqual(EmploiDuTemps.objects.count(), 9)
+        self.assertEqual(ConflitsEmploi.charger(ANNEE_SCOLAIRE, 1).tous(), [])
+
+    def test_simulation_rien_ecrit(self):
+        indicateurs, _, _ = generer_emploi_du_temps(ANNEE_SCOLAIRE, 1, duree=1, simulation=True)
+
+        self.assertEqual(indicateurs['cours'], 9)
+        self.assertFalse(EmploiDuTemps.objects.exists())
+
+    def test_conflits_restants_rien_ecrit(self):
+        # Neuf cours pour deux créneaux de deux salles : au moins cinq cours sans place
+        Creneau.objects.exclude(jour='LUNDI', heure_debut__in=(datetime.time(8), datetime.time(9))).delete()
+
+        with self.assertRaisesMessage(ValueError, 'emploi du temps non enregistré'):
+            generer_emploi_du_temps(ANNEE_SCOLAIRE, 1, duree=0.2)
+        self.assertFalse(EmploiDuTemps.objects.exists())
+
+    def test_duree_bornee_sous_le_timeout(self):
+        donnees = {'annee_scolaire': ANNEE_SCOLAIRE, 'semestre': 1, 'duree': 15}
+        self.assertTrue(GenerationEmploiForm(donnees).is_valid())
+        form = GenerationEmploiForm({**donnees, 'duree': 30})
+        self.assertFalse(form.is_valid())
+        self.assertIn('duree', form.errors)
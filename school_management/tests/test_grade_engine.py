@@ -0,0 +1,86 @@
+"""
+Résultats de classe calculés par grade_engine
+
+Les valeurs attendues sont calculées à la main : elles fixent les règles du
+moteur (coefficients des évaluations puis des matières, rangs ex æquo,
+effectif égal au nombre d'inscrits).
+"""
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.utils import timezone
+
+from ..grade_engine import calculer_resultats_classe
+from ..models import Bulletin, Classe, Eleve, Evaluation, Matiere, Note, Professeur
+
+
+ANNEE_SCOLAIRE = '2024-2025'
+
+
+class ResultatsClasseTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user('prof', password='motdepasse')
+        professeur = Professeur.objects.create(user=user, civilite='M', date_embauche=datetime.date(2015, 9, 1))
+        cls.classe = Classe.objects.create(nom='6eA', niveau='6e')
+        cls.francais = Matiere.objects.create(nom='Français', code='FR', coefficient=2)
+        cls.anglais = Matiere.objects.create(nom='Anglais', code='AN', coefficient=1)
+        cls.eleves = [
+            Eleve.objects.create(
+                nom='Eleve', prenom=str(e), date_naissance=datetime.date(2012, 1, 1), lieu_naissance='Lyon',
+                sexe='F', numero_etudiant=f'ETU{e}', classe=cls.classe, adresse='1 rue de l\'École'
+            )
+            for e in range(4)
+        ]
+
+        def evaluation(matiere, coefficient, note_sur):
+            return Evaluation.objects.create(
+                titre='Contrôle', matiere=matiere, classe=cls.classe, professeur=professeur,
+                date_evaluation=timezone.now(), type_evaluation='DS', coefficient=coefficient, note_sur=note_sur,
+                trimestre=1, annee_scolaire=ANNEE_SCOLAIRE
+            )
+
+        evaluations = [evaluation(cls.francais, 1, 20), evaluation(cls.francais, 3, 10), evaluation(cls.anglais, 1, 20)]
+        # Le quatrième élève n'a aucune note
+        notes = [(10, 8, 12), (20, 10, 5), (16, 7, 12)]
+        Note.objects.bulk_create(
+            Note(eleve=eleve, evaluation=evaluation, note=note)
+            for eleve, ligne in zip(cls.eleves, notes)
+            for evaluation, note in zip(evaluations, ligne)
+        )
+
+    def test_moyennes_rangs_et_effectif(self):
+        resultats = calculer_resultats_classe(self.classe, 1, ANNEE_SCOLAIRE)
+        premier, deuxieme, troisieme, sans_note = (eleve.id for eleve in self.eleves)
+
+        # Français : (10 × 1 + 16 × 3) / 4, la note sur 10 ramenée sur 20
+        self.assertEqual(resultats.moyennes_par_matiere(premier), {self.francais: 14.5, self.anglais: 12.0})
+        # Générale : (14,5 × 2 + 12 × 1) / 3
+        self.assertEqual(resultats.moyenne_generale(premier), 13.67)
+        self.assertEqual(resultats.moyenne_generale(deuxieme), 15.0)
+        self.assertEqual(resultats.moyenne_generale(troisieme), 13.67)
+        self.assertIsNone(resultats.moyenne_generale(sans_note))
+
+        self.assertEqual(resultats.rang(deuxieme), 1)
+        self.assertEqual(resultats.rang(premier), 2)
+        self.assertEqual(resultats.rang(troisieme), 2)
+        self.assertIsNone(resultats.rang(sans_note))
+
+        self.assertEqual(resultats.nb_echecs(deuxieme), 1)
+        self.assertEqual(resultats.moyenne_classe, 14.11)
+        self.assertEqual(resultats.effectif, 4)
+
+    def test_bulletin_recalcule(self):
+        bulletin = Bulletin.objects.create(
+            eleve=self.eleves[0], classe=self.classe, trimestre=1, annee_scolaire=ANNEE_SCOLAIRE
+        )
+        bulletin.recalculer_tous_les_champs()
+        bulletin.refresh_from_db()
+
+        self.assertEqual(bulletin.moyenne_generale, Decimal('13.67'))
+        self.assertEqual(bulletin.rang, 2)
+        self.assertEqual(bulletin.moyenne_classe, Decimal('14.11'))
+        self.assertEqual(bulletin.effectif_classe, 4)
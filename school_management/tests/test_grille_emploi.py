@@ -0,0 +1,62 @@
+"""
+Grilles de l'emploi du temps en cache : invalidation par les signaux
+"""
+from django.core.cache import cache
+from django.test import TestCase
+
+from ..grille_emploi import grille_classe, grille_professeur
+from ..models import Professeur
+from .donnees import ANNEE_SCOLAIRE, creer_ecole
+
+
+def cours(grille):
+    return {cellule['pk']: cellule for ligne in grille['lignes'] for cellule in ligne['cellules'] if cellule}
+
+
+class GrilleEmploiTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ecole = creer_ecole()
+        cls.emploi = cls.ecole.emploi
+        cls.autre = Professeur.objects.exclude(pk=cls.emploi.professeur_id).select_related('user').first()
+
+    def setUp(self):
+        cache.clear()
+
+    def grilles(self, professeur_id):
+        return (
+            grille_classe(self.emploi.classe_id, ANNEE_SCOLAIRE, 1), grille_professeur(professeur_id, ANNEE_SCOLAIRE, 1)
+        )
+
+    def test_cours_reaffecte(self):
+        ancien = self.emploi.professeur
+        self.grilles(ancien.pk)
+        self.grilles(self.autre.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.emploi.professeur = self.autre
+            self.emploi.save()
+
+        classe, nouveau = self.grilles(self.autre.pk)
+        self.assertEqual(cours(classe)[self.emploi.pk]['professeur'], self.autre.nom_complet)
+        self.assertIn(self.emploi.pk, cours(nouveau))
+        self.assertNotIn(self.emploi.pk, cours(grille_professeur(ancien.pk, ANNEE_SCOLAIRE, 1)))
+
+    def test_professeur_renomme(self):
+        user = self.emploi.professeur.user
+        self.grilles(self.emploi.professeur_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            user.last_name = 'Renommé'
+            user.save()
+
+        for grille in self.grilles(self.emploi.professeur_id):
+            self.assertEqual(cours(grille)[self.emploi.pk]['professeur'], f'Renommé {user.first_name}')
+
+    def test_connexion_sans_invalidation(self):
+        user = self.emploi.professeur.user
+        # Seul last_login est enregistré : ni relecture du nom, ni invalidation
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks() as rappels:
+            user.save(update_fields=['last_login'])
+        self.assertEqual(rappels, [])
@@ -0,0 +1,46 @@
+"""
+Messagerie : flux des nouveaux messages
+"""
+from django.test import TestCase
+from django.urls import reverse
+
+from .donnees import creer_ecole
+
+
+class FluxMessagesWsgiTests(TestCase):
+    """Servi en WSGI (client de test), le flux ne garde jamais la connexion ouverte"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ecole = creer_ecole()
+        cls.messages = list(cls.ecole.conversation.messages.order_by('id'))
+
+    def setUp(self):
+        self.client.force_login(self.ecole.professeur.user)
+
+    def test_sse_refuse(self):
+        reponse = self.client.get(reverse('school_management:message_stream'))
+        self.assertEqual(reponse.status_code, 204)
+
+    def test_sondage_immediat(self):
+        apres = self.messages[-3].id
+        reponse = self.client.get(reverse('school_management:message_stream'), {'mode': 'poll', 'apres': apres})
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual([message['id'] for message in reponse.json()['messages']], [m.id for m in self.messages[-2:]])
+
+    def test_sondage_sans_point_de_depart(self):
+        url = reverse('school_management:message_stream')
+        self.assertEqual(self.client.get(url, {'mode': 'poll'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'mode': 'poll', 'apres': 'x'}).status_code, 400)
+
+        reponse = self.client.get(url, {'mode': 'poll'}, HTTP_LAST_EVENT_ID=str(self.messages[-2].id))
+        self.assertEqual([message['id'] for message in reponse.json()['messages']], [self.messages[-1].id])
+
+    def test_page_sans_event_source(self):
+        url = reverse('school_management:conversation_detail', kwargs={'pk': self.ecole.conversation.pk})
+        reponse = self.client.get(url)
+
+        self.assertFalse(reponse.context['flux_temps_reel'])
+        self.assertEqual(reponse.context['dernier_message_id'], self.messages[-1].id)
+        self.assertNotContains(reponse, 'new EventSource(urlFlux')
@@ -0,0 +1,162 @@
+"""
+Métriques de requêtes par vue : mesure par le middleware, détection des N+1,
+exposition Prometheus et accès à /metrics
+"""
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import metriques
+from ..metriques import Collecte, Registre, SEUIL_N_PLUS_1, cumuls, empreinte, exposition_prometheus, mesure_requete
+from ..middleware import MetriquesRequetesMiddleware
+from .donnees import creer_ecole
+
+
+def mesure(duree, requetes=()):
+    """Mesure d'une requête HTTP de la durée donnée ayant exécuté les requêtes SQL données"""
+    collecte = Collecte()
+    collecte.debut -= duree
+    for sql in requetes:
+        collecte(lambda *args: None, sql, (), False, {})
+    return mesure_requete(collecte, 200)
+
+
+class MetriquesTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ecole = creer_ecole()
+
+    def setUp(self):
+        # Registre et instantanés propres au test
+        cache.clear()
+        patch = mock.patch.object(metriques, 'registre', Registre())
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_empreinte(self):
+        self.assertEqual(
+            empreinte('SELECT "id" FROM "eleve" WHERE "classe_id" IN (%s, %s, %s) AND "statut" = %s'),
+            'SELECT "id" FROM "eleve" WHERE "classe_id" IN (%s, ...) AND "statut" = %s'
+        )
+        self.assertEqual(empreinte('... IN (%s, %s)'), empreinte('... IN (%s, %s, %s, %s)'))
+        self.assertEqual(len(empreinte('SELECT %s' + ', %s' * 500)), metriques.TAILLE_EMPREINTE)
+
+    def test_seuil_n_plus_1(self):
+        sous_le_seuil = mesure(0.01, ['SELECT * FROM note WHERE eleve_id = %s'] * (SEUIL_N_PLUS_1 - 1))
+        self.assertEqual((sous_le_seuil['n_plus_1'], sous_le_seuil['empreintes']), (0, {}))
+
+        # Listes IN de longueurs différentes : une seule empreinte
+        requetes = [
+            f'SELECT * FROM note WHERE eleve_id IN ({", ".join(["%s"] * n)})' for n in range(2, 2 + SEUIL_N_PLUS_1)
+        ]
+        au_seuil = mesure(0.01, requetes + ['SELECT 1'])
+        self.assertEqual(au_seuil['n_plus_1'], 1)
+        self.assertEqual(au_seuil['empreintes'], {'SELECT * FROM note WHERE eleve_id IN (%s, ...)': SEUIL_N_PLUS_1})
+        self.assertEqual(au_seuil['requetes_sql'], SEUIL_N_PLUS_1 + 1)
+
+    @override_settings(METRIQUES_EN_TETES=True)
+    def test_requetes_par_vue(self):
+        self.client.force_login(self.ecole.admin)
+        url = reverse('school_management:eleve_list')
+        with CaptureQueriesContext(connection) as capture:
+            reponse = self.client.get(url)
+        # Le journal des requêtes est vidé au début de chaque requête HTTP
+        nombre = len(capture)
+        self.client.get(url, {'page': 1})
+
+        self.assertEqual(int(reponse['X-Requetes-SQL']), nombre)
+        agregat = cumuls()['school_management:eleve_list']
+        self.assertEqual(agregat['requetes'], 2)
+        self.assertEqual(agregat['max_requetes_sql'], nombre)
+        self.assertGreaterEqual(agregat['requetes_sql'], nombre + 1)
+        self.assertEqual(sum(agregat['buckets']), 2)
+        self.assertAlmostEqual(
+            agregat['temps_sql'] + agregat['temps_templates'] + agregat['temps_vue'], agregat['duree'], places=6
+        )
+        # Fichiers statiques et 404 : aucune vue résolue, rien n'est enregistré
+        self.client.get('/aucune-vue/')
+        self.assertEqual(set(cumuls()), {'school_management:eleve_list'})
+
+    def test_n_plus_1_detecte_par_le_middleware(self):
+        def vue(request):
+            for n in range(2, 2 + SEUIL_N_PLUS_1 + 1):
+                list(User.objects.filter(pk__in=range(1, n + 1)).values_list('id', flat=True))
+            list(User.objects.filter(username='admin').values_list('id', flat=True))
+            return HttpResponse()
+
+        request = RequestFactory().get('/')
+        request.resolver_match = SimpleNamespace(view_name='test:n_plus_1')
+        MetriquesRequetesMiddleware(vue)(request)
+
+        agregat = cumuls()['test:n_plus_1']
+        self.assertEqual((agregat['requetes_sql'], agregat['n_plus_1']), (SEUIL_N_PLUS_1 + 2, 1))
+        (sql, nombre), = agregat['empreintes'].items()
+        self.assertIn('IN (%s, ...)', sql)
+        self.assertEqual(nombre, SEUIL_N_PLUS_1 + 1)
+
+    def test_exposition_prometheus(self):
+        metriques.registre.enregistrer('liste "notes"', mesure(0.2))
+        metriques.registre.enregistrer('liste "notes"', mesure(3, ['SELECT %s'] * SEUIL_N_PLUS_1))
+        # Instantané publié par un autre processus
+        autre = Registre()
+        autre.enregistrer('liste "notes"', mesure(0.01))
+        cache.set('metriques:autre:1', autre.instantane())
+        cache.set(metriques.CLE_PROCESSUS, ['autre:1'])
+
+        lignes = exposition_prometheus().splitlines()
+        vue = 'vue="liste \\"notes\\""'
+        self.assertIn('# TYPE school_duree_requete_secondes histogram', lignes)
+        # Buckets cumulés : chaque borne compte les requêtes plus courtes qu'elle
+        buckets = [
+            ligne.rsplit(' ', 1) for ligne in lignes
+            if ligne.startswith(f'school_duree_requete_secondes_bucket{{{vue}')
+        ]
+        self.assertEqual([(etiquette.split('le="')[1][:-2], int(valeur)) for etiquette, valeur in buckets], [
+            ('0.05', 1), ('0.1', 1), ('0.25', 2), ('0.5', 2), ('1', 2), ('2.5', 2), ('5', 3), ('10', 3), ('+Inf', 3)
+        ])
+        self.assertIn(f'school_duree_requete_secondes_count{{{vue}}} 3', lignes)
+        self.assertIn(f'school_requetes_http_total{{{vue}}} 3', lignes)
+        self.assertIn(f'school_requetes_sql_total{{{vue}}} {SEUIL_N_PLUS_1}', lignes)
+        self.assertIn(f'school_requetes_n_plus_1_total{{{vue}}} 1', lignes)
+        self.assertIn('school_metriques_echantillonnage 1.0', lignes)
+
+    @override_settings(METRIQUES_JETON='jeton-secret')
+    def test_acces_metrics(self):
+        url = reverse('school_management:metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer autre').status_code, 403)
+        reponse = self.client.get(url, HTTP_AUTHORIZATION='Bearer jeton-secret')
+        self.assertEqual(reponse.status_code, 200)
+        self.assertTrue(reponse['Content-Type'].startswith('text/plain; version=0.0.4'))
+
+        self.client.force_login(self.ecole.professeur.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(self.ecole.admin)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    @override_settings(METRIQUES_JETON='')
+    def test_jeton_vide_refuse(self):
+        url = reverse('school_management:metrics')
+        self.assertEqual(self.client.get(url, HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+
+class MetriquesDureeTests(TestCase):
+
+    def test_bucket_de_la_duree(self):
+        # La borne est incluse dans son intervalle
+        with mock.patch.object(time, 'perf_counter', return_value=100.0):
+            collecte = Collecte()
+            collecte.debut = 99.5
+            self.assertEqual(mesure_requete(collecte, 200)['buckets'], [0, 0, 0, 1, 0, 0, 0, 0, 0])
+            collecte.debut = 80.0
+            self.assertEqual(mesure_requete(collecte, 503)['buckets'], [0, 0, 0, 0, 0, 0, 0, 0, 1])
+            self.assertEqual(mesure_requete(collecte, 503)['erreurs'], 1)
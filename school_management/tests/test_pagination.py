@@ -0,0 +1,160 @@
+"""
+Pagination par curseur : parcours des messages d'une conversation page à
+page, et des listes de notes, d'absences et de logs d'audit
+"""
+import base64
+import datetime
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from ..messaging_views import ORDRE_MESSAGES
+from ..models import Absence, AuditLog, Note
+from ..pagination import CurseurInvalide, paginer_par_curseur
+from .donnees import creer_ecole
+
+
+def curseur(valeurs):
+    return base64.urlsafe_b64encode(json.dumps(valeurs).encode()).decode().rstrip('=')
+
+
+class PaginationCurseurTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ecole = creer_ecole()
+        cls.conversation = cls.ecole.conversation
+        # Même date d'envoi pour tous : l'id seul départage les messages aux bornes des pages
+        premier = cls.conversation.messages.order_by('id').first()
+        cls.conversation.messages.update(date_envoi=premier.date_envoi)
+        cls.ids = list(cls.conversation.messages.order_by('id').values_list('id', flat=True))
+
+    def paginer(self, **curseurs):
+        return paginer_par_curseur(self.conversation.messages.all(), ORDRE_MESSAGES, 5, **curseurs)
+
+    def test_parcours_vers_les_plus_recents(self):
+        pages = [self.paginer()]
+        while pages[-1].has_next:
+            pages.append(self.paginer(apres=pages[-1].curseur_suivant))
+
+        self.assertEqual([[message.id for message in page] for page in pages], [
+            self.ids[:5], self.ids[5:10], self.ids[10:]
+        ])
+        self.assertEqual([(page.has_previous, page.has_next) for page in pages], [
+            (False, True), (True, True), (True, False)
+        ])
+
+    def test_parcours_depuis_la_fin(self):
+        pages = [self.paginer(depuis_la_fin=True)]
+        while pages[-1].has_previous:
+            pages.append(self.paginer(avant=pages[-1].curseur_precedent))
+
+        self.assertEqual([[message.id for message in page] for page in pages], [
+            self.ids[7:], self.ids[2:7], self.ids[:2]
+        ])
+        self.assertFalse(pages[0].has_next)
+        self.assertTrue(pages[1].has_next)
+        # Retour vers les plus récents depuis la page du milieu
+        self.assertEqual([message.id for message in self.paginer(apres=pages[1].curseur_suivant)], self.ids[7:12])
+
+    def test_curseur_invalide(self):
+        for invalide in ('pas-un-curseur', 'WzFd', curseur([None, 1]), curseur([{'a': 1}, 1]), curseur([[], 1])):
+            with self.subTest(invalide), self.assertRaises(CurseurInvalide):
+                self.paginer(apres=invalide)
+
+    def test_api_json(self):
+        self.client.force_login(self.ecole.professeur.user)
+        url = reverse('school_management:get_conversation_messages', kwargs={'conversation_id': self.conversation.pk})
+
+        reponse = self.client.get(url, {'taille': 5}).json()
+        self.assertEqual([message['id'] for message in reponse['messages']], self.ids[7:])
+        self.assertIsNone(reponse['curseurs']['plus_recents'])
+
+        reponse = self.client.get(url, {'taille': 5, 'avant': reponse['curseurs']['plus_anciens']}).json()
+        self.assertEqual([message['id'] for message in reponse['messages']], self.ids[2:7])
+
+        self.assertEqual(self.client.get(url, {'avant': 'pas-un-curseur'}).status_code, 400)
+
+
+class PaginationListesTests(TestCase):
+    """Listes paginées par PaginationCurseurMixin et paginer_requete, parcourues par leurs liens"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ecole = creer_ecole()
+        instant = timezone.now() - datetime.timedelta(days=1)
+        # Clé de tri identique pour toutes les notes et la moitié des absences : l'id départage
+        Note.objects.update(date_saisie=instant)
+        absences = list(Absence.objects.values_list('id', flat=True))
+        Absence.objects.filter(id__in=absences[::2]).update(date_debut=instant)
+        AuditLog.objects.bulk_create(
+            AuditLog(
+                user=cls.ecole.admin, action='UPDATE' if n % 3 else 'CREATE', model_name='Note',
+                object_repr=f'note {n}', timestamp=instant - datetime.timedelta(minutes=n // 10)
+            )
+            for n in range(120)
+        )
+
+    def setUp(self):
+        self.client.force_login(self.ecole.admin)
+
+    def parcourir(self, url, **filtres):
+        """Pages successives en suivant le lien « suivant », puis retour en arrière par « précédent »"""
+        reponse = self.client.get(url, filtres)
+        pages = [reponse.context['page_obj']]
+        while pages[-1].has_next:
+            pages.append(self.client.get(url + pages[-1].lien_suivant).context['page_obj'])
+        retour = [pages[-1]]
+        while retour[-1].has_previous:
+            retour.append(self.client.get(url + retour[-1].lien_precedent).context['page_obj'])
+        return [[objet.id for objet in page] for page in pages], [[objet.id for objet in page] for page in retour]
+
+    def verifier(self, url, attendus, taille, **filtres):
+        pages, retour = self.parcourir(url, **filtres)
+        self.assertGreater(len(pages), 1)
+        self.assertEqual([id for page in pages for id in page], attendus)
+        self.assertTrue(all(len(page) == taille for page in pages[:-1]))
+        self.assertEqual(retour, pages[::-1])
+
+    def test_notes(self):
+        attendus = list(Note.objects.order_by('-date_saisie', '-id').values_list('id', flat=True))
+        self.verifier(reverse('school_management:note_list'), attendus, 50)
+
+    def test_absences(self):
+        attendus = list(Absence.objects.order_by('-date_debut', '-id').values_list('id', flat=True))
+        self.verifier(reverse('school_management:absence_list'), attendus, 20)
+
+    def test_logs_audit_avec_filtre(self):
+        logs = AuditLog.objects.filter(action='UPDATE').order_by('-timestamp', '-id')
+        url = reverse('school_management:audit_logs')
+        self.verifier(url, list(logs.values_list('id', flat=True)), 50, action='UPDATE')
+
+        page = self.client.get(url, {'action': 'UPDATE'}).context['page_obj']
+        self.assertIn('action=UPDATE', page.lien_suivant)
+        self.assertEqual((page.compte, page.compte_exact), (logs.count(), True))
+
+    def test_derniere_page(self):
+        url = reverse('school_management:absence_list')
+        derniere = self.client.get(url, {'avant': ''}).context['page_obj']
+        attendus = list(Absence.objects.order_by('-date_debut', '-id').values_list('id', flat=True))
+        self.assertEqual([absence.id for absence in derniere], attendus[-20:])
+        self.assertFalse(derniere.has_next)
+
+    def test_curseur_altere(self):
+        premiere = [note.id for note in self.client.get(reverse('school_management:note_list')).context['page_obj']]
+        note = Note.objects.get(pk=premiere[0])
+        for nom, valeur in {
+            'illisible': '!!!',
+            'trop de valeurs': curseur([note.date_saisie.isoformat(), note.id, 1]),
+            'date invalide': curseur(['hier', note.id]),
+            'objet à la place de la date': curseur([{'date': 1}, note.id]),
+            'valeur nulle': curseur([None, note.id]),
+            'id non numérique': curseur([note.date_saisie.isoformat(), 'x']),
+        }.items():
+            for sens in ('apres', 'avant'):
+                with self.subTest(nom, sens=sens):
+                    reponse = self.client.get(reverse('school_management:note_list'), {sens: valeur})
+                    self.assertEqual(reponse.status_code, 200)
+                    self.assertEqual([n.id for n in reponse.context['page_obj']], premiere)
@@ -0,0 +1,149 @@
+"""
+Saisie groupée des notes : grille JSON ou formulaire HTML envoyé à saisir_notes
+"""
+import json
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Note
+from ..saisie_notes import GrilleInvalide, lire_grille_formulaire, lire_grille_json
+from .donnees import creer_ecole
+
+
+class SaisieNotesJsonTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ecole = creer_ecole()
+        cls.evaluation = cls.ecole.evaluation
+        cls.eleves = list(cls.evaluation.classe.eleves.order_by('id'))
+
+    def setUp(self):
+        self.client.force_login(self.ecole.professeur.user)
+
+    def envoyer(self, corps):
+        return self.client.post(
+            reverse('school_management:saisir_notes', kwargs={'pk': self.evaluation.pk}),
+            data=corps if isinstance(corps, str) else json.dumps(corps),
+            content_type='application/json'
+        )
+
+    def note(self, eleve):
+        return Note.objects.get(evaluation=self.evaluation, eleve=eleve)
+
+    def test_grille_enregistree(self):
+        premier, second = self.eleves[:2]
+        reponse = self.envoyer({'notes': [
+            {'eleve': premier.id, 'note': '15,5', 'commentaire': 'Bien'},
+            {'eleve': second.id, 'note': None, 'absent': True},
+        ]})
+
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual(reponse.json(), {'success': True, 'crees': 0, 'mis_a_jour': 2, 'inchanges': 0, 'saisies': 2})
+        self.assertEqual(self.note(premier).note, Decimal('15.50'))
+        self.assertEqual(self.note(premier).commentaire, 'Bien')
+        self.assertIsNone(self.note(second).note)
+        self.assertTrue(self.note(second).absent)
+        # Les élèves absents de la grille ne sont pas modifiés
+        self.assertIsNotNone(self.note(self.eleves[2]).note)
+
+    def test_grille_invalide_rien_ecrit(self):
+        premier, second = self.eleves[:2]
+        avant = self.note(premier).note
+        reponse = self.envoyer({'notes': [
+            {'eleve': premier.id, 'note': 12},
+            {'eleve': second.id, 'note': 25},
+        ]})
+
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(list(reponse.json()['errors']), [str(second.id)])
+        self.assertEqual(self.note(premier).note, avant)
+
+    def test_erreurs_de_grille(self):
+        premier, second = self.eleves[:2]
+        cas = {
+            'corps illisible': ('pas du json', '__all__'),
+            'notes absentes': ({'lignes': []}, '__all__'),
+            'notes non liste': ({'notes': {}}, '__all__'),
+            'ligne non objet': ({'notes': [12]}, 'ligne_0'),
+            'élève inconnu': ({'notes': [{'eleve': 0, 'note': 12}]}, 'ligne_0'),
+            'élève liste': ({'notes': [{'eleve': [premier.id], 'note': 12}]}, 'ligne_0'),
+            'élève objet': ({'notes': [{'eleve': {}, 'note': 12}]}, 'ligne_0'),
+            'élève booléen': ({'notes': [{'eleve': True, 'note': 12}]}, 'ligne_0'),
+            'élève texte': ({'notes': [{'eleve': str(premier.id), 'note': 12}]}, 'ligne_0'),
+            'élève décimal': ({'notes': [{'eleve': float(premier.id), 'note': 12}]}, 'ligne_0'),
+            'élève en double': ({'notes': [{'eleve': premier.id}, {'eleve': premier.id}]}, premier.id),
+            'note non numérique': ({'notes': [{'eleve': premier.id, 'note': 'abc'}]}, premier.id),
+            'note négative': ({'notes': [{'eleve': premier.id, 'note': -1}]}, premier.id),
+            'note hors barème': ({'notes': [{'eleve': premier.id, 'note': 21}]}, premier.id),
+            'absent non booléen': ({'notes': [{'eleve': premier.id, 'absent': 'oui'}]}, premier.id),
+            'commentaire nombre': ({'notes': [{'eleve': premier.id, 'commentaire': 3}]}, premier.id),
+            'commentaire liste': ({'notes': [{'eleve': second.id, 'commentaire': ['a']}]}, second.id),
+            'commentaire objet': ({'notes': [{'eleve': second.id, 'commentaire': {}}]}, second.id),
+        }
+        for nom, (corps, cle) in cas.items():
+            with self.subTest(nom):
+                corps = corps if isinstance(corps, str) else json.dumps(corps)
+                with self.assertRaises(GrilleInvalide) as contexte:
+                    lire_grille_json(corps, self.evaluation, self.eleves)
+                self.assertIn(cle, contexte.exception.erreurs)
+
+    def test_commentaire_nul_accepte(self):
+        premier = self.eleves[0]
+        corps = json.dumps({'notes': [{'eleve': premier.id, 'note': 10, 'commentaire': None}]})
+        lignes = lire_grille_json(corps, self.evaluation, self.eleves)
+        self.assertEqual(lignes[premier.id]['commentaire'], '')
+
+
+class SaisieNotesFormulaireTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ecole = creer_ecole()
+        cls.evaluation = cls.ecole.evaluation
+        cls.eleves = list(cls.evaluation.classe.eleves.order_by('id'))
+        cls.url = reverse('school_management:saisir_notes', kwargs={'pk': cls.evaluation.pk})
+
+    def setUp(self):
+        self.client.force_login(self.ecole.professeur.user)
+
+    def test_lignes_de_tous_les_eleves(self):
+        premier, second = self.eleves[:2]
+        lignes = lire_grille_formulaire(
+            {f'note_{premier.id}': '12,25', f'absent_{second.id}': 'on'}, self.evaluation, self.eleves
+        )
+
+        self.assertEqual(list(lignes), [eleve.id for eleve in self.eleves])
+        self.assertEqual(lignes[premier.id], {'note': Decimal('12.25'), 'absent': False, 'commentaire': ''})
+        self.assertEqual(lignes[second.id], {'note': None, 'absent': True, 'commentaire': ''})
+
+    def test_valeurs_hors_bareme(self):
+        premier, second, troisieme = self.eleves[:3]
+        with self.assertRaises(GrilleInvalide) as contexte:
+            lire_grille_formulaire(
+                {f'note_{premier.id}': '-1', f'note_{second.id}': '20.5', f'note_{troisieme.id}': 'NaN'},
+                self.evaluation, self.eleves
+            )
+        self.assertEqual(set(contexte.exception.erreurs), {premier.id, second.id, troisieme.id})
+
+    def test_formulaire_enregistre(self):
+        premier = self.eleves[0]
+        donnees = {f'note_{eleve.id}': '10' for eleve in self.eleves}
+        donnees[f'note_{premier.id}'] = '17'
+        reponse = self.client.post(self.url, donnees)
+
+        self.assertRedirects(
+            reponse, reverse('school_management:evaluation_detail', kwargs={'pk': self.evaluation.pk}),
+            fetch_redirect_response=False
+        )
+        self.assertEqual(Note.objects.get(evaluation=self.evaluation, eleve=premier).note, Decimal('17.00'))
+
+    def test_formulaire_invalide_rien_ecrit(self):
+        premier, second = self.eleves[:2]
+        avant = Note.objects.get(evaluation=self.evaluation, eleve=premier).note
+        reponse = self.client.post(self.url, {f'note_{premier.id}': '18', f'note_{second.id}': '21'})
+
+        self.assertRedirects(reponse, self.url, fetch_redirect_response=False)
+        self.assertEqual(Note.objects.get(evaluation=self.evaluation, eleve=premier).note, avant)
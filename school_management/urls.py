@@ -135,6 +135,8 @@ urlpatterns = [
     # Administration personnalisée
     path('administration/dashboard/', admin_views.AdminDashboardView.as_view(), name='admin_dashboard'),
     path('administration/statistics/', admin_views.admin_statistics, name='admin_statistics'),
+    path('administration/metriques/', admin_views.admin_metriques, name='admin_metriques'),
+    path('metrics', admin_views.metrics, name='metrics'),
     path('administration/users/', admin_views.admin_users_management, name='admin_users'),
     path('administration/professeurs-principaux/', admin_views.admin_prof_principal_management, name='admin_prof_principal'),
     
@@ -186,6 +188,8 @@ urlpatterns = [
     path('planning/emplois/<int:pk>/supprimer/', planning_views.EmploiDuTempsDeleteView.as_view(), name='emploi_delete'),
     path('planning/emplois/classe/<int:classe_id>/', planning_views.emploi_du_temps_classe, name='emploi_classe'),
     path('planning/emplois/professeur/<int:professeur_id>/', planning_views.emploi_du_temps_professeur, name='emploi_professeur'),
+    path('planning/emplois/conflits/', planning_views.rapport_conflits_emploi, name='emploi_conflits'),
+    path('planning/emplois/generer/', planning_views.generer_emploi_du_temps, name='emploi_generer'),
     path('planning/mon-emploi/', planning_views.emploi_du_temps_eleve, name='emploi_eleve'),
     
     # Gestion du calendrier
@@ -218,4 +222,6 @@ urlpatterns = [
     path('messagerie/conversations/<int:conversation_id>/ajouter-participants/', messaging_views.add_participants, name='add_participants'),
     path('messagerie/conversations/<int:conversation_id>/retirer-participant/<int:user_id>/', messaging_views.remove_participant, name='remove_participant'),
     path('ajax/messagerie/conversations/<int:conversation_id>/messages/', messaging_views.get_conversation_messages, name='get_conversation_messages'),
+    path('ajax/messagerie/conversations/<int:conversation_id>/lu/', messaging_views.mark_messages_read, name='mark_messages_read'),
+    path('ajax/messagerie/flux/', messaging_views.message_stream, name='message_stream'),
 ]
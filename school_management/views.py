@@ -10,15 +10,19 @@ from django.views.generic import (
 )
 from django.urls import reverse_lazy
 from django.contrib import messages
-from django.db.models import Count, Avg, Q
-from django.http import HttpResponse
+from django.db.models import Count, Avg, Q, Sum
+from django.http import HttpResponse, JsonResponse
 from django.utils import timezone
 from django.views.decorators.csrf import csrf_protect
 from django.utils.decorators import method_decorator
 from .models import (
     Classe, Matiere, Professeur, Eleve,
-    Evaluation, Note, Absence, AnneeScolaire, Parent, Communication, Conversation, Message
+    Evaluation, Note, MoyenneEleveMatiere, Absence, AnneeScolaire, Parent, Communication
 )
+from .permissions import get_user_type
+from .dashboard_cache import contexte_dashboard
+from .messagerie import compteurs_messagerie
+from .pagination import PaginationCurseurMixin, paginer_requete
 from .forms import NoteFormSet, ProfesseurForm, ParentForm, CommunicationForm, CustomLoginForm, UserProfileForm, PasswordChangeForm
 
 
@@ -520,36 +524,42 @@ def saisir_notes(request, pk):
         raise PermissionDenied("Les élèves ne peuvent pas saisir de notes")
     
     evaluation = get_object_or_404(Evaluation, pk=pk)
-    eleves = evaluation.classe.eleves.filter(statut=True).order_by('nom', 'prenom')
+    eleves = evaluation.classe.eleves.filter(statut=True).select_related('user').order_by('nom', 'prenom')
     
     if request.method == 'POST':
-        for eleve in eleves:
-            note_value = request.POST.get(f'note_{eleve.id}')
-            absent = request.POST.get(f'absent_{eleve.id}') == 'on'
-            commentaire = request.POST.get(f'commentaire_{eleve.id}', '')
-            
-            note, created = Note.objects.get_or_create(
-                eleve=eleve,
-                evaluation=evaluation,
-                defaults={'note': note_value if note_value else None, 'absent': absent, 'commentaire': commentaire}
-            )
-            
-            if not created:
-                note.note = note_value if note_value else None
-                note.absent = absent
-                note.commentaire = commentaire
-                note.save()
+        from .audit_utils import log_notes_save
+        from .saisie_notes import GrilleInvalide, enregistrer_grille, lire_grille_formulaire, lire_grille_json
+        
+        en_json = request.content_type == 'application/json'
+        eleves = list(eleves)
+        
+        # Valider toute la grille avant d'écrire quoi que ce soit
+        try:
+            if en_json:
+                lignes = lire_grille_json(request.body, evaluation, eleves)
+            else:
+                lignes = lire_grille_formulaire(request.POST, evaluation, eleves)
+        except GrilleInvalide as e:
+            if en_json:
+                return JsonResponse({'success': False, 'errors': e.erreurs}, status=400)
+            noms = {eleve.id: eleve.nom_complet for eleve in eleves}
+            for eleve_id, erreur in e.erreurs.items():
+                messages.error(request, f"{noms.get(eleve_id, eleve_id)} : {erreur}")
+            return redirect('school_management:saisir_notes', pk=evaluation.pk)
+        
+        bilan = enregistrer_grille(evaluation, lignes)
         
         # Enregistrer le log d'audit
-        from .audit_utils import log_notes_save
-        notes_count = len([eleve for eleve in eleves if request.POST.get(f'note_{eleve.id}') or request.POST.get(f'absent_{eleve.id}') == 'on'])
-        log_notes_save(request.user, evaluation, notes_count, request)
+        log_notes_save(request.user, evaluation, bilan['saisies'], request)
+        
+        if en_json:
+            return JsonResponse({'success': True, **bilan})
         
         messages.success(request, 'Notes enregistrées avec succès!')
         return redirect('school_management:evaluation_detail', pk=evaluation.pk)
     
     # Récupérer les notes existantes
-    notes_existantes = {note.eleve.id: note for note in Note.objects.filter(evaluation=evaluation)}
+    notes_existantes = {note.eleve_id: note for note in Note.objects.filter(evaluation=evaluation)}
     
     context = {
         'evaluation': evaluation,
@@ -561,16 +571,18 @@ def saisir_notes(request, pk):
 
 # =============== VUES POUR LES NOTES ===============
 
-class NoteListView(LoginRequiredMixin, ListView):
+class NoteListView(LoginRequiredMixin, PaginationCurseurMixin, ListView):
     model = Note
     template_name = 'school_management/note/list.html'
     context_object_name = 'notes'
     paginate_by = 50
+    ordre_curseur = ('-date_saisie', '-id')
+    compte_approximatif = True
     
     def get_queryset(self):
         from .permissions import get_user_type
         
-        queryset = Note.objects.select_related('eleve', 'evaluation', 'evaluation__matiere').order_by('-date_saisie')
+        queryset = Note.objects.select_related('eleve', 'evaluation', 'evaluation__matiere', 'evaluation__classe').order_by('-date_saisie')
         user_type = get_user_type(self.request.user)
         
         if user_type == 'eleve':
@@ -587,27 +599,21 @@ class NoteListView(LoginRequiredMixin, ListView):
 def notes_eleve(request, eleve_id):
     """Vue pour afficher toutes les notes d'un élève"""
     from .permissions import check_eleve_access
-    from django.db.models import Avg
-    from collections import defaultdict
+    from .moyennes import moyennes_eleve
     
     eleve = get_object_or_404(Eleve, pk=eleve_id)
     # Vérifier les permissions d'accès
     check_eleve_access(request.user, eleve)
     
-    notes = Note.objects.filter(eleve=eleve).select_related('evaluation', 'evaluation__matiere').order_by('-evaluation__date_evaluation')
+    notes = list(Note.objects.filter(eleve=eleve).select_related('evaluation', 'evaluation__matiere').order_by('-evaluation__date_evaluation'))
     
-    # Calculer les moyennes par matière
+    # Moyennes par matière lues dans la table agrégée
+    moyennes = moyennes_eleve(eleve)
     moyennes_par_matiere = {}
     for note in notes:
         matiere = note.evaluation.matiere
         if matiere not in moyennes_par_matiere:
-            # Calculer la moyenne pour cette matière
-            notes_matiere = notes.filter(evaluation__matiere=matiere, note__isnull=False)
-            if notes_matiere.exists():
-                moyenne = notes_matiere.aggregate(moyenne=Avg('note'))['moyenne']
-                moyennes_par_matiere[matiere] = round(moyenne, 2) if moyenne else None
-            else:
-                moyennes_par_matiere[matiere] = None
+            moyennes_par_matiere[matiere] = moyennes.get(matiere)
     
     context = {
         'eleve': eleve,
@@ -619,11 +625,12 @@ def notes_eleve(request, eleve_id):
 
 # =============== VUES POUR LES ABSENCES ===============
 
-class AbsenceListView(LoginRequiredMixin, ListView):
+class AbsenceListView(LoginRequiredMixin, PaginationCurseurMixin, ListView):
     model = Absence
     template_name = 'school_management/absence/list.html'
     context_object_name = 'absences'
     paginate_by = 20
+    ordre_curseur = ('-date_debut', '-id')
     
     def get_queryset(self):
         from .permissions import get_user_type
@@ -741,26 +748,13 @@ def rapport_classe(request, classe_id):
 @login_required
 def bulletin_eleve(request, eleve_id):
     """Bulletin de notes d'un élève"""
+    from .moyennes import moyennes_eleve
+
     eleve = get_object_or_404(Eleve, pk=eleve_id)
     notes = Note.objects.filter(eleve=eleve).select_related('evaluation', 'evaluation__matiere')
     
-    # Calculer les moyennes par matière
-    moyennes_matieres = {}
-    for note in notes:
-        matiere = note.evaluation.matiere
-        if matiere not in moyennes_matieres:
-            moyennes_matieres[matiere] = {'notes': [], 'coefficients': []}
-        
-        if note.note is not None:
-            moyennes_matieres[matiere]['notes'].append(float(note.note_sur_20 or 0))
-            moyennes_matieres[matiere]['coefficients'].append(float(note.evaluation.coefficient))
-    
-    # Calculer la moyenne générale
-    moyennes_finales = {}
-    for matiere, data in moyennes_matieres.items():
-        if data['notes']:
-            moyenne_ponderee = sum(n * c for n, c in zip(data['notes'], data['coefficients'])) / sum(data['coefficients'])
-            moyennes_finales[matiere] = round(moyenne_ponderee, 2)
+    # Moyennes pondérées par matière lues dans la table agrégée
+    moyennes_finales = moyennes_eleve(eleve, ponderee=True)
     
     context = {
         'eleve': eleve,
@@ -793,7 +787,7 @@ class CustomLoginView(LoginView):
             return self.form_invalid(form)
         
         # Authentification selon le type d'utilisateur
-        user = authenticate(self.request, username=username, password=password)
+        user = authenticate(self.request, username=username, password=password, user_type=user_type)
         
         if user is not None:
             # Vérifier que l'utilisateur correspond au type sélectionné
@@ -841,19 +835,6 @@ class CustomLoginView(LoginView):
             return False
 
 
-def get_user_type(user):
-    """Détermine le type d'utilisateur"""
-    if hasattr(user, 'eleve'):
-        return 'eleve'
-    elif hasattr(user, 'professeur'):
-        return 'professeur'
-    elif hasattr(user, 'parent'):
-        return 'parent'
-    elif user.is_staff or user.is_superuser:
-        return 'admin'
-    return None
-
-
 @login_required
 def eleve_dashboard(request):
     """Tableau de bord pour les élèves"""
@@ -863,42 +844,41 @@ def eleve_dashboard(request):
         messages.error(request, 'Accès non autorisé')
         return redirect('school_management:login')
     
-    # Récupérer les données de l'élève
-    notes = Note.objects.filter(eleve=eleve).select_related('evaluation', 'evaluation__matiere').order_by('-evaluation__date_evaluation')[:10]
-    absences = Absence.objects.filter(eleve=eleve).order_by('-date_debut')[:5]
-    evaluations_a_venir = Evaluation.objects.filter(
-        classe=eleve.classe,
-        date_evaluation__gte=timezone.now().date()
-    ).order_by('date_evaluation')[:5]
-    
-    # Statistiques
-    moyenne_generale = notes.aggregate(moyenne=Avg('note'))['moyenne']
-    total_absences = Absence.objects.filter(eleve=eleve).count()
-    absences_non_justifiees = Absence.objects.filter(eleve=eleve, justifiee=False).count()
-    
-    # Données de messagerie
-    conversations_count = Conversation.objects.filter(
-        participants__user=request.user,
-        participants__actif=True,
-        active=True
-    ).count()
-    
-    unread_messages_count = Message.objects.filter(
-        conversation__participants__user=request.user,
-        conversation__participants__actif=True,
-        lu=False
-    ).exclude(expediteur=request.user).count()
+    def calculer():
+        # Récupérer les données de l'élève
+        notes = Note.objects.filter(eleve=eleve).select_related('evaluation', 'evaluation__matiere').order_by('-evaluation__date_evaluation')[:10]
+        absences = Absence.objects.filter(eleve=eleve).order_by('-date_debut')[:5]
+        evaluations_a_venir = Evaluation.objects.filter(
+            classe_id=eleve.classe_id,
+            date_evaluation__gte=timezone.now().date()
+        ).select_related('matiere').order_by('date_evaluation')[:5]
+        
+        # Statistiques
+        cumul = MoyenneEleveMatiere.objects.filter(eleve=eleve).aggregate(
+            somme=Sum('somme_notes'), nombre=Sum('nombre_notes')
+        )
+        absences_stats = Absence.objects.filter(eleve=eleve).aggregate(
+            total=Count('id'), non_justifiees=Count('id', filter=Q(justifiee=False))
+        )
+        
+        return {
+            'notes': list(notes),
+            'absences': list(absences),
+            'evaluations_a_venir': list(evaluations_a_venir),
+            'moyenne_generale': cumul['somme'] / cumul['nombre'] if cumul['nombre'] else None,
+            'total_absences': absences_stats['total'],
+            'absences_non_justifiees': absences_stats['non_justifiees'],
+            **compteurs_messagerie(request.user),
+        }
     
     context = {
         'eleve': eleve,
-        'notes': notes,
-        'absences': absences,
-        'evaluations_a_venir': evaluations_a_venir,
-        'moyenne_generale': moyenne_generale,
-        'total_absences': total_absences,
-        'absences_non_justifiees': absences_non_justifiees,
-        'conversations_count': conversations_count,
-        'unread_messages_count': unread_messages_count,
+        **contexte_dashboard(
+            'eleve',
+            f'{eleve.pk}:{timezone.localdate()}',
+            ['structure', f'eleve:{eleve.pk}', f'classe:{eleve.classe_id}', f'user:{request.user.pk}'],
+            calculer
+        ),
     }
     
     return render(request, 'school_management/dashboards/eleve.html', context)
@@ -913,44 +893,34 @@ def professeur_dashboard(request):
         messages.error(request, 'Accès non autorisé')
         return redirect('school_management:login')
     
-    # Récupérer les données du professeur
-    classes = professeur.classes.all()
-    matieres = professeur.matieres.all()
-    evaluations_recentes = Evaluation.objects.filter(professeur=professeur).order_by('-date_evaluation')[:5]
-    
-    # Statistiques
-    total_eleves = sum([classe.eleves.count() for classe in classes])
-    total_evaluations = Evaluation.objects.filter(professeur=professeur).count()
-    # Compter les évaluations sans notes saisies
-    evaluations_sans_notes = []
-    for evaluation in Evaluation.objects.filter(professeur=professeur):
-        if not evaluation.notes.exists():
-            evaluations_sans_notes.append(evaluation)
-    notes_a_saisir = len(evaluations_sans_notes)
-    
-    # Données de messagerie
-    conversations_count = Conversation.objects.filter(
-        participants__user=request.user,
-        participants__actif=True,
-        active=True
-    ).count()
-    
-    unread_messages_count = Message.objects.filter(
-        conversation__participants__user=request.user,
-        conversation__participants__actif=True,
-        lu=False
-    ).exclude(expediteur=request.user).count()
+    def calculer():
+        # Récupérer les données du professeur
+        classes = list(professeur.classes.annotate(nb_eleves=Count('eleves')))
+        evaluations = Evaluation.objects.filter(professeur=professeur)
+        evaluations_recentes = evaluations.select_related('classe').annotate(
+            nb_notes=Count('notes', distinct=True),
+            nb_eleves_classe=Count('classe__eleves', distinct=True)
+        ).order_by('-date_evaluation')[:5]
+        
+        return {
+            'classes': classes,
+            'matieres': list(professeur.matieres.all()),
+            'evaluations_recentes': list(evaluations_recentes),
+            'total_eleves': sum(classe.nb_eleves for classe in classes),
+            'total_evaluations': evaluations.count(),
+            # Évaluations sans notes saisies
+            'notes_a_saisir': evaluations.filter(notes__isnull=True).count(),
+            **compteurs_messagerie(request.user),
+        }
     
     context = {
         'professeur': professeur,
-        'classes': classes,
-        'matieres': matieres,
-        'evaluations_recentes': evaluations_recentes,
-        'total_eleves': total_eleves,
-        'total_evaluations': total_evaluations,
-        'notes_a_saisir': notes_a_saisir,
-        'conversations_count': conversations_count,
-        'unread_messages_count': unread_messages_count,
+        **contexte_dashboard(
+            'professeur',
+            professeur.pk,
+            ['structure', f'professeur:{professeur.pk}', f'user:{request.user.pk}'],
+            calculer
+        ),
     }
     
     return render(request, 'school_management/dashboards/professeur.html', context)
@@ -962,7 +932,6 @@ def audit_logs(request):
     from .permissions import get_user_type
     from .models import AuditLog
     from django.contrib.auth.models import User
-    from django.core.paginator import Paginator
     from django.db.models import Q
     
     # Vérifier que l'utilisateur est administrateur
@@ -1003,30 +972,16 @@ def audit_logs(request):
     if date_to:
         logs = logs.filter(timestamp__date__lte=date_to)
     
-    # Pagination
-    paginator = Paginator(logs, 50)  # 50 logs par page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    # Statistiques
-    total_logs = logs.count()
-    today_logs = logs.filter(timestamp__date=timezone.now().date()).count()
-    
-    # Actions les plus fréquentes
-    from django.db.models import Count
-    frequent_actions = logs.values('action').annotate(count=Count('action')).order_by('-count')[:5]
+    # Pagination par curseur, servie par l'index (timestamp, id)
+    page_obj = paginer_requete(request, logs, ('-timestamp', '-id'), 50, compte_approximatif=True)
     
-    # Utilisateurs les plus actifs
-    active_users = logs.values('user__username', 'user__first_name', 'user__last_name').annotate(
-        count=Count('user')
-    ).order_by('-count')[:5]
+    # Statistiques, lues dans les cumuls journaliers quand les filtres le permettent
+    from .audit_archive import indicateurs_audit
+    indicateurs = indicateurs_audit(logs, search, action_filter, user_filter, date_from, date_to)
     
     context = {
         'page_obj': page_obj,
-        'total_logs': total_logs,
-        'today_logs': today_logs,
-        'frequent_actions': frequent_actions,
-        'active_users': active_users,
+        **indicateurs,
         'search': search,
         'action_filter': action_filter,
         'user_filter': user_filter,
@@ -1763,171 +1718,14 @@ def sync_user_accounts(request):
 def results_analysis(request):
     """Vue pour l'analyse des résultats et performances"""
     from .permissions import get_user_type
-    from django.db.models import Avg, Count, Q, Min, Max
+    from .analytics import obtenir_analyse_resultats
     
     user_type = get_user_type(request.user)
     
-    # Statistiques générales des notes
-    total_notes = Note.objects.count()
-    moyenne_generale = Note.objects.aggregate(avg=Avg('note'))['avg'] or 0
-    note_min = Note.objects.aggregate(min=Min('note'))['min'] or 0
-    note_max = Note.objects.aggregate(max=Max('note'))['max'] or 0
-    
-    # Répartition des notes par tranches
-    excellent = Note.objects.filter(note__gte=16).count()
-    tres_bien = Note.objects.filter(note__gte=14, note__lt=16).count()
-    bien = Note.objects.filter(note__gte=12, note__lt=14).count()
-    assez_bien = Note.objects.filter(note__gte=10, note__lt=12).count()
-    insuffisant = Note.objects.filter(note__lt=10).count()
-    
-    # Top 10 des meilleurs élèves (moyenne générale)
-    meilleurs_eleves = []
-    for eleve in Eleve.objects.all():
-        notes_eleve = Note.objects.filter(eleve=eleve)
-        if notes_eleve.exists():
-            moyenne = notes_eleve.aggregate(avg=Avg('note'))['avg']
-            meilleurs_eleves.append({
-                'eleve': eleve,
-                'moyenne': moyenne,
-                'nb_notes': notes_eleve.count()
-            })
-    
-    # Trier par moyenne décroissante
-    meilleurs_eleves.sort(key=lambda x: x['moyenne'], reverse=True)
-    meilleurs_eleves = meilleurs_eleves[:10]
-    
-    # Top 10 des élèves en difficulté
-    eleves_difficulte = []
-    for eleve in Eleve.objects.all():
-        notes_eleve = Note.objects.filter(eleve=eleve)
-        if notes_eleve.exists():
-            moyenne = notes_eleve.aggregate(avg=Avg('note'))['avg']
-            if moyenne < 10:  # Seulement les élèves en difficulté
-                eleves_difficulte.append({
-                    'eleve': eleve,
-                    'moyenne': moyenne,
-                    'nb_notes': notes_eleve.count()
-                })
-    
-    # Trier par moyenne croissante (les plus en difficulté en premier)
-    eleves_difficulte.sort(key=lambda x: x['moyenne'])
-    eleves_difficulte = eleves_difficulte[:10]
-    
-    # Performance par matière
-    performance_matieres = []
-    for matiere in Matiere.objects.all():
-        notes_matiere = Note.objects.filter(evaluation__matiere=matiere)
-        if notes_matiere.exists():
-            stats = notes_matiere.aggregate(
-                moyenne=Avg('note'),
-                min=Min('note'),
-                max=Max('note'),
-                count=Count('note')
-            )
-            performance_matieres.append({
-                'matiere': matiere,
-                'moyenne': stats['moyenne'],
-                'min': stats['min'],
-                'max': stats['max'],
-                'count': stats['count']
-            })
-    
-    # Trier par moyenne décroissante
-    performance_matieres.sort(key=lambda x: x['moyenne'], reverse=True)
-    
-    # Performance par classe
-    performance_classes = []
-    for classe in Classe.objects.all():
-        eleves_classe = classe.eleves.all()
-        if eleves_classe.exists():
-            notes_classe = Note.objects.filter(eleve__in=eleves_classe)
-            if notes_classe.exists():
-                stats = notes_classe.aggregate(
-                    moyenne=Avg('note'),
-                    min=Min('note'),
-                    max=Max('note'),
-                    count=Count('note')
-                )
-                performance_classes.append({
-                    'classe': classe,
-                    'moyenne': stats['moyenne'],
-                    'min': stats['min'],
-                    'max': stats['max'],
-                    'count': stats['count'],
-                    'nb_eleves': eleves_classe.count()
-                })
-    
-    # Trier par moyenne décroissante
-    performance_classes.sort(key=lambda x: x['moyenne'], reverse=True)
-    
-    # Évolution des moyennes par mois (6 derniers mois)
-    from datetime import datetime, timedelta
-    evolution_moyennes = []
-    for i in range(6):
-        mois_date = timezone.now() - timedelta(days=30*i)
-        mois_debut = mois_date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        if i == 0:
-            mois_fin = timezone.now()
-        else:
-            mois_fin = (mois_debut + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        
-        notes_mois = Note.objects.filter(
-            date_saisie__gte=mois_debut,
-            date_saisie__lte=mois_fin
-        )
-        
-        moyenne_mois = notes_mois.aggregate(avg=Avg('note'))['avg'] if notes_mois.exists() else 0
-        
-        evolution_moyennes.append({
-            'mois': mois_debut.strftime('%B %Y'),
-            'moyenne': moyenne_mois,
-            'nb_notes': notes_mois.count()
-        })
-    
-    evolution_moyennes.reverse()
-    
-    # Taux de réussite par classe
-    taux_reussite_classes = []
-    for classe in Classe.objects.all():
-        eleves_classe = classe.eleves.all()
-        if eleves_classe.exists():
-            eleves_reussite = 0
-            for eleve in eleves_classe:
-                notes_eleve = Note.objects.filter(eleve=eleve)
-                if notes_eleve.exists():
-                    moyenne = notes_eleve.aggregate(avg=Avg('note'))['avg']
-                    if moyenne >= 10:
-                        eleves_reussite += 1
-            
-            taux_reussite = (eleves_reussite / eleves_classe.count()) * 100 if eleves_classe.count() > 0 else 0
-            
-            taux_reussite_classes.append({
-                'classe': classe,
-                'taux_reussite': taux_reussite,
-                'eleves_reussite': eleves_reussite,
-                'total_eleves': eleves_classe.count()
-            })
-    
-    # Trier par taux de réussite décroissant
-    taux_reussite_classes.sort(key=lambda x: x['taux_reussite'], reverse=True)
-    
+    # Tous les chiffres proviennent de l'instantané en cache, recalculé après chaque modification des notes
     context = {
         'user_type': user_type,
-        'total_notes': total_notes,
-        'moyenne_generale': moyenne_generale,
-        'note_min': note_min,
-        'note_max': note_max,
-        'excellent': excellent,
-        'tres_bien': tres_bien,
-        'bien': bien,
-        'assez_bien': assez_bien,
-        'insuffisant': insuffisant,
-        'meilleurs_eleves': meilleurs_eleves,
-        'eleves_difficulte': eleves_difficulte,
-        'performance_matieres': performance_matieres,
-        'performance_classes': performance_classes,
-        'evolution_moyennes': evolution_moyennes,
-        'taux_reussite_classes': taux_reussite_classes,
+        **obtenir_analyse_resultats(),
     }
     
     return render(request, 'school_management/statistics/results_analysis.html', context)
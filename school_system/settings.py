@@ -48,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'school_management.middleware.MetriquesRequetesMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,6 +56,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'school_management.middleware.RoleUtilisateurMiddleware',
     'school_management.middleware.UserTypeRedirectMiddleware',
     'school_management.audit_middleware.AuditMiddleware',
 ]
@@ -156,11 +158,14 @@ CRISPY_TEMPLATE_PACK = "bootstrap4"
 
 # Authentication backends
 AUTHENTICATION_BACKENDS = [
+    # Numéro étudiant ou nom d'utilisateur, permissions de ModelBackend
+    'school_management.backends.SchoolAuthBackend',
+    # Anciens chemins, pour les sessions ouvertes avant leur remplacement : à retirer à la version suivante.
+    # Ils ne font que relire la session, l'authentification reste une requête et un hachage.
     'school_management.backends.EleveAuthBackend',
     'school_management.backends.ProfesseurAuthBackend',
     'school_management.backends.ParentAuthBackend',
     'school_management.backends.AdminAuthBackend',
-    'django.contrib.auth.backends.ModelBackend',  # Fallback
 ]
 
 # Login/Logout URLs
@@ -188,6 +193,30 @@ EMAIL_USE_TLS = os.getenv('EMAIL_USE_TLS', 'True').lower() == 'true'
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 
+# Audit Configuration
+# Les logs d'audit sont mis en file et écrits par lots depuis un thread d'arrière-plan.
+# AUDIT_ASYNC=False revient à une écriture synchrone dans la requête.
+AUDIT_ASYNC = os.getenv('AUDIT_ASYNC', 'True').lower() == 'true'
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 200))
+AUDIT_FLUSH_INTERVAL = float(os.getenv('AUDIT_FLUSH_INTERVAL', 2.0))  # secondes
+AUDIT_QUEUE_MAX_SIZE = int(os.getenv('AUDIT_QUEUE_MAX_SIZE', 10000))
+AUDIT_ARCHIVE_DIR = os.getenv('AUDIT_ARCHIVE_DIR', str(BASE_DIR / 'archives' / 'audit'))
+
+# Diffusion temps réel des messages (school_management.evenements)
+MESSAGERIE_PUBSUB = {
+    'BACKEND': 'school_management.evenements.BackendMemoire',
+}
+
+# Métriques de requêtes par vue (school_management.metriques)
+# Fraction des requêtes mesurées ; METRIQUES_JETON autorise la collecte de
+# /metrics sans session (en-tête Authorization: Bearer <jeton>).
+# METRIQUES_EN_TETES ajoute aux réponses mesurées le nombre de requêtes SQL
+# (X-Requetes-SQL, Server-Timing), lu par la commande benchmark_http.
+METRIQUES_ACTIVES = os.getenv('METRIQUES_ACTIVES', 'True').lower() == 'true'
+METRIQUES_ECHANTILLONNAGE = float(os.getenv('METRIQUES_ECHANTILLONNAGE', 1.0))
+METRIQUES_JETON = os.getenv('METRIQUES_JETON', '')
+METRIQUES_EN_TETES = os.getenv('METRIQUES_EN_TETES', 'False').lower() == 'true'
+
 # Logging Configuration
 LOGGING = {
     'version': 1,
@@ -33,7 +33,7 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
 # Middleware pour les fichiers statiques
-MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+MIDDLEWARE.insert(MIDDLEWARE.index('django.middleware.security.SecurityMiddleware') + 1, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
 # Cache (Redis recommandé pour la production)
 CACHES = {
@@ -43,6 +43,15 @@ CACHES = {
     }
 }
 
+# Diffusion des messages entre les processus
+MESSAGERIE_PUBSUB = {
+    'BACKEND': 'school_management.evenements.BackendRedis',
+    'OPTIONS': {'url': os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/1')},
+}
+
+# Métriques : une requête sur dix suffit à repérer les vues coûteuses
+METRIQUES_ECHANTILLONNAGE = float(os.getenv('METRIQUES_ECHANTILLONNAGE', 0.1))
+
 # Session
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
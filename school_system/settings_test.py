@@ -29,6 +29,9 @@ CACHES = {
     }
 }
 
+# Écriture synchrone des logs d'audit pendant les tests
+AUDIT_ASYNC = False
+
 # Désactiver les emails pendant les tests
 EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
 